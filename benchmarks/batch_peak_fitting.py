@@ -0,0 +1,57 @@
+"""
+Benchmark batch peak fitting
+
+Fits a synthetic series of two-peak scans (peaks moving with "temperature") using:
+    - a serial loop of multipeakfit
+    - batch_multipeakfit with a pool of worker processes
+    - batch_multipeakfit seeding each fit from the previous result
+
+Usage:
+    python benchmarks/batch_peak_fitting.py [n_scans] [workers]
+"""
+
+import sys
+import time
+
+import numpy as np
+
+from mmg_toolbox.fitting import gauss, multipeakfit, batch_multipeakfit
+from mmg_toolbox.utils.parallel import DEFAULT_WORKERS
+
+N_SCANS = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+WORKERS = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_WORKERS
+
+
+def create_series(n_scans: int) -> tuple[np.ndarray, list[np.ndarray]]:
+    rng = np.random.default_rng(0)
+    x = np.linspace(-1, 1, 201)
+    ydata = []
+    for temperature in np.linspace(0, 1, n_scans):
+        y = gauss(x, height=100, cen=-0.3 + 0.1 * temperature, fwhm=0.1, bkg=5)
+        y += gauss(x, height=50 * (1 - temperature) + 10, cen=0.3, fwhm=0.15)
+        ydata.append(rng.poisson(y).astype(float))
+    return x, ydata
+
+
+if __name__ == '__main__':
+    x, ydata = create_series(N_SCANS)
+    options = dict(npeaks=2, model='Gaussian', background='slope')
+
+    t0 = time.perf_counter()
+    serial = [multipeakfit(x, y, **options) for y in ydata]
+    t_serial = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    batch = batch_multipeakfit([x] * N_SCANS, ydata, workers=WORKERS, **options)
+    t_batch = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    seeded = batch_multipeakfit([x] * N_SCANS, ydata, workers=WORKERS, seed_from_previous=True, **options)
+    t_seeded = time.perf_counter() - t0
+
+    diff = max(abs(a.center - b.center) for a, b in zip(serial, batch))
+    print(f"\n{N_SCANS} scans, {WORKERS} workers")
+    print(f"  serial multipeakfit loop:      {t_serial:.2f} s")
+    print(f"  batch_multipeakfit:            {t_batch:.2f} s  (x{t_serial / t_batch:.1f})")
+    print(f"  batch_multipeakfit (seeded):   {t_seeded:.2f} s  (x{t_serial / t_seeded:.1f})")
+    print(f"  max difference in centre between serial and batch: {diff:.3g}")
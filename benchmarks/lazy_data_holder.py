@@ -0,0 +1,72 @@
+"""
+Benchmark memory and time of NexusDataHolder
+
+Compares the memory allocated and the time taken between:
+    - reading every scannable and metadata value on creation (NexusDataHolder(...).preload())
+    - reading only the scannables that are used (NexusDataHolder(...).x, .signal)
+
+Usage:
+    python benchmarks/lazy_data_holder.py [n_points] [n_scannables]
+"""
+
+import os
+import sys
+import time
+import tempfile
+import tracemalloc
+
+import h5py
+import numpy as np
+
+import mmg_toolbox.nexus.nexus_writer as nw
+from mmg_toolbox.nexus.nexus_scan import NexusDataHolder
+
+N_POINTS = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+N_SCANNABLES = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+
+
+def create_file(filename: str, n_points: int, n_scannables: int) -> str:
+    x = np.linspace(0, 1, n_points)
+    with h5py.File(filename, 'w') as hdf:
+        entry = nw.add_nxentry(hdf, 'entry', default=True)
+        nw.add_nxfield(entry, 'entry_identifier', 12345)
+        nw.add_nxfield(entry, 'scan_command', 'scan x 0 1 0.1 signal')
+        nw.add_nxsample(entry, 'sample', 'test', temperature_k=300)
+        data = nw.add_nxdata(entry, 'measurement', axes=['x'], signal='signal', default=True)
+        nw.add_nxfield(data, 'x', x, units='mm')
+        nw.add_nxfield(data, 'signal', np.exp(-(x - 0.5) ** 2 / 0.02))
+        for n in range(n_scannables):
+            nw.add_nxfield(data, f'counter{n}', np.random.rand(n_points))
+        data.attrs['auxiliary_signals'] = [f'counter{n}' for n in range(n_scannables)]
+    return filename
+
+
+def eager(filename: str) -> float:
+    scan = NexusDataHolder(filename).preload()
+    return scan.signal[scan.x.argmax()]
+
+
+def lazy(filename: str) -> float:
+    scan = NexusDataHolder(filename)
+    return scan.signal[scan.x.argmax()]
+
+
+def measure(function, filename: str) -> tuple[float, float]:
+    """Return peak memory in MB and time taken"""
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    function(filename)
+    t1 = time.perf_counter()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1e6, t1 - t0
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmpdir:
+        file = create_file(os.path.join(tmpdir, '12345.nxs'), N_POINTS, N_SCANNABLES)
+        lazy(file)  # populate the NexusMap cache
+        print(f"{N_SCANNABLES + 2} scannables x {N_POINTS} points")
+        for label, fn in [('preload', eager), ('lazy, 2 fields', lazy)]:
+            memory, duration = measure(fn, file)
+            print(f"{label:>15}: {memory:8.1f} MB peak, {1000 * duration:8.1f} ms")
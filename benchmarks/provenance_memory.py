@@ -0,0 +1,60 @@
+"""
+Benchmark memory of an averaging workflow of many scans, keeping parent spectra of every processing step
+against keeping only provenance records and weak references to parents (provenance.set_keep_parents(False))
+
+Usage:
+    python benchmarks/provenance_memory.py [n_scans] [n_points]
+"""
+
+import gc
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from mmg_toolbox.xas.spectra import Spectra
+from mmg_toolbox.xas.spectra_container import SpectraContainer
+from mmg_toolbox.xas.container_functions import average_scans
+from mmg_toolbox.xas.provenance import set_keep_parents
+
+N_SCANS = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+N_POINTS = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+MODES = ('tey', 'tfy', 'pfy')
+
+
+def load_scan(n: int, rng: np.random.Generator) -> SpectraContainer:
+    energy = np.linspace(700, 730, N_POINTS)
+    spectra = {
+        mode: Spectra(energy, 1 + 0.01 * energy + np.exp(-(energy - 708) ** 2 / 2) + rng.normal(0, 0.01, N_POINTS),
+                      label=str(n), mode=mode)
+        for mode in MODES
+    }
+    return SpectraContainer(str(n), spectra)
+
+
+def workflow() -> SpectraContainer:
+    rng = np.random.default_rng(0)
+    scans = [
+        load_scan(n, rng).trim(1, 1).divide_by_preedge().remove_background('flat').divide_by_jump()
+        for n in range(N_SCANS)
+    ]
+    return average_scans(*scans)
+
+
+if __name__ == '__main__':
+    print(f"{N_SCANS} scans x {len(MODES)} modes x {N_POINTS} points")
+    for label, keep in [('keep parents', True), ('provenance', False)]:
+        previous = set_keep_parents(keep)
+        gc.collect()
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        average = workflow()
+        t1 = time.perf_counter()
+        gc.collect()
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        set_keep_parents(previous)
+        n_steps = len(average.spectra['tey'].history)
+        print(f"{label:>12}: {current / 1e6:.1f} MB retained, {peak / 1e6:.1f} MB peak, {t1 - t0:.2f} s, {n_steps} steps in history")
+        del average
@@ -0,0 +1,76 @@
+"""
+Benchmark file opens in load_xas_scans
+
+Compares the number of times each file is opened and the time taken to load
+processed NXxas files, between:
+    - checking the file type using is_i16vortex, is_subtraction and is_nxxas, then loading from the filename
+    - load_xas_scans, which opens each file once and passes the open file to the loader
+
+Usage:
+    python benchmarks/xas_loader_opens.py [n_files]
+"""
+
+import os
+import sys
+import time
+import tempfile
+
+import h5py
+import numpy as np
+
+from mmg_toolbox.xas import Spectra, SpectraContainer, load_xas_scans
+from mmg_toolbox.xas.nxxas_loader import is_i16vortex, is_subtraction, is_nxxas, load_from_nxs
+
+N_FILES = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+
+def create_files(folder: str, n_files: int) -> list[str]:
+    energy = np.arange(700, 730, 0.1)
+    filenames = []
+    for n in range(n_files):
+        spectra = {
+            mode: Spectra(energy, np.random.rand(len(energy)) + 3, label=f'{n}', mode=mode)
+            for mode in ['tey', 'tfy']
+        }
+        container = SpectraContainer(f'scan{n}', spectra).divide_by_preedge()
+        filename = os.path.join(folder, f'{n}.nxs')
+        container.write_nexus(filename)
+        filenames.append(filename)
+    return filenames
+
+
+def previous_loader(*filenames: str) -> list[SpectraContainer]:
+    """File type checks each open the file before loading"""
+    return [
+        load_from_nxs(filename)
+        for filename in filenames
+        if not is_i16vortex(filename) and not is_subtraction(filename) and is_nxxas(filename)
+    ]
+
+
+def count_opens(function, *filenames: str) -> tuple[int, float]:
+    """Return number of files opened and time taken"""
+    opened = []
+    h5py_init = h5py.File.__init__
+
+    def count_init(self, name, *args, **kwargs):
+        if isinstance(name, str):
+            opened.append(name)
+        h5py_init(self, name, *args, **kwargs)
+
+    h5py.File.__init__ = count_init
+    try:
+        t0 = time.perf_counter()
+        function(*filenames)
+        t1 = time.perf_counter()
+    finally:
+        h5py.File.__init__ = h5py_init
+    return len(opened), t1 - t0
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmpdir:
+        files = create_files(tmpdir, N_FILES)
+        for label, fn in [('is_* checks + loader', previous_loader), ('load_xas_scans', load_xas_scans)]:
+            n_opens, duration = count_opens(fn, *files)
+            print(f"{label:>22}: {n_opens / N_FILES:.1f} opens/file, {1000 * duration / N_FILES:.2f} ms/file")
@@ -3,12 +3,9 @@ Magnetic Materials Group Toolbox
 """
 
 import sys
-from mmg_toolbox.utils.file_reader import data_file_reader
-from mmg_toolbox.utils.experiment import Experiment
+import importlib
 from mmg_toolbox.utils.env_functions import get_dls_visits, get_dls_visits_str, find_scan_files, scan_number_mapping
-from mmg_toolbox.nexus import NexusScan, NexusDataHolder
 from mmg_toolbox.beamline_metadata import metadata, xas_metadata, nexus_metadata
-from mmg_toolbox.scripts.experiment_startup import create_notebooks
 
 __version__ = '0.6.4'
 __date__ = '22/07/2026'
@@ -20,6 +17,31 @@ __all__ = ['start_gui', 'version_info', 'title', 'module_info',
            'metadata', 'xas_metadata', 'nexus_metadata',
            'create_notebooks']
 
+# Attributes imported on first use, as they import matplotlib, lmfit, scipy, tkinter, etc.
+_LAZY_ATTRIBUTES = {
+    'data_file_reader': 'mmg_toolbox.utils.file_reader',
+    'Experiment': 'mmg_toolbox.utils.experiment',
+    'NexusScan': 'mmg_toolbox.nexus',
+    'NexusDataHolder': 'mmg_toolbox.nexus',
+    'create_notebooks': 'mmg_toolbox.scripts.experiment_startup',
+}
+_LAZY_MODULES = ('nexus', 'xas', 'fitting', 'plotting', 'diffraction', 'tkguis', 'scripts')
+
+
+def __getattr__(name: str):
+    if name in _LAZY_ATTRIBUTES:
+        value = getattr(importlib.import_module(_LAZY_ATTRIBUTES[name]), name)
+    elif name in _LAZY_MODULES:
+        value = importlib.import_module(f"{__name__}.{name}")
+    else:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + list(_LAZY_ATTRIBUTES) + list(_LAZY_MODULES))
+
 
 def start_gui(*args: str):
     from mmg_toolbox.tkguis import run
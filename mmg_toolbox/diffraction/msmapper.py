@@ -6,6 +6,7 @@ import h5py
 
 from mmg_toolbox import version_info
 from mmg_toolbox.nexus import nexus_writer as nw
+from mmg_toolbox.utils.hdf_file_pool import close_hdf
 from mmg_toolbox.fitting import FitResults
 from .plotly_colourmaps import PLOTLY_CMAPS
 
@@ -196,6 +197,7 @@ def update_msmapper_nexus(filename: str, hkl_slice: tuple[np.ndarray, np.ndarray
 
     print(f"Updating NeXus file: {filename}")
 
+    close_hdf(filename)
     with h5py.File(filename, 'a') as hdf:
         entry = nw.add_nxentry(hdf, 'analysis', definition=None, default=True)
         nw.add_nxprocess(entry, 'process',
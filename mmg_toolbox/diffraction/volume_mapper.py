@@ -0,0 +1,346 @@
+"""
+Native reciprocal space mapper
+
+Python alternative to the Java msmapper, binning detector images from a NeXus scan into a regular
+voxel grid in HKL or Q, using the instrument geometry from NXtransformations (NXInstrumentModel).
+
+    output = map_scan_volume('12345.nxs', 'processed/12345_rsmap.nxs', step=0.002, normalisation='rc')
+    scan = NexusScan(output)
+    h, k, l, volume = scan('h_axis, k_axis, l_axis, volume')
+
+Images are read and binned in blocks of frames on a pool of worker processes, with each worker returning
+only the occupied voxels, so memory use is bounded by the voxel grid and the size of the frame blocks.
+The output file uses the same /processed/reciprocal_space layout as msmapper.
+"""
+
+import os
+import datetime
+import typing
+from functools import partial, lru_cache
+
+import h5py
+import numpy as np
+from hdfmap.nexus import default_nxentry
+
+from mmg_toolbox import version_info
+from mmg_toolbox.nexus import nexus_writer as nw
+from mmg_toolbox.nexus.nexus_scan import NexusScan
+from mmg_toolbox.nexus.instrument_model import NXInstrumentModel, frame_indices
+from mmg_toolbox.utils.hdf_file_pool import load_hdf, close_hdf
+from mmg_toolbox.utils.parallel import parallel_map, DEFAULT_WORKERS
+
+OUTPUT_MODES = {
+    'Volume_HKL': ('h-axis', 'k-axis', 'l-axis'),
+    'Volume_Q': ('x-axis', 'y-axis', 'z-axis'),
+}
+SPLITTERS = ('nearest', 'gaussian')
+DEFAULT_STEP = 0.002
+DEFAULT_BLOCK_SIZE = 10  # frames read and binned in each task
+
+
+class VoxelGrid:
+    """
+    Regular grid of voxels in HKL or Q
+
+        grid = VoxelGrid(start=[0, 0, 6.9], step=0.002, shape=[11, 11, 101])
+        h_axis, k_axis, l_axis = grid.axes()
+
+    :param start: [h, k, l] centre of the first voxel
+    :param step: [dh, dk, dl] size of voxel, or single value for all directions
+    :param shape: [n, m, o] number of voxels in each direction
+    """
+    def __init__(self, start: typing.Sequence[float], step: float | typing.Sequence[float],
+                 shape: typing.Sequence[int]):
+        self.start = np.asarray(start, dtype=float).reshape(3)
+        self.step = np.broadcast_to(np.asarray(step, dtype=float), (3,)).copy()
+        self.shape = tuple(int(n) for n in np.reshape(shape, 3))
+        if np.any(self.step <= 0) or min(self.shape) < 1:
+            raise ValueError(f"Invalid voxel grid: step={self.step}, shape={self.shape}")
+
+    def __repr__(self):
+        return f"VoxelGrid(start={self.start.tolist()}, step={self.step.tolist()}, shape={self.shape})"
+
+    @classmethod
+    def from_limits(cls, minimum: typing.Sequence[float], maximum: typing.Sequence[float],
+                    step: float | typing.Sequence[float]) -> 'VoxelGrid':
+        """Return grid with voxels covering the range minimum to maximum"""
+        minimum = np.asarray(minimum, dtype=float)
+        step = np.broadcast_to(np.asarray(step, dtype=float), (3,))
+        shape = np.rint((np.asarray(maximum) - minimum) / step).astype(int) + 1
+        return cls(minimum, step, shape)
+
+    def size(self) -> int:
+        """Return the total number of voxels"""
+        return int(np.prod(self.shape))
+
+    def axes(self) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Return coordinates of the voxel centres along each direction"""
+        return tuple(self.start[n] + self.step[n] * np.arange(self.shape[n]) for n in range(3))
+
+
+def bin_pixels(coordinates: np.ndarray, values: np.ndarray, grid: VoxelGrid, splitter: str = 'nearest',
+               splitter_parameter: float = 2.0) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Bin pixel values into the voxel grid, returning only the occupied voxels
+
+    Splitters:
+        'nearest': each pixel is added to the voxel containing it
+        'gaussian': each pixel is split between the 8 neighbouring voxels with weights exp(-ln2.(d/p)^2),
+                    where d is the distance from the pixel to the voxel centre and p = splitter_parameter is the
+                    distance to half-height, both in units of voxels.
+
+    :param coordinates: (N, 3) array of pixel coordinates in the units of the grid
+    :param values: (N, ) array of pixel intensities
+    :param grid: VoxelGrid
+    :param splitter: 'nearest' or 'gaussian'
+    :param splitter_parameter: distance to half-height of the gaussian splitter, in voxels
+    :return: flat_index, value_sum, weight_sum - arrays of occupied voxels
+    """
+    voxel = (np.reshape(coordinates, (-1, 3)) - grid.start) / grid.step
+    values = np.reshape(values, -1)
+    if splitter == 'nearest':
+        indices = [np.rint(voxel).astype(int)]
+        weights = [np.ones(len(voxel))]
+    elif splitter == 'gaussian':
+        base = np.floor(voxel).astype(int)
+        indices, weights = [], []
+        for offset in np.ndindex(2, 2, 2):
+            index = base + offset
+            distance2 = np.sum((voxel - index) ** 2, axis=1)
+            indices.append(index)
+            weights.append(np.exp(-np.log(2) * distance2 / splitter_parameter ** 2))
+    else:
+        raise ValueError(f"Unknown splitter '{splitter}', should be one of {SPLITTERS}")
+
+    index = np.concatenate(indices)
+    weight = np.concatenate(weights)
+    value = np.tile(values, len(indices)) * weight
+    valid = np.all((index >= 0) & (index < grid.shape), axis=1) & np.isfinite(value)
+    flat_index = np.ravel_multi_index(index[valid].T, grid.shape)
+    occupied, inverse = np.unique(flat_index, return_inverse=True)
+    value_sum = np.bincount(inverse, weights=value[valid], minlength=len(occupied))
+    weight_sum = np.bincount(inverse, weights=weight[valid], minlength=len(occupied))
+    return occupied, value_sum, weight_sum
+
+
+@lru_cache(maxsize=4)
+def _cached_instrument_model(filename: str, file_state: tuple[int, int]) -> NXInstrumentModel:
+    """Build instrument model without references to the file, cached by filename, modified time and size"""
+    with load_hdf(filename) as hdf:
+        return NXInstrumentModel(hdf).detach()
+
+
+def _load_instrument_model(filename: str) -> NXInstrumentModel:
+    """Build instrument model once per process, rebuilt if the file is changed (e.g. a scan still running)"""
+    stat = os.stat(filename)
+    return _cached_instrument_model(filename, (stat.st_mtime_ns, stat.st_size))
+
+
+def _detector_region(detector_region: typing.Sequence[int] | None) -> tuple[slice, slice]:
+    """Convert [sx, ex, sy, ey] to (slow, fast) slices of the detector image"""
+    if detector_region is None:
+        return slice(None), slice(None)
+    sx, ex, sy, ey = (int(n) for n in detector_region)
+    return slice(sy, ey), slice(sx, ex)
+
+
+def _read_images(scan: NexusScan, frames: np.ndarray) -> np.ndarray:
+    """Read a block of images from the default detector"""
+    with scan.load_hdf() as hdf:
+        dataset = hdf.get(scan.map.get_image_path())
+        if isinstance(dataset, h5py.Dataset) and dataset.ndim == 3 and np.issubdtype(dataset.dtype, np.number):
+            first, last = int(frames.min()), int(frames.max())
+            return dataset[first:last + 1][frames - first]
+    # TIFF images or multi-dimensional scans
+    return np.array([scan.image(int(frame)) for frame in frames])
+
+
+def _map_frames(block: tuple[np.ndarray, np.ndarray | None], filename: str, hdf_map, grid: VoxelGrid,
+                hkl: bool, splitter: str, splitter_parameter: float,
+                detector_region: typing.Sequence[int] | None) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Read and bin a block of frames, run on worker processes"""
+    frames, monitor = block
+    scan = NexusScan(filename, hdf_map)
+    model = _load_instrument_model(filename)
+    slow, fast = _detector_region(detector_region)
+    images = _read_images(scan, frames)[:, slow, fast].astype(float)
+    if monitor is not None:
+        images /= monitor[:, np.newaxis, np.newaxis]
+    block_frames, coordinates = next(model.iter_pixel_q(frames, hkl=hkl, block_size=len(frames)))
+    return bin_pixels(coordinates[:, slow, fast], images, grid, splitter, splitter_parameter)
+
+
+def auto_grid(model: NXInstrumentModel, frames: np.ndarray, step: float | typing.Sequence[float] = DEFAULT_STEP,
+              hkl: bool = True, detector_region: typing.Sequence[int] | None = None) -> VoxelGrid:
+    """
+    Return a voxel grid covering every pixel in the scan (autobox)
+    :param model: NXInstrumentModel
+    :param frames: frame indices
+    :param step: [dh, dk, dl] size of voxel
+    :param hkl: if True, use Miller indices, otherwise Q in the lab frame
+    :param detector_region: [sx, ex, sy, ey] region of interest on detector
+    :return: VoxelGrid
+    """
+    slow, fast = _detector_region(detector_region)
+    minimum = np.full(3, np.inf)
+    maximum = np.full(3, -np.inf)
+    for block, coordinates in model.iter_pixel_q(frames, hkl=hkl):
+        coordinates = coordinates[:, slow, fast].reshape(-1, 3)
+        minimum = np.minimum(minimum, coordinates.min(axis=0))
+        maximum = np.maximum(maximum, coordinates.max(axis=0))
+    return VoxelGrid.from_limits(minimum, maximum, step)
+
+
+def map_volume(scan: NexusScan | str, start: typing.Sequence[float] | None = None,
+               shape: typing.Sequence[int] | None = None, step: float | typing.Sequence[float] = DEFAULT_STEP,
+               output_mode: str = 'Volume_HKL', splitter: str = 'nearest', splitter_parameter: float = 2.0,
+               normalisation: str | None = None, detector_region: typing.Sequence[int] | None = None,
+               block_size: int = DEFAULT_BLOCK_SIZE,
+               workers: int = DEFAULT_WORKERS) -> tuple[VoxelGrid, np.ndarray, np.ndarray]:
+    """
+    Bin detector images from a scan into a regular voxel grid in HKL or Q
+
+    The volume is the weighted mean of the pixel intensities in each voxel, the weight array gives
+    the total weight of pixels added to each voxel (the number of pixels for the 'nearest' splitter).
+
+    :param scan: NexusScan or filename of scan with area detector and NXtransformations
+    :param start: [h, k, l] start of box (None to calculate autobox)
+    :param shape: [n, m, o] size of box in voxels (None to calculate autobox)
+    :param step: [dh, dk, dl] step size in each direction - size of voxel in reciprocal lattice units
+    :param output_mode: 'Volume_HKL' or 'Volume_Q' (lab frame, inverse Angstrom) type of calculation
+    :param splitter: 'nearest' or 'gaussian' pixel splitting
+    :param splitter_parameter: for 'gaussian', distance to half-height of the weight function, in voxels
+    :param normalisation: name or expression of monitor value to divide each image by, e.g. 'rc'
+    :param detector_region: [sx, ex, sy, ey] region of interest on detector
+    :param block_size: number of frames read and binned in each task
+    :param workers: number of worker processes, if <= 1 images are binned in the current process
+    :return: grid, volume, weight
+    """
+    if isinstance(scan, str):
+        scan = NexusScan(scan)
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"Unknown output_mode '{output_mode}', should be one of {list(OUTPUT_MODES)}")
+    if splitter not in SPLITTERS:
+        raise ValueError(f"Unknown splitter '{splitter}', should be one of {SPLITTERS}")
+    if not scan.map.image_data:
+        raise ValueError(f'{repr(scan)} contains no image data')
+    hkl = output_mode == 'Volume_HKL'
+    model = _load_instrument_model(scan.filename)
+    frames = frame_indices(None, max(scan.map.scannables_length(), 1))
+
+    if start is None or shape is None:
+        grid = auto_grid(model, frames, step, hkl, detector_region)
+    else:
+        grid = VoxelGrid(start, step, shape)
+
+    monitor = None
+    if normalisation:
+        monitor = np.reshape(scan(normalisation), -1).astype(float)
+        if monitor.size == 1:
+            monitor = np.repeat(monitor, len(frames))
+
+    blocks = [
+        (frames[n:n + block_size], None if monitor is None else monitor[frames[n:n + block_size]])
+        for n in range(0, len(frames), block_size)
+    ]
+    function = partial(
+        _map_frames,
+        filename=scan.filename,
+        hdf_map=scan.map,
+        grid=grid,
+        hkl=hkl,
+        splitter=splitter,
+        splitter_parameter=splitter_parameter,
+        detector_region=detector_region,
+    )
+    value_sum = np.zeros(grid.size())
+    weight = np.zeros(grid.size())
+    for index, result, error in parallel_map(function, blocks, workers=workers, chunk_size=1,
+                                             ordered=False, processes=True):
+        if error:
+            raise error
+        occupied, values, weights = result
+        value_sum[occupied] += values
+        weight[occupied] += weights
+    volume = np.divide(value_sum, weight, out=np.zeros_like(value_sum), where=weight > 0)
+    return grid, volume.reshape(grid.shape), weight.reshape(grid.shape)
+
+
+def write_volume_nexus(output_file: str, scan_file: str, grid: VoxelGrid, volume: np.ndarray,
+                       weight: np.ndarray, output_mode: str = 'Volume_HKL', **parameters) -> str:
+    """
+    Write reciprocal space volume to NeXus file, using the msmapper layout
+
+        /entry0 -> link to original scan
+        /processed/reciprocal_space/[h-axis, k-axis, l-axis, volume, weight]
+
+    :param output_file: str location of output file
+    :param scan_file: str location of scan file
+    :param grid: VoxelGrid
+    :param volume: (n, m, o) array
+    :param weight: (n, m, o) array
+    :param output_mode: 'Volume_HKL' or 'Volume_Q'
+    :param parameters: mapping parameters to store in NXprocess
+    :return: output_file
+    """
+    axis_names = OUTPUT_MODES[output_mode]
+    units = '' if output_mode == 'Volume_HKL' else '1/Angstrom'
+    with load_hdf(scan_file) as nxs:
+        entry_path = default_nxentry(nxs)
+    close_hdf(output_file)
+    with h5py.File(output_file, 'w') as hdf:
+        hdf['entry0'] = h5py.ExternalLink(os.path.abspath(scan_file), entry_path)
+        entry = nw.add_nxentry(hdf, 'processed', definition='NXprocess', default=True)
+        nw.add_nxprocess(
+            root=entry,
+            name='process',
+            program='Python:mmg_toolbox.diffraction.volume_mapper',
+            version=version_info(),
+            date=str(datetime.datetime.now()),
+            input_file=str(scan_file),
+            output_mode=output_mode,
+            start=grid.start,
+            step=grid.step,
+            shape=np.array(grid.shape),
+            **parameters
+        )
+        data = nw.add_nxdata(entry, 'reciprocal_space', axes=list(axis_names), signal='volume',
+                             default=True)
+        for name, axis in zip(axis_names, grid.axes()):
+            nw.add_nxfield(data, name, axis, units=units)
+        nw.add_nxfield(data, 'volume', volume)
+        nw.add_nxfield(data, 'weight', weight)
+    return output_file
+
+
+def map_scan_volume(scan_file: str, output_file: str, start: typing.Sequence[float] | None = None,
+                    shape: typing.Sequence[int] | None = None, step: float | typing.Sequence[float] = DEFAULT_STEP,
+                    output_mode: str = 'Volume_HKL', splitter: str = 'nearest', splitter_parameter: float = 2.0,
+                    normalisation: str | None = None, detector_region: typing.Sequence[int] | None = None,
+                    block_size: int = DEFAULT_BLOCK_SIZE, workers: int = DEFAULT_WORKERS) -> str:
+    """
+    Map a scan into reciprocal space and write the volume to a NeXus file, in place of msmapper
+
+    See map_volume for description of parameters.
+    :return: output_file
+    """
+    grid, volume, weight = map_volume(
+        scan=scan_file,
+        start=start,
+        shape=shape,
+        step=step,
+        output_mode=output_mode,
+        splitter=splitter,
+        splitter_parameter=splitter_parameter,
+        normalisation=normalisation,
+        detector_region=detector_region,
+        block_size=block_size,
+        workers=workers,
+    )
+    return write_volume_nexus(
+        output_file, scan_file, grid, volume, weight, output_mode,
+        splitter=splitter,
+        splitter_parameter=splitter_parameter,
+        normalisation=normalisation,
+        detector_region=detector_region,
+    )
@@ -1,14 +1,40 @@
+"""
+Peak fitting tools
 
-from .functions import *
-from .models import *
-from .results import *
-from .fit_functions import *
-from .manager import *
+Submodules are imported on first use of their attributes, as lmfit and matplotlib are slow to import.
+"""
+
+import importlib
+
+# submodule: names
+_SUBMODULES = {
+    'functions': ['poisson_errors', 'peak_ratio', 'gen_weights', 'gauss', 'group_adjacent', 'find_peaks',
+                  'find_peaks_str', 'max_index'],
+    'models': ['PEAK_PARS', 'METHODS', 'get_peak_model', 'get_background_model', 'get_default_model',
+               'PEAK_MODELS', 'BACKGROUND_MODELS'],
+    'results': ['peak_results', 'peak_results_str', 'peak_results_fit', 'peak_results_plot', 'Peak', 'FitResults'],
+    'fit_functions': ['modelfit', 'peakfit', 'peak2dfit', 'generate_model', 'generate_model_script', 'multipeakfit'],
+    'batch': ['batch_multipeakfit', 'BatchFitResults'],
+    'manager': ['ScanFitManager', 'batch_multi_peak_fit'],
+}
+_LAZY_ATTRIBUTES = {name: module for module, names in _SUBMODULES.items() for name in names}
 
 __all__ = [
     'poisson_errors', 'peak_ratio', 'gen_weights', 'gauss', 'group_adjacent', 'find_peaks', 'find_peaks_str', 'max_index',
     'modelfit', 'peakfit', 'peak2dfit', 'generate_model', 'generate_model_script', 'multipeakfit',
     'peak_results', 'peak_results_str', 'peak_results_fit', 'peak_results_plot', 'Peak', 'FitResults',
     'PEAK_PARS', 'METHODS', 'PEAK_MODELS', 'BACKGROUND_MODELS', 'get_peak_model', 'get_background_model', 'get_default_model',
-    'ScanFitManager'
+    'ScanFitManager', 'batch_multi_peak_fit', 'batch_multipeakfit', 'BatchFitResults'
 ]
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -0,0 +1,195 @@
+"""
+Batch peak fitting of many datasets using a pool of worker processes
+
+    results = batch_multipeakfit(xdata_list, ydata_list, model='Gaussian', seed_from_previous=True)
+    print(results)  # table of parameters
+    table = results.table('amplitude', 'center')  # dict of arrays, including 'stderr_amplitude' etc.
+"""
+
+import io
+import copyreg
+import pickle
+import typing
+from functools import partial
+from concurrent.futures import Executor
+
+import numpy as np
+from lmfit.model import CompositeModel
+
+from mmg_toolbox.utils.parallel import parallel_map, DEFAULT_WORKERS
+from .models import PEAK_PARS
+from .results import FitResults
+from .fit_functions import multipeakfit
+
+__all__ = ['batch_multipeakfit', 'BatchFitResults']
+
+TABLE_PARAMETERS = PEAK_PARS + ['background']
+
+
+def _reduce_composite_model(model: CompositeModel):
+    """Pickle CompositeModel by its components, lmfit stores the operator in a local function"""
+    return CompositeModel, (model.left, model.right, model.op)
+
+
+def _dumps(obj: typing.Any) -> bytes:
+    """Pickle fit results to return from worker processes, without registering reducers globally"""
+    buffer = io.BytesIO()
+    pickler = pickle.Pickler(buffer, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = {**copyreg.dispatch_table, CompositeModel: _reduce_composite_model}
+    pickler.dump(obj)
+    return buffer.getvalue()
+
+
+def _seed_parameters(previous: FitResults) -> dict:
+    """Return starting values from the varying parameters of a previous fit"""
+    return {
+        name: par.value for name, par in previous.res.params.items()
+        if par.vary and par.expr is None
+    }
+
+
+def _fit_segment(segment: list[tuple[int, np.ndarray, np.ndarray, np.ndarray | None, dict]],
+                 seed_from_previous: bool = False) -> bytes:
+    """
+    Fit a sequence of datasets, optionally seeding each from the previous result, run on workers
+    Returns pickled list of (FitResults, None) or (None, Exception), see _dumps
+    """
+    output = []
+    previous = None
+    for index, xvals, yvals, yerrors, options in segment:
+        options = dict(options)
+        if seed_from_previous and previous is not None:
+            options['initial_parameters'] = {
+                **(options.get('initial_parameters') or {}),
+                **_seed_parameters(previous)
+            }
+            if options.get('npeaks') is None:
+                options['npeaks'] = previous.npeaks
+        try:
+            previous = multipeakfit(xvals, yvals, yerrors, **options)
+            output.append((previous, None))
+        except Exception as ex:
+            output.append((None, ex))
+    return _dumps(output)
+
+
+class BatchFitResults:
+    """
+    Results of batch peak fitting
+
+    results = batch_multipeakfit(...)
+    results[0]  # FitResults of the first dataset, or None if the fit failed
+    results.errors[0]  # Exception if the fit failed, else None
+    table = results.table('amplitude', 'center')  # {'amplitude': array, 'stderr_amplitude': array, ...}
+    print(results)  # formatted table of parameters
+
+    :param results: list of FitResults or None for failed fits
+    :param errors: list of Exceptions or None for successful fits
+    :param labels: list of labels for each dataset, e.g. scan numbers
+    """
+    def __init__(self, results: list[FitResults | None], errors: list[Exception | None],
+                 labels: list | None = None):
+        self.results = results
+        self.errors = errors
+        self.labels = list(range(len(results))) if labels is None else list(labels)
+
+    def __repr__(self):
+        n_failed = sum(1 for e in self.errors if e is not None)
+        return f"BatchFitResults(n={len(self.results)}, failed={n_failed})"
+
+    def __str__(self):
+        return self.table_str()
+
+    def __len__(self):
+        return len(self.results)
+
+    def __getitem__(self, item: int | slice) -> FitResults | None | list[FitResults | None]:
+        return self.results[item]
+
+    def table(self, *names: str) -> dict[str, np.ndarray]:
+        """
+        Return dict of arrays of fit parameters and errors, with nan for failed fits
+        :param names: parameter names, e.g. 'amplitude', 'p1_center', default is total peak parameters
+        :return: {'label': array, name: array, 'stderr_name': array, ...}
+        """
+        names = names or TABLE_PARAMETERS
+        table = {'label': np.array(self.labels)}
+        for name in names:
+            values, errors = zip(*[
+                result.get_value(name) if result is not None else (np.nan, np.nan)
+                for result in self.results
+            ]) if self.results else ([], [])
+            table[name] = np.array([np.nan if v is None else v for v in values], dtype=float)
+            table[f"stderr_{name}"] = np.array([np.nan if e is None else e for e in errors], dtype=float)
+        return table
+
+    def table_str(self, *names: str, delimiter: str = ', ') -> str:
+        """Return str table of fit parameters with errors"""
+        names = names or TABLE_PARAMETERS
+        lines = [delimiter.join(['label', *names])]
+        for label, result, error in zip(self.labels, self.results, self.errors):
+            if result is None:
+                lines.append(delimiter.join([str(label), f"Fit failed: {error}"]))
+            else:
+                lines.append(delimiter.join([str(label), *(result.get_string(name) for name in names)]))
+        return '\n'.join(lines)
+
+
+def batch_multipeakfit(xvals_list: typing.Sequence[np.ndarray], yvals_list: typing.Sequence[np.ndarray],
+                       yerrors_list: typing.Sequence[np.ndarray | None] | None = None,
+                       seed_from_previous: bool = False, workers: int = DEFAULT_WORKERS,
+                       fit_options: typing.Sequence[dict] | None = None, labels: list | None = None,
+                       processes: bool = True, executor: Executor | None = None,
+                       **kwargs) -> BatchFitResults:
+    """
+    Fit many x,y datasets to a multi-peak model, using a pool of worker processes
+
+    Each dataset is fitted using multipeakfit, with the same options given in kwargs, e.g. model='Voight'.
+    Options for individual datasets can be given in fit_options.
+
+    If seed_from_previous is True, the starting parameters (and number of peaks, if npeaks is None) of each fit
+    are taken from the result of the previous dataset, e.g. for a temperature series. The series is split into
+    one contiguous segment per worker, each segment is fitted in order.
+
+    :param xvals_list: list of x arrays
+    :param yvals_list: list of y arrays
+    :param yerrors_list: None or list of error arrays
+    :param seed_from_previous: if True, use the previous fit result as the starting parameters
+    :param workers: number of worker processes, if <= 1 fits are performed in the current process
+    :param fit_options: None or list of dicts of multipeakfit options for each dataset
+    :param labels: list of labels for each dataset, e.g. scan numbers
+    :param processes: if True, use a pool of processes, otherwise threads (e.g. in the GUI)
+    :param executor: existing executor to use instead of creating a pool, e.g. parallel.get_thread_executor()
+    :param kwargs: multipeakfit options for all datasets, e.g. npeaks, model, background, method
+    :return: BatchFitResults
+    """
+    n_fits = len(yvals_list)
+    if yerrors_list is None:
+        yerrors_list = [None] * n_fits
+    if fit_options is None:
+        fit_options = [{}] * n_fits
+    items = [
+        (n, xvals, yvals, yerrors, {**kwargs, **options})
+        for n, (xvals, yvals, yerrors, options) in enumerate(zip(xvals_list, yvals_list, yerrors_list, fit_options))
+    ]
+    if seed_from_previous:
+        n_segments = max(1, min(workers, n_fits))
+        segments = [list(seg) for seg in np.array_split(np.arange(n_fits), n_segments) if len(seg)]
+        segments = [[items[n] for n in seg] for seg in segments]
+    else:
+        segments = [[item] for item in items]
+
+    results: list[FitResults | None] = [None] * n_fits
+    errors: list[Exception | None] = [None] * n_fits
+    function = partial(_fit_segment, seed_from_previous=seed_from_previous)
+    for index, output, error in parallel_map(function, segments, workers=workers,
+                                             processes=processes, executor=executor):
+        segment = segments[index]
+        if error is not None:
+            for item in segment:
+                errors[item[0]] = error
+            continue
+        for item, (result, fit_error) in zip(segment, pickle.loads(output)):
+            results[item[0]] = result
+            errors[item[0]] = fit_error
+    return BatchFitResults(results, errors, labels)
@@ -7,11 +7,13 @@ from lmfit.model import ModelResult, Model, Parameters
 from lmfit.models import LinearModel
 
 from mmg_toolbox.nexus.nexus_scan import NexusScan
+from mmg_toolbox.utils.parallel import DEFAULT_WORKERS
 from .functions import peak_ratio, find_peaks
 from .results import FitResults
 from .fit_functions import peakfit, multipeakfit, generate_model, generate_model_script
+from .batch import batch_multipeakfit, BatchFitResults
 
-__all__ = ['ScanFitManager']
+__all__ = ['ScanFitManager', 'batch_multi_peak_fit']
 
 
 class ScanFitManager:
@@ -29,6 +31,7 @@ class ScanFitManager:
     fit.fit_values()  # return dict of fit values for last fit
     fit.fit_report()  # return str of fit report
     fit.plot()  # plot last lmfit results
+    fit.batch_multi_peak_fit(*scans)  # fit this and other scans to the same model using worker processes
     * xaxis, yaxis are str names of arrays in the scan namespace
 
     :param scan: babelscan.Scan
@@ -416,3 +419,88 @@ class ScanFitManager:
         fitobj = self.fit_result()
         return fitobj.plot(title=self.scan.title())
 
+    def batch_multi_peak_fit(self, *scans: NexusScan, xaxis: str = 'axes', yaxis: str = 'signal',
+                             npeaks: int | None = None, min_peak_power: int | None = None,
+                             peak_distance_idx: int = 6, model: str = 'Gaussian', background: str = 'slope',
+                             initial_parameters: dict | None = None, fix_parameters: dict | None = None,
+                             method: str = 'leastsq', seed_from_previous: bool = False,
+                             workers: int = DEFAULT_WORKERS) -> BatchFitResults:
+        """
+        Fit this scan and other scans to the same peak model, using a pool of worker processes
+
+        E.G.:
+          results = scan.fit.batch_multi_peak_fit(*exp.scans(*range(-20, 0)), seed_from_previous=True)
+          print(results)  # table of amplitude, center, height, fwhm, background for each scan
+
+        See batch_multi_peak_fit and ScanFitManager.multi_peak_fit for description of parameters.
+        :param scans: other NexusScan objects, fitted after this scan
+        :return: BatchFitResults object, the first result is the fit of this scan
+        """
+        return batch_multi_peak_fit(
+            [self.scan, *scans], xaxis, yaxis, npeaks=npeaks, min_peak_power=min_peak_power,
+            peak_distance_idx=peak_distance_idx, model=model, background=background,
+            initial_parameters=initial_parameters, fix_parameters=fix_parameters, method=method,
+            seed_from_previous=seed_from_previous, workers=workers
+        )
+
+
+
+def batch_multi_peak_fit(scans: list[NexusScan], xaxis: str = 'axes', yaxis: str = 'signal',
+                         npeaks: int | None = None, min_peak_power: int | None = None, peak_distance_idx: int = 6,
+                         model: str = 'Gaussian', background: str = 'slope',
+                         initial_parameters: dict | None = None, fix_parameters: dict | None = None,
+                         method: str = 'leastsq', seed_from_previous: bool = False,
+                         workers: int = DEFAULT_WORKERS) -> BatchFitResults:
+    """
+    Fit x,y data from many scans to the same peak model, using a pool of worker processes
+
+    E.G.:
+      results = batch_multi_peak_fit(exp.scans(*range(-20, 0)), 'axes', 'signal', seed_from_previous=True)
+      print(results)  # table of amplitude, center, height, fwhm, background for each scan
+      table = results.table('amplitude', 'p1_center')
+
+    Fit results are added to each scan namespace, as with ScanFitManager.multi_peak_fit.
+    If seed_from_previous is True, the starting parameters of each fit are taken from the result
+    of the previous scan, e.g. for a temperature series.
+
+    See ScanFitManager.multi_peak_fit for description of parameters.
+    :param scans: list of NexusScan objects
+    :param seed_from_previous: if True, use the previous fit result as the starting parameters
+    :param workers: number of worker processes
+    :return: BatchFitResults object
+    """
+    xdata, ydata, errors, ynames = [], [], [], []
+    for scan in scans:
+        data = scan.get_plot_data(xaxis, yaxis)
+        xdata.append(data['xdata'])
+        ydata.append(data['ydata'].squeeze())
+        errors.append(data['yerror'].squeeze())
+        ynames.append(data['ylabel'])
+
+    results = batch_multipeakfit(
+        xdata, ydata, errors,
+        seed_from_previous=seed_from_previous,
+        workers=workers,
+        labels=[scan.scan_number() for scan in scans],
+        npeaks=npeaks,
+        min_peak_power=min_peak_power,
+        peak_distance_idx=peak_distance_idx,
+        model=model,
+        background=background,
+        initial_parameters=initial_parameters,
+        fix_parameters=fix_parameters,
+        method=method,
+    )
+    for scan, res, yname in zip(scans, results, ynames):
+        if res is None:
+            continue
+        output = res.results()
+        output.update({
+            'lmfit': res.res,
+            'fit_result': res.res,
+            'fitobj': res,
+            'fit': res.res.best_fit,
+            f"fit_{yname}": res.res.best_fit,
+        })
+        scan.add_local(**output)
+    return results
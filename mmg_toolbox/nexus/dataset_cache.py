@@ -0,0 +1,186 @@
+"""
+Cache of dataset values read from a NeXus file
+
+Interactive use evaluates the same expressions many times, e.g. scan('signal / monitor'), get_plot_data
+or metadata_str, each reading the same datasets from the file. Each NexusScan keeps the values read while
+evaluating expressions in a DatasetCache, stored by HDF path:
+
+ - arrays are kept in a least-recently-used cache limited by the total size in bytes
+ - scalar values (numbers, strings, timestamps) are small and are kept until the file changes
+ - all values are dropped when the modified time or size of the file changes
+ - cached arrays are read-only, as they are shared by every expression using them
+
+    scan = NexusScan('12345.nxs')
+    scan('signal / monitor')  # reads signal and monitor
+    scan('signal / monitor')  # uses cached values
+    print(scan.cache)  # DatasetCache(arrays=2, scalars=0, bytes=176, hits=2, misses=2)
+    print(dataset_cache_stats())  # combined statistics of all caches in this process
+
+The default size of the cache of each scan is set by DEFAULT_MAX_BYTES,
+the cache of a scan can be disabled with scan.cache.max_bytes = 0.
+"""
+
+import os
+import sys
+import threading
+import typing
+import weakref
+from collections import OrderedDict
+
+import numpy as np
+
+DEFAULT_MAX_BYTES = 2 ** 25  # 32 MB for arrays in the cache of each scan
+
+_caches: weakref.WeakSet['DatasetCache'] = weakref.WeakSet()
+
+
+def _file_state(filename: str) -> tuple[int, int] | None:
+    """Return (modified time, size) of file, used to detect changes"""
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _is_scalar(value: typing.Any) -> bool:
+    """Return True if value is a single number, string or timestamp"""
+    return np.ndim(value) == 0
+
+
+def _nbytes(value: typing.Any) -> int:
+    """Return approximate size of value in memory"""
+    if isinstance(value, np.ndarray):
+        if value.dtype == object:
+            return value.nbytes + sum(sys.getsizeof(v) for v in value.flat)
+        return value.nbytes
+    return sys.getsizeof(value)
+
+
+class DatasetCache:
+    """
+    Cache of dataset values of a single file, stored by HDF path
+
+    :param filename: HDF filename, checked for changes with check_file
+    :param max_bytes: maximum total size of cached arrays, 0 to disable the cache, None for DEFAULT_MAX_BYTES
+    """
+    def __init__(self, filename: str, max_bytes: int | None = None):
+        self.filename = filename
+        self.max_bytes = DEFAULT_MAX_BYTES if max_bytes is None else max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self._arrays: OrderedDict[str, typing.Any] = OrderedDict()
+        self._scalars: dict[str, typing.Any] = {}
+        self._bytes = 0
+        self._state = _file_state(filename)
+        self._lock = threading.Lock()
+        _caches.add(self)
+
+    def __repr__(self):
+        return (f"DatasetCache(arrays={len(self._arrays)}, scalars={len(self._scalars)}, bytes={self._bytes}, "
+                f"hits={self.hits}, misses={self.misses})")
+
+    def __getstate__(self):
+        # scans are sent to worker processes without cached values
+        return {'filename': self.filename, 'max_bytes': self.max_bytes}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    def __len__(self):
+        return len(self._arrays) + len(self._scalars)
+
+    def __contains__(self, path: str):
+        return path in self._scalars or path in self._arrays
+
+    def check_file(self) -> bool:
+        """Clear the cache if the file has changed, returns True if the cache was cleared"""
+        state = _file_state(self.filename)
+        if state == self._state:
+            return False
+        with self._lock:
+            self._state = state
+            if self._arrays or self._scalars:
+                self.invalidations += 1
+            self._clear()
+        return True
+
+    def get(self, paths: dict[str, str]) -> dict[str, typing.Any]:
+        """
+        Return cached values
+        :param paths: {name: hdf_path}
+        :return: {name: value} for each cached path
+        """
+        out = {}
+        with self._lock:
+            for name, path in paths.items():
+                if path in self._scalars:
+                    out[name] = self._scalars[path]
+                elif path in self._arrays:
+                    self._arrays.move_to_end(path)
+                    out[name] = self._arrays[path]
+            self.hits += len(out)
+        return out
+
+    def store(self, values: dict[str, typing.Any]):
+        """
+        Add values to the cache, removing the least recently used arrays
+        Arrays are set as read-only, copy values before changing them.
+        :param values: {hdf_path: value}
+        """
+        with self._lock:
+            self.misses += len(values)
+            if self.max_bytes <= 0:
+                return
+            for path, value in values.items():
+                if isinstance(value, np.ndarray):
+                    value.setflags(write=False)
+                if _is_scalar(value):
+                    self._scalars[path] = value
+                    continue
+                nbytes = _nbytes(value)
+                if nbytes > self.max_bytes:
+                    continue
+                if path in self._arrays:
+                    self._bytes -= _nbytes(self._arrays.pop(path))
+                self._arrays[path] = value
+                self._bytes += nbytes
+            while self._bytes > self.max_bytes:
+                path, value = self._arrays.popitem(last=False)
+                self._bytes -= _nbytes(value)
+                self.evictions += 1
+
+    def _clear(self):
+        self._arrays.clear()
+        self._scalars.clear()
+        self._bytes = 0
+
+    def clear(self):
+        """Remove all cached values"""
+        with self._lock:
+            self._clear()
+
+    def stats(self) -> dict[str, int]:
+        """Return dict of cache statistics"""
+        return {
+            'arrays': len(self._arrays),
+            'scalars': len(self._scalars),
+            'bytes': self._bytes,
+            'max_bytes': self.max_bytes,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'invalidations': self.invalidations,
+        }
+
+
+def dataset_cache_stats() -> dict[str, int]:
+    """Return combined statistics of the dataset caches of all scans in this process"""
+    caches = list(_caches)
+    stats = {'caches': len(caches)}
+    for cache in caches:
+        for name, value in cache.stats().items():
+            stats[name] = stats.get(name, 0) + value
+    return stats
@@ -0,0 +1,275 @@
+"""
+Memory-bounded reductions of detector image stacks
+
+Images are read from the default detector in blocks of frames, aligned to the HDF5 chunks of the
+image dataset, and each block is reduced before the next is read, so only one block of images
+per worker is held in memory.
+
+    total = image_stack_sum(scan, block_size=100)
+    background = image_stack_mode(scan, n_bins=100, workers=4)
+
+MCA detectors record a spectrum of channels at each scan point. The total spectrum and the sums of any
+number of channel windows (ROIs) at each scan point are accumulated in a single pass over the blocks:
+
+    with h5py.File(filename) as hdf:
+        spectrum, rois = mca_roi_sums(hdf['/entry/instrument/xmapMca/data'], {'pfy': (550, 700)}, workers=4)
+"""
+
+import typing
+from functools import partial
+
+import h5py
+import numpy as np
+
+from mmg_toolbox.utils.parallel import parallel_map
+
+if typing.TYPE_CHECKING:
+    from mmg_toolbox.nexus.nexus_scan import NexusScan
+
+MAX_BLOCK_BYTES = 2 ** 28  # maximum size of a block of images read at once
+MCA_BLOCK_BYTES = 2 ** 24  # maximum size of a block of MCA spectra read at once, summed in 64-bit
+REDUCTIONS = ('sum', 'max', 'min', 'frame_sum', 'range', 'histogram')
+
+
+def _image_dataset(scan: 'NexusScan', hdf: h5py.File) -> h5py.Dataset | None:
+    """Return the image dataset if the images are stored as a numeric array, otherwise None"""
+    dataset = hdf.get(scan.map.get_image_path())
+    if isinstance(dataset, h5py.Dataset) and dataset.ndim >= 3 and np.issubdtype(dataset.dtype, np.number):
+        return dataset
+    return None
+
+
+def image_block_size(dataset: h5py.Dataset | None, max_bytes: int = MAX_BLOCK_BYTES, frame_ndim: int = 2) -> int:
+    """
+    Return number of frames to read at once, a multiple of the HDF5 chunk size along the first axis
+    where possible, limited to max_bytes.
+    frame_ndim is the number of dimensions of each frame, e.g. 2 for images or ndim-1 for MCA spectra.
+    """
+    if dataset is None:
+        return 1
+    frame_bytes = dataset.dtype.itemsize * int(np.prod(dataset.shape[-frame_ndim:]))
+    block_size = max(1, max_bytes // max(1, frame_bytes))
+    if dataset.chunks and dataset.ndim == frame_ndim + 1:
+        chunk = dataset.chunks[0]
+        block_size = max(chunk, chunk * (block_size // chunk))
+    return block_size
+
+
+def image_stack_frames(scan: 'NexusScan') -> int:
+    """Return the number of detector images in the scan"""
+    with scan.load_hdf() as hdf:
+        dataset = _image_dataset(scan, hdf)
+        if dataset is not None:
+            return int(np.prod(dataset.shape[:-2]))
+    return scan.map.scannables_length()
+
+
+def read_image_block(scan: 'NexusScan', start: int, stop: int) -> np.ndarray:
+    """
+    Return block of images from the default detector
+    :param scan: NexusScan
+    :param start: first frame index (flattened over the scan dimensions)
+    :param stop: last frame index + 1
+    :return: (stop-start, i, j) array
+    """
+    with scan.load_hdf() as hdf:
+        dataset = _image_dataset(scan, hdf)
+        if dataset is not None:
+            if dataset.ndim == 3:
+                return dataset[start:stop]
+            scan_shape = dataset.shape[:-2]
+            return np.array([dataset[np.unravel_index(n, scan_shape)] for n in range(start, stop)])
+    # TIFF images
+    return np.array([scan.image(n) for n in range(start, stop)])
+
+
+def _histogram_values(images: np.ndarray, log: bool) -> np.ndarray:
+    if log:
+        return np.log10(images[images > 0])
+    return images.reshape(-1)
+
+
+def _reduce_block(block: tuple[int, int], scan: 'NexusScan', reduction: str, log: bool = True,
+                  bin_range: tuple[float, float] | None = None, n_bins: int = 100):
+    """Read and reduce a block of images, run on workers"""
+    start, stop = block
+    images = read_image_block(scan, start, stop)
+    if reduction == 'sum':
+        return images.sum(axis=0)
+    if reduction == 'max':
+        return images.max(axis=0)
+    if reduction == 'min':
+        return images.min(axis=0)
+    if reduction == 'frame_sum':
+        return images.sum(axis=(1, 2))
+    values = _histogram_values(images, log)
+    if reduction == 'range':
+        return (values.min(), values.max()) if values.size else (np.inf, -np.inf)
+    if reduction == 'histogram':
+        return np.histogram(values, bins=n_bins, range=bin_range)[0]
+    raise ValueError(f"Unknown reduction '{reduction}', should be one of {REDUCTIONS}")
+
+
+def reduce_image_stack(scan: 'NexusScan', reduction: str, block_size: int | None = None, workers: int = 1,
+                       **kwargs) -> list[tuple[int, typing.Any]]:
+    """
+    Apply a reduction to each block of images in the scan
+    :param scan: NexusScan
+    :param reduction: one of REDUCTIONS
+    :param block_size: number of frames read at once, None to align with the HDF5 chunks
+    :param workers: number of worker processes, if <= 1 blocks are reduced in the current process
+    :param kwargs: additional arguments for histogram reductions
+    :return: list of (first_frame, result) for each block
+    """
+    if not scan.map.image_data:
+        raise ValueError(f'{repr(scan)} contains no image data')
+    n_frames = image_stack_frames(scan)
+    if block_size is None:
+        with scan.load_hdf() as hdf:
+            block_size = image_block_size(_image_dataset(scan, hdf))
+    blocks = [(n, min(n + block_size, n_frames)) for n in range(0, n_frames, block_size)]
+    function = partial(_reduce_block, scan=scan, reduction=reduction, **kwargs)
+    results = []
+    for index, result, error in parallel_map(function, blocks, workers=workers, chunk_size=1,
+                                             ordered=False, processes=True):
+        if error:
+            raise error
+        results.append((blocks[index][0], result))
+    return results
+
+
+def image_stack_sum(scan: 'NexusScan', block_size: int | None = None, workers: int = 1) -> np.ndarray:
+    """Return sum of all detector images in the scan"""
+    return sum(result for start, result in reduce_image_stack(scan, 'sum', block_size, workers))
+
+
+def image_stack_mean(scan: 'NexusScan', block_size: int | None = None, workers: int = 1) -> np.ndarray:
+    """Return mean of all detector images in the scan"""
+    return image_stack_sum(scan, block_size, workers) / image_stack_frames(scan)
+
+
+def image_stack_max(scan: 'NexusScan', block_size: int | None = None, workers: int = 1) -> np.ndarray:
+    """Return maximum of each pixel over all detector images in the scan"""
+    results = reduce_image_stack(scan, 'max', block_size, workers)
+    return np.max([result for start, result in results], axis=0)
+
+
+def image_stack_min(scan: 'NexusScan', block_size: int | None = None, workers: int = 1) -> np.ndarray:
+    """Return minimum of each pixel over all detector images in the scan"""
+    results = reduce_image_stack(scan, 'min', block_size, workers)
+    return np.min([result for start, result in results], axis=0)
+
+
+def image_frame_totals(scan: 'NexusScan', block_size: int | None = None, workers: int = 1) -> np.ndarray:
+    """Return the sum of each detector image in the scan, as a flat array of frames"""
+    results = sorted(reduce_image_stack(scan, 'frame_sum', block_size, workers), key=lambda x: x[0])
+    return np.concatenate([result for start, result in results])
+
+
+def image_stack_histogram(scan: 'NexusScan', n_bins: int = 100, log: bool = True, block_size: int | None = None,
+                          workers: int = 1) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return histogram of all pixel values in the scan, using a fixed number of bins.
+
+    Two passes are made over the images, the first to find the range of values and the second to
+    count the values in each bin, the bins match np.histogram(values, bins=n_bins).
+
+    :param scan: NexusScan
+    :param n_bins: number of histogram bins
+    :param log: if True, histogram log10 of positive pixel values
+    :param block_size: number of frames read at once, None to align with the HDF5 chunks
+    :param workers: number of worker processes
+    :return: counts, bin_edges
+    """
+    ranges = [result for start, result in reduce_image_stack(scan, 'range', block_size, workers, log=log)]
+    bin_range = (min(r[0] for r in ranges), max(r[1] for r in ranges))
+    if not np.all(np.isfinite(bin_range)):
+        raise ValueError(f"{repr(scan)} contains no valid pixel values")
+    results = reduce_image_stack(scan, 'histogram', block_size, workers, log=log, bin_range=bin_range,
+                                 n_bins=n_bins)
+    counts = sum(result for start, result in results)
+    bin_edges = np.histogram_bin_edges([], bins=n_bins, range=bin_range)
+    return counts, bin_edges
+
+
+def image_stack_mode(scan: 'NexusScan', n_bins: int = 100, log: bool = True, block_size: int | None = None,
+                     workers: int = 1) -> float:
+    """
+    Return the modal pixel value of all detector images in the scan, which usually gives the background value.
+    The value returned is the lower edge of the largest histogram bin.
+    """
+    counts, bin_edges = image_stack_histogram(scan, n_bins, log, block_size, workers)
+    mode = bin_edges[np.argmax(counts)]
+    return 10 ** mode if log else mode
+
+
+def _mca_block_sums(block: np.ndarray, windows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Return the total spectrum and ROI sums of each frame of a block of MCA spectra
+    :param block: (n_frames, ..., n_channels) array
+    :param windows: (n_rois, 2) array of first and last+1 channel of each ROI
+    :return: spectrum[n_channels], rois[n_frames, n_rois]
+    """
+    dtype = np.int64 if np.issubdtype(block.dtype, np.integer) else np.float64
+    frames = block.reshape(len(block), -1, block.shape[-1])
+    # sum detector elements, a single element is used without a copy
+    frames = frames[:, 0] if frames.shape[1] == 1 else frames.sum(axis=1, dtype=dtype)
+    rois = np.zeros((len(frames), len(windows)), dtype=dtype)
+    for n, (start, stop) in enumerate(windows):
+        rois[:, n] = frames[:, start:stop].sum(axis=1, dtype=dtype)
+    return frames.sum(axis=0, dtype=dtype), rois
+
+
+def _read_mca_block(block: tuple[int, int], filename: str, path: str, windows: np.ndarray,
+                    swmr: bool = False) -> tuple[np.ndarray, np.ndarray]:
+    """Read and sum a block of MCA spectra, run on workers"""
+    start, stop = block
+    # forked workers share the open file of the parent process, which must be opened with the same flags
+    with h5py.File(filename, 'r', swmr=swmr) as hdf:
+        return _mca_block_sums(hdf[path][start:stop], windows)
+
+
+def mca_roi_sums(dataset: h5py.Dataset, rois: dict[str, tuple[int, int]] | None = None,
+                 block_size: int | None = None, workers: int = 1) -> tuple[np.ndarray, dict[str, np.ndarray]]:
+    """
+    Return the total spectrum and the ROI sums at each scan point of an MCA dataset, in a single pass
+
+    The dataset is read in blocks of frames along the first axis, so memory is bounded by the block size
+    rather than the length of the scan. Any axes between the first and the channel axis, e.g. detector
+    elements, are summed.
+
+    :param dataset: h5py.Dataset with shape (n_frames, ..., n_channels)
+    :param rois: {name: (start, stop)} channel windows, summed over channels start <= channel < stop
+    :param block_size: number of frames read at once, None to align with the HDF5 chunks
+    :param workers: number of worker processes, if <= 1 blocks are read in the current process
+    :return: spectrum[n_channels], {name: array[n_frames]}
+    """
+    rois = rois or {}
+    n_frames, n_channels = dataset.shape[0], dataset.shape[-1]
+    windows = np.array([slice(*window).indices(n_channels)[:2] for window in rois.values()], dtype=int)
+    if block_size is None:
+        block_size = image_block_size(dataset, MCA_BLOCK_BYTES, frame_ndim=dataset.ndim - 1)
+    blocks = [(n, min(n + block_size, n_frames)) for n in range(0, n_frames, block_size)]
+
+    dtype = np.int64 if np.issubdtype(dataset.dtype, np.integer) else np.float64
+    spectrum = np.zeros(n_channels, dtype=dtype)
+    roi_sums = np.zeros((n_frames, len(rois)), dtype=dtype)
+
+    def accumulate(block: tuple[int, int], result: tuple[np.ndarray, np.ndarray]):
+        block_spectrum, block_rois = result
+        spectrum[:] += block_spectrum
+        roi_sums[block[0]:block[1]] = block_rois
+
+    if workers <= 1:
+        # use the open dataset, only one block is held in memory
+        for start, stop in blocks:
+            accumulate((start, stop), _mca_block_sums(dataset[start:stop], windows))
+    else:
+        function = partial(_read_mca_block, filename=dataset.file.filename, path=dataset.name,
+                           windows=windows, swmr=dataset.file.swmr_mode)
+        for index, result, error in parallel_map(function, blocks, workers=workers, chunk_size=1,
+                                                 ordered=False, processes=True):
+            if error:
+                raise error
+            accumulate(blocks[index], result)
+    return spectrum, {name: roi_sums[:, n] for n, name in enumerate(rois)}
@@ -4,6 +4,8 @@ Instrument Model from NeXus files
 Makes use of NeXus classes and NXtransformations to build a structure of the instrument from a scan file.
 """
 
+import typing
+
 import h5py
 import numpy as np
 
@@ -11,14 +13,48 @@ from mmg_toolbox.nexus import nexus_names as nn
 from mmg_toolbox.nexus.nexus_functions import nx_find, get_dataset_value
 from mmg_toolbox.nexus.nexus_transformations import nx_direction, nx_transformations_max_size, \
     nx_transformations_matrix, nx_transform_vector
-from mmg_toolbox.utils.rotations import norm_vector, transform_by_t_matrix
+from mmg_toolbox.utils.rotations import norm_vector
 from mmg_toolbox.utils.xray_utils import photon_energy, photon_wavelength
 from mmg_toolbox.diffraction.lattice import wavevector, bmatrix
-from mmg_toolbox.plotting.matplotlib import Axes3D
+
+if typing.TYPE_CHECKING:
+    from mmg_toolbox.plotting.matplotlib import Axes3D
 
 # types
 Shape = tuple[int, int, int]  #  (n, i, j) == (frame, slow_pixel, fast_pixel) #TODO: should this be fast, slow?
 Pixel = tuple[int, float, float]  # (n, i, j) pixel coordinates
+Frames = int | slice | typing.Sequence[int] | np.ndarray | None  # frame indices, None for all frames
+
+MAX_BLOCK_BYTES = 2 ** 28  # maximum size of intermediate arrays in vectorised pixel calculations
+
+
+def frame_indices(frames: Frames, size: int) -> np.ndarray:
+    """Return array of frame indices from int, slice, list of indices or None (all frames)"""
+    if frames is None:
+        return np.arange(size)
+    if isinstance(frames, slice):
+        return np.arange(size)[frames]
+    return np.reshape(frames, -1).astype(int)
+
+
+def frame_block_size(*shape: int, max_bytes: int = MAX_BLOCK_BYTES) -> int:
+    """Return the number of frames of pixel vectors (..., 3) of float64 that fit in max_bytes"""
+    frame_bytes = 3 * 8 * int(np.prod(shape))
+    return max(1, max_bytes // max(1, frame_bytes))
+
+def _detach(obj: typing.Any):
+    """Replace h5py objects in the attributes of obj with their HDF path, or filename for files"""
+    def path(value):
+        if isinstance(value, h5py.File):
+            return value.filename
+        return value.name if isinstance(value, h5py.HLObject) else value
+
+    for name, value in vars(obj).items():
+        if isinstance(value, list):
+            setattr(obj, name, [path(v) for v in value])
+        else:
+            setattr(obj, name, path(value))
+
 
 #TODO: add polarisation
 #TODO: improve docs
@@ -77,9 +113,25 @@ class NXSsample:
             for n in range(self.size)
         ]  # list of 4x4 transformation matrices
 
+        # cached inverse matrices for Q -> hkl
+        self.rotations = np.reshape([t[:3, :3] for t in self.transforms], (-1, 3, 3))  # (n, 3, 3)
+        self.inv_rotations = np.linalg.inv(self.rotations)
+        self.inv_ub = np.linalg.inv(2 * np.pi * self.ub_matrix)
+
     def __repr__(self):
         return f"NXSsample({self.sample})"
 
+    def q2hkl_matrices(self, frames: Frames = None) -> np.ndarray:
+        """
+        Return matrices transforming Q in the lab frame to hkl, for each frame
+        :param frames: frame indices, if the sample transformations only have 1 frame this is used for all frames
+        :return: (n, 3, 3) array of matrices inv(UB).inv(Z)
+        """
+        frames = frame_indices(frames, len(self.rotations))
+        if len(self.rotations) == 1:
+            frames = np.zeros_like(frames)
+        return np.matmul(self.inv_ub, self.inv_rotations[frames])
+
     def hkl2q(self, hkl: tuple[float, float, float] | np.ndarray, index: int = 0) -> np.ndarray:
         """
         Returns wavevector direction for given hkl in lab space
@@ -124,6 +176,11 @@ class NXDetectorModule:
             for n in range(self.size)
         ]  # list of 4x4 transformation matrices
 
+        # (n, 3) arrays of module origin and pixel directions for each frame
+        self.origins = np.reshape([t[:3, 3] for t in self.offset_transforms], (-1, 3))
+        self.fast_directions = np.reshape([t[:3, 3] for t in self.fast_transforms], (-1, 3)) - self.origins
+        self.slow_directions = np.reshape([t[:3, 3] for t in self.slow_transforms], (-1, 3)) - self.origins
+
     def __repr__(self):
         return f"NXDetectorModule({self.module})"
 
@@ -163,14 +220,45 @@ class NXDetectorModule:
             j = pixel along fast axis
         """
         index, ii, jj = point
+        index = index if self.size > 1 else 0  # detector position may not be stored for every frame
+        return ii * self.slow_directions[index] + jj * self.fast_directions[index] + self.origins[index]
 
-        module_origin = transform_by_t_matrix([0, 0, 0], self.offset_transforms[index])
-        fast_pixel = transform_by_t_matrix([0, 0, 0], self.fast_transforms[index])
-        slow_pixel = transform_by_t_matrix([0, 0, 0], self.slow_transforms[index])
+    def pixel_positions(self, frames: Frames = None) -> np.ndarray:
+        """
+        Return positions of every pixel in lab frame, for each frame
+        :param frames: frame indices, if the module only has 1 frame this is used for all frames
+        :return: (n, i, j, 3) array of [x, y, z] positions
+        """
+        frames = frame_indices(frames, self.size)
+        if self.size == 1:
+            frames = np.zeros_like(frames)
+        ii = np.arange(self.data_size[0]).reshape(1, -1, 1, 1)
+        jj = np.arange(self.data_size[1]).reshape(1, 1, -1, 1)
+        origin = self.origins[frames, None, None, :]
+        slow = self.slow_directions[frames, None, None, :]
+        fast = self.fast_directions[frames, None, None, :]
+        return ii * slow + jj * fast + origin
+
+    def pixel_directions(self, frames: Frames = None) -> np.ndarray:
+        """
+        Return direction of every pixel in lab frame, for each frame
+        :param frames: frame indices, if the module only has 1 frame this is used for all frames
+        :return: (n, i, j, 3) array of [dx, dy, dz] unit vectors
+        """
+        positions = self.pixel_positions(frames)
+        positions /= np.linalg.norm(positions, axis=-1, keepdims=True)
+        return positions
 
-        fast_direction = fast_pixel - module_origin
-        slow_direction = slow_pixel - module_origin
-        return np.squeeze(ii * slow_direction + jj * fast_direction + module_origin)
+    def pixel_wavevectors(self, wavelength_a: float, frames: Frames = None) -> np.ndarray:
+        """
+        Return wavevector of every pixel in lab frame, for each frame
+        :param wavelength_a: wavelength in Angstrom
+        :param frames: frame indices, if the module only has 1 frame this is used for all frames
+        :return: (n, i, j, 3) array of [x, y, z] in inverse Angstrom
+        """
+        directions = self.pixel_directions(frames)
+        directions *= wavevector(wavelength_a)
+        return directions
 
     def corners(self, frame: int) -> np.ndarray:
         """return corners of the detector module at this frame in scan"""
@@ -243,6 +331,18 @@ class NXInstrumentModel:
     def __repr__(self):
         return f"NXInstrumentModel({self.file})"
 
+    def detach(self) -> 'NXInstrumentModel':
+        """
+        Remove references to the HDF file, so the model can be kept after the file is closed.
+        h5py objects are replaced by their HDF path, calculations only use numpy data.
+        plot_instrument is not available on a detached model.
+        :return: self
+        """
+        modules = [module for detector in self.detectors for module in detector.modules]
+        for obj in [self, self.sample, self.beam, *self.detectors, *modules]:
+            _detach(obj)
+        return self
+
     def _first_detector(self):
         return self.detectors[0].modules[0]
 
@@ -278,17 +378,70 @@ class NXInstrumentModel:
         """
         n, i, j = point
         q = self.detector_q(point)
-        if len(self.sample.transforms) > 1:
-            z = self.sample.transforms[n][:3, :3]
-        else:
-            z = self.sample.transforms[0][:3, :3]  # if sample tranformations aren't stored on every angle
-        ub = 2 * np.pi * self.sample.ub_matrix
+        # if sample tranformations aren't stored on every angle, use the first
+        inv_z = self.sample.inv_rotations[n if len(self.sample.inv_rotations) > 1 else 0]
+        hphi = np.dot(inv_z, q)
+        return np.dot(self.sample.inv_ub, hphi).T
 
-        inv_ub = np.linalg.inv(ub)
-        inv_z = np.linalg.inv(z)
+    def frames(self) -> int:
+        """Return number of frames in the scan, from the first detector module or sample transformations"""
+        return max(self._first_detector().size, len(self.sample.rotations))
 
-        hphi = np.dot(inv_z, q)
-        return np.dot(inv_ub, hphi).T
+    def iter_pixel_q(self, frames: Frames = None, hkl: bool = False,
+                     block_size: int | None = None) -> typing.Iterator[tuple[np.ndarray, np.ndarray]]:
+        """
+        Generator of wavevector transfer of every pixel in the first detector module, in blocks of frames
+
+            for frame_index, hkl in model.iter_pixel_q(hkl=True, block_size=10):
+                h, k, l = hkl[..., 0], hkl[..., 1], hkl[..., 2]
+
+        Memory use is bounded by the block size, by default blocks are limited to MAX_BLOCK_BYTES.
+
+        :param frames: frame indices, slice or None for all frames
+        :param hkl: if True, return hkl in reciprocal lattice units, otherwise Q in the lab frame in inverse Angstrom
+        :param block_size: number of frames in each block, or None to use MAX_BLOCK_BYTES
+        :return: generator of (frame_indices, (n, i, j, 3) array)
+        """
+        module = self._first_detector()
+        frames = frame_indices(frames, self.frames())
+        if block_size is None:
+            block_size = frame_block_size(*module.data_size, 3)  # allow for intermediate arrays
+        ki = self.beam.incident_wavevector
+        for start in range(0, len(frames), block_size):
+            block = frames[start:start + block_size]
+            q = module.pixel_wavevectors(self.beam.wl, block)
+            q -= ki
+            if hkl:
+                q = np.einsum('nab,nijb->nija', self.sample.q2hkl_matrices(block), q)
+            yield block, q
+
+    def pixel_q(self, frames: Frames = None, block_size: int | None = None) -> np.ndarray:
+        """
+        Return wavevector transfer, Q=kf-ki, of every pixel in the first detector module, in lab frame
+        :param frames: frame indices, slice or None for all frames
+        :param block_size: number of frames calculated at once, or None to use MAX_BLOCK_BYTES
+        :return: (frames, slow_pixels, fast_pixels, 3) array of [x, y, z] in inverse Angstrom
+        """
+        return self._pixel_array(frames, False, block_size)
+
+    def pixel_hkl(self, frames: Frames = None, block_size: int | None = None) -> np.ndarray:
+        """
+        Return Miller indices of every pixel in the first detector module
+        :param frames: frame indices, slice or None for all frames
+        :param block_size: number of frames calculated at once, or None to use MAX_BLOCK_BYTES
+        :return: (frames, slow_pixels, fast_pixels, 3) array of [h, k, l] in reciprocal lattice units
+        """
+        return self._pixel_array(frames, True, block_size)
+
+    def _pixel_array(self, frames: Frames, hkl: bool, block_size: int | None) -> np.ndarray:
+        frames = frame_indices(frames, self.frames())
+        shape = self._first_detector().data_size
+        out = np.empty((len(frames), int(shape[0]), int(shape[1]), 3))
+        n = 0
+        for block, values in self.iter_pixel_q(frames, hkl=hkl, block_size=block_size):
+            out[n:n + len(block)] = values
+            n += len(block)
+        return out
 
     def hkl2q(self, hkl: tuple[float, float, float] | np.ndarray):
         """
@@ -298,7 +451,7 @@ class NXInstrumentModel:
         """
         return self.sample.hkl2q(hkl)
 
-    def plot_instrument(self, axes: Axes3D):
+    def plot_instrument(self, axes: 'Axes3D'):
         instrument_name = get_dataset_value('name', self.instrument, 'no name')
         max_distance = max([np.linalg.norm(position) for position in self.component_positions.values()])
         max_position = max_distance * self.beam.direction
@@ -321,7 +474,7 @@ class NXInstrumentModel:
         axes.set_title(f"Instrument: {instrument_name}")
         # ax.set_aspect('equalxz')
 
-    def plot_wavevectors(self, axes: Axes3D):
+    def plot_wavevectors(self, axes: 'Axes3D'):
         frames, ii, jj = self.shape()
         pixel_centre = (frames // 2, ii // 2, jj // 2)
         ki = self.beam.incident_wavevector
@@ -362,7 +515,7 @@ class NXInstrumentModel:
         axes.set_title(f"Wavevectors\nHKL: {np.array_str(hkl, precision=2, suppress_small=True)}")
         axes.set_aspect('equal')
 
-    def plot_hkl(self, axes: Axes3D):
+    def plot_hkl(self, axes: 'Axes3D'):
         frames, ii, jj = self.shape()
         pixel_centre = (frames // 2, ii // 2, jj // 2)
         hkl = self.hkl(pixel_centre)
@@ -0,0 +1,250 @@
+"""
+Process-wide cache of NexusMap objects
+
+Creating a NexusMap walks the whole HDF5 tree, reading the attributes of every group and dataset.
+Consecutive scans of the same type have the same structure, so the map of one scan can be used
+for the next. Maps are stored under a cheap structural fingerprint of the file:
+
+ - the path of every link in the file (read in a single low-level visit, without opening objects)
+ - the NeXus default, signal and axes attributes and the scan_fields of the default entry
+ - the shapes of the array datasets in the map, checked against the new file
+
+A copy of the cached map is returned for each file, with the filename and local namespace of the
+new file, so that ROIs and named expressions added to one scan don't change the others.
+
+    hdf_map = create_nexus_map('12345.nxs')  # populates map
+    hdf_map = create_nexus_map('12346.nxs')  # same structure, map copied from cache
+    print(get_nexus_map_cache())  # NexusMapCache(maps=1, hits=1, misses=1)
+
+The cache can be disabled for a single call with create_nexus_map(filename, use_cache=False),
+or for the whole process with get_nexus_map_cache().enabled = False.
+"""
+
+import os
+import copy
+import hashlib
+import threading
+from collections import OrderedDict
+
+import h5py
+import hdfmap
+from hdfmap import NexusMap
+
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
+
+DEFAULT_MAX_MAPS = 32  # number of maps of different structure kept in the cache
+MAX_FILES = 1000  # number of filenames remembered, to skip the fingerprint of unchanged files
+DEFAULT_ATTRS = ('default', 'signal', 'axes')
+SCAN_FIELDS = 'diamond_scan/scan_fields'
+
+
+def _file_state(filename: str) -> tuple[int, int]:
+    """Return (modified time, size) of file, used to detect changes"""
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _attr_str(value) -> str:
+    if isinstance(value, bytes):
+        return value.decode(errors='replace')
+    if hasattr(value, 'tolist'):
+        return str(value.tolist())
+    return str(value)
+
+
+def structure_fingerprint(hdf: h5py.File) -> str:
+    """
+    Return hash of the link layout and NeXus default attributes of the file
+    :param hdf: open HDF file
+    :return: hex digest str
+    """
+    names = []
+    hdf.id.links.visit(names.append)
+
+    # NeXus defaults change the axes and signal of the map
+    defaults = []
+    groups = [hdf]
+    entry_name = hdf.attrs.get('default')
+    entry = hdf.get(_attr_str(entry_name)) if entry_name is not None else None
+    if isinstance(entry, h5py.Group):
+        groups.append(entry)
+        data_name = entry.attrs.get('default')
+        data = entry.get(_attr_str(data_name)) if data_name is not None else None
+        if isinstance(data, h5py.Group):
+            groups.append(data)
+        scan_fields = entry.get(SCAN_FIELDS)
+        if isinstance(scan_fields, h5py.Dataset):
+            defaults.append(_attr_str(scan_fields[()]))
+    for group in groups:
+        defaults.extend(f"{group.name}@{attr}={_attr_str(group.attrs[attr])}"
+                        for attr in DEFAULT_ATTRS if attr in group.attrs)
+
+    fingerprint = hashlib.sha1()
+    fingerprint.update(b'\n'.join(names))
+    fingerprint.update('\n'.join(defaults).encode())
+    return fingerprint.hexdigest()
+
+
+def _array_paths(hdf_map: NexusMap) -> tuple[str, ...]:
+    """Return paths of datasets in the map with more than 0 dimensions"""
+    return tuple(path for path, dataset in hdf_map.datasets.items() if dataset.shape)
+
+
+def _array_shapes(hdf: h5py.File, paths: tuple[str, ...]) -> tuple[tuple[int, ...] | None, ...]:
+    """Return shapes of datasets in the file, None if the path doesn't exist or isn't a dataset"""
+    shapes = []
+    for path in paths:
+        dataset = hdf.get(path)
+        shapes.append(dataset.shape if isinstance(dataset, h5py.Dataset) else None)
+    return tuple(shapes)
+
+
+def copy_nexus_map(hdf_map: NexusMap, filename: str | None = None) -> NexusMap:
+    """
+    Return a copy of the map that can be modified independently, e.g. with add_roi
+    The mutable namespaces are copied, the dataset and group information is shared.
+    :param hdf_map: NexusMap
+    :param filename: filename of the new map, or None to keep the original filename
+    :return: NexusMap
+    """
+    new_map = copy.copy(hdf_map)
+    names = [name for cls in type(hdf_map).__mro__ for name in getattr(cls, '__slots__', ())]
+    names += list(getattr(hdf_map, '__dict__', {}))
+    for name in names:
+        value = getattr(hdf_map, name, None)
+        if isinstance(value, (dict, list)):
+            setattr(new_map, name, copy.copy(value))
+    if filename is not None:
+        new_map.filename = filename
+        if 'filepath' in new_map._local_data:
+            new_map._local_data['filepath'] = filename
+        if 'filename' in new_map._local_data:
+            new_map._local_data['filename'] = os.path.basename(filename)
+    return new_map
+
+
+def _populate(hdf: h5py.File) -> NexusMap:
+    """Return new NexusMap of open file"""
+    hdf_map = NexusMap()
+    hdf_map.populate(hdf)
+    return hdf_map
+
+
+class NexusMapCache:
+    """
+    LRU cache of NexusMaps, stored by structural fingerprint
+
+    :param max_maps: maximum number of maps of different structure to keep
+    :param enabled: if False, a new map is always created
+    """
+    def __init__(self, max_maps: int = DEFAULT_MAX_MAPS, enabled: bool = True):
+        self.max_maps = max_maps
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        # (fingerprint, array shapes): (map, array paths)
+        self._maps: OrderedDict[tuple, tuple[NexusMap, tuple[str, ...]]] = OrderedDict()
+        # filename: (file state, key in self._maps)
+        self._files: OrderedDict[str, tuple[tuple[int, int], tuple]] = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __repr__(self):
+        return f"NexusMapCache(maps={len(self._maps)}, hits={self.hits}, misses={self.misses})"
+
+    def __len__(self):
+        return len(self._maps)
+
+    def _lookup(self, hdf: h5py.File, fingerprint: str) -> tuple | None:
+        """Return key of cached map with the same structure and array shapes, call with lock"""
+        for key, (hdf_map, paths) in reversed(self._maps.items()):
+            if key[0] == fingerprint and _array_shapes(hdf, paths) == key[1]:
+                return key
+        return None
+
+    def _store(self, filename: str, state: tuple[int, int], key: tuple):
+        """Remember the map key for the filename, call with lock"""
+        self._files[filename] = (state, key)
+        self._files.move_to_end(filename)
+        while len(self._files) > MAX_FILES:
+            self._files.popitem(last=False)
+
+    def _get(self, hdf: h5py.File, filename: str, state: tuple[int, int] | None) -> NexusMap:
+        """Return map of open file from cache or populate a new map"""
+        fingerprint = structure_fingerprint(hdf)
+        with self._lock:
+            key = self._lookup(hdf, fingerprint)
+            if key is not None:
+                self.hits += 1
+                self._maps.move_to_end(key)
+                hdf_map = self._maps[key][0]
+        if key is None:
+            # populate outside the lock as this can take several seconds
+            hdf_map = _populate(hdf)
+            paths = _array_paths(hdf_map)
+            key = (fingerprint, _array_shapes(hdf, paths))
+            with self._lock:
+                self.misses += 1
+                self._maps[key] = (hdf_map, paths)
+                while len(self._maps) > self.max_maps:
+                    self._maps.popitem(last=False)
+        if state is not None:
+            with self._lock:
+                self._store(filename, state, key)
+        return copy_nexus_map(hdf_map, filename)
+
+    def get(self, file: str | h5py.File) -> NexusMap:
+        """
+        Return NexusMap for the file, copied from the cache if a file of the same structure has been mapped
+        :param file: NeXus filename or open HDF file
+        :return: NexusMap
+        """
+        if not self.enabled:
+            return hdfmap.create_nexus_map(file) if isinstance(file, str) else _populate(file)
+        filename = file if isinstance(file, str) else file.filename
+        try:
+            state = _file_state(filename)
+        except OSError:
+            state = None  # in-memory file
+        with self._lock:
+            old_state, key = self._files.get(filename, (None, None))
+            if state is not None and old_state == state and key in self._maps:
+                self.hits += 1
+                self._maps.move_to_end(key)
+                return copy_nexus_map(self._maps[key][0], filename)
+        if isinstance(file, str):
+            with load_hdf(file) as hdf:
+                return self._get(hdf, filename, state)
+        return self._get(file, filename, state)
+
+    def clear(self):
+        """Remove all maps and reset the counters"""
+        with self._lock:
+            self._maps.clear()
+            self._files.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+_nexus_map_cache: NexusMapCache | None = None
+
+
+def get_nexus_map_cache() -> NexusMapCache:
+    """Return the NexusMap cache shared by all readers in this process"""
+    global _nexus_map_cache
+    if _nexus_map_cache is None:
+        _nexus_map_cache = NexusMapCache()
+    return _nexus_map_cache
+
+
+def create_nexus_map(file: str | h5py.File, use_cache: bool = True) -> NexusMap:
+    """
+    Create a NexusMap from a NeXus file, re-using the map of a previous file with the same structure
+    :param file: NeXus filename or open HDF file
+    :param use_cache: if False, always populate a new map
+    :return: NexusMap
+    """
+    if use_cache:
+        return get_nexus_map_cache().get(file)
+    if isinstance(file, h5py.File):
+        return _populate(file)
+    return hdfmap.create_nexus_map(file)
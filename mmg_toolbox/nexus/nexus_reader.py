@@ -2,10 +2,11 @@ import os
 
 from mmg_toolbox.beamline_metadata.config import beamline_config
 import hdfmap
-from hdfmap import load_hdf, create_nexus_map
 
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
 from mmg_toolbox.nexus.nexus_scan import NexusDataHolder, NexusScan
 from mmg_toolbox.utils.file_functions import get_scan_number, replace_scan_number
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 
 
 def read_nexus_file(filename: str, flatten_scannables: bool = True, beamline: str | None = None) -> NexusDataHolder:
@@ -37,7 +38,8 @@ def find_matching_scans(filename: str, match_field: str = 'scan_command',
     :returns: list of scan files that exist and have matching field values
     """
     nexus_map = create_nexus_map(filename)
-    field_value = nexus_map.eval(nexus_map.load_hdf(), match_field)
+    with load_hdf(filename) as hdf:
+        field_value = nexus_map.eval(hdf, match_field)
     scanno = get_scan_number(filename)
     if search_scans_after is None:
         search_scans_after = search_scans_before
@@ -45,7 +47,8 @@ def find_matching_scans(filename: str, match_field: str = 'scan_command',
     for scn in range(scanno - search_scans_before, scanno + search_scans_after):
         new_filename = replace_scan_number(filename, scn)
         if os.path.isfile(new_filename):
-            new_field_value = nexus_map.eval(load_hdf(new_filename), match_field)
+            with load_hdf(new_filename) as hdf:
+                new_field_value = nexus_map.eval(hdf, match_field)
             if field_value == new_field_value:
                 matching_files.append(new_filename)
     return matching_files
@@ -68,7 +71,7 @@ def find_similar_scans(filename: str, *files: str, metadata: list[str | tuple[st
     """
     nexus_map = create_nexus_map(filename)
     names = [n if isinstance(n, str) else n[0] for n in metadata]
-    with hdfmap.load_hdf(filename) as hdf:
+    with load_hdf(filename) as hdf:
         initial_parameters = [
             nexus_map.eval(hdf, name)
             for name in names
@@ -77,7 +80,7 @@ def find_similar_scans(filename: str, *files: str, metadata: list[str | tuple[st
     for file in files:
         if file == filename:
             continue
-        with hdfmap.load_hdf(file) as hdf:
+        with load_hdf(file) as hdf:
             new_parameters = [
                 nexus_map.eval(hdf, name)
                 for name in names
@@ -91,6 +94,21 @@ def find_similar_scans(filename: str, *files: str, metadata: list[str | tuple[st
     return similar_files
 
 
+def match_value(file_value, value: str | float | tuple[float, float]) -> bool:
+    """
+    Return True if the value from a file matches the requirement
+
+        'scan' -> matches if 'scan' in file_value
+        value -> matches if file_value ~= value
+        (value, tol) -> matches if abs(file_value - value) < tol
+    """
+    if isinstance(value, str):
+        return value in file_value
+    elif isinstance(value, (float, int)):
+        return abs(value - file_value) < 0.01
+    return abs(value[0] - file_value) < value[1]
+
+
 def find_scans(filename: str, *files: str, hdf_map: hdfmap.NexusMap | None = None, first_only: bool = False,
                **matches: str | float | tuple[float, float]) -> list[str]:
     """
@@ -113,17 +131,10 @@ def find_scans(filename: str, *files: str, hdf_map: hdfmap.NexusMap | None = Non
     nexus_map = hdf_map or create_nexus_map(filename)
     matching_files = []
     for file in (filename,) + files:
-        with hdfmap.load_hdf(file) as hdf:
+        with load_hdf(file) as hdf:
             all_ok = True
-            for name, match_value in matches.items():
-                file_value = nexus_map.eval(hdf, name)
-                if isinstance(match_value, str):
-                    chk = match_value in file_value
-                elif isinstance(match_value, (float, int)):
-                    chk = abs(match_value - file_value) < 0.01
-                else:
-                    chk = abs(match_value[0] - file_value) < match_value[1]
-                if not chk:
+            for name, value in matches.items():
+                if not match_value(nexus_map.eval(hdf, name), value):
                     all_ok = False
                     break
         if all_ok:
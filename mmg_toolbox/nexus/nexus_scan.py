@@ -8,21 +8,48 @@ NexusDataHolder - Loads scan data and meta data into attributes
 import os
 import datetime
 import re
+import typing
 
 import h5py
 import hdfmap
 import numpy as np
-from hdfmap import NexusLoader, NexusMap, load_hdf
-from hdfmap.eval_functions import dataset2data, dataset2str
+from hdfmap import NexusLoader, NexusMap
+from hdfmap.eval_functions import dataset2data, dataset2str, extra_hdf_data, replace_expression_vars, DEFAULT
 
 from mmg_toolbox.beamline_metadata.hdfmap_generic import HdfMapMMGMetadata as Md
 from mmg_toolbox.beamline_metadata.config import beamline_config, C
-from mmg_toolbox.nexus.instrument_model import NXInstrumentModel
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+from mmg_toolbox.nexus.dataset_cache import DatasetCache
+from mmg_toolbox.nexus.image_reductions import image_stack_sum, image_stack_mean, image_stack_max, \
+    image_stack_min, image_stack_mode, image_frame_totals
 from mmg_toolbox.nexus.nexus_functions import get_dataset_value, nx_find, nx_find_all
 from mmg_toolbox.utils.file_functions import get_scan_number, read_tiff
-from mmg_toolbox.utils.misc_functions import shorten_string, DataHolder
-from mmg_toolbox.xas.spectra_container import SpectraContainer
-from mmg_toolbox.xas.nxxas_loader import load_xas_scans
+from mmg_toolbox.utils.misc_functions import shorten_string, DataHolder, LazyDataHolder
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
+
+if typing.TYPE_CHECKING:
+    from mmg_toolbox.fitting.manager import ScanFitManager
+    from mmg_toolbox.plotting.scan_plot_manager import ScanPlotManager
+    from mmg_toolbox.nexus.instrument_model import NXInstrumentModel
+    from mmg_toolbox.xas.spectra_container import SpectraContainer
+
+re_identifier = re.compile(r'[a-zA-Z_]\w*')
+
+STACK_REDUCTIONS = {
+    'sum': image_stack_sum,
+    'mean': image_stack_mean,
+    'max': image_stack_max,
+    'min': image_stack_min,
+}
+
+
+def _writable(value: typing.Any) -> typing.Any:
+    """Return a copy of read-only arrays from the dataset cache, so callers can't change cached values"""
+    if isinstance(value, np.ndarray) and not value.flags.writeable:
+        return value.copy()
+    if isinstance(value, (tuple, list)):  # e.g. scan('axes, signal')
+        return type(value)(_writable(v) for v in value)
+    return value
 
 
 class NexusScan(NexusLoader):
@@ -42,16 +69,24 @@ class NexusScan(NexusLoader):
         >>> scan.map.add_roi('name', ...)  # add ROI to namespace
         >>> scan.image(0)  # return first detector image as array
         >>> scan.volume()  # return image stack
+        >>> scan.image('sum', block_size=100)  # sum image stack, reading 100 frames at a time
         >>> data = scan.get_plot_data()  # return dict of plot data
+        >>> scan.cache.stats()  # statistics of datasets cached while evaluating expressions
+
+    The file is opened through the pool of open files (see utils.hdf_file_pool) and closed after each call,
+    so it can be written to between calls. To keep the file open between calls, use:
+        >>> with hdf_file_pool():
+        >>>     data = [scan(name) for name in names]  # file opened once
 
     :param nxs_filename: path to nexus file
-    :param hdf_map: NexusMap object or None
+    :param hdf_map: NexusMap object or None to use the map of a previous scan with the same structure
     :param config: configuration dict
     """
     MAX_STR_LEN: int = 100
 
     def __init__(self, nxs_filename: str, hdf_map: NexusMap | None = None, config: dict | None = None):
-        super().__init__(nxs_filename, hdf_map)
+        super().__init__(nxs_filename, hdf_map or create_nexus_map(nxs_filename))
+        self.cache = DatasetCache(nxs_filename)
         self.config: dict = config or beamline_config()
         self.beamline = self.config.get(C.beamline, None)
 
@@ -63,11 +98,38 @@ class NexusScan(NexusLoader):
         for (name, cen_i, cen_j, wid_i, wid_j, det_name) in self.config.get(C.roi, []):
             self.map.add_roi(name, cen_i, cen_j, wid_i, wid_j, det_name)
 
-        from mmg_toolbox.fitting import ScanFitManager, poisson_errors
-        self.fit = ScanFitManager(self)
-        self._error_function = poisson_errors
-        from mmg_toolbox.plotting.scan_plot_manager import ScanPlotManager
-        self.plot = ScanPlotManager(self)
+        # fit and plot managers are created on first use, as fitting and plotting are slow to import
+        self._fit: typing.Any | None = None
+        self._plot: typing.Any | None = None
+
+    @property
+    def fit(self) -> 'ScanFitManager':
+        """Peak fitting of scan data, e.g. scan.fit.multi_peak_fit()"""
+        if self._fit is None:
+            from mmg_toolbox.fitting.manager import ScanFitManager
+            self._fit = ScanFitManager(self)
+        return self._fit
+
+    @fit.setter
+    def fit(self, fit_manager: 'ScanFitManager'):
+        self._fit = fit_manager
+
+    @property
+    def plot(self) -> 'ScanPlotManager':
+        """Plotting of scan data, e.g. scan.plot()"""
+        if self._plot is None:
+            from mmg_toolbox.plotting.scan_plot_manager import ScanPlotManager
+            self._plot = ScanPlotManager(self)
+        return self._plot
+
+    @plot.setter
+    def plot(self, plot_manager: 'ScanPlotManager'):
+        self._plot = plot_manager
+
+    @staticmethod
+    def _error_function(data: np.ndarray) -> np.ndarray:
+        from mmg_toolbox.fitting.functions import poisson_errors
+        return poisson_errors(data)
 
     def __repr__(self):
         if self.beamline:
@@ -118,9 +180,91 @@ class NexusScan(NexusLoader):
         return f"#{self.scan_number()}"
 
     def load_hdf(self) -> h5py.File:
-        """Load the Hdf file"""
+        """Load the Hdf file, from the pool of open files"""
         return load_hdf(self.filename)
 
+    def _load(self) -> h5py.File:
+        return self.load_hdf()
+
+    def _eval(self, hdf: h5py.File, expression: str, default=DEFAULT, prefer_local: bool = True,
+              raise_errors: bool = True, format_string: bool = False):
+        """
+        Evaluate expression in the namespace of the file, using and adding to the dataset cache
+
+        Values of names in the expression are taken from the cache if available, datasets read from the
+        file while evaluating the expression are added to the cache.
+        Cached arrays are read-only, so arrays returned from the cache are copied.
+        """
+        self.cache.check_file()
+        replaced = replace_expression_vars(expression, self.map.alternate_names)
+        if not format_string and replaced.strip() and replaced in hdf:
+            # expression is a hdf path
+            cached = self.cache.get({replaced: replaced})
+            if replaced in cached:
+                return _writable(cached[replaced])
+            value = dataset2data(hdf[replaced])
+            self.cache.store({replaced: value})
+            return _writable(value)
+
+        paths = {
+            name: self.map.combined[name] for name in re_identifier.findall(replaced)
+            if name in self.map.combined and name not in self._local_data
+        }
+        cached = self.cache.get(paths) if prefer_local else {}
+        namespace = {**cached, **self._local_data}
+        evaluate = self.map.format_hdf if format_string else self.map.eval
+        result = evaluate(
+            hdf_file=hdf,
+            expression=expression,
+            default=default,
+            local_data=namespace,
+            prefer_local=prefer_local,
+            raise_errors=raise_errors
+        )
+        self.cache.store({
+            path: namespace[name] for name, path in paths.items()
+            if name in namespace and name not in cached and path in hdf
+        })
+        return _writable(result)
+
+    def eval(self, expression: str, default=DEFAULT, prefer_local: bool | None = None, raise_errors: bool = True):
+        """
+        Evaluate an expression using the namespace of the hdf file
+
+        Datasets read from the file are kept in scan.cache for the next evaluation.
+        See hdfmap.HdfLoader.eval for the allowed patterns.
+
+        :param expression: str expression to be evaluated
+        :param default: returned if varname not in namespace
+        :param prefer_local: if True, uses values in local_data and the dataset cache first if available
+        :param raise_errors: raise exceptions if True, otherwise return str error message as result and log the error
+        :return: eval(expression)
+        """
+        prefer_local = self._prefer_local_data if prefer_local is None else prefer_local
+        if prefer_local and expression in self._local_data:
+            return self._local_data[expression]
+        with self.load_hdf() as hdf:
+            return self._eval(hdf, expression, default, prefer_local, raise_errors)
+
+    def format(self, expression: str, default=DEFAULT, prefer_local: bool | None = None,
+               raise_errors: bool = True) -> str:
+        """
+        Evaluate a formatted string expression using the namespace of the hdf file
+
+        E.G.
+            expression = '{scan_command} E={mean(incident_energy):.2f}'
+            output = scan.format(expression)
+
+        :param expression: str expression using {name} format specifiers
+        :param default: returned if varname not in namespace
+        :param prefer_local: if True, uses values in local_data and the dataset cache first if available
+        :param raise_errors: raise exceptions if True, otherwise return str error message
+        :return: eval_hdf(f"expression")
+        """
+        prefer_local = self._prefer_local_data if prefer_local is None else prefer_local
+        with self.load_hdf() as hdf:
+            return self._eval(hdf, expression, default, prefer_local, raise_errors, format_string=True)
+
     def hdf_tree_string(self, group: str = '/', all_links: bool = True, attributes: bool = True) -> str:
         """
         Generate string of the hdf file structure, similar to h5ls. Uses h5py.visititems
@@ -188,16 +332,20 @@ class NexusScan(NexusLoader):
         with self.load_hdf() as hdf:
             return [dataset2str(hdf[self.map.combined[name]], units=units) for name in args]
 
-    def image(self, index: int | tuple | slice | str | None = None) -> np.ndarray:
-        """Return image or selection from default detector"""
+    def image(self, index: int | tuple | slice | str | None = None, block_size: int | None = None,
+              workers: int = 1) -> np.ndarray:
+        """
+        Return image or selection from default detector
+
+        index can also be 'sum', 'mean', 'max' or 'min' to reduce the full image stack, read in blocks of
+        block_size frames (None to align with HDF5 chunks) using an optional pool of worker processes.
+        """
         if not self.map.image_data:
             raise ValueError(f'{repr(self)} contains no image data')
+        if isinstance(index, str) and index in STACK_REDUCTIONS:
+            return STACK_REDUCTIONS[index](self, block_size=block_size, workers=workers)
         with self.load_hdf() as hdf:
-            if index == 'sum':
-                volume = self.map.get_image(hdf, ())
-                image = volume.sum(axis=tuple(range(volume.ndim-2)))  # this will fail for filenames
-            else:
-                image = self.map.get_image(hdf, index)
+            image = self.map.get_image(hdf, index)
 
             if issubclass(type(image), str):
                 # TIFF image, NXdetector/image_data -> array('file.tif')
@@ -224,21 +372,37 @@ class NexusScan(NexusLoader):
 
     def volume(self) -> np.ndarray:
         """Return complete stack of images"""
-        return self.map.get_image(self.load_hdf(), ())
+        with self.load_hdf() as hdf:
+            return self.map.get_image(hdf, ())
+
+    def image_totals(self, block_size: int | None = None, workers: int = 1) -> np.ndarray:
+        """
+        Return the sum of each detector image, reading the image stack in blocks of frames
+        :param block_size: number of frames read at once, None to align with HDF5 chunks
+        :param workers: number of worker processes
+        :return: array of image sums, flattened over the scan dimensions
+        """
+        return image_frame_totals(self, block_size=block_size, workers=workers)
 
-    def image_background(self, index: int | tuple | slice | str | None = (), n_bins: int  = 100) -> np.ndarray:
+    def image_background(self, index: int | tuple | slice | str | None = (), n_bins: int  = 100,
+                         block_size: int | None = None, workers: int = 1) -> np.ndarray:
         """
         Return the modal value of the detector image,
         which usually gives the background value.
 
         The modal value is determined by histograming the image (or image stack) and taking
-        the value of the largest bin.
+        the value of the largest bin. The full image stack is histogrammed in blocks of frames.
 
         :param index: index of image to return, use () for full image stack.
         :param n_bins: number of histogram bins
+        :param block_size: number of frames read at once for the full image stack, None to align with HDF5 chunks
+        :param workers: number of worker processes for the full image stack
         :return: modal value or values per image
         """
-        image = self.map.get_image(self.load_hdf(), index)  # hdf data only
+        if index == ():
+            return image_stack_mode(self, n_bins=n_bins, block_size=block_size, workers=workers)
+        with self.load_hdf() as hdf:
+            image = self.map.get_image(hdf, index)  # hdf data only
         n, bins = np.histogram(np.log10(image[image>0].flatten()), bins=n_bins)
         return 10 ** bins[np.argmax(n)]
 
@@ -271,7 +435,7 @@ class NexusScan(NexusLoader):
                 index = int(axis_name.strip('signal') or 0)
                 axis_name = list(signal_names)[index]
         label, = self.map.generate_ids(axis_name, modify_missing=False)
-        data = self.map.eval(hdf, axis_name)
+        data = self._eval(hdf, axis_name)
         if np.ndim(data) > 1 and reduce_shape:
             # reduce high dimensional arrays to the default scannable shape
             shape = self.map.scannables_shape()
@@ -336,7 +500,7 @@ class NexusScan(NexusLoader):
         """
         with self.load_hdf() as hdf:
             data = self.map.get_plot_data(hdf)
-            cmd = self.map.eval(hdf, Md.cmd)
+            cmd = self._eval(hdf, Md.cmd)
             if len(cmd) > self.MAX_STR_LEN:
                 cmd = shorten_string(cmd)
             x_data, x_lab = self._get_plot_axis(hdf, x_axis or 'axes', reduce_shape=True, flatten=True)
@@ -394,7 +558,7 @@ class NexusScan(NexusLoader):
             return data
 
     def xas_spectra(self, sample_name: str | None = None, element_edge: str | None = None, mode: str | list[str] = 'all',
-                    dls_loader: bool = False) -> SpectraContainer:
+                    dls_loader: bool = False) -> 'SpectraContainer':
         """
         Load XAS Spectra from the scan file
 
@@ -408,27 +572,36 @@ class NexusScan(NexusLoader):
         :param dls_loader: bool, if True uses explicit loading of metadata from DLS MMG beamlines
         :return: SpectraContainer
         """
+        from mmg_toolbox.xas.nxxas_loader import load_xas_scans
         return load_xas_scans(self.filename, sample_name=sample_name, element_edge=element_edge,
                               mode=mode, dls_loader=dls_loader)[0]
 
-    def instrument_model(self) -> NXInstrumentModel:
+    def instrument_model(self) -> 'NXInstrumentModel':
         """Build and instrument model from NeXus file"""
+        from mmg_toolbox.nexus.instrument_model import NXInstrumentModel
         with self.load_hdf() as hdf:
             return NXInstrumentModel(hdf)
 
 
-class NexusDataHolder(DataHolder, NexusScan):
+class NexusDataHolder(LazyDataHolder, NexusScan):
     """
     Nexus data holder class
      - Automatically reads scannable and metadata from file
      - acts like the old .dat DataHolder class
      - has additional functions to read data from NeXus file
 
+    Scannables and metadata are read from the file on first access and kept, so
+    only the fields that are used are loaded. Use preload() to read everything at once.
+
     Example:
         scan = NexusDataHolder('12345.nxs')
         scan.eta -> returns array
         scan.metadata.metadata -> returns value
         scan('signal') -> evaluate expression
+        scan.preload() -> load all scannables and metadata
+
+    Note that scannables with the same name as an attribute of the class, e.g. 'map', are
+    only available using scan['map'].
 
     :param filename: path to Nexus file
     :param hdf_map: NexusMap object or None to generate
@@ -436,17 +609,46 @@ class NexusDataHolder(DataHolder, NexusScan):
     """
     filename: str
     map: NexusMap
-    metadata: DataHolder
+    metadata: LazyDataHolder
 
     def __init__(self, filename: str | None, hdf_map: NexusMap | None = None, flatten_scannables: bool = True,
                  config: dict | None = None):
         NexusScan.__init__(self, filename, hdf_map, config)
+        self.flatten_scannables = flatten_scannables
+
+        metadata_paths = self.map.metadata or {
+            ds.name: path for path, ds in self.map.datasets.items() if ds.size <= 1
+        }
+        with self.load_hdf() as hdf:
+            scannables = {name: path for name, path in self.map.scannables.items() if path in hdf}
+            metadata = {name: path for name, path in metadata_paths.items() if path in hdf}
+            extra = {name: value for name, value in extra_hdf_data(hdf).items() if name not in metadata_paths}
+        self._scannable_paths = scannables
+        self._metadata_paths = metadata
+        LazyDataHolder.__init__(self, list(scannables), self._load_scannables)
+        self.metadata = LazyDataHolder(list(metadata_paths), self._load_metadata, values=extra)
+
+    def _load_scannables(self, names: list[str]) -> dict[str, np.ndarray]:
+        """Read scannable arrays from file"""
+        with self.load_hdf() as hdf:
+            data = {name: hdf[self._scannable_paths[name]][()] for name in names}
+        if self.flatten_scannables:
+            data = {name: np.reshape(value, -1) for name, value in data.items()}
+        return data
+
+    def _load_metadata(self, names: list[str]) -> dict[str, typing.Any]:
+        """Read metadata values from file, None if the path doesn't exist"""
+        with self.load_hdf() as hdf:
+            return {
+                name: dataset2data(hdf[self._metadata_paths[name]]) if name in self._metadata_paths else None
+                for name in names
+            }
 
-        with load_hdf(filename) as hdf:
-            metadata = self.map.get_metadata(hdf)
-            scannables = self.map.get_scannables(hdf, flatten=flatten_scannables)
-        DataHolder.__init__(self, **scannables)
-        self.metadata = DataHolder(**metadata)
+    def preload(self) -> 'NexusDataHolder':
+        """Load all scannables and metadata from the file, returns self"""
+        LazyDataHolder.preload(self)
+        self.metadata.preload()
+        return self
 
     def __repr__(self):
         return f"NexusDataHolder('{self.filename}')"
@@ -2,7 +2,6 @@
 NXtransformations
 code taken from https://github.com/DanPorter/i16_diffractometer
 """
-import hdfmap
 import numpy as np
 import h5py
 
@@ -10,6 +9,7 @@ import mmg_toolbox.nexus.nexus_names as nn
 from mmg_toolbox.utils.units import METERS
 from mmg_toolbox.utils.rotations import norm_vector, rotation_t_matrix, translation_t_matrix, transform_by_t_matrix
 from mmg_toolbox.nexus.nexus_functions import nx_find_all, bytes2str
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 
 H5pyType = h5py.File | h5py.Group | h5py.Dataset
 
@@ -296,7 +296,7 @@ def generate_nxtranformations_string(filename: str) -> str:
     return a string describing all the transformation chains in the NeXus file
     """
     out_str = "######################## NXtransformations ##########################\n"
-    with hdfmap.load_hdf(filename) as nxs:
+    with load_hdf(filename) as nxs:
         datasets = nx_find_all(nxs, nn.NX_DEPON)
         for dataset in datasets:
             chain = NxTransformationChain(dataset.parent, 0)
@@ -11,6 +11,7 @@ from hdfmap.nexus import default_nxentry
 
 import mmg_toolbox.nexus.nexus_names as nn
 from mmg_toolbox.utils.file_functions import get_scan_number
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 from mmg_toolbox.nexus.nexus_transformations import TransformationAxis, RotationAxis, TranslationAxis, get_depends_on
 from mmg_toolbox.utils.polarisation import polarisation_label_to_stokes, analyser_jones_matrix
 from mmg_toolbox.utils.xray_utils import photon_wavelength
@@ -323,7 +324,7 @@ def add_entry_links(root: h5py.File, *filenames: str):
     for n, filename in enumerate(filenames):
         if not h5py.is_hdf5(filename):
             continue
-        with h5py.File(filename) as nxs:
+        with load_hdf(filename) as nxs:
             entry_path = default_nxentry(nxs)
         number = get_scan_number(filename) or n + 1
         label = str(number)
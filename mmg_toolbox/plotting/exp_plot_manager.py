@@ -6,6 +6,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import hdfmap
 from ..utils.experiment import Experiment
+from ..nexus.nexus_map_cache import create_nexus_map
 from .matplotlib import (
     set_plot_defaults, generate_subplots, plot_lines, plot_2d_surface, plot_3d_surface, plot_3d_lines,
     FIG_SIZE, FIG_DPI, DEFAULT_CMAP, Axes3D
@@ -142,13 +143,12 @@ class ExperimentPlotManager:
         scans = self.exp.scans(*scan_files, hdf_map=hdf_map)
         hdf_map = scans[0].map
 
-        plot_data = []
-        for scan in scans:
-            with hdfmap.load_hdf(scan.filename) as hdf:
-                xdata = hdf_map.eval(hdf, xaxis)
-                ydata = hdf_map.eval(hdf, yaxis)
-                value_data = np.mean(hdf_map.eval(hdf, value)) if value else None
-                plot_data.append((value_data, xdata, ydata))
+        data_fields = [xaxis, yaxis] + ([value] if value else [])
+        data = self.exp.join_scan_data(*scan_files, hdf_map=hdf_map, data_fields=data_fields)
+        plot_data = [
+            (np.mean(data[value][n]) if value else None, data[xaxis][n], data[yaxis][n])
+            for n in range(len(scans))
+        ]
 
         if axes is None:
             fig, axes = plt.subplots()
@@ -211,7 +211,7 @@ class ExperimentPlotManager:
         :return: axes object
         """
         first_file = self.exp.get_scan_filename(scan_files[0])
-        hdf_map = hdfmap.create_nexus_map(first_file) if hdf_map is None else hdf_map
+        hdf_map = create_nexus_map(first_file) if hdf_map is None else hdf_map
         x, y, z = self.exp.generate_mesh(*scan_files, hdf_map=hdf_map,
                                          axes=xaxis, signal=signal, values=values)
 
@@ -245,7 +245,7 @@ class ExperimentPlotManager:
         :return: axes object
         """
         first_file = self.exp.get_scan_filename(scan_files[0])
-        hdf_map = hdfmap.create_nexus_map(first_file) if hdf_map is None else hdf_map
+        hdf_map = create_nexus_map(first_file) if hdf_map is None else hdf_map
         scans = self.exp.scans(*scan_files, hdf_map=hdf_map)
         data_fields = [signal, xaxis] + ([values] if values is not None else [])
         data = self.exp.join_scan_data(*scan_files, hdf_map=hdf_map, data_fields=data_fields)
@@ -286,7 +286,7 @@ class ExperimentPlotManager:
         :return: axes object
         """
         first_file = self.exp.get_scan_filename(scan_files[0])
-        hdf_map = hdfmap.create_nexus_map(first_file) if hdf_map is None else hdf_map
+        hdf_map = create_nexus_map(first_file) if hdf_map is None else hdf_map
         x, y, z = self.exp.generate_mesh(*scan_files, hdf_map=hdf_map,
                                          axes=xaxis, signal=signal, values=values)
 
@@ -1,12 +1,20 @@
 """
 mmg_toolbox tkinter dataviewer
+
+Apps are imported on first use, as tkinter and matplotlib are slow to import.
 """
 
-from .apps.experiment import create_title_window
-from .apps.data_viewer import create_data_viewer
-from .apps.nexus import create_nexus_viewer
-from .apps.file_browser import create_nexus_file_browser
-from .cli import cli_run, run
+import importlib
+
+# name: submodule
+_LAZY_ATTRIBUTES = {
+    'create_title_window': 'apps.experiment',
+    'create_data_viewer': 'apps.data_viewer',
+    'create_nexus_viewer': 'apps.nexus',
+    'create_nexus_file_browser': 'apps.file_browser',
+    'cli_run': 'cli',
+    'run': 'cli',
+}
 
 __all__ = [
     'create_nexus_file_browser',
@@ -17,3 +25,14 @@ __all__ = [
     'run'
 ]
 
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
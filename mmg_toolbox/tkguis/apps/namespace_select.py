@@ -5,6 +5,7 @@ tk window to select HDF paths from files
 import tkinter as tk
 from tkinter import ttk
 import hdfmap
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 
 from ..misc.functions import open_close_all_tree
 from ..misc.config import get_config
@@ -22,7 +23,7 @@ def create_metadata_selector(hdf_map: hdfmap.NexusMap,
     config = get_config() if config is None else config
 
     widget = HdfNameSpace(root)
-    with hdf_map.load_hdf() as hdf:
+    with load_hdf(hdf_map.filename) as hdf:
         widget.populate(hdf, hdf_map, all=False, metadata=True)
     open_close_all_tree(widget.tree, "", True)
 
@@ -52,7 +53,7 @@ def create_scannable_selector(hdf_map: hdfmap.NexusMap,
     config = get_config() if config is None else config
 
     widget = HdfNameSpace(root)
-    with hdf_map.load_hdf() as hdf:
+    with load_hdf(hdf_map.filename) as hdf:
         widget.populate(hdf, hdf_map, all=False, scannables=True)
     open_close_all_tree(widget.tree, "", True)
 
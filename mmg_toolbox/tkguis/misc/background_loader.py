@@ -0,0 +1,204 @@
+"""
+Debounced, cancellable background loading for tkinter widgets
+
+Requests are started after a short delay, so that a rapid series of requests (e.g. holding the arrow
+key in a file list) only starts the last one. Loading runs in a single background thread, a newer
+request cancels older requests and the results of stale requests are discarded. Finished results are
+passed back to the tkinter thread by polling with root.after, so widgets are only updated from the
+mainloop.
+
+    loader = BackgroundLoader(root)
+
+    def load(request):
+        data = read_file(filename)  # runs in background thread
+        request.check()  # raises LoadCancelled if a newer request has been made
+        return data
+
+    loader.submit(load, callback=update_widgets)  # callback(data) runs in the tkinter thread
+
+Loaders returning a generator can be submitted with iterate=True, the callback is then called with each
+item as it is generated, allowing widgets to be updated progressively:
+
+    def load_all(request):
+        for filename in filenames:
+            yield read_file(filename)  # runs in background thread
+
+    loader.submit(load_all, callback=add_plot, iterate=True)  # add_plot(data) called for each file
+"""
+
+import threading
+import typing
+import queue
+import tkinter as tk
+
+from .logging import create_logger
+
+logger = create_logger(__file__)
+
+DEFAULT_DELAY_MS = 150  # time to wait for further requests before loading
+DEFAULT_POLL_MS = 20  # interval to check for finished results
+
+
+class LoadCancelled(Exception):
+    """Raised by LoadRequest.check() when a newer request has been made"""
+    pass
+
+
+class LoadRequest:
+    """
+    Single request of the background loader, passed to the loading function
+    :param generation: request number, only the latest request is delivered
+    :param loader: function(request) -> result, called in the background thread
+    :param callback: function(result), called in the tkinter thread
+    :param error_callback: function(exception), called in the tkinter thread if loader raises an exception
+    :param iterate: if True, loader returns an iterable and callback is called with each item
+    """
+    def __init__(self, generation: int, loader: typing.Callable[['LoadRequest'], typing.Any],
+                 callback: typing.Callable[[typing.Any], None],
+                 error_callback: typing.Callable[[Exception], None] | None = None,
+                 iterate: bool = False):
+        self.generation = generation
+        self.loader = loader
+        self.callback = callback
+        self.error_callback = error_callback
+        self.iterate = iterate
+        self._cancelled = threading.Event()
+
+    def __repr__(self):
+        return f"LoadRequest({self.generation}, cancelled={self.cancelled})"
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self):
+        self._cancelled.set()
+
+    def check(self):
+        """Raise LoadCancelled if this request has been replaced, call between loading stages"""
+        if self._cancelled.is_set():
+            raise LoadCancelled(repr(self))
+
+
+class BackgroundLoader:
+    """
+    Load data in a background thread, delivering only the result of the latest request
+
+    :param root: tkinter widget (or tk.Tcl interpreter) used to schedule calls in the mainloop
+    :param delay_ms: time in ms to wait for further requests before loading starts
+    :param poll_ms: interval in ms to check for finished results
+    """
+    def __init__(self, root: tk.Misc | tk.Tk, delay_ms: int = DEFAULT_DELAY_MS, poll_ms: int = DEFAULT_POLL_MS):
+        self.root = root
+        self.delay_ms = delay_ms
+        self.poll_ms = poll_ms
+        self.loaded = 0
+        self.cancelled = 0
+        self._generation = 0
+        self._current: LoadRequest | None = None
+        self._next: LoadRequest | None = None
+        self._delay_id: str | None = None
+        self._poll_id: str | None = None
+        self._condition = threading.Condition()
+        self._results = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    def __repr__(self):
+        return f"BackgroundLoader(loaded={self.loaded}, cancelled={self.cancelled})"
+
+    @property
+    def busy(self) -> bool:
+        """True if a request has not been delivered yet"""
+        return self._current is not None
+
+    def submit(self, loader: typing.Callable[[LoadRequest], typing.Any], callback: typing.Callable[[typing.Any], None],
+               error_callback: typing.Callable[[Exception], None] | None = None,
+               iterate: bool = False) -> LoadRequest:
+        """
+        Request background load, cancelling any previous request. Call from the tkinter thread.
+        :param loader: function(request) -> result, called in the background thread
+        :param callback: function(result), called in the tkinter thread with the result
+        :param error_callback: function(exception), called in the tkinter thread if loading fails
+        :param iterate: if True, loader returns an iterable (e.g. a generator) and callback is called with each item
+        :return: LoadRequest
+        """
+        self._generation += 1
+        if self._current is not None:
+            self._current.cancel()
+            self.cancelled += 1
+        if self._delay_id is not None:
+            self.root.after_cancel(self._delay_id)
+        request = LoadRequest(self._generation, loader, callback, error_callback, iterate)
+        self._current = request
+        self._delay_id = self.root.after(self.delay_ms, self._start, request)
+        return request
+
+    def cancel(self):
+        """Cancel the current request"""
+        if self._delay_id is not None:
+            self.root.after_cancel(self._delay_id)
+            self._delay_id = None
+        if self._current is not None:
+            self._current.cancel()
+            self.cancelled += 1
+            self._current = None
+
+    def _start(self, request: LoadRequest):
+        """Pass request to the background thread, called after the delay"""
+        self._delay_id = None
+        with self._condition:
+            self._next = request
+            self._condition.notify()
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._load_loop, daemon=True)
+            self._thread.start()
+        if self._poll_id is None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
+
+    def _load_loop(self):
+        """Background thread, loads the latest request"""
+        while True:
+            with self._condition:
+                while self._next is None:
+                    self._condition.wait()
+                request, self._next = self._next, None
+            if request.cancelled:
+                continue
+            try:
+                if request.iterate:
+                    for item in request.loader(request):
+                        request.check()
+                        self._results.put((request, item, None, False))
+                    self._results.put((request, None, None, True))
+                else:
+                    result = request.loader(request)
+                    self._results.put((request, result, None, True))
+            except LoadCancelled:
+                logger.debug(f"{request} cancelled")
+            except Exception as e:
+                self._results.put((request, None, e, True))
+
+    def _poll(self):
+        """Deliver finished results in the tkinter thread"""
+        self._poll_id = None
+        while True:
+            try:
+                request, result, error, finished = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if request is not self._current or request.cancelled:
+                continue  # stale result
+            if not finished:
+                request.callback(result)  # item of an iterating request
+                break  # deliver one item per poll, keeping the mainloop responsive
+            self._current = None
+            self.loaded += 1
+            if error is None:
+                if not request.iterate:
+                    request.callback(result)
+            elif request.error_callback is not None:
+                request.error_callback(error)
+            else:
+                logger.error(f"{request} failed: {error}")
+        if self._current is not None and self._delay_id is None:
+            self._poll_id = self.root.after(self.poll_ms, self._poll)
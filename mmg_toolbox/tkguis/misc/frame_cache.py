@@ -0,0 +1,206 @@
+"""
+Detector frame cache for image viewers
+
+Frames are kept in a least-recently-used cache limited by size in bytes, HDF files are kept open
+between reads in the shared pool of open files, and their frames are dropped when the file changes on disk.
+A background thread prefetches frames ahead of the current frame in the direction of travel.
+
+    cache = get_frame_cache()
+    image = cache.get(filename, 'pil3_100k', index, reader=lambda hdf, n: hdf['/entry/pil3_100k/data'][n])
+"""
+
+import os
+import threading
+import queue
+import typing
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import h5py
+import numpy as np
+
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
+from .logging import create_logger
+
+logger = create_logger(__file__)
+
+DEFAULT_CACHE_BYTES = 2 ** 28  # 256 MB
+DEFAULT_PREFETCH = 4  # number of frames to read ahead
+MAX_FILES = 4  # number of files with cached frames
+
+Reader = typing.Callable[[h5py.File, int], np.ndarray]
+
+
+def _file_state(filename: str) -> tuple[int, int]:
+    """Return (modified time, size) of file, used to detect changes"""
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class FrameCache:
+    """
+    LRU cache of detector frames with background prefetch
+
+    Frames are stored under (filename, key, index), where key identifies the dataset or detector.
+    The reader function is called with the open HDF file and the frame index and should return
+    the image array, e.g. including reading any TIFF file referenced by the HDF file.
+    Files are read without holding the cache lock, so cached frames are returned while the prefetch
+    thread is reading. Returned frames are read-only, as they are shared between callers.
+
+    :param max_bytes: maximum total size of cached frames
+    :param prefetch: number of frames to read ahead in the direction of travel, 0 to disable
+    """
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES, prefetch: int = DEFAULT_PREFETCH):
+        self.max_bytes = max_bytes
+        self.prefetch = prefetch
+        self.hits = 0
+        self.misses = 0
+        self._frames: OrderedDict[tuple, np.ndarray] = OrderedDict()
+        self._bytes = 0
+        self._files: OrderedDict[str, tuple[int, int]] = OrderedDict()
+        self._last_index: dict[tuple, int] = {}
+        self._lock = threading.Lock()  # held only to update the cache, never during file reads
+        self._queue = queue.Queue()
+        self._thread: threading.Thread | None = None
+
+    def __repr__(self):
+        return f"FrameCache(frames={len(self._frames)}, bytes={self._bytes}, hits={self.hits}, misses={self.misses})"
+
+    def _check_file(self, filename: str) -> tuple[int, int]:
+        """Clear frames if the file has changed, returns the file state"""
+        state = _file_state(filename)  # stat outside the lock
+        with self._lock:
+            if filename in self._files:
+                if self._files[filename] == state:
+                    self._files.move_to_end(filename)
+                    return state
+                logger.info(f"File changed, clearing cached frames: {filename}")
+                self._close(filename)
+            self._files[filename] = state
+            while len(self._files) > MAX_FILES:
+                self._close(next(iter(self._files)))
+        return state
+
+    def _close(self, filename: str):
+        """Remove cached frames of file, call with lock"""
+        self._files.pop(filename)
+        for frame_key in [k for k in self._frames if k[0] == filename]:
+            self._bytes -= self._frames.pop(frame_key).nbytes
+
+    @contextmanager
+    def open_file(self, filename: str) -> typing.Iterator[h5py.File]:
+        """Context manager returning the pooled open file, clearing cached frames if the file has changed"""
+        self._check_file(filename)
+        with load_hdf(filename) as hdf:
+            yield hdf
+
+    def _store(self, frame_key: tuple, image: np.ndarray):
+        """Add frame to cache, removing least recently used frames, call with lock"""
+        if image.nbytes > self.max_bytes or frame_key in self._frames:
+            return
+        self._frames[frame_key] = image
+        self._bytes += image.nbytes
+        while self._bytes > self.max_bytes:
+            old_key, old_image = self._frames.popitem(last=False)
+            self._bytes -= old_image.nbytes
+
+    def _lookup(self, frame_key: tuple) -> np.ndarray | None:
+        """Return cached frame or None, call with lock"""
+        if frame_key in self._frames:
+            self._frames.move_to_end(frame_key)
+            return self._frames[frame_key]
+        return None
+
+    def _read(self, filename: str, key: typing.Hashable, index: int, reader: Reader) -> np.ndarray:
+        """Return cached frame or read it, the file is read without holding the lock"""
+        frame_key = (filename, key, index)
+        state = self._check_file(filename)  # clears frames if file changed
+        with self._lock:
+            image = self._lookup(frame_key)
+        if image is not None:
+            return image
+        with load_hdf(filename) as hdf:
+            image = np.array(reader(hdf, index))  # copy, as the frame is shared by all callers
+        image.setflags(write=False)
+        with self._lock:
+            if self._files.get(filename) == state:  # don't store frames of a file changed while reading
+                self._store(frame_key, image)
+                image = self._frames.get(frame_key, image)  # frame read by another thread at the same time
+        return image
+
+    def get(self, filename: str, key: typing.Hashable, index: int, reader: Reader,
+            n_frames: int | None = None) -> np.ndarray:
+        """
+        Return frame from cache or read it, then prefetch the following frames
+        :param filename: HDF filename
+        :param key: identifier of the dataset or detector
+        :param index: frame index
+        :param reader: function(hdf, index) -> image array
+        :param n_frames: number of frames in the scan, limits prefetching
+        :return: read-only image array, shared with other callers
+        """
+        frame_key = (filename, key, index)
+        with self._lock:
+            if frame_key in self._frames:
+                self.hits += 1
+            else:
+                self.misses += 1
+            last_index = self._last_index.get((filename, key), index - 1)
+            self._last_index[(filename, key)] = index
+        image = self._read(filename, key, index, reader)
+
+        # prefetch in direction of travel
+        if self.prefetch > 0 and index != last_index:
+            step = 1 if index > last_index else -1
+            indices = [index + step * n for n in range(1, self.prefetch + 1)]
+            indices = [n for n in indices if n >= 0 and (n_frames is None or n < n_frames)]
+            self._schedule(filename, key, indices, reader)
+        return image
+
+    def _schedule(self, filename: str, key: typing.Hashable, indices: list[int], reader: Reader):
+        """Replace pending prefetch requests"""
+        while True:
+            try:
+                self._queue.get_nowait()
+                self._queue.task_done()
+            except queue.Empty:
+                break
+        for index in indices:
+            self._queue.put((filename, key, index, reader))
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._prefetch_loop, daemon=True)
+            self._thread.start()
+
+    def _prefetch_loop(self):
+        while True:
+            filename, key, index, reader = self._queue.get()
+            try:
+                self._read(filename, key, index, reader)
+            except Exception as e:
+                logger.debug(f"prefetch failed for {filename} [{index}]: {e}")
+            finally:
+                self._queue.task_done()
+
+    def wait(self):
+        """Block until pending prefetch requests are finished"""
+        self._queue.join()
+
+    def clear(self):
+        """Remove all frames"""
+        with self._lock:
+            for filename in list(self._files):
+                self._close(filename)
+            self._frames.clear()
+            self._bytes = 0
+            self._last_index.clear()
+
+
+_frame_cache: FrameCache | None = None
+
+
+def get_frame_cache() -> FrameCache:
+    """Return the frame cache shared between image viewers"""
+    global _frame_cache
+    if _frame_cache is None:
+        _frame_cache = FrameCache()
+    return _frame_cache
@@ -17,6 +17,7 @@ from __future__ import annotations
 import os
 import tkinter as tk
 from tkinter import ttk
+from mmg_toolbox.utils.hdf_file_pool import get_hdf_file_pool
 from .logging import create_logger
 
 logger = create_logger(__name__)
@@ -79,6 +80,8 @@ def create_root(window_title: str, parent: tk.Misc | RootWithStyle | None = None
             root.style = parent.style
     else:
         root = tk.Tk()
+        # widgets read the same files repeatedly, keep files open between reads
+        get_hdf_file_pool().keep_open = True
 
     def update(event):
         root.update()
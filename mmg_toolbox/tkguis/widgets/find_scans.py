@@ -4,8 +4,9 @@ tkinter widget to find scans
 
 import tkinter as tk
 from tkinter import ttk
-import hdfmap
 
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 from mmg_toolbox.utils.experiment import Experiment
 from ..misc.config import C
 from ..misc.logging import create_logger
@@ -24,7 +25,7 @@ class FindScans:
         self.close_fun = root.destroy if close_fun is None else close_fun
         self.exp = Experiment(exp_folder, instrument=config.get(C.beamline, None))
         self.scan_file = scan_file or self.exp.get_scan_filename(-1)
-        self.hdf_map = hdfmap.create_nexus_map(self.scan_file)
+        self.hdf_map = create_nexus_map(self.scan_file)
         self.scan_numbers = []
         self.vars: list[tuple[tk.StringVar, tk.StringVar, tk.StringVar, tk.StringVar]] = []
         self.return_on_first = False
@@ -68,7 +69,8 @@ class FindScans:
                      var_val: tk.StringVar, var_tol: tk.StringVar):
         def update_val(_event=None):
             if var_name.get():
-                val = self.hdf_map.eval(self.hdf_map.load_hdf(), var_name.get())
+                with load_hdf(self.hdf_map.filename) as hdf:
+                    val = self.hdf_map.eval(hdf, var_name.get())
                 var_val.set(val)
                 if isinstance(val, str):
                     var_lab.set('contains')
@@ -489,7 +489,7 @@ class NexusFolderTreeViewFrame(FolderTreeViewFrame):
         th.start()  # will run until complete, may error if TreeView is destroyed
 
     def file_options(self):
-        from hdfmap import create_nexus_map
+        from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
         window = super().file_options()
 
         filename, foldername = self.get_filepath()
@@ -8,7 +8,9 @@ from tkinter import ttk
 import h5py
 import hdfmap
 
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
 from mmg_toolbox.utils.file_functions import hdfobj_string
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 from ..misc.functions import open_close_all_tree, select_hdf_file
 from ..misc.search import search_tree
 from ..misc.styles import update_text_style
@@ -212,8 +214,8 @@ class HDFViewer:
 
     def populate_from_file(self, event=None):
         filename = self.filepath.get()
-        self.map = hdfmap.create_nexus_map(filename)
-        with hdfmap.load_hdf(filename) as hdf:
+        self.map = create_nexus_map(filename)
+        with load_hdf(filename) as hdf:
             self.populate(hdf, self.map)
 
     def populate(self, hdf_obj: h5py.File, hdf_map: hdfmap.NexusMap):
@@ -285,7 +287,8 @@ class HDFViewer:
         out_str = f">>> {expression}\n"
         try:
             # out = hdfmap.hdf_eval(self.filepath.get(), expression)
-            out = self.map.eval(self.map.load_hdf(), expression)
+            with load_hdf(self.map.filename) as hdf:
+                out = self.map.eval(hdf, expression)
         except NameError as ne:
             out = ne
         out_str += f"{out}\n\n"
@@ -6,11 +6,17 @@ NOT CURRENTLY USED!!!
 
 import tkinter as tk
 from tkinter import ttk
+from functools import partial
+
+import h5py
+import numpy as np
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 
 from ..misc.styles import create_root
 from ..misc.matplotlib import ini_image
 from ..misc.config import COLORMAPS, DEFAULT_COLORMAP
 from ..misc.logging import create_logger
+from ..misc.frame_cache import get_frame_cache
 
 logger = create_logger(__file__)
 
@@ -18,6 +24,11 @@ logger = create_logger(__file__)
 AXES = ['axis 1', 'axis 2', 'axis 3']
 
 
+def read_axis_image(address: str, axis: int, hdf: h5py.File, index: int) -> np.ndarray:
+    """Return image from 3D dataset, taking index along axis"""
+    return np.asarray(hdf[address][(slice(None),) * axis + (index,)])
+
+
 class SimpleImage:
     """
     Simple Image plot
@@ -73,6 +84,7 @@ class ImageViewer:
     def __init__(self, hdf_filename="", parent=None):
 
         self.root = create_root('HDF Image Viewer', parent=parent)
+        self.frame_cache = get_frame_cache()
 
         # Variables
         self._ax = 0
@@ -241,11 +253,13 @@ class ImageViewer:
         if self.error_message:
             show_error(self.error_message, self.root)
         # Load image
-        image = get_hdf_image(
-            hdf_filename=self.filepath.get(),
-            address=self.address.get(),
-            image_number=int(self.view_index.get()),
-            axis=self._ax
+        address = self.address.get()
+        image = self.frame_cache.get(
+            filename=self.filepath.get(),
+            key=(address, self._ax),
+            index=int(self.view_index.get()),
+            reader=partial(read_axis_image, address, self._ax),
+            n_frames=int(self.tkscale.cget('to')) + 1
         )
         # Options
         cmin, cmax = self.cmin.get(), self.cmax.get()
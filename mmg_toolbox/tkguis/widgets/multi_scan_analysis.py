@@ -6,8 +6,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 import matplotlib.pyplot as plt
 
-import hdfmap
-
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
 from mmg_toolbox import Experiment
 from mmg_toolbox.scripts import NOTEBOOKS, SCRIPTS, R
 from mmg_toolbox.utils.env_functions import get_first_file, get_processing_directory
@@ -128,7 +127,7 @@ class MultiScanAnalysis:
     def browse_x_axis(self):
         from ..apps.namespace_select import create_scannable_selector
         scan_file = next(iter(self.range.generate_scan_files().values()), get_first_file(self.exp_folder.get()))
-        hdf_map = hdfmap.create_nexus_map(scan_file)
+        hdf_map = create_nexus_map(scan_file)
         names = create_scannable_selector(hdf_map)
         if names:
             self.x_axis.set(', '.join(name for name in names))
@@ -136,7 +135,7 @@ class MultiScanAnalysis:
     def browse_y_axis(self):
         from ..apps.namespace_select import create_scannable_selector
         scan_file = next(iter(self.range.generate_scan_files().values()), get_first_file(self.exp_folder.get()))
-        hdf_map = hdfmap.create_nexus_map(scan_file)
+        hdf_map = create_nexus_map(scan_file)
         names = create_scannable_selector(hdf_map)
         if names:
             self.y_axis.set(', '.join(name for name in names))
@@ -144,7 +143,7 @@ class MultiScanAnalysis:
     def browse_metadata(self):
         from ..apps.namespace_select import create_metadata_selector
         scan_file = next(iter(self.range.generate_scan_files().values()), get_first_file(self.exp_folder.get()))
-        hdf_map = hdfmap.create_nexus_map(scan_file)
+        hdf_map = create_nexus_map(scan_file)
         paths = create_metadata_selector(hdf_map)
         if paths:
             self.metadata_name.set(', '.join(path for path in paths))
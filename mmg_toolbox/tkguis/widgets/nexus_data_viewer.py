@@ -9,13 +9,15 @@ import tkinter as tk
 from tkinter import ttk
 import time
 
-from hdfmap import create_nexus_map
-
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map, get_nexus_map_cache
 from mmg_toolbox.utils.env_functions import get_scan_number
 from ..misc.logging import create_logger
 from ..misc.config import get_config, C
+from ..misc.background_loader import BackgroundLoader, LoadRequest
 from .scan_selector import FolderScanSelector
 from .nexus_details import NexusDetails
+from .nexus_plot import load_plot_data, load_plot_title
+from .nexus_image import load_first_image
 from .nexus_plot_and_image import NexusPlotAndImage
 
 logger = create_logger(__file__)
@@ -35,6 +37,7 @@ class NexusDataViewer:
         self.root = root
         self.map = None
         self.config = config or get_config()
+        self.loader = BackgroundLoader(self.root)
 
         self.root.rowconfigure(0, weight=1)
         self.root.columnconfigure(0, weight=1)
@@ -77,27 +80,79 @@ class NexusDataViewer:
                 self.selector_widget.tree.selection_set(first_scan)
 
     def on_file_select(self, event=None):
+        """
+        Update widgets for the selected files.
+        On <<TreeviewSelect>> events, the files are loaded in the background after a short delay,
+        cancelling any earlier selection that is still loading. When called directly (without an event),
+        the widgets are updated immediately.
+        """
         filename, folder = self.selector_widget.get_filepath()
         filenames = self.selector_widget.get_multi_filepath()
         if len(filenames) == 0:
             return
         self.config[C.current_dir] = folder
+        self.selector_widget.select_box.set(get_scan_number(filename))
 
-        logger.info(f"Updating widgets for file: {filename}")
+        if event is None:
+            self.loader.cancel()
+            self.update_widgets(self.load_selection(filename, *filenames))
+        else:
+            self.loader.submit(
+                loader=lambda request: self.load_selection(filename, *filenames, request=request),
+                callback=self.update_widgets,
+                error_callback=lambda e: logger.error(f"Failed to load {filename}: {e}")
+            )
+
+    def load_selection(self, filename: str, *filenames: str, request: LoadRequest | None = None) -> dict:
+        """Read map, details, plot data, title and first image of the selected files, without updating widgets (runs in a thread)"""
+        logger.info(f"Loading file: {filename}")
+        check = request.check if request else (lambda: None)
         t0 = time.perf_counter()
-        self.selector_widget.select_box.set(get_scan_number(filename))
+        hdf_map = create_nexus_map(filename)
+        check()
         t1 = time.perf_counter()
-        self.map = create_nexus_map(filename)
+        details = self.detail_widget.load_details(filename, hdf_map)
+        check()
         t2 = time.perf_counter()
-        self.detail_widget.update_data_from_file(filename, self.map)
+        plot_data = load_plot_data(filenames, hdf_map)
+        title = load_plot_title(filename, hdf_map, self.config.get(C.scan_title, 'title'))
+        check()
         t3 = time.perf_counter()
-        self.plot_widget.update_data_from_files(*filenames, hdf_map=self.map)
+        image = load_first_image(filenames[0], hdf_map) if hdf_map.image_data else None
+        check()
         t4 = time.perf_counter()
         tot = t4 - t0
         logger.info('\n'.join([
-            f"\n---time taken: {tot:.3} s---",
-            f"set selector widget time: {t1-t0:.3} s {(t1-t0)/tot:.2%}",
-            f"create nexus map time: {t2-t1:.3} s {(t2-t1)/tot:.2%}",
-            f"update detail widget time: {t3-t2:.3} s {(t3-t2)/tot:.2%}",
-            f"plot widget time: {t4-t3:.3} s {(t4-t3)/tot:.2%}"
+            f"\n---load time: {tot:.3} s---",
+            f"create nexus map time: {t1-t0:.3} s {(t1-t0)/tot:.2%} {get_nexus_map_cache()}",
+            f"load details time: {t2-t1:.3} s {(t2-t1)/tot:.2%}",
+            f"load plot data time: {t3-t2:.3} s {(t3-t2)/tot:.2%}",
+            f"load image time: {t4-t3:.3} s {(t4-t3)/tot:.2%}",
+        ]))
+        return {
+            'filename': filename,
+            'filenames': filenames,
+            'map': hdf_map,
+            'details': details,
+            'plot_data': plot_data,
+            'title': title,
+            'image': image,
+        }
+
+    def update_widgets(self, selection: dict):
+        """Update widgets from the output of load_selection, in the tkinter thread"""
+        logger.info(f"Updating widgets for file: {selection['filename']}")
+        t0 = time.perf_counter()
+        self.map = selection['map']
+        self.detail_widget.update_data_from_file(selection['filename'], self.map, details=selection['details'])
+        t1 = time.perf_counter()
+        self.plot_widget.update_data_from_files(*selection['filenames'], hdf_map=self.map,
+                                                plot_data=selection['plot_data'], title=selection['title'],
+                                                image=selection['image'])
+        t2 = time.perf_counter()
+        tot = t2 - t0
+        logger.info('\n'.join([
+            f"\n---update time: {tot:.3} s---",
+            f"update detail widget time: {t1-t0:.3} s {(t1-t0)/tot:.2%}",
+            f"plot widget time: {t2-t1:.3} s {(t2-t1)/tot:.2%}"
         ]))
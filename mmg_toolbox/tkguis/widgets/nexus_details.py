@@ -7,8 +7,9 @@ from tkinter import ttk
 from tkinter.messagebox import askyesnocancel
 
 import hdfmap
-from hdfmap import create_nexus_map
 
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 from mmg_toolbox.utils.env_functions import get_scan_notebooks, TMPDIR
 from ..misc.functions import post_right_click_menu, show_error
 from ..misc.logging import create_logger
@@ -112,28 +113,52 @@ class NexusDetails:
         ttk.Button(frm, text='Reprocess', command=self.reprocess_notebook).pack(side=tk.LEFT)
         return menu
 
-    def update_data_from_file(self, filename: str, hdf_map: hdfmap.NexusMap | None = None):
-        self.filename = filename
-        self.map = create_nexus_map(self.filename) if hdf_map is None else hdf_map
-        self.update_text()
-        self.notebooks = {
+    def load_details(self, filename: str, hdf_map: hdfmap.NexusMap) -> tuple[str, dict[str, str]]:
+        """Read details text and notebooks of the file, without updating the widget (safe to call in a thread)"""
+        with load_hdf(filename) as hdf:
+            txt = hdf_map.format_hdf(hdf, self._text_expression)
+        notebooks = {
             os.path.basename(file): file
             for file in get_scan_notebooks(filename)
         }
+        return txt, notebooks
+
+    def update_data_from_file(self, filename: str, hdf_map: hdfmap.NexusMap | None = None,
+                              details: tuple[str, dict[str, str]] | None = None):
+        """
+        Update the widget with details of the file
+        :param filename: NeXus filename
+        :param hdf_map: NexusMap or None to generate
+        :param details: (text, notebooks) from self.load_details, or None to read the file
+        """
+        self.filename = filename
+        self.map = create_nexus_map(self.filename) if hdf_map is None else hdf_map
+        if details is None:
+            self.update_text()
+            self.notebooks = {
+                os.path.basename(file): file
+                for file in get_scan_notebooks(filename)
+            }
+        else:
+            txt, self.notebooks = details
+            self._set_text(txt)
         if self.notebooks:
             first_notebook = next(iter(self.notebooks))
             self.combo_notebook.set_menu(first_notebook, *self.notebooks)
         else:
             self.combo_notebook.set_menu('None')
 
+    def _set_text(self, txt: str):
+        self.textbox.configure(state=tk.NORMAL)
+        self.textbox.delete('1.0', tk.END)
+        self.textbox.insert('1.0', txt)
+        self.textbox.configure(state=tk.DISABLED)
+
     def update_text(self):
         try:
-            with hdfmap.load_hdf(self.filename) as hdf:
+            with load_hdf(self.filename) as hdf:
                 txt = self.map.format_hdf(hdf, self._text_expression)
-            self.textbox.configure(state=tk.NORMAL)
-            self.textbox.delete('1.0', tk.END)
-            self.textbox.insert('1.0', txt)
-            self.textbox.configure(state=tk.DISABLED)
+            self._set_text(txt)
         except Exception as e:
             show_error(f"Error:\n{e}", parent=self.root, raise_exception=False)
 
@@ -193,7 +218,7 @@ class NexusDetails:
         out_str = f"\n>>> {expression}\n"
         try:
             # TODO: replace with asteval.Interpreter (maybe in hdfmap V1.1)
-            with hdfmap.load_hdf(self.filename) as hdf:
+            with load_hdf(self.filename) as hdf:
                 out = self.map.eval(hdf, expression)
             self.terminal_history.insert(1, expression)
             self.terminal_history_index = 0
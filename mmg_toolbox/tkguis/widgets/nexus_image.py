@@ -4,22 +4,80 @@ a tkinter frame with a single plot
 import os
 import tkinter as tk
 from tkinter import ttk
+from functools import partial
+
+import h5py
 import numpy as np
 
 import hdfmap
-from hdfmap import create_nexus_map
 
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
 from mmg_toolbox.utils.file_functions import read_tiff, get_scan_number
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 from ..misc.styles import create_hover, create_root
 from ..misc.screen_size import get_figure_size
 from ..misc.matplotlib import ini_image, add_rectangle
 from ..misc.logging import create_logger
 from ..misc.config import get_config, C, COLORMAPS, DEFAULT_COLORMAP
+from ..misc.frame_cache import get_frame_cache
 from .roi_editor import RoiEditor
 
 logger = create_logger(__file__)
 
 
+def read_frame(filename: str, hdf_map: hdfmap.NexusMap, detector: str,
+               hdf: h5py.File, index: int) -> np.ndarray:
+    """Read detector image from open file, called by the frame cache, possibly on the prefetch thread"""
+    image_path = hdf_map.image_data[detector]
+    image = hdf_map.get_data(hdf, image_path, hdf_map.get_image_index(index))
+
+    if issubclass(type(image), str):
+        # TIFF image, NXdetector/image_data -> array('file.tif')
+        file_directory = os.path.dirname(filename)
+        image_filename = os.path.join(file_directory, image)
+        logger.info(f"load tiff image from '{image}': {image_filename}")
+        if not os.path.isfile(image_filename):
+            raise FileNotFoundError(f"File not found: {image_filename}")
+        image = read_tiff(image_filename)
+    elif np.ndim(image) == 0:
+        # image is file path number, NXdetector/path -> arange(n_points)
+        scan_number = get_scan_number(filename)
+        file_directory = os.path.dirname(filename)
+        image_filename = os.path.join(file_directory, f"{scan_number}-{detector}-files/{image:05.0f}.tif")
+        logger.info(f"load tiff image from {image}: {image_filename}")
+        if not os.path.isfile(image_filename):
+            raise FileNotFoundError(f"File not found: {image_filename}")
+        image = read_tiff(image_filename)
+    elif np.ndim(image) != 2:
+        raise Exception(f"detector image[{index}] is the wrong shape: {np.shape(image)}")
+    return image
+
+
+def load_first_image(filename: str, hdf_map: hdfmap.NexusMap) -> np.ndarray | None:
+    """
+    Read the first image of the first detector, without updating any widgets (safe to call in a thread)
+
+    The image is stored in the frame cache, so later requests for the frame don't read the file.
+    :param filename: NeXus filename
+    :param hdf_map: NexusMap
+    :return: image array, or None if the file has no detectors or the image can't be read
+    """
+    detector = next(iter(hdf_map.image_data), None)
+    if detector is None:
+        return None
+    try:
+        return get_frame_cache().get(
+            filename=filename,
+            key=detector,
+            index=0,
+            reader=partial(read_frame, filename, hdf_map, detector),
+            n_frames=hdf_map.scannables_length()
+        )
+    except Exception as e:
+        logger.error(f"Error loading first image of {filename}: {e}")
+        return None
+
+
 class NexusDetectorImage:
     def __init__(self, root: tk.Misc, hdf_filename: str | None = None,
                  config: dict | None = None, hdf_map: hdfmap.NexusMap | None = None):
@@ -27,6 +85,7 @@ class NexusDetectorImage:
         self.parent = root
         self.map = hdf_map
         self.config = config or get_config()
+        self.frame_cache = get_frame_cache()
 
         self.PLOT_OPTIONS = ['Image', 'sum axis 0', 'sum axis 1']
         self.detector_name = tk.StringVar(root, 'NXdetector')
@@ -208,7 +267,8 @@ class NexusDetectorImage:
         return menu
 
     def new_window(self):
-        title = self.map.format_hdf(self.map.load_hdf(), self.config.get(C.scan_title, '')) or self.filename
+        with load_hdf(self.map.filename) as hdf:
+            title = self.map.format_hdf(hdf, self.config.get(C.scan_title, '')) or self.filename
         window = create_root(title, self.parent)
         widget = NexusDetectorImage(window, self.filename, self.config, self.map)
         return widget
@@ -234,7 +294,14 @@ class NexusDetectorImage:
                 obj.remove()
         self._im_lines.clear()
 
-    def update_image_data_from_file(self, filename: str, hdf_map: hdfmap.NexusMap | None = None):
+    def update_image_data_from_file(self, filename: str, hdf_map: hdfmap.NexusMap | None = None,
+                                    image: np.ndarray | None = None):
+        """
+        Update the image plot with the detector images in the file
+        :param filename: NeXus filename
+        :param hdf_map: NexusMap or None to generate from the file
+        :param image: output of load_first_image(filename, hdf_map), or None to read the file
+        """
         logger.debug(f'update image from filename: {filename}')
         self._clear_image_error()
         self.filename = filename
@@ -258,9 +325,15 @@ class NexusDetectorImage:
             self.plot_option.set(self.PLOT_OPTIONS[0])
         self.add_config_rois()
         self.view_index.set(0)
-        self.update_image_plot()
+        self.update_image_plot(image=image)
+
+    def _get_axis_value(self, axis_name: str, index: int) -> float:
+        """Return value of axis at image index"""
+        with self.frame_cache.open_file(self.filename) as hdf:
+            return self.map.get_data(hdf, axis_name, index=index, default=index)
 
-    def _get_image(self):
+    def _get_image(self, image: np.ndarray | None = None):
+        """Return image and axis value at the current index, image is read unless given"""
         try:
             detector = self.detector_name.get()
             axis_name = self.axis_name.get()
@@ -269,30 +342,15 @@ class NexusDetectorImage:
             logger.debug(f"load image: {detector} [{index}] with axis '{axis_name}'")
 
             self.map.set_image_path(self.map.image_data[detector])
-            with hdfmap.load_hdf(self.filename) as hdf:
-                image = self.map.get_image(hdf, index)
-                value = self.map.get_data(hdf, axis_name, index=index, default=index)
-
-            if issubclass(type(image), str):
-                # TIFF image, NXdetector/image_data -> array('file.tif')
-                file_directory = os.path.dirname(self.filename)
-                image_filename = os.path.join(file_directory, image)
-                # print(f"directory: {file_directory}\nstring: {image}\nfilename: {image_filename}")
-                logger.info(f"load tiff image from '{image}': {image_filename}")
-                if not os.path.isfile(image_filename):
-                    raise FileNotFoundError(f"File not found: {image_filename}")
-                image = read_tiff(image_filename)
-            elif image.ndim == 0:
-                # image is file path number, NXdetector/path -> arange(n_points)
-                scan_number = get_scan_number(self.filename)
-                file_directory = os.path.dirname(self.filename)
-                image_filename = os.path.join(file_directory, f"{scan_number}-{detector}-files/{image:05.0f}.tif")
-                logger.info(f"load tiff image from {image}: {image_filename}")
-                if not os.path.isfile(image_filename):
-                    raise FileNotFoundError(f"File not found: {image_filename}")
-                image = read_tiff(image_filename)
-            elif image.ndim != 2:
-                raise Exception(f"detector image[{index}] is the wrong shape: {image.shape}")
+            if image is None:
+                image = self.frame_cache.get(
+                    filename=self.filename,
+                    key=detector,
+                    index=index,
+                    reader=partial(read_frame, self.filename, self.map, detector),
+                    n_frames=self.map.scannables_length()
+                )
+            value = self._get_axis_value(axis_name, index)
         except Exception as e:
             self._show_image_error(f'Error loading image: {e}')
             image = np.zeros([10, 10])
@@ -324,12 +382,12 @@ class NexusDetectorImage:
     def update_value(self, value: float):
         self.axis_value.set(f"{self.axis_name.get()} = {value:.3f}")
 
-    def update_image_plot(self, event=None):
-        """replace plot instance (e.g. on loading new file)"""
+    def update_image_plot(self, event=None, image: np.ndarray | None = None):
+        """replace plot instance (e.g. on loading new file), image is read from the file unless given"""
         self._clear_image_error()
         if self.filename is None:
             return
-        image, value = self._get_image()
+        image, value = self._get_image(image)
 
         # clear previous plot
         self.im_ax.clear()
@@ -443,7 +501,7 @@ class NexusDetectorImage:
         ymin, ymax = self.im_ax.get_ylim()
         if rois:
             try:
-                with hdfmap.load_hdf(self.filename) as hdf:
+                with load_hdf(self.filename) as hdf:
                     for n, (name, cen_i, cen_j, wid_i, wid_j, det_name) in enumerate(rois):
                         if det_name == detector:
                             cen_i, cen_j, wid_i, wid_j = self.map.eval(hdf, f"{cen_i},{cen_j},{wid_i},{wid_j}")
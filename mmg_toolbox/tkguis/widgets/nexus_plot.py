@@ -7,9 +7,10 @@ from tkinter import ttk
 import numpy as np
 
 import hdfmap
-from hdfmap import create_nexus_map
 from hdfmap.eval_functions import generate_identifier
 
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 from mmg_toolbox.utils.env_functions import get_scan_number
 from mmg_toolbox.fitting import multipeakfit, FitResults, find_peaks_str
 from ..misc.logging import create_logger
@@ -20,6 +21,38 @@ from .simple_plot import SimplePlot
 logger = create_logger(__file__)
 
 
+def load_plot_data(filenames: tuple[str, ...] | list[str], hdf_map: hdfmap.NexusMap) -> tuple[list[dict], list[str]]:
+    """
+    Read plot data from each file, without updating any widgets (safe to call in a thread)
+    :param filenames: NeXus filenames
+    :param hdf_map: NexusMap
+    :return: list of plot data dicts for each file, list of error messages
+    """
+    all_plot_data = []
+    errors = []
+    for filename in filenames:
+        try:
+            with load_hdf(filename) as hdf:
+                plot_data = hdf_map.get_plot_data(hdf)
+        except Exception as e:
+            errors.append(f"Error loading data in file {os.path.basename(filename)}: {e}")
+            plot_data = {}
+        all_plot_data.append(plot_data)
+    return all_plot_data, errors
+
+
+def load_plot_title(filename: str, hdf_map: hdfmap.NexusMap, expression: str) -> str:
+    """
+    Read plot title from file, without updating any widgets (safe to call in a thread)
+    :param filename: NeXus filename
+    :param hdf_map: NexusMap
+    :param expression: title format expression, e.g. config[C.scan_title]
+    :return: formatted title
+    """
+    with load_hdf(filename) as hdf:
+        return hdf_map.format_hdf(hdf, expression)
+
+
 class NexusDefaultPlot(SimplePlot):
     """
     Tkinter widget for Nexus plot
@@ -36,6 +69,7 @@ class NexusDefaultPlot(SimplePlot):
         self.map: hdfmap.NexusMap | None = None
         self.config = config or get_config()
         self._plot_data: list[dict] = []
+        self._title = ''
         self._scannable_data: list[dict[str, np.ndarray]] = []  # plot data: list of dicts of arrays
         self._fit_result: FitResults | None = None
 
@@ -164,13 +198,21 @@ class NexusDefaultPlot(SimplePlot):
         ttk.Label(frm, textvariable=self.error_message, style='error.TLabel').pack()
         return combo_x, combo_y
 
-    def update_data_from_files(self, *filenames: str, hdf_map: hdfmap.NexusMap | None = None):
+    def update_data_from_files(self, *filenames: str, hdf_map: hdfmap.NexusMap | None = None,
+                               plot_data: tuple[list[dict], list[str]] | None = None, title: str | None = None):
+        """
+        Update the plot with data from the files
+        :param filenames: NeXus filenames
+        :param hdf_map: NexusMap or None to generate from the first file
+        :param plot_data: output of load_plot_data(filenames, hdf_map), or None to read the files
+        :param title: output of load_plot_title(hdf_map.filename, hdf_map, config[C.scan_title]), or None to read
+        """
         if not filenames:
             return
         self._clear_error()
         self.filenames = filenames
         self.map = create_nexus_map(filenames[0]) if hdf_map is None else hdf_map
-        self._load_data()
+        self._load_data(plot_data)
         if not self._scannable_data:
             self._set_error("No data loaded")
             return
@@ -184,7 +226,9 @@ class NexusDefaultPlot(SimplePlot):
         if not self.fix_y.get():
             self.axes_y.set(next(iter(signals), f'zeros({self.map.scannables_length()})'))
         self.update_axis_choice()
-        title = self.map.format_hdf(self.map.load_hdf(), self.config.get(C.scan_title, 'title'))
+        if title is None:
+            title = load_plot_title(self.map.filename, self.map, self.config.get(C.scan_title, 'title'))
+        self._title = title
         self.update_labels(title=title)
 
     def _label(self, name: str) -> str:
@@ -195,18 +239,11 @@ class NexusDefaultPlot(SimplePlot):
         unit_str = f" [{units}]" if units else ''
         return generate_identifier(path) + unit_str
 
-    def _load_data(self):
-        self._plot_data = []
-        self._scannable_data = []
-        errors = []
-        for filename in self.filenames:
-            try:
-                with hdfmap.load_hdf(filename) as hdf:
-                    plot_data = self.map.get_plot_data(hdf)
-            except Exception as e:
-                errors.append(f"Error loading data in file {os.path.basename(filename)}: {e}")
-            self._plot_data.append(plot_data)
-            self._scannable_data.append(plot_data.get('data', {}))
+    def _load_data(self, plot_data: tuple[list[dict], list[str]] | None = None):
+        if plot_data is None:
+            plot_data = load_plot_data(self.filenames, self.map)
+        self._plot_data, errors = plot_data
+        self._scannable_data = [data.get('data', {}) for data in self._plot_data]
         if errors:
             self._set_error('\n'.join(errors))
 
@@ -224,7 +261,7 @@ class NexusDefaultPlot(SimplePlot):
 
             if this_x_data is None or any(data is None for data in this_y_data):
                 # Load additional data
-                with hdfmap.load_hdf(filename) as hdf:
+                with load_hdf(filename) as hdf:
                     if this_x_data is None:
                         try:
                             this_x_data = self.map.eval(hdf, x_label, np.arange(self.map.scannables_length()))
@@ -318,7 +355,7 @@ class NexusDefaultPlot(SimplePlot):
         xdata, ydata, labels = self.get_xy_data(x_axis, y_axis)
         peak_str = find_peaks_str(xdata[0], ydata[0])
 
-        title = self.map.format_hdf(self.map.load_hdf(), self.config.get(C.scan_title, 'title'))
+        title = self._title
         x_label, y_label = self.map.generate_ids(x_axis, y_axis)
         label = f"{x_label} vs {y_label}"
         out = f"{title}\n{label}\n\n"
@@ -380,8 +417,9 @@ class NexusMultiAxisPlot(NexusDefaultPlot):
         listbox.pack(side="left", fill="both", expand=True)
         return listbox
 
-    def update_data_from_files(self, *filenames: str, hdf_map: hdfmap.NexusMap | None = None):
-        super().update_data_from_files(*filenames, hdf_map=hdf_map)
+    def update_data_from_files(self, *filenames: str, hdf_map: hdfmap.NexusMap | None = None,
+                               plot_data: tuple[list[dict], list[str]] | None = None, title: str | None = None):
+        super().update_data_from_files(*filenames, hdf_map=hdf_map, plot_data=plot_data, title=title)
         auto_signal = self.axes_y.get()
 
         # populate listbox
@@ -3,11 +3,11 @@ a tkinter frame combining 2D line plots and images from a NeXus file
 """
 import tkinter as tk
 from tkinter import ttk
-from threading import Thread
 
+import numpy as np
 import hdfmap
 
-from ..misc.config import C
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
 from ..misc.styles import create_root
 from ..misc.logging import create_logger
 from .nexus_plot import NexusMultiAxisPlot
@@ -79,23 +79,36 @@ class NexusPlotAndImage(NexusMultiAxisPlot, NexusDetectorImage):
         self.index_line.set_data([xval, xval], ylim)
         self.update_axes()
 
-    def _update_image(self, filename: str, hdf_map: hdfmap.NexusMap):
-        self.axis_name.set(self.axes_x.get())
-        NexusDetectorImage.update_image_data_from_file(self, filename, hdf_map=hdf_map)
-
-    def update_data_from_files(self, *filenames: str, hdf_map: hdfmap.NexusMap | None = None):
-        hdf_map = hdf_map or hdfmap.create_nexus_map(filenames[0])
+    def _get_axis_value(self, axis_name: str, index: int) -> float:
+        """Return value of axis at image index, from the loaded plot data if available"""
+        values = self._scannable_data[0].get(axis_name) if self._scannable_data else None
+        if values is not None and index < np.size(values):
+            return np.ravel(values)[index]
+        return NexusDetectorImage._get_axis_value(self, axis_name, index)
+
+    def update_data_from_files(self, *filenames: str, hdf_map: hdfmap.NexusMap | None = None,
+                               plot_data: tuple[list[dict], list[str]] | None = None, title: str | None = None,
+                               image: np.ndarray | None = None):
+        """
+        Update the plot and image with data from the files
+        :param filenames: NeXus filenames
+        :param hdf_map: NexusMap or None to generate from the first file
+        :param plot_data: output of load_plot_data(filenames, hdf_map), or None to read the files
+        :param title: output of load_plot_title(hdf_map.filename, hdf_map, config[C.scan_title]), or None to read
+        :param image: output of load_first_image(filenames[0], hdf_map), or None to read the first file
+        """
+        hdf_map = hdf_map or create_nexus_map(filenames[0])
         # 2D line data
-        NexusMultiAxisPlot.update_data_from_files(self, *filenames, hdf_map=hdf_map)
+        NexusMultiAxisPlot.update_data_from_files(self, *filenames, hdf_map=hdf_map, plot_data=plot_data,
+                                                  title=title)
         # pack/hide plots
         self.pack_frames(hdf_map)
         # Image data
         if hdf_map.image_data:
             self.view_index.set(0)
             self.update_index_line()
-            th = Thread(target=self._update_image, args=(filenames[0], hdf_map))
-            th.daemon = True
-            th.start()
+            self.axis_name.set(self.axes_x.get())
+            NexusDetectorImage.update_image_data_from_file(self, filenames[0], hdf_map=hdf_map, image=image)
         else:
             self.index_line.set_data([], [])
 
@@ -122,8 +135,7 @@ class NexusPlotAndImage(NexusMultiAxisPlot, NexusDetectorImage):
             self.listbox.see(iid)
 
     def new_window(self):
-        title = self.map.format_hdf(self.map.load_hdf(), self.config.get(C.scan_title, '')) or self.filename
-        window = create_root(title, self.parent)
+        window = create_root(self._title or self.filename, self.parent)
         widget = NexusPlotAndImage(window, config=self.config, horizontal_alignment=True)
-        widget.update_data_from_files(self.filename, hdf_map=self.map)
+        widget.update_data_from_files(self.filename, hdf_map=self.map, title=self._title)
         return widget
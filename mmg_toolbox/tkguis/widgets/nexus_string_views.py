@@ -6,6 +6,7 @@ import tkinter as tk
 from tkinter import ttk
 
 import hdfmap
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 
 from mmg_toolbox.tkguis.misc.styles import update_text_style
 
@@ -73,7 +74,7 @@ class Nexus2SrsStr(_StringView):
     def populate(self, hdf_map: hdfmap.NexusMap):
         """Load HDF file, populate ttk.treeview object"""
         from nexus2srs.nexus2srs import generate_datafile
-        with hdf_map.load_hdf() as hdf:
+        with load_hdf(hdf_map.filename) as hdf:
             outstr, detector_image_paths = generate_datafile(hdf, hdf_map)
         self._populate(outstr)
 
@@ -4,6 +4,7 @@ widget for performing peak fitting on a list of scans
 
 import tkinter as tk
 from tkinter import ttk, messagebox
+from concurrent.futures import Executor
 import matplotlib.pyplot as plt
 
 import hdfmap
@@ -13,7 +14,11 @@ from mmg_toolbox import Experiment
 from mmg_toolbox.plotting.matplotlib import generate_subplots, set_span_bounds
 from mmg_toolbox.utils.env_functions import get_processing_directory
 from mmg_toolbox.fitting import multipeakfit, FitResults, find_peaks, find_peaks_str
+from mmg_toolbox.fitting.batch import batch_multipeakfit, BatchFitResults
 from mmg_toolbox.fitting.models import PEAK_MODELS, BACKGROUND_MODELS
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
+from mmg_toolbox.utils.parallel import get_thread_executor
 from ..misc.logging import create_logger
 from ..misc.config import get_config, C
 from ..misc.functions import show_error
@@ -43,11 +48,8 @@ class ScanFitModel:
         self.label = label
         self.result: FitResults | None = None
 
-    def fit(self) -> FitResults:
-        self.result = multipeakfit(
-            xvals=self.x_data,
-            yvals=self.y_data,
-            yerrors=None,
+    def fit_options(self) -> dict:
+        return dict(
             npeaks=self.n_peaks,
             min_peak_power=self.power,
             peak_distance_idx=self.distance,
@@ -57,9 +59,31 @@ class ScanFitModel:
             fix_parameters=None,
             method='leastsq',
         )
+
+    def fit(self) -> FitResults:
+        self.result = multipeakfit(
+            xvals=self.x_data,
+            yvals=self.y_data,
+            yerrors=None,
+            **self.fit_options()
+        )
         return self.result
 
 
+def fit_models(*models: ScanFitModel, executor: Executor | None = None) -> BatchFitResults:
+    """Fit several scan models using the thread pool shared in the GUI, or the given executor"""
+    results = batch_multipeakfit(
+        xvals_list=[model.x_data for model in models],
+        yvals_list=[model.y_data for model in models],
+        fit_options=[model.fit_options() for model in models],
+        labels=[model.scan_no for model in models],
+        executor=executor or get_thread_executor(),
+    )
+    for model, result in zip(models, results):
+        model.result = result
+    return results
+
+
 class ScanPeakTreeview(CanvasTreeview):
     """Treeview object for peak details of scans"""
     def __init__(self, root: tk.Misc, width: int | None = None, height: int | None = None):
@@ -344,7 +368,7 @@ class PeakFitAnalysis:
         try:
             exp = self.get_experiment()
             scan_files = [exp.get_scan_filename(n) for n in scan_numbers]
-            self.map = hdfmap.create_nexus_map(scan_files[0])
+            self.map = create_nexus_map(scan_files[0])
         except Exception as e:
             show_error(e, self.root, raise_exception=False)
             raise e
@@ -356,7 +380,7 @@ class PeakFitAnalysis:
         if not name:
             return metadata
         for n, filename in enumerate(scan_files):
-            with hdfmap.load_hdf(filename) as hdf:
+            with load_hdf(filename) as hdf:
                 metadata[n] = self.map.eval(hdf, name)
         return metadata
 
@@ -389,7 +413,7 @@ class PeakFitAnalysis:
             filename = self.scans.get_current_filepath()
         x_axis = self.x_axis.get()
         y_axis = self.y_axis.get()
-        with self.map.load_hdf(filename) as hdf:
+        with load_hdf(filename) as hdf:
             x_data = self.map.eval(hdf, x_axis, np.arange(self.map.scannables_length()))
             y_data = self.map.eval(hdf, y_axis, np.ones_like(x_data))
         return x_data, y_data
@@ -483,21 +507,30 @@ class PeakFitAnalysis:
         exp = self.get_experiment()
         return exp.generate_scans_title(*scan_numbers, hdf_map=self.map)
 
+    def _fit_models(self, *models: ScanFitModel) -> BatchFitResults:
+        """Fit models, showing a warning with the scans that failed to fit"""
+        results = fit_models(*models)
+        failed = [f"{label}: {error}" for label, error in zip(results.labels, results.errors) if error is not None]
+        if failed:
+            logger.warning(f"{len(failed)} fits failed:\n" + '\n'.join(failed))
+            messagebox.showwarning(
+                title='Peak Fitting',
+                message=f"{len(failed)} of {len(results)} fits failed:\n" + '\n'.join(failed),
+                parent=self.root,
+            )
+        return results
+
     def fit_all(self):
         option = self.plot_option.get()
         if option == 'All':
             self._plot_all_results()
             return
 
-        metadata, value, error = [], [], []
-        for n in range(len(self.fit_models)):
-            model = self.update_model(n)
-            if model.use_dataset:
-                result = model.fit()
-                metadata.append(model.metadata)
-                val, err = result.get_value(option)
-                value.append(val)
-                error.append(err)
+        models = [self.update_model(n) for n in range(len(self.fit_models))]
+        models = [model for model in models if model.use_dataset]
+        table = self._fit_models(*models).table(option)
+        metadata = [model.metadata for model in models]
+        value, error = table[option], table[f"stderr_{option}"]
 
         x_label = self.metadata_name.get()
         y_label = option.capitalize()
@@ -516,9 +549,9 @@ class PeakFitAnalysis:
         axes = axes.flatten()
         x_label = self.metadata_name.get()
         metadata = [model.metadata for model in self.fit_models]
-        results = [model.fit() for model in self.fit_models]
+        table = self._fit_models(*self.fit_models).table(*FIT_PARAMETERS)
         for ax, option in zip(axes, FIT_PARAMETERS):
-            values, errors = zip(*[result.get_value(option) for result in results])
+            values, errors = table[option], table[f"stderr_{option}"]
             ax.errorbar(metadata, values, errors, fmt='-o', label=option)
             ax.set_xlabel(x_label)
             ax.set_ylabel(option.capitalize())
@@ -527,9 +560,11 @@ class PeakFitAnalysis:
     def fit_plots(self):
         x_label, y_label, name = self.map.generate_ids(self.x_axis.get(), self.y_axis.get(), self.metadata_name.get())
 
+        models = [self.update_model(n) for n in range(len(self.fit_models))]
+        self._fit_models(*(model for model in models if model.use_dataset))
         fig_axes = generate_subplots(len(self.fit_models))
         for n, (fig, axes) in enumerate(fig_axes):
-            model = self.update_model(n)
+            model = models[n]
             x_data, y_data = self.get_scan_xy_data(model.filepath)
             if model.mask is not None:
                 x_mask = x_data[model.mask]
@@ -539,9 +574,8 @@ class PeakFitAnalysis:
             else:
                 x_mask, y_mask = [], []
 
-            if model.use_dataset:
-                result = model.fit()
-                x_fit, y_fit = result.fit_data(x_data)
+            if model.use_dataset and model.result is not None:
+                x_fit, y_fit = model.result.fit_data(x_data)
             else:
                 x_fit, y_fit = [], []
 
@@ -8,9 +8,11 @@ import tkinter as tk
 from tkinter import ttk
 from threading import Thread, current_thread
 
-import hdfmap
 
-from mmg_toolbox.utils.file_functions import list_files, display_timestamp, get_scan_number
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
+from mmg_toolbox.utils.file_functions import display_timestamp, get_scan_number
+from mmg_toolbox.utils.folder_watcher import get_folder_watcher
 from ..misc.functions import post_right_click_menu, select_folder
 from ..misc.logging import create_logger
 from ..misc.config import get_config, C
@@ -30,6 +32,7 @@ class _ScanSelector(CanvasTreeview):
         self.search_time = time.time()
         self.search_reset = 3.0  # seconds
         self._update_time = 10  # seconds - poll folders for new files
+        self._folder_sequence = {}  # (folder, extension): sequence number of last FolderWatcher change
 
         # Variables
         self.extension = tk.StringVar(root, '.nxs')
@@ -79,8 +82,8 @@ class _ScanSelector(CanvasTreeview):
             return
         try:
             if self.map is None:
-                self.map = hdfmap.create_nexus_map(filepath)
-            with hdfmap.load_hdf(filepath) as nxs:
+                self.map = create_nexus_map(filepath)
+            with load_hdf(filepath) as nxs:
                 for name, fmt in self.metadata_names.items():
                     if not self.tree.winfo_exists():
                         return
@@ -358,24 +361,35 @@ class FolderScanSelector(_ScanSelector):
 
     def add_folder(self, folder_path: str):
         iid = self._add_row("", name=os.path.basename(folder_path), filepath=folder_path)
-        files = list_files(folder_path, self.extension.get())
-        self.populate_files(iid, *files)
+        extension = self.extension.get()
+        changes = get_folder_watcher(extension).changes(folder_path)
+        self._folder_sequence[(folder_path, extension)] = changes.sequence
+        self.populate_files(iid, *changes.added)
 
     def update_files(self):
-        """Check folders in the tree for new files"""
+        """Check folders in the tree for new or removed files"""
         for branch in self.tree.get_children():
             folder = self.tree.set(branch, 'filepath')
-            files = list_files(folder, self.extension.get())
-            for leaf in self.tree.get_children(branch):  # files
-                if not self.tree.winfo_exists():
-                    return
-                file = self.tree.set(leaf, 'filepath')
-                if file in files:
-                    files.remove(file)
+            key = (folder, self.extension.get())
+            changes = get_folder_watcher(key[1]).changes(folder, self._folder_sequence.get(key))
+            if changes.sequence == self._folder_sequence.get(key):
+                continue
+            self._folder_sequence[key] = changes.sequence
+            if not self.tree.winfo_exists():
+                return
+            leaves = {
+                self.tree.set(leaf, 'filepath'): leaf
+                for leaf in self.tree.get_children(branch)
+            }
+            removed = set(leaves) - set(changes.added) if changes.reset else changes.removed
+            for file in removed:
+                if file in leaves:
+                    self.tree.delete(leaves[file])
+            files = [file for file in changes.added if file not in leaves]
 
             logger.info(f"Updating {len(files)} in '{os.path.basename(folder)}'")
             logger.debug(f"update_files: Current thread: {current_thread()}, in process pid: {os.getpid()}")
-            for file in reversed(files):
+            for file in files:
                 if not self.tree.winfo_exists():
                     return
                 iid = self._add_file(branch, file)
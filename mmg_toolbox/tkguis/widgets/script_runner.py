@@ -6,8 +6,7 @@ import os
 import tkinter as tk
 from tkinter import ttk
 
-import hdfmap
-
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
 from mmg_toolbox.scripts import scripts
 from mmg_toolbox.utils.env_functions import get_first_file, run_python_script
 from ..misc.logging import create_logger
@@ -102,7 +101,7 @@ class ScriptRunner:
     def browse_metadata(self):
         from ..apps.namespace_select import create_metadata_selector
         scan_file = next(iter(self.range.generate_scan_files().values()), get_first_file(self.exp_folder.get()))
-        hdf_map = hdfmap.create_nexus_map(scan_file)
+        hdf_map = create_nexus_map(scan_file)
         paths = create_metadata_selector(hdf_map)
         if paths:
             self.metadata_name.set(', '.join(path for path in paths))
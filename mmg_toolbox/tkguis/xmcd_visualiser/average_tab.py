@@ -5,14 +5,18 @@ a tkinter frame with 3 sections:
     3. average of selected pairs
 """
 import os
+import typing
 import tkinter as tk
 from tkinter import ttk
 
 from mmg_toolbox.utils.experiment import Experiment
-from mmg_toolbox.xas import SpectraContainerSubtraction, SpectraContainer, average_scans
+from mmg_toolbox.utils.parallel import get_thread_executor
+from mmg_toolbox.xas import (SpectraContainerSubtraction, SpectraContainer, average_scans, get_processed_cache,
+                             iter_similar_measurements, iter_polarised_pairs)
 
 from ..misc.logging import create_logger
 from ..misc.config import C
+from ..misc.background_loader import BackgroundLoader, LoadRequest
 from .widget import XMCDVisualiser
 
 logger = create_logger(__file__)
@@ -38,6 +42,7 @@ class Average:
         self.pair_numbers: list[tuple[int, int]] = []
         self.pairs: list[tuple[SpectraContainer, SpectraContainer]] = []
         self.selection: list[tk.BooleanVar] = []
+        self.loader = BackgroundLoader(self.root, delay_ms=0)
 
         # Average Tab
         self.root.rowconfigure(0, weight=1)
@@ -79,16 +84,68 @@ class Average:
         s1, s2 = self.exp.load_xas(scan_number1, scan_number2, dls_loader=dls_loader)
         return s1, s2
 
-    def process_pair(self, scan_number1: int, scan_number2: int,
-                     background: str) -> tuple[SpectraContainer, SpectraContainer]:
-        scan1, scan2 = self.load_pair(scan_number1, scan_number2, dls_loader=self.use_dls_loader)
-        scan1_proc = scan1.divide_by_preedge()
-        scan2_proc = scan2.divide_by_preedge()
+    def _process_files(self, filename1: str, filename2: str, background: str,
+                       dls_loader: bool) -> tuple[SpectraContainer, SpectraContainer]:
+        """Load and process pair of files, using the cache of processed scans (safe to call in a thread)"""
+        steps = [('divide_by_preedge', ())]
         if background != 'None':
-            scan1_proc = scan1_proc.remove_background(background)
-            scan2_proc = scan2_proc.remove_background(background)
+            steps.append(('remove_background', (background,)))
+        scan1_proc, scan2_proc = get_processed_cache().process_scans(
+            filename1, filename2, steps=steps, sample_name='', dls_loader=dls_loader
+        )
         return scan1_proc, scan2_proc
 
+    def process_pair(self, scan_number1: int, scan_number2: int,
+                     background: str) -> tuple[SpectraContainer, SpectraContainer]:
+        """Load and process pair of scans, using the cache of processed scans (see xas.processed_cache)"""
+        filename1, filename2 = (self.exp.get_scan_filename(n) for n in (scan_number1, scan_number2))
+        return self._process_files(filename1, filename2, background, self.use_dls_loader)
+
+    def _iter_pairs(self, request: LoadRequest, filenames: list[str], background: str,
+                    dls_loader: bool) -> typing.Iterator[tuple[tuple[int, int], tuple[SpectraContainer, SpectraContainer]]]:
+        """Generate processed pairs of similar scans, runs in the background loader thread"""
+        scans = iter_similar_measurements(*filenames, sample_name='', dls_loader=dls_loader,
+                                          executor=get_thread_executor())
+        for s1, s2 in iter_polarised_pairs(scans):
+            request.check()
+            scan_numbers = (s1.metadata.scan_no, s2.metadata.scan_no)
+            yield scan_numbers, self._process_files(s1.metadata.filename, s2.metadata.filename,
+                                                    background, dls_loader)
+
+    def find_pairs(self, *scan_numbers: int, dls_loader: bool | None = None):
+        """
+        Load similar scans in the background, plotting each polarisation pair as it is found
+
+        Scans are loaded using xas.iter_similar_measurements and paired using xas.iter_polarised_pairs,
+        each pair is added to the pair selector and grid plot from the tkinter thread.
+        """
+        dls_loader = self.use_dls_loader if dls_loader is None else dls_loader
+        filenames = [self.exp.get_scan_filename(n) for n in scan_numbers]
+        background = self.pair_selector.bkg_option.get()
+        self.pair_numbers, self.pairs, self.selection = [], [], []
+        self.grid_plots.clear_plots()
+        self.loader.submit(
+            loader=lambda request: self._iter_pairs(request, filenames, background, dls_loader),
+            callback=self._add_pair,
+            error_callback=lambda e: logger.error(f"Failed to find pairs: {e}"),
+            iterate=True
+        )
+
+    def _add_pair(self, pair: tuple[tuple[int, int], tuple[SpectraContainer, SpectraContainer]]):
+        """Add pair to the pair selector and grid plot, in the tkinter thread"""
+        (scan_number1, scan_number2), (s1, s2) = pair
+        subtraction = s1 - s2
+        if not self.pairs:
+            self.pair_selector.update_modes(s1)
+        self.pair_selector.set_pair(len(self.pairs), scan_number1, scan_number2, spectra=subtraction)
+        check = tk.BooleanVar(self.root, True)
+        self.pair_numbers.append((scan_number1, scan_number2))
+        self.pairs.append((s1, s2))
+        self.selection.append(check)
+        mode = self.pair_selector.mode_option.get()
+        self.grid_plots.add_next_plot((subtraction, check), mode=mode, command=self.plot_average)
+        self.plot_average()
+
     def _update_pair_numbers(self):
         self.pair_numbers = self.pair_selector.get_pair_numbers()
         self.selection = [tk.BooleanVar(self.root, True) for _ in self.pair_numbers]
@@ -98,6 +155,7 @@ class Average:
         self.pairs = [self.process_pair(s1, s2, background) for s1, s2 in self.pair_numbers]
 
     def plot_pairs(self, event=None):
+        self.loader.cancel()  # stop find_pairs
         self._update_pair_numbers()
         self._update_pairs()
         mode = self.pair_selector.mode_option.get()
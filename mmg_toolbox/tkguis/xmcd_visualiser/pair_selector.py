@@ -3,7 +3,7 @@ from tkinter import ttk
 from typing import Callable
 
 from mmg_toolbox.utils.misc_functions import string2numbers
-from mmg_toolbox.xas import SpectraContainer, polarised_pairs
+from mmg_toolbox.xas import SpectraContainer, SpectraContainerSubtraction
 from mmg_toolbox.xas.spectra import BACKGROUND_FUNCTIONS
 from ..misc.functions import create_scrollable_window, entry_with_placeholder
 from ..misc.config import C
@@ -65,7 +65,8 @@ class PairSelector:
                        command=self._base.update_plots).pack(side='top', fill='x', padx=4)
         ttk.Button(frm, text='Plot', command=self._base.plot_pairs).pack(side='top', fill='x', padx=10, pady=3)
 
-    def add_pair(self, number1: int | None = None, number2: int | None = None):
+    def add_pair(self, number1: int | None = None, number2: int | None = None,
+                 spectra: SpectraContainerSubtraction | None = None):
         var1 = tk.IntVar(self.root, number1)
         var2 = tk.IntVar(self.root, number2)
         label = tk.StringVar(self.root, '')
@@ -73,9 +74,11 @@ class PairSelector:
         frm = ttk.Frame(self.pair_frm)
         frm.pack(side='top', fill='x')
 
-        def update_label(event=None):
+        def update_label(event=None, subtraction: SpectraContainerSubtraction | None = None):
             n1, n2 = var1.get(), var2.get()
-            if n1 and n2:
+            if subtraction is not None:
+                label.set(subtraction.label())  # already loaded, e.g. by Average.find_pairs
+            elif n1 and n2:
                 try:
                     s1, s2 = self._base.load_pair(n1, n2, dls_loader=self.dls_loader.get())
                     subtract = s1 - s2
@@ -97,7 +100,7 @@ class PairSelector:
         ttk.Button(frm, text='X', command=remove, width=1).pack(side='left', padx=1)
         ttk.Label(frm, textvariable=label).pack(side='left')
         self.pair_numbers.append((var1, var2, update_label))
-        update_label()
+        update_label(subtraction=spectra)
 
     def get_pair_numbers(self) -> list[tuple[int, int]]:
         return [
@@ -105,15 +108,20 @@ class PairSelector:
             if all(vals := (v1.get(), v2.get()))
         ]
 
+    def set_pair(self, index: int, number1: int, number2: int,
+                 spectra: SpectraContainerSubtraction | None = None) -> None:
+        """Set scan numbers of pair at index, adding a new pair if required"""
+        if index < len(self.pair_numbers):
+            v1, v2, update = self.pair_numbers[index]
+            v1.set(number1)
+            v2.set(number2)
+            update(subtraction=spectra)
+        else:
+            self.add_pair(number1, number2, spectra=spectra)
+
     def set_pair_numbers(self, pair_numbers: list[tuple[int, int]]) -> None:
         for n, (scan_no1, scan_no2) in enumerate(pair_numbers):
-            if n < len(self.pair_numbers):
-                v1, v2, update = self.pair_numbers[n]
-                v1.set(scan_no1)
-                v2.set(scan_no2)
-                update()
-            else:
-                self.add_pair(scan_no1, scan_no2)
+            self.set_pair(n, scan_no1, scan_no2)
             if n == 0:
                 scan, = self._base.load_scans(scan_no1, dls_loader=self.dls_loader.get())
                 self.update_modes(scan)
@@ -136,19 +144,8 @@ class PairSelector:
 
     def btn_find_pairs(self, event=None):
         scan_numbers = string2numbers(self.scan_range.get())
-        scans = self._base.load_scans(*scan_numbers, dls_loader=self.dls_loader.get())
-        if scans:
-            self.update_modes(scans[0])
-            pol_pairs = polarised_pairs(*scans)
-            for n, (s1, s2) in enumerate(pol_pairs):
-                if n < len(self.pair_numbers):
-                    v1, v2, update = self.pair_numbers[n]
-                    v1.set(s1.metadata.scan_no)
-                    v2.set(s2.metadata.scan_no)
-                    update()
-                else:
-                    self.add_pair(s1.metadata.scan_no, s2.metadata.scan_no)
-            self._base.plot_pairs()
+        if scan_numbers:
+            self._base.find_pairs(*scan_numbers, dls_loader=self.dls_loader.get())
 
     def btn_load_file(self):
         folder, pairs = load_pairs(self.root, self._base.config[C.current_proc])
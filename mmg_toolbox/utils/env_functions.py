@@ -72,6 +72,31 @@ def get_user(default=''):
     return next((os.environ[u] for u in USER if u in os.environ), default)
 
 
+def get_cache_directory() -> str:
+    """
+    Return the cache directory of the current user, created with user-only permissions.
+    Uses $XDG_CACHE_HOME/mmg_toolbox or ~/.cache/mmg_toolbox if writable, otherwise
+    a directory owned by the user in the temporary directory.
+    """
+    cache = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    directory = os.path.join(cache, 'mmg_toolbox')
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        if os.access(directory, os.W_OK):
+            return directory
+    except OSError:
+        pass
+    directory = os.path.join(TMPDIR, f"mmg_toolbox_{get_user() or 'user'}")
+    try:
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+    except OSError:
+        pass
+    # don't use a directory created by another user
+    if os.path.isdir(directory) and (not hasattr(os, 'getuid') or os.stat(directory).st_uid == os.getuid()):
+        return directory
+    return tempfile.mkdtemp(prefix='mmg_toolbox_')
+
+
 def get_data_directory():
     """Return the default data directory"""
     beamline = get_beamline()
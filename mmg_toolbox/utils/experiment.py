@@ -5,12 +5,19 @@ Experiment Folder Monitor
 import os
 import numpy as np
 import hdfmap
+from hdfmap.eval_functions import DEFAULT
 
 from ..utils.misc_functions import numbers2string
-from ..utils.env_functions import scan_number_mapping, last_folder_update, get_beamline_from_directory
+from ..utils.env_functions import get_beamline_from_directory
+from ..utils.file_functions import get_scan_number
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
+from ..utils.folder_watcher import get_folder_watcher
+from ..utils.scan_index import ScanIndex, default_index_file
+from ..utils.parallel import MultiScanReader, ReadResult
 from ..beamline_metadata.config import beamline_config, C, add_roi
 from ..nexus.nexus_scan import NexusScan, NexusDataHolder
-from ..nexus.nexus_reader import find_scans
+from ..nexus.nexus_map_cache import create_nexus_map
+from ..nexus.nexus_reader import find_scans, match_value
 from ..xas import load_xas_scans, SpectraContainer, find_similar_measurements, average_polarised_scans
 
 
@@ -28,16 +35,39 @@ class Experiment:
         scan_list = exp.scans(*range(12345, 12355))
         data = exp.join_scan_data(*range(-100, 0), data_fields=['cmd', 'Ta'])  # returns dict of arrays
 
+    Evaluated metadata is stored in a persistent index (see utils.scan_index.ScanIndex), so
+    that find_scans, join_scan_data and scans_str only open files that are new or have changed.
+    By default, the index is stored in the cache directory of the current user, to share an index
+    in the processing directory of the visit, use utils.scan_index.default_index_file:
+        exp = Experiment(folder, index=default_index_file(folder, processing=True))
+
+    Files are read in parallel by Experiment.reader (see utils.parallel.MultiScanReader), e.g.
+        exp.reader = MultiScanReader(workers=16, chunk_size=4)
+
+    Files are closed after each call, to re-use open files between calls, read scans within a
+    utils.hdf_file_pool.hdf_file_pool() block:
+        with hdf_file_pool():
+            data = [exp.scan(n)('signal') for n in range(-10, 0)]
+
+    New and removed scan files are found incrementally by a FolderWatcher shared with the GUI
+    (see utils.folder_watcher), so existing files are not listed again on each update.
+
     :param folder_paths: file directories containing .nxs files
     :param instrument: instrument name for configuration.
+    :param index: True to use the default scan index, False to disable, or str filename of the index.
     """
 
-    def __init__(self, *folder_paths: str, instrument: str | None = None):
+    def __init__(self, *folder_paths: str, instrument: str | None = None, index: bool | str = True):
         self.folder_paths = [os.path.dirname(f) if os.path.isfile(f) else f for f in folder_paths]
         self.scan_list = {}
-        self._scan_list_update = None
+        self._scan_list_update = {}  # folder: sequence number of last FolderWatcher change
+        self.watcher = get_folder_watcher('.nxs')
         self.instrument = instrument or get_beamline_from_directory(folder_paths[0], None)
         self.config = beamline_config(self.instrument)
+        if index is True:
+            index = default_index_file(*self.folder_paths)
+        self.index = ScanIndex(index) if index else None
+        self.reader = MultiScanReader()
         from ..plotting.exp_plot_manager import ExperimentPlotManager
         self.plot = ExperimentPlotManager(self)
 
@@ -71,13 +101,35 @@ class Experiment:
         return len(self.all_scan_numbers())
 
     def _update_scan_list(self):
-        mod_times = [last_folder_update(folder) for folder in self.folder_paths]
-        folders = [
-            folder for folder, time in zip(self.folder_paths, mod_times)
-            if self._scan_list_update is None or time > self._scan_list_update
-        ]
-        self._scan_list_update = max(mod_times)  # datetime.now()?
-        self.scan_list.update(scan_number_mapping(*folders))
+        """Update scan_list with files added or removed from the data folders since the last update"""
+        new_scans = {}
+        changed = False
+        for folder in self.folder_paths:
+            changes = self.watcher.changes(folder, self._scan_list_update.get(folder))
+            if changes.sequence == self._scan_list_update.get(folder):
+                continue
+            self._scan_list_update[folder] = changes.sequence
+            removed = set(changes.removed)
+            if changes.reset:
+                removed.update(f for f in self.scan_list.values() if os.path.dirname(f) == folder)
+            if removed:
+                self.scan_list = {n: f for n, f in self.scan_list.items() if f not in removed}
+            new_scans.update({
+                number: filename for filename in changes.added
+                if (number := get_scan_number(filename)) > 0
+            })
+            changed = True
+        if changed:
+            self.scan_list = dict(sorted({**self.scan_list, **new_scans}.items()))
+        if self.index is not None and new_scans:
+            self.index.update(new_scans)
+
+    def _read_scans(self, hdf_map: hdfmap.NexusMap, *filenames: str, names: list[str],
+                    default=np.array([0.0])) -> list[ReadResult]:
+        """Evaluate expressions in each file, using the scan index if available, reading files in parallel"""
+        if self.index is not None:
+            return self.index.eval(hdf_map, *filenames, names=names, default=default, reader=self.reader)
+        return self.reader.eval(hdf_map, *filenames, names=names, default=default)
 
     def _scan_numbers(self) -> list[int]:
         self._update_scan_list()
@@ -131,7 +183,7 @@ class Experiment:
         if not filenames:
             filenames = list(self.all_scans().values())
         if filenames and hdf_map is None:
-            hdf_map = hdfmap.create_nexus_map(filenames[0])
+            hdf_map = create_nexus_map(filenames[0])
         return [NexusScan(file, hdf_map, config=self.config) for file in filenames]
 
     def find_scans(self, *scan_files: int | str,  hdf_map: hdfmap.NexusMap | None = None, first_only: bool = False,
@@ -156,22 +208,50 @@ class Experiment:
         if not filenames:
             filenames = list(self.all_scans().values())
         if hdf_map is None:
-            hdf_map = hdfmap.create_nexus_map(filenames[0])
-        matches = find_scans(*filenames, hdf_map=hdf_map, first_only=first_only, **matches)
-        return self.scans(*matches, hdf_map=hdf_map)
+            hdf_map = create_nexus_map(filenames[0])
+        if first_only and self.index is None:
+            matches = find_scans(*filenames, hdf_map=hdf_map, first_only=first_only, **matches)
+            return self.scans(*matches, hdf_map=hdf_map)
+
+        names = list(matches)
+        if first_only:
+            self.index.update(filenames)  # check files once, rather than on each call
+            results = (
+                self.index.eval(hdf_map, filename, names=names, check_files=False)[0]
+                for filename in filenames
+            )
+        else:
+            results = self._read_scans(hdf_map, *filenames, names=names, default=DEFAULT)
+        matching_files = []
+        for result in results:
+            if not result:
+                print(f"Error reading {result.filename}: {result.error}")
+                continue
+            if all(match_value(value, matches[name]) for name, value in zip(names, result.values)):
+                matching_files.append(result.filename)
+                if first_only:
+                    break
+        return self.scans(*matching_files, hdf_map=hdf_map)
 
     def join_scan_data(self, *scan_files: int | str, hdf_map: hdfmap.NexusMap | None = None,
                        data_fields: list[str] | None = None, default: np.ndarray = np.array([0.0])) -> dict[str, list]:
         """
         Join data from scans
+
+        Files are read in parallel using self.reader, files that fail to load return the default value.
         """
         scans = self.scans(*scan_files, hdf_map=hdf_map)
         data_fields = [self.config[C.scan_description]] if data_fields is None else data_fields
         data = {name: [] for name in data_fields}
-        for scan in scans:
-            with scan.load_hdf() as hdf:
-                for name in data_fields:
-                    data[name].append(scan.map.eval(hdf, name, default=default))
+        if not scans:
+            return data
+        results = self._read_scans(scans[0].map, *(scan.filename for scan in scans),
+                                   names=data_fields, default=default)
+        for result in results:
+            if not result:
+                print(f"Error reading {result.filename}: {result.error}")
+            for n, name in enumerate(data_fields):
+                data[name].append(result.values[n] if result else default)
         return data
 
     def get_all_data(self, *fields: str, default: np.ndarray = np.array([0.0])) -> dict[str, list]:
@@ -220,12 +300,15 @@ class Experiment:
                 )
             return x_data, y_data, z_data
         else:
+            names = [axes, signal] + ([values] if values is not None else [])
+            results = self._read_scans(scans[0].map, *(scan.filename for scan in scans), names=names, default=0.0)
             x_data, y_data, z_data = [], [], []
-            for n, scan in enumerate(scans):
-                with scan.load_hdf() as hdf:
-                    x = np.reshape(scan.map.eval(hdf, axes, default=0.0), -1)
-                    y = np.reshape(scan.map.eval(hdf, signal, default=0.0), -1)
-                    val = np.reshape(scan.map.eval(hdf, values, default=0.0), -1) if values is not None else np.array([n])
+            for n, (scan, result) in enumerate(zip(scans, results)):
+                if not result:
+                    raise Exception(f"{repr(scan)} failed to load: {result.error}") from result.error
+                x = np.reshape(result.values[0], -1)
+                y = np.reshape(result.values[1], -1)
+                val = np.reshape(result.values[2], -1) if values is not None else np.array([n])
                 if val.size == 1:
                     val = np.tile(val, x.size)
                 if y.size != x.size or val.size != x.size:
@@ -257,9 +340,9 @@ class Experiment:
         scan_file = self.get_scan_filename(scan_file)
 
         if hdf_map is None:
-            hdf_map = hdfmap.create_nexus_map(scan_file)
+            hdf_map = create_nexus_map(scan_file)
 
-        with hdfmap.load_hdf(self.get_scan_filename(scan_file)) as hdf:
+        with load_hdf(self.get_scan_filename(scan_file)) as hdf:
             return hdf_map.format_hdf(hdf, metadata_str, raise_errors=True)
 
     def scans_str(self, *scan_files: int | str, metadata_str: str | None = None,
@@ -269,8 +352,11 @@ class Experiment:
             metadata_str = " : {str(start_time):30} : " + self.config[C.scan_description]
         filenames = [self.get_scan_filename(scan_file) for scan_file in scan_files]
         if hdf_map is None:
-            hdf_map = hdfmap.create_nexus_map(filenames[0])
+            hdf_map = create_nexus_map(filenames[0])
         folder_file = ['/'.join(filename.split(os.sep)[-2:]) for filename in filenames]
+        if self.index is not None:
+            strings = self.index.format(hdf_map, *filenames, expression=metadata_str)
+            return [name + string for name, string in zip(folder_file, strings)]
         return [
             name + self.scan_str(file, metadata_str, hdf_map)
             for file, name in zip(filenames, folder_file)
@@ -370,4 +456,6 @@ class Experiment:
         :param image_name: string name of the image
         """
         add_roi(self.config, name, cen_i, cen_j, wid_i, wid_j, image_name)
+        if self.index is not None:
+            self.index.clear_names(name)
 
@@ -6,12 +6,12 @@ import os
 import datetime
 import typing
 import h5py
-import hdfmap
 import numpy as np
 from hdfmap.eval_functions import dataset2str, dataset2data
 from imageio.v2 import imread
 
 from mmg_toolbox.utils.misc_functions import consolidate_numeric_strings, regex_number
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 
 
 def list_files(folder_directory: str, extension='.nxs') -> list[str]:
@@ -123,7 +123,7 @@ def get_hdf_value(hdf_filename: str, hdf_address: str, default_value: typing.Any
     :return [dataset doesn't exist]: default_value
     """
     try:
-        with hdfmap.load_hdf(hdf_filename) as hdf:
+        with load_hdf(hdf_filename) as hdf:
             dataset = hdf.get(hdf_address)
             if isinstance(dataset, h5py.Dataset):
                 return dataset2data(dataset)
@@ -143,7 +143,7 @@ def get_hdf_string(hdf_filename: str, hdf_address: str, default_value: str = '')
     :return [dataset doesn't exist]: default_value
     """
     try:
-        with hdfmap.load_hdf(hdf_filename) as hdf:
+        with load_hdf(hdf_filename) as hdf:
             dataset = hdf.get(hdf_address)
             if isinstance(dataset, h5py.Dataset):
                 return dataset2str(dataset)
@@ -154,7 +154,7 @@ def get_hdf_string(hdf_filename: str, hdf_address: str, default_value: str = '')
 
 def hdfobj_string(hdf_filename: str, hdf_address: str) -> str:
     """Generate string describing object in hdf file"""
-    with hdfmap.load_hdf(hdf_filename) as hdf:
+    with load_hdf(hdf_filename) as hdf:
         obj = hdf.get(hdf_address)
         if not obj:
             return ''
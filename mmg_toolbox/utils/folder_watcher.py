@@ -0,0 +1,299 @@
+"""
+Incremental folder watcher
+
+Keeps an in-memory list of the scan files in each watched folder, sorted by modified time, and reports
+only the files added or removed since the last check. On Linux, inotify events are used where available,
+otherwise (or additionally, as inotify doesn't see changes made by other hosts on network file systems)
+the folder is only re-listed when the modified time of the directory changes. Files already known are
+never stat'ed again.
+
+The watcher is shared between the Experiment class and the GUI scan selectors, each consumer keeps the
+sequence number of the last change it has seen:
+
+    watcher = get_folder_watcher('.nxs')
+    watcher.add_folder('/dls/i16/data/2025/cm12345-1')
+    changes = watcher.changes('/dls/i16/data/2025/cm12345-1', since=None)  # all files
+    ...
+    changes = watcher.changes('/dls/i16/data/2025/cm12345-1', since=changes.sequence)
+    print(changes.added, changes.removed)
+"""
+
+import os
+import bisect
+import struct
+import threading
+import typing
+
+MAX_HISTORY = 1000  # number of changes kept per folder, older consumers receive a complete listing
+
+# inotify constants, see man inotify
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ISDIR = 0x40000000
+IN_EVENT = struct.Struct('iIII')  # wd, mask, cookie, len
+
+
+class FolderChanges(typing.NamedTuple):
+    """
+    Files added and removed from a folder since a previous sequence number.
+    If reset is True, added contains every file in the folder and the consumer should discard
+    files not in added.
+    """
+    sequence: int
+    added: list[str]
+    removed: list[str]
+    reset: bool = False
+
+
+class _Inotify:
+    """Minimal non-blocking inotify interface using libc, raises OSError if not available"""
+    MASK = IN_CREATE | IN_DELETE | IN_MOVED_FROM | IN_MOVED_TO
+
+    def __init__(self):
+        import ctypes
+        import ctypes.util
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        if not hasattr(self._libc, 'inotify_init1'):
+            raise OSError('inotify not available')
+        self.fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.watches: dict[int, str] = {}
+
+    def add_watch(self, folder: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(folder), self.MASK)
+        if wd < 0:
+            raise OSError(f"inotify_add_watch failed for {folder}")
+        self.watches[wd] = folder
+        return wd
+
+    def remove_watch(self, folder: str):
+        for wd, path in list(self.watches.items()):
+            if path == folder:
+                self._libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+
+    def read_events(self) -> typing.Iterator[tuple[str | None, int, str]]:
+        """Yield (folder, mask, name) for pending events, folder is None on queue overflow"""
+        while True:
+            try:
+                buffer = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return
+            offset = 0
+            while offset < len(buffer):
+                wd, mask, cookie, length = IN_EVENT.unpack_from(buffer, offset)
+                offset += IN_EVENT.size
+                name = os.fsdecode(buffer[offset:offset + length].rstrip(b'\0'))
+                offset += length
+                if mask & IN_Q_OVERFLOW:
+                    yield None, mask, ''
+                elif wd in self.watches:
+                    yield self.watches[wd], mask, name
+                    if mask & IN_IGNORED:
+                        del self.watches[wd]
+
+    def close(self):
+        os.close(self.fd)
+
+
+class _Folder:
+    """Sorted set of files in a folder, with history of changes"""
+    def __init__(self, path: str):
+        self.path = path
+        self.sorted: list[tuple[float, str]] = []  # (modified time, path)
+        self.files: dict[str, float] = {}  # path: modified time
+        self.mtime = None
+        self.sequence = 0
+        self.history: list[tuple[int, list[str], list[str]]] = []
+
+    def apply(self, added: list[str], removed: list[str]):
+        """Update sorted set and record change"""
+        added = [f for f in added if f not in self.files]
+        removed = [f for f in removed if f in self.files]
+        for filepath in removed:
+            mtime = self.files.pop(filepath)
+            index = bisect.bisect_left(self.sorted, (mtime, filepath))
+            del self.sorted[index]
+        new = []
+        for filepath in added:
+            try:
+                mtime = os.stat(filepath).st_mtime
+            except OSError:
+                continue  # file removed again
+            self.files[filepath] = mtime
+            bisect.insort(self.sorted, (mtime, filepath))
+            new.append(filepath)
+        if new or removed:
+            self.sequence += 1
+            self.history.append((self.sequence, new, removed))
+            del self.history[:-MAX_HISTORY]
+
+    def sorted_files(self) -> list[str]:
+        return [filepath for mtime, filepath in self.sorted]
+
+
+class FolderWatcher:
+    """
+    Watch folders for added and removed files with a given extension
+
+    :param extension: file extension to watch, e.g. '.nxs'
+    :param use_inotify: if True, use inotify events where available
+    """
+    def __init__(self, extension: str = '.nxs', use_inotify: bool = True):
+        self.extension = extension
+        self._folders: dict[str, _Folder] = {}
+        self._lock = threading.RLock()
+        self._inotify = None
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError):
+                self._inotify = None
+
+    def __repr__(self):
+        mode = 'inotify' if self._inotify else 'mtime'
+        return f"FolderWatcher('{self.extension}', folders={len(self._folders)}, mode={mode})"
+
+    def _list_folder(self, folder: _Folder):
+        """Re-list folder, comparing names with the known files"""
+        try:
+            folder.mtime = os.stat(folder.path).st_mtime_ns
+            current = {
+                entry.path for entry in os.scandir(folder.path)
+                if entry.name.endswith(self.extension) and entry.is_file()
+            }
+        except OSError:
+            current = set()
+        known = set(folder.files)
+        folder.apply(sorted(current - known), sorted(known - current))
+
+    def add_folder(self, folder_path: str) -> list[str]:
+        """Start watching folder, returns list of files sorted by modified time"""
+        with self._lock:
+            if folder_path not in self._folders:
+                folder = _Folder(folder_path)
+                if self._inotify:
+                    try:
+                        self._inotify.add_watch(folder_path)
+                    except OSError:
+                        pass
+                self._list_folder(folder)
+                self._folders[folder_path] = folder
+            return self._folders[folder_path].sorted_files()
+
+    def remove_folder(self, folder_path: str):
+        """Stop watching folder"""
+        with self._lock:
+            if self._folders.pop(folder_path, None) and self._inotify:
+                self._inotify.remove_watch(folder_path)
+
+    def files(self, folder_path: str) -> list[str]:
+        """Return list of files in the folder, sorted by modified time"""
+        self.check(folder_path)
+        return self._folders[folder_path].sorted_files()
+
+    def _read_inotify(self) -> set[str]:
+        """Apply pending inotify events, returns folders with events"""
+        updated = set()
+        events: dict[str, tuple[list[str], list[str]]] = {}
+        for folder_path, mask, name in self._inotify.read_events():
+            if folder_path is None:  # event queue overflow, re-list everything
+                for folder in self._folders.values():
+                    folder.mtime = None
+                continue
+            if folder_path not in self._folders or mask & IN_ISDIR or not name.endswith(self.extension):
+                continue
+            added, removed = events.setdefault(folder_path, ([], []))
+            filepath = os.path.join(folder_path, name)
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                added.append(filepath)
+            elif mask & (IN_DELETE | IN_MOVED_FROM):
+                removed.append(filepath)
+        for folder_path, (added, removed) in events.items():
+            folder = self._folders[folder_path]
+            folder.apply(added, removed)
+            try:
+                folder.mtime = os.stat(folder_path).st_mtime_ns
+            except OSError:
+                folder.mtime = None
+            updated.add(folder_path)
+        return updated
+
+    def check(self, *folder_paths: str) -> list[str]:
+        """
+        Check folders for changes, using inotify events or the directory modified time
+        :param folder_paths: folders to check, or all watched folders if none given
+        :return: list of folders that have changed
+        """
+        with self._lock:
+            folder_paths = folder_paths or tuple(self._folders)
+            for folder_path in folder_paths:
+                if folder_path not in self._folders:
+                    self.add_folder(folder_path)
+            changed = set()
+            if self._inotify:
+                changed.update(self._read_inotify())
+            for folder_path in folder_paths:
+                folder = self._folders[folder_path]
+                try:
+                    mtime = os.stat(folder_path).st_mtime_ns
+                except OSError:
+                    mtime = None
+                if mtime is None or mtime != folder.mtime:
+                    sequence = folder.sequence
+                    self._list_folder(folder)
+                    if folder.sequence != sequence:
+                        changed.add(folder_path)
+            return [f for f in folder_paths if f in changed]
+
+    def changes(self, folder_path: str, since: int | None = None) -> FolderChanges:
+        """
+        Return files added and removed from folder since a previous sequence number
+        :param folder_path: folder to check
+        :param since: sequence number from previous FolderChanges, or None to return all files
+        :return: FolderChanges(sequence, added, removed, reset)
+        """
+        with self._lock:
+            self.check(folder_path)
+            folder = self._folders[folder_path]
+            if since == folder.sequence:
+                return FolderChanges(folder.sequence, [], [])
+            history = [h for h in folder.history if h[0] > (since or 0)]
+            if since is None or not history or history[0][0] != since + 1:
+                return FolderChanges(folder.sequence, folder.sorted_files(), [], reset=True)
+            added, removed = [], []
+            for sequence, new, old in history:
+                added.extend(new)
+                removed.extend(old)
+            removed_set = set(removed)
+            added_set = set(added)
+            return FolderChanges(
+                sequence=folder.sequence,
+                added=[f for f in added if f not in removed_set and f in folder.files],
+                removed=[f for f in dict.fromkeys(removed) if f not in added_set or f not in folder.files],
+            )
+
+    def close(self):
+        """Stop watching all folders"""
+        with self._lock:
+            if self._inotify:
+                self._inotify.close()
+                self._inotify = None
+            self._folders.clear()
+
+
+_watchers: dict[str, FolderWatcher] = {}
+_watchers_lock = threading.Lock()
+
+
+def get_folder_watcher(extension: str = '.nxs') -> FolderWatcher:
+    """Return the folder watcher for files with extension, shared by all consumers in this process"""
+    with _watchers_lock:
+        if extension not in _watchers:
+            _watchers[extension] = FolderWatcher(extension)
+        return _watchers[extension]
@@ -0,0 +1,265 @@
+"""
+Process-wide pool of open HDF5 files
+
+Opening a file on a network file system (NFS, GPFS) costs several metadata round trips, and most
+readers open the same scan file many times (NexusScan.arrays, .image, .get_plot_data, GUI widgets...).
+The pool returns the same read-only handle for each call while the file is in use, and can keep a
+limited number of files open between calls:
+
+ - by default, files are closed at the end of the outermost with block, as with h5py.File
+ - within a hdf_file_pool() block, or if get_hdf_file_pool().keep_open is True (set by the GUI),
+   files stay open after the with block and are re-used by later calls
+ - the least recently used file is closed when more than max_open files are kept open
+ - the modified time and size of the file are checked on each call and the file is re-opened if it has changed
+ - files are not closed by the pool between being returned and the end of the with block, in any thread,
+   so always use load_hdf in a with block, otherwise the file stays open until closed with close_hdf
+ - files are never opened or closed while holding the pool lock, so h5py's global lock can't deadlock
+
+    with load_hdf('12345.nxs') as hdf:  # opens file
+        data = hdf['/entry/measurement/x'][()]
+    # file is closed
+
+    with hdf_file_pool():
+        with load_hdf('12345.nxs') as hdf:  # opens file
+            data = hdf['/entry/measurement/x'][()]
+        with load_hdf('12345.nxs') as hdf:  # same file handle
+            data = hdf['/entry/measurement/y'][()]
+        print(get_hdf_file_pool())  # HdfFilePool(open=1, opens=1, reused=1, reopened=0, closed=0)
+    # files not in use are closed
+
+Files kept open can't be opened for writing, as HDF5 won't open a file for writing that is already open for
+reading. Release the file from the pool with close_hdf(filename) before writing to it.
+
+The pool can be disabled with get_hdf_file_pool().enabled = False, load_hdf then opens a new file each call.
+"""
+
+import os
+import typing
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import h5py
+import hdfmap
+from hdfmap.hdf_loader import HDF_FILE_OPTIONS
+
+DEFAULT_MAX_OPEN = 32  # maximum number of files kept open when not in use
+
+
+def _file_state(filename: str) -> tuple[int, int]:
+    """Return (modified time, size) of file, used to detect changes"""
+    stat = os.stat(filename)
+    return stat.st_mtime_ns, stat.st_size
+
+
+class PooledFile(h5py.File):
+    """
+    Read-only h5py.File owned by a HdfFilePool
+    The file is marked as in use when returned by the pool, the end of the with statement releases
+    the file, which is closed by the pool if no longer in use and files are not being kept open.
+    close() has no effect, the file is closed by the pool.
+    """
+    _pool: 'HdfFilePool'
+    _pool_key: str
+    _pool_state: tuple[int, int]
+    _pool_users: int
+    _pool_released: bool
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._pool.release(self)
+
+    def close(self):
+        """The file is closed by the pool, use HdfFilePool.close(filename) to close it"""
+        pass
+
+    def _close_file(self) -> bool:
+        if self.id.valid:
+            h5py.File.close(self)
+            return True
+        return False
+
+
+class HdfFilePool:
+    """
+    LRU pool of open read-only HDF5 files
+
+    :param max_open: maximum number of files to keep open
+    :param enabled: if False, a new file is opened on each call to open and closed by the with statement
+    :param keep_open: if True, files are kept open when not in use, otherwise only within keep_files_open()
+    """
+    def __init__(self, max_open: int = DEFAULT_MAX_OPEN, enabled: bool = True, keep_open: bool = False):
+        self.max_open = max_open
+        self.enabled = enabled
+        self.keep_open = keep_open
+        self._scopes = 0  # number of active keep_files_open blocks
+        self.opens = 0
+        self.reused = 0
+        self.reopened = 0
+        self.closed = 0
+        self._files: OrderedDict[str, PooledFile] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return (f"HdfFilePool(open={len(self._files)}, opens={self.opens}, reused={self.reused}, "
+                f"reopened={self.reopened}, closed={self.closed})")
+
+    def __len__(self):
+        return len(self._files)
+
+    def _remove(self, hdf: PooledFile) -> list[PooledFile]:
+        """Remove file from the pool, returning the file if it can be closed now, call with lock"""
+        if self._files.get(hdf._pool_key) is hdf:
+            del self._files[hdf._pool_key]
+        hdf._pool_released = True
+        return [] if hdf._pool_users else [hdf]
+
+    def _evict(self) -> list[PooledFile]:
+        """Remove the least recently used files that aren't in use, call with lock"""
+        max_open = self.max_open if self.keep_open or self._scopes else 0
+        to_close = []
+        for hdf in list(self._files.values()):
+            if len(self._files) <= max_open:
+                break
+            if not hdf._pool_users:
+                to_close += self._remove(hdf)
+        return to_close
+
+    def _close_files(self, files: list[PooledFile]):
+        """Close files, call without lock"""
+        n_closed = sum(hdf._close_file() for hdf in files)
+        if n_closed:
+            with self._lock:
+                self.closed += n_closed
+
+    def release(self, hdf: PooledFile):
+        """Mark file as no longer in use, closing it if it has been removed from the pool or isn't kept open"""
+        with self._lock:
+            hdf._pool_users = max(hdf._pool_users - 1, 0)
+            to_close = [hdf] if hdf._pool_released and not hdf._pool_users else []
+            to_close += self._evict()
+        self._close_files(to_close)
+
+    def open(self, filename: str) -> h5py.File:
+        """
+        Return open read-only file, re-using the pooled file if it hasn't changed
+        :param filename: HDF filename
+        :return: PooledFile (h5py.File), marked as in use until the end of the with statement
+        """
+        if not self.enabled:
+            return hdfmap.load_hdf(filename)
+        state = _file_state(filename)
+        to_close = []
+        with self._lock:
+            hdf = self._files.get(filename)
+            if hdf is not None:
+                if hdf._pool_state == state and hdf.id.valid:
+                    self.reused += 1
+                    self._files.move_to_end(filename)
+                    hdf._pool_users += 1
+                    return hdf
+                self.reopened += 1
+                to_close += self._remove(hdf)
+        self._close_files(to_close)
+
+        new_file = PooledFile(filename, 'r', **HDF_FILE_OPTIONS)
+        new_file._pool = self
+        new_file._pool_key = filename
+        new_file._pool_state = state
+        new_file._pool_users = 0
+        new_file._pool_released = False
+        with self._lock:
+            self.opens += 1
+            hdf = self._files.get(filename)
+            if hdf is not None and hdf._pool_state == state and hdf.id.valid:
+                # opened by another thread at the same time
+                to_close = [new_file]
+                new_file._pool_released = True
+            else:
+                if hdf is not None:
+                    to_close = self._remove(hdf)
+                self._files[filename] = hdf = new_file
+            hdf._pool_users += 1
+            to_close += self._evict()
+        self._close_files(to_close)
+        return hdf
+
+    @contextmanager
+    def keep_files_open(self) -> typing.Iterator['HdfFilePool']:
+        """Keep files open after use within the with block, files not in use are closed at the end"""
+        with self._lock:
+            self._scopes += 1
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._scopes -= 1
+                to_close = self._evict()
+            self._close_files(to_close)
+
+    def close(self, filename: str | None = None):
+        """
+        Close pooled file, or all pooled files. Files in use are closed when released.
+        :param filename: HDF filename, or None to close all files
+        """
+        with self._lock:
+            if filename is None:
+                files = list(self._files.values())
+            else:
+                files = [hdf] if (hdf := self._files.get(filename)) is not None else []
+            to_close = [f for hdf in files for f in self._remove(hdf)]
+        self._close_files(to_close)
+
+
+_hdf_file_pool: HdfFilePool | None = None
+
+
+def get_hdf_file_pool() -> HdfFilePool:
+    """Return the pool of open files shared by all readers in this process"""
+    global _hdf_file_pool
+    if _hdf_file_pool is None:
+        _hdf_file_pool = HdfFilePool()
+    return _hdf_file_pool
+
+
+def _reset_after_fork():
+    """Start a new pool in forked worker processes, files and locks of the parent can't be shared"""
+    global _hdf_file_pool
+    if _hdf_file_pool is not None:
+        _hdf_file_pool = HdfFilePool(_hdf_file_pool.max_open, _hdf_file_pool.enabled, _hdf_file_pool.keep_open)
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def hdf_file_pool() -> typing.ContextManager[HdfFilePool]:
+    """
+    Keep files read within the with block open and re-use them, files not in use are closed at the end
+        with hdf_file_pool():
+            for n in range(10):
+                with load_hdf('file.nxs') as hdf:  # file opened once
+                    data = hdf['/entry/data'][n]
+    """
+    return get_hdf_file_pool().keep_files_open()
+
+
+def load_hdf(hdf_filename: str) -> h5py.File:
+    """
+    Return open read-only HDF file from the pool of open files
+        with load_hdf('file.nxs') as hdf:
+            data = hdf['/entry/data'][()]
+    :param hdf_filename: HDF filename
+    :return: h5py.File, the file is closed after the with statement unless kept open by the pool
+    """
+    return get_hdf_file_pool().open(hdf_filename)
+
+
+def close_hdf(hdf_filename: str | None = None):
+    """
+    Close the pooled file, call before writing to a file that may have been read
+    :param hdf_filename: HDF filename, or None to close all pooled files
+    """
+    get_hdf_file_pool().close(hdf_filename)
@@ -4,7 +4,7 @@ Miscellaneous functions
 
 import re
 import numpy as np
-from typing import Any
+from typing import Any, Callable
 from collections import defaultdict
 
 
@@ -274,6 +274,84 @@ class DataHolder(dict):
             self.update({name: kwargs[name]})
 
 
+class LazyDataHolder(DataHolder):
+    """
+    DataHolder that loads each value on first access, then keeps it.
+    The names are known on creation, values are loaded by calling loader with a list of names.
+        obj = LazyDataHolder(['item1', 'item2'], loader=lambda names: {name: read(name) for name in names})
+        obj.item1 -> loads 'item1'
+        obj['item2'] -> loads 'item2'
+        obj.keys() -> names, without loading
+        obj.preload() -> loads all remaining values
+    Methods that return every value (values, items, dict(obj), etc.) load all values first.
+
+    :param names: names of values that can be loaded
+    :param loader: function(names) -> dict of {name: value} for each name
+    :param values: dict of values already loaded
+    """
+
+    def __init__(self, names: list[str], loader: Callable[[list[str]], dict[str, Any]],
+                 values: dict[str, Any] | None = None):
+        super().__init__()
+        self._lazy_names = dict.fromkeys(list(values or []) + list(names))  # ordered set
+        self._lazy_loader = loader
+        dict.update(self, values or {})
+
+    def _load(self, names: list[str]):
+        names = [name for name in names if not dict.__contains__(self, name)]
+        if names:
+            dict.update(self, self._lazy_loader(names))
+
+    def preload(self) -> 'LazyDataHolder':
+        """Load all values that have not yet been loaded, returns self"""
+        self._load(list(self._lazy_names))
+        return self
+
+    def loaded(self) -> list[str]:
+        """Return names of values that have been loaded"""
+        return list(dict.keys(self))
+
+    def __getattr__(self, name: str):
+        if name.startswith('_') or name not in self.__dict__.get('_lazy_names', {}):
+            raise AttributeError(f"'{type(self).__name__}' object has no attribute '{name}'")
+        return self[name]
+
+    def __getitem__(self, name: str):
+        if not dict.__contains__(self, name) and name in self._lazy_names:
+            self._load([name])
+        return dict.__getitem__(self, name)
+
+    def get(self, name: str, default=None):
+        return self[name] if name in self else default
+
+    def __contains__(self, name) -> bool:
+        return name in self._lazy_names or dict.__contains__(self, name)
+
+    def __iter__(self):
+        return iter(self._lazy_names)
+
+    def __len__(self) -> int:
+        return len(self._lazy_names)
+
+    def keys(self):
+        return self._lazy_names.keys()
+
+    def values(self):
+        self.preload()
+        return dict.values(self)
+
+    def items(self):
+        self.preload()
+        return dict.items(self)
+
+    def copy(self) -> dict:
+        return dict(self.preload())
+
+    def __setitem__(self, name: str, value):
+        self.__dict__.get('_lazy_names', {})[name] = None
+        dict.__setitem__(self, name, value)
+
+
 def data_holder(scan_data: dict[str, np.ndarray], metadata: dict[str, Any]) -> DataHolder:
     """
     Create DataHolder object from scan data and metadata
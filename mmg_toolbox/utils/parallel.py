@@ -0,0 +1,244 @@
+"""
+Functions for running tasks over many files using a pool of workers
+
+    reader = MultiScanReader(workers=8)
+    results = reader.eval(hdf_map, *filenames, names=['axes', 'signal'])
+"""
+
+import os
+import typing
+from functools import partial
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+
+import hdfmap
+from hdfmap.eval_functions import DEFAULT
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
+
+DEFAULT_WORKERS = min(8, os.cpu_count() or 1)
+
+
+
+class _Missing:
+    """Marker for names not available in a file, unpickled as the module-level MISSING object"""
+    def __repr__(self):
+        return 'MISSING'
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()  # returned by eval_file for missing names, identity is preserved between processes
+
+T = typing.TypeVar('T')
+R = typing.TypeVar('R')
+
+
+def _run_chunk(function: typing.Callable[[T], R], chunk: list[T]) -> list[tuple[R | None, Exception | None]]:
+    """Run function on each item of the chunk, capturing errors for each item"""
+    results = []
+    for item in chunk:
+        try:
+            results.append((function(item), None))
+        except Exception as ex:
+            results.append((None, ex))
+    return results
+
+
+def create_executor(workers: int = DEFAULT_WORKERS, processes: bool = False) -> Executor:
+    """Return a process or thread pool executor"""
+    if processes:
+        return ProcessPoolExecutor(max_workers=workers)
+    return ThreadPoolExecutor(max_workers=workers)
+
+
+_thread_executor: ThreadPoolExecutor | None = None
+
+
+def get_thread_executor() -> ThreadPoolExecutor:
+    """Return a thread pool shared within the process, e.g. between widgets of the GUI, created on first use"""
+    global _thread_executor
+    if _thread_executor is None:
+        _thread_executor = ThreadPoolExecutor(max_workers=DEFAULT_WORKERS, thread_name_prefix='mmg_toolbox')
+    return _thread_executor
+
+
+def parallel_map(function: typing.Callable[[T], R], items: typing.Iterable[T], workers: int = DEFAULT_WORKERS,
+                 chunk_size: int | None = None, ordered: bool = True, processes: bool = False,
+                 executor: Executor | None = None) -> typing.Iterator[tuple[int, R | None, Exception | None]]:
+    """
+    Apply function to each item using a pool of workers, yielding results as they complete
+
+        for index, result, error in parallel_map(load_file, filenames, workers=8):
+            if error:
+                print(f"{filenames[index]} failed: {error}")
+
+    Errors raised by the function are captured and returned for each item, rather than stopping other items.
+    If workers <= 1 or there is only one item, the function is run serially in the current process.
+
+    Note that if processes=True, function and items must be picklable (e.g. a module-level function).
+
+    :param function: function taking a single item
+    :param items: iterable of items
+    :param workers: number of workers in the pool
+    :param chunk_size: number of items sent to each worker per task, None to split evenly between workers
+    :param ordered: if True, results are yielded in the order of items, otherwise in order of completion
+    :param processes: if True, use a process pool, otherwise use a thread pool
+    :param executor: existing executor to use instead of creating a new pool
+    :returns: generator of (index, result, error), where result is None if error is not None
+    """
+    items = list(items)
+    if not items:
+        return
+    if executor is None and (workers <= 1 or len(items) == 1):
+        for index, item in enumerate(items):
+            (result, error), = _run_chunk(function, [item])
+            yield index, result, error
+        return
+
+    if chunk_size is None:
+        chunk_size = max(1, len(items) // (4 * workers))
+    chunks = [
+        (n, items[n:n + chunk_size])
+        for n in range(0, len(items), chunk_size)
+    ]
+    pool = executor or create_executor(workers, processes)
+    try:
+        futures = {pool.submit(_run_chunk, function, chunk): start for start, chunk in chunks}
+        completed = futures if ordered else as_completed(futures)
+        for future in completed:
+            start = futures[future]
+            for n, (result, error) in enumerate(future.result()):
+                yield start + n, result, error
+    finally:
+        if executor is None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+def eval_file(filename: str, hdf_map: hdfmap.NexusMap, names: list[str], default: typing.Any = MISSING) -> list:
+    """Open file and return list of evaluated expressions, names not in the file return default (MISSING)"""
+    with load_hdf(filename) as hdf:
+        return [hdf_map.eval(hdf, name, default=default) for name in names]
+
+
+class ReadResult:
+    """
+    Values read from a single file
+
+    :param filename: path of the file
+    :param values: list of values, or None if reading failed
+    :param error: Exception raised while reading the file, or None
+    :param found: list of bool, False for values replaced by the default as the name is not in the file
+    """
+    def __init__(self, filename: str, values: list | None, error: Exception | None = None,
+                 found: list[bool] | None = None):
+        self.filename = filename
+        self.values = values
+        self.error = error
+        if found is None and values is not None:
+            found = [True] * len(values)
+        self.found = found
+
+    def __repr__(self):
+        if self.error:
+            return f"ReadResult('{self.filename}', error={self.error!r})"
+        return f"ReadResult('{self.filename}', values[{len(self.values)}])"
+
+    def __bool__(self):
+        return self.error is None
+
+
+class MultiScanReader:
+    """
+    Parallel reader for many scan files
+
+    Each file is opened in a pool of workers, which on network file systems allows the latency of
+    opening each file to overlap. A thread pool is used by default, as it starts quickly and is safe to use
+    from the GUI. h5py serialises calls within a single process, so for reads limited by CPU rather than
+    file latency use processes=True. The pool is created on first use and re-used by later calls,
+    use shutdown() to stop the workers.
+
+        reader = MultiScanReader(workers=8, chunk_size=4)
+        for result in reader.eval(hdf_map, *filenames, names=['axes', 'signal']):
+            if result:
+                x, y = result.values
+            else:
+                print(result.error)
+
+    Errors are captured for each file and returned in ReadResult.error.
+
+    :param workers: number of workers, if <= 1 files are read serially
+    :param chunk_size: number of files passed to each worker per task, None to split evenly between workers
+    :param ordered: if True, results are returned in the order of files, otherwise in order of completion
+    :param processes: if True, use a process pool, otherwise use a thread pool
+    """
+
+    def __init__(self, workers: int = DEFAULT_WORKERS, chunk_size: int | None = None,
+                 ordered: bool = True, processes: bool = False):
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.ordered = ordered
+        self.processes = processes
+        self._executor: Executor | None = None
+        self._executor_options: tuple[int, bool] | None = None
+
+    def __getstate__(self):
+        # the pool is not sent to other processes
+        return {**self.__dict__, '_executor': None, '_executor_options': None}
+
+    def __del__(self):
+        self.shutdown(wait=False)
+
+    def __repr__(self):
+        return (f"MultiScanReader(workers={self.workers}, chunk_size={self.chunk_size}, " +
+                f"ordered={self.ordered}, processes={self.processes})")
+
+    def executor(self) -> Executor:
+        """Return the pool of workers, created on first use or if workers or processes have changed"""
+        options = (self.workers, self.processes)
+        if self._executor is None or self._executor_options != options:
+            self.shutdown(wait=False)
+            self._executor = create_executor(self.workers, self.processes)
+            self._executor_options = options
+        return self._executor
+
+    def shutdown(self, wait: bool = True):
+        """Stop the pool of workers, a new pool is created on the next call"""
+        executor, self._executor = getattr(self, '_executor', None), None
+        if executor is not None:
+            executor.shutdown(wait=wait)
+
+    def imap(self, function: typing.Callable[[str], list], *filenames: str) -> typing.Iterator[ReadResult]:
+        """
+        Apply function to each file, yielding ReadResult objects
+
+        :param function: function(filename) -> list of values, must be picklable if processes=True
+        :param filenames: files to read
+        :returns: generator of ReadResult
+        """
+        # single files are read in the current thread, without starting the pool
+        executor = self.executor() if self.workers > 1 and len(filenames) > 1 else None
+        for index, values, error in parallel_map(function, filenames, workers=self.workers,
+                                                 chunk_size=self.chunk_size, ordered=self.ordered,
+                                                 processes=self.processes, executor=executor):
+            yield ReadResult(filenames[index], values, error)
+
+    def eval(self, hdf_map: hdfmap.NexusMap, *filenames: str, names: list[str],
+             default: typing.Any = DEFAULT) -> list[ReadResult]:
+        """
+        Evaluate expressions in each file
+
+        :param hdf_map: NexusMap used to evaluate expressions
+        :param filenames: files to read
+        :param names: list of expressions to evaluate, using hdf_map.eval
+        :param default: value returned if a name is not available in the file
+        :returns: list of ReadResult, with values in the order of names and ReadResult.found False for defaults
+        """
+        # workers return MISSING rather than default, which is returned as a copy by a process pool
+        function = partial(eval_file, hdf_map=hdf_map, names=list(names), default=MISSING)
+        results = []
+        for result in self.imap(function, *filenames):
+            if result:
+                result.found = [value is not MISSING for value in result.values]
+                result.values = [default if value is MISSING else value for value in result.values]
+            results.append(result)
+        return results
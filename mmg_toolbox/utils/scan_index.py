@@ -0,0 +1,347 @@
+"""
+Persistent scan metadata index
+
+Stores evaluated hdfmap expressions for each scan file in an SQLite database,
+allowing repeated searches of large experiment folders without re-opening every file.
+
+Entries are keyed by filename and hdfmap (see map_key) and are invalidated when the file modified time or size changes.
+Values are stored as JSON (strings and numbers) or in numpy .npy format (arrays), other values are not stored.
+
+    index = ScanIndex('/dls/i16/data/2025/cm12345-1/processing/mmg_scan_index.sqlite')
+    index.update(scan_number_mapping('/dls/i16/data/2025/cm12345-1'))
+    results = index.eval(hdf_map, *filenames, names=['Tsample', 'scan_command'])
+"""
+
+import io
+import os
+import json
+import hashlib
+import sqlite3
+import typing
+from contextlib import contextmanager
+
+import numpy as np
+import hdfmap
+from hdfmap.eval_functions import DEFAULT
+
+from mmg_toolbox.utils.file_functions import get_scan_number
+from mmg_toolbox.utils.parallel import MultiScanReader, ReadResult
+from mmg_toolbox.utils.env_functions import get_cache_directory, get_processing_directory
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
+
+INDEX_FILENAME = 'mmg_scan_index.sqlite'
+INDEX_VERSION = 2  # tables are re-created if the stored version differs
+MAX_VALUE_BYTES = 100_000  # larger values are evaluated but not stored
+FORMAT_PREFIX = 'format:'  # prefix used to store formatted strings
+JSON_PREFIX = b'json:'  # stored value formats
+NUMPY_PREFIX = b'npy:'
+NUMPY_SCALAR_PREFIX = b'npy0:'
+
+
+def default_index_file(*folder_paths: str, processing: bool = False) -> str:
+    """
+    Return the default path of the scan index for a set of data folders.
+    The index is stored in the cache directory of the current user, unless processing is True,
+    when it is stored in the processing directory of the first folder.
+
+    :param folder_paths: data folders
+    :param processing: if True, return the index in the processing directory, raising OSError if not writable
+    :returns: path of the SQLite database
+    """
+    if processing:
+        directory = get_processing_directory(folder_paths[0])
+        if not os.access(directory, os.W_OK):
+            raise OSError(f"processing directory is not writable: '{directory}'")
+        return os.path.join(directory, INDEX_FILENAME)
+    folder_hash = hashlib.md5(':'.join(os.path.abspath(f) for f in folder_paths).encode()).hexdigest()[:8]
+    name, ext = os.path.splitext(INDEX_FILENAME)
+    return os.path.join(get_cache_directory(), f"{name}_{folder_hash}{ext}")
+
+
+def encode_value(value: typing.Any) -> bytes | None:
+    """Return stored bytes of value, or None if the value type can't be stored"""
+    if isinstance(value, (np.ndarray, np.generic)):  # before builtins as np.float64 is a float
+        if value.dtype.kind in 'OV':
+            return None
+        buffer = io.BytesIO()
+        np.save(buffer, value, allow_pickle=False)
+        prefix = NUMPY_SCALAR_PREFIX if isinstance(value, np.generic) else NUMPY_PREFIX
+        return prefix + buffer.getvalue()
+    if value is None or isinstance(value, (str, bool, int, float)):
+        return JSON_PREFIX + json.dumps(value).encode()
+    return None
+
+
+def decode_value(data: bytes) -> typing.Any:
+    """Return value from stored bytes, raises ValueError if the format is unknown"""
+    if data.startswith(JSON_PREFIX):
+        return json.loads(data[len(JSON_PREFIX):])
+    for prefix in (NUMPY_PREFIX, NUMPY_SCALAR_PREFIX):
+        if data.startswith(prefix):
+            value = np.load(io.BytesIO(data[len(prefix):]), allow_pickle=False)
+            return value[()] if prefix == NUMPY_SCALAR_PREFIX else value
+    raise ValueError('unknown value format')
+
+
+def map_key(hdf_map: hdfmap.NexusMap | None) -> str:
+    """
+    Return identity of the names defined in a NexusMap, used to key stored values
+
+    Maps with the same dataset paths and alternate names (including ROIs and named expressions)
+    return the same key. None returns an empty key, used for values that don't depend on a map.
+    """
+    if hdf_map is None:
+        return ''
+    names = json.dumps([hdf_map.combined, hdf_map.alternate_names], sort_keys=True, default=str)
+    return hashlib.md5(names.encode()).hexdigest()
+
+
+def file_stat(filename: str) -> tuple[float, int]:
+    """Return file modified time and size"""
+    stat = os.stat(filename)
+    return stat.st_mtime, stat.st_size
+
+
+class ScanIndex:
+    """
+    Persistent index of scan metadata
+
+    Evaluated hdfmap expressions are stored per scan file in an SQLite database.
+    Each stored file records the modified time and size of the file, if either changes
+    the stored values are removed and re-evaluated from the file on the next request.
+
+        index = ScanIndex('scan_index.sqlite')
+        index.update({12345: '/path/to/12345.nxs'})
+        result, = index.eval(hdf_map, '/path/to/12345.nxs', names=['Tsample', 'scan_command'])
+        temp, cmd = result.values
+
+    Values are stored per hdf_map (see map_key), so names that resolve differently in
+    another map are re-evaluated rather than returned from the other map.
+    Files are checked for changes on each call, callers that have just checked the files
+    (e.g. using update) can skip this using check_files=False.
+
+    Values larger than max_value_bytes (e.g. image data) are evaluated but not stored.
+    Only strings, numbers and numeric or string arrays are stored, see encode_value.
+
+    :param index_file: path of the SQLite database, created if it doesn't exist
+    :param max_value_bytes: maximum size of stored values, in bytes
+    """
+    TIMEOUT = 10.  # seconds to wait for a locked database
+    MAX_QUERY = 500  # maximum number of filenames per query
+
+    def __init__(self, index_file: str, max_value_bytes: int = MAX_VALUE_BYTES):
+        self.index_file = index_file
+        self.max_value_bytes = max_value_bytes
+        with self._connect() as db:
+            if db.execute("PRAGMA user_version").fetchone()[0] != INDEX_VERSION:
+                db.execute("DROP TABLE IF EXISTS fields")
+                db.execute("DROP TABLE IF EXISTS files")
+                db.execute(f"PRAGMA user_version = {INDEX_VERSION}")
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS files "
+                "(filename TEXT PRIMARY KEY, scan_number INTEGER, mtime REAL, size INTEGER)"
+            )
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS fields "
+                "(filename TEXT, map TEXT, name TEXT, value BLOB, PRIMARY KEY (filename, map, name))"
+            )
+
+    def __repr__(self):
+        return f"ScanIndex('{self.index_file}')"
+
+    def __len__(self):
+        with self._connect() as db:
+            return db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def __contains__(self, filename: str):
+        with self._connect() as db:
+            return db.execute(
+                "SELECT 1 FROM files WHERE filename=?", (filename,)
+            ).fetchone() is not None
+
+    @contextmanager
+    def _connect(self) -> typing.Iterator[sqlite3.Connection]:
+        """Open the database, committing and closing on exit"""
+        db = sqlite3.connect(self.index_file, timeout=self.TIMEOUT)
+        try:
+            with db:
+                yield db
+        finally:
+            db.close()
+
+    def _check_files(self, db: sqlite3.Connection, *filenames: str) -> list[str]:
+        """Add files to the index, clearing stored values of changed files. Returns list of new or changed files"""
+        stored = {}
+        for n in range(0, len(filenames), self.MAX_QUERY):
+            chunk = filenames[n:n + self.MAX_QUERY]
+            stored.update(
+                (filename, (mtime, size))
+                for filename, mtime, size in db.execute(
+                    f"SELECT filename, mtime, size FROM files WHERE filename IN ({','.join('?' * len(chunk))})",
+                    chunk
+                )
+            )
+        changed = []
+        for filename in filenames:
+            stat = file_stat(filename)
+            if stored.get(filename) != stat:
+                changed.append((filename, get_scan_number(filename), *stat))
+        if changed:
+            db.executemany("DELETE FROM fields WHERE filename=?", ((c[0],) for c in changed))
+            db.executemany("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?)", changed)
+        return [c[0] for c in changed]
+
+    def _get_values(self, db: sqlite3.Connection, filename: str, key: str,
+                    names: list[str]) -> dict[str, typing.Any]:
+        values = {}
+        for name, data in db.execute(
+                f"SELECT name, value FROM fields WHERE filename=? AND map=? AND name IN ({','.join('?' * len(names))})",
+                (filename, key, *names)):
+            try:
+                values[name] = decode_value(data)
+            except ValueError:
+                pass  # unknown formats, e.g. from older versions, are re-evaluated and replaced
+        return values
+
+    def _set_values(self, db: sqlite3.Connection, filename: str, key: str, values: dict[str, typing.Any]):
+        rows = [
+            (filename, key, name, data)
+            for name, value in values.items()
+            if (data := encode_value(value)) is not None and len(data) <= self.max_value_bytes
+        ]
+        db.executemany("INSERT OR REPLACE INTO fields VALUES (?, ?, ?, ?)", rows)
+
+    def update(self, scan_files: dict[int, str] | list[str]) -> list[str]:
+        """
+        Add scan files to the index, e.g. from scan_number_mapping
+
+        Files that are new or have changed since they were indexed have their stored values removed.
+
+        :param scan_files: dict of {scan_number: filename} or list of filenames
+        :returns: list of new or changed filenames
+        """
+        filenames = list(scan_files.values()) if isinstance(scan_files, dict) else list(scan_files)
+        with self._connect() as db:
+            return self._check_files(db, *filenames)
+
+    def get(self, filename: str, *names: str, hdf_map: hdfmap.NexusMap | None = None,
+            check_files: bool = True) -> dict[str, typing.Any]:
+        """
+        Return dict of stored values for file, names without stored values are omitted
+
+        :param filename: scan file
+        :param names: stored names
+        :param hdf_map: NexusMap the values were evaluated with, or None for values stored without a map
+        :param check_files: if False, don't check if the file has changed since it was indexed
+        :returns: {name: value}
+        """
+        with self._connect() as db:
+            if check_files:
+                self._check_files(db, filename)
+            return self._get_values(db, filename, map_key(hdf_map), list(names))
+
+    def set(self, filename: str, hdf_map: hdfmap.NexusMap | None = None, check_files: bool = True, **values):
+        """
+        Store values for file
+
+        :param filename: scan file
+        :param hdf_map: NexusMap the values were evaluated with, or None for values that don't depend on a map
+        :param check_files: if False, don't check if the file has changed since it was indexed
+        :param values: name=value
+        """
+        with self._connect() as db:
+            if check_files:
+                self._check_files(db, filename)
+            self._set_values(db, filename, map_key(hdf_map), values)
+
+    def remove(self, *filenames: str):
+        """Remove files from the index"""
+        with self._connect() as db:
+            db.executemany("DELETE FROM fields WHERE filename=?", ((f,) for f in filenames))
+            db.executemany("DELETE FROM files WHERE filename=?", ((f,) for f in filenames))
+
+    def clear_names(self, *patterns: str):
+        """Remove stored values with names containing any of the patterns, for all files and maps"""
+        with self._connect() as db:
+            db.executemany("DELETE FROM fields WHERE instr(name, ?) > 0", ((p,) for p in patterns))
+
+    def clear(self):
+        """Remove all entries from the index"""
+        with self._connect() as db:
+            db.execute("DELETE FROM fields")
+            db.execute("DELETE FROM files")
+
+    def eval(self, hdf_map: hdfmap.NexusMap, *filenames: str, names: list[str], default: typing.Any = DEFAULT,
+             reader: MultiScanReader | None = None, check_files: bool = True) -> list[ReadResult]:
+        """
+        Return values of expressions for each file, using stored values where available
+
+        Files are only opened if they contain expressions that haven't been stored
+        or if the file has changed since it was indexed.
+
+        :param hdf_map: NexusMap used to evaluate expressions
+        :param filenames: scan files
+        :param names: list of expressions to evaluate, using hdf_map.eval
+        :param default: value returned if a name is not available in the file (not stored)
+        :param reader: MultiScanReader used to read files in parallel, or None to read files serially
+        :param check_files: if False, don't check if files have changed since they were indexed
+        :returns: list of ReadResult, with values in the order of names
+        """
+        names = list(names)
+        key = map_key(hdf_map)
+        with self._connect() as db:
+            if check_files:
+                self._check_files(db, *filenames)
+            stored = [self._get_values(db, filename, key, names) for filename in filenames]
+
+        missing_names = [name for name in names if any(name not in values for values in stored)]
+        missing_files = [filename for filename, values in zip(filenames, stored) if len(values) < len(names)]
+        if missing_files:
+            reader = reader or MultiScanReader(workers=1)
+            results = {
+                result.filename: result
+                for result in reader.eval(hdf_map, *missing_files, names=missing_names, default=default)
+            }
+            with self._connect() as db:
+                for filename, values in zip(filenames, stored):
+                    if filename in results and results[filename]:
+                        result = results[filename]
+                        self._set_values(db, filename, key, {
+                            name: value for name, value, found in zip(missing_names, result.values, result.found)
+                            if name not in values and found
+                        })
+                        values.update(zip(missing_names, result.values))
+        else:
+            results = {}
+
+        return [
+            results[filename] if filename in results and not results[filename]
+            else ReadResult(filename, [values[name] for name in names])
+            for filename, values in zip(filenames, stored)
+        ]
+
+    def format(self, hdf_map: hdfmap.NexusMap, *filenames: str, expression: str,
+               check_files: bool = True) -> list[str]:
+        """
+        Return formatted strings for each file, using stored strings where available
+
+        :param hdf_map: NexusMap used to format expressions
+        :param filenames: scan files
+        :param expression: str expression using {name} format specifiers, see hdf_map.format_hdf
+        :param check_files: if False, don't check if files have changed since they were indexed
+        :returns: list of strings
+        """
+        name = FORMAT_PREFIX + expression
+        key = map_key(hdf_map)
+        out = []
+        with self._connect() as db:
+            if check_files:
+                self._check_files(db, *filenames)
+            for filename in filenames:
+                values = self._get_values(db, filename, key, [name])
+                if name not in values:
+                    with load_hdf(filename) as hdf:
+                        values[name] = hdf_map.format_hdf(hdf, expression, raise_errors=True)
+                    self._set_values(db, filename, key, values)
+                out.append(values[name])
+        return out
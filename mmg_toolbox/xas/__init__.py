@@ -1,20 +1,56 @@
 """
 X-Ray Absorption Spectroscopy (XAS) tools
+
+Submodules are imported on first use of their attributes, as lmfit and matplotlib are slow to import.
 """
 
+import importlib
 
-from .spectra_analysis import xray_edges_in_range, energy_range_edge_label
-from .metadata import XasMetadata
-from .spectra import Spectra, SpectraSubtraction, SpectraAverage
-from .spectra_container import SpectraContainer, SpectraContainerSubtraction, SpectraContainerAverage
-from .container_functions import average_scans, average_polarised_scans, polarised_pairs, pair_scans
-from .nxxas_loader import load_xas_scans, create_xas_scan, find_similar_measurements
+# name: submodule
+_LAZY_ATTRIBUTES = {
+    'xray_edges_in_range': 'spectra_analysis',
+    'energy_range_edge_label': 'spectra_analysis',
+    'energy_range_edge_labels': 'spectra_analysis',
+    'XasMetadata': 'metadata',
+    'Spectra': 'spectra',
+    'SpectraSubtraction': 'spectra',
+    'SpectraAverage': 'spectra',
+    'SpectraContainer': 'spectra_container',
+    'SpectraContainerSubtraction': 'spectra_container',
+    'SpectraContainerAverage': 'spectra_container',
+    'average_scans': 'container_functions',
+    'average_polarised_scans': 'container_functions',
+    'polarised_pairs': 'container_functions',
+    'iter_polarised_pairs': 'container_functions',
+    'pair_scans': 'container_functions',
+    'calculate_scans_sum_rules': 'container_functions',
+    'load_xas_scans': 'nxxas_loader',
+    'create_xas_scan': 'nxxas_loader',
+    'find_similar_measurements': 'nxxas_loader',
+    'iter_similar_measurements': 'nxxas_loader',
+    'ProcessedCache': 'processed_cache',
+    'get_processed_cache': 'processed_cache',
+}
 
 __all__ = [
     'Spectra', 'SpectraSubtraction', 'SpectraAverage',
     'SpectraContainer', 'SpectraContainerSubtraction', 'SpectraContainerAverage',
-    'load_xas_scans', 'create_xas_scan', 'find_similar_measurements',
-    'average_scans', 'average_polarised_scans', 'polarised_pairs', 'pair_scans',
-    'xray_edges_in_range', 'energy_range_edge_label',
+    'load_xas_scans', 'create_xas_scan', 'find_similar_measurements', 'iter_similar_measurements',
+    'average_scans', 'average_polarised_scans', 'polarised_pairs', 'iter_polarised_pairs', 'pair_scans',
+    'calculate_scans_sum_rules',
+    'xray_edges_in_range', 'energy_range_edge_label', 'energy_range_edge_labels',
+    'ProcessedCache', 'get_processed_cache',
     'XasMetadata'
 ]
+
+
+def __getattr__(name: str):
+    if name not in _LAZY_ATTRIBUTES:
+        raise AttributeError(f"module '{__name__}' has no attribute '{name}'")
+    value = getattr(importlib.import_module(f"{__name__}.{_LAZY_ATTRIBUTES[name]}"), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
@@ -1,21 +1,33 @@
 from __future__ import annotations
 
+import typing
+import logging
+import numpy as np
+
 from mmg_toolbox.utils.polarisation import opposite_polarisations, check_polarisation
-from mmg_toolbox.xas.spectra_container import SpectraContainer, SpectraContainerAverage
+from mmg_toolbox.xas import pairing
+from mmg_toolbox.xas.spectra import calculate_sum_rules_batch
+from mmg_toolbox.xas.spectra_container import SpectraContainer, SpectraContainerAverage, SpectraContainerSubtraction
+
+logger = logging.getLogger(__name__)
 
 
-def average_scans(*scans: SpectraContainer) -> SpectraContainerAverage:
+def average_scans(*scans: SpectraContainer, grid: str = 'min_step',
+                  weight_by_counts: bool = False) -> SpectraContainerAverage:
     """
     Average spectra within a set of scans
 
         av_scan = average_scans(scan1, scan2, scan3)
+        av_scan = average_scans(*scans, grid='median_step', weight_by_counts=True)
 
     Equivalent to: av_scan = sum([scan2, scan3], scan1)
 
     :param scans: list of SpectraContainer objects
+    :param grid: energy grid policy, 'min_step', 'median_step' or 'n_points'
+    :param weight_by_counts: if True, weight each scan by its monitor counts
     :return: SpectraContainer object containing averaged spectra
     """
-    return SpectraContainerAverage(*scans)
+    return SpectraContainerAverage(*scans, grid=grid, weight_by_counts=weight_by_counts)
 
 
 def average_polarised_scans(*scans: SpectraContainer) -> tuple[SpectraContainerAverage, SpectraContainerAverage | None]:
@@ -30,8 +42,9 @@ def average_polarised_scans(*scans: SpectraContainer) -> tuple[SpectraContainerA
     :return: pol1, (pol2|None) SpectraContainer objects for opposite polarisations
     """
     pols = opposite_polarisations(scans[0].metadata.pol, scans[0].metadata.pol_angle)
+    scan_pols = [check_polarisation(scan.metadata.pol) for scan in scans]
     pol_scans = [
-        [scan for scan in scans if check_polarisation(scan.metadata.pol) == pol]
+        [scan for scan, scan_pol in zip(scans, scan_pols) if scan_pol == pol]
         for pol in pols
     ]
 
@@ -52,42 +65,111 @@ def average_polarised_scans(*scans: SpectraContainer) -> tuple[SpectraContainerA
     return av_scans[0], av_scans[1]
 
 
-def polarised_pairs(*scans: SpectraContainer) -> list[tuple[SpectraContainer, SpectraContainer]]:
+def _report_unmatched(scans: tuple[SpectraContainer, ...], unmatched: list[int]):
+    if unmatched:
+        logger.warning(f"{len(unmatched)} scans could not be paired: {', '.join(scans[n].name for n in unmatched)}")
+
+
+def polarised_pairs(*scans: SpectraContainer, temp_tol: float = pairing.TEMP_TOL, field_tol: float = pairing.FIELD_TOL,
+                    energy_tol: float = pairing.ENERGY_TOL) -> list[tuple[SpectraContainer, SpectraContainer]]:
     """
     Find the polarisation pair of each spectra from the list of spectra
 
         [(pol1, pol2), (pol3, pol4)] = polarised_pairs(*scans)
 
+    Scans are paired with a scan of opposite polarisation with the same magnetic field, temperature and
+    energy range, within the tolerances, see pairing.polarisation_pairs. Unmatched scans are reported.
+
     :param scans: list of SpectraContainer objects
+    :param temp_tol: tolerance of temperatures, in K
+    :param field_tol: tolerance of magnetic fields, in T
+    :param energy_tol: tolerance of the minimum and maximum energy, in eV
     :return: list((pol1, pol2)) SpectraContainer objects for opposite polarisations
     """
-    pol1, pol2 = opposite_polarisations(scans[0].metadata.pol, scans[0].metadata.pol_angle)
-    pol1_scans, pol2_scans = [
-        [scan for scan in scans if check_polarisation(scan.metadata.pol) == pol]
-        for pol in (pol1, pol2)
-    ]
-    return list((p1, p2) for p1, p2 in zip(pol1_scans, pol2_scans))
+    pairs, unmatched = pairing.polarisation_pairs(
+        *(scan.metadata for scan in scans), temp_tol=temp_tol, field_tol=field_tol, energy_tol=energy_tol
+    )
+    _report_unmatched(scans, unmatched)
+    return [(scans[n], scans[m]) for n, m in pairs]
+
+
+def iter_polarised_pairs(scans: typing.Iterable[SpectraContainer], temp_tol: float = pairing.TEMP_TOL,
+                         field_tol: float = pairing.FIELD_TOL, energy_tol: float = pairing.ENERGY_TOL
+                         ) -> typing.Iterator[tuple[SpectraContainer, SpectraContainer]]:
+    """
+    Generator of polarisation pairs, yielding each pair as soon as both scans have been loaded
 
+        for pol1, pol2 in iter_polarised_pairs(iter_similar_measurements(*filenames)):
+            plot(pol1 - pol2)
 
-def pair_scans(*scans: SpectraContainer) -> list[tuple[SpectraContainer, SpectraContainer]]:
+    Scans are paired as in polarised_pairs, using the scans loaded so far. Pairs are yielded once,
+    scans already yielded in a pair are not paired again. Unmatched scans are reported once all
+    scans have been loaded.
+
+    :param scans: iterable of SpectraContainer objects, e.g. a generator loading each scan
+    :param temp_tol: tolerance of temperatures, in K
+    :param field_tol: tolerance of magnetic fields, in T
+    :param energy_tol: tolerance of the minimum and maximum energy, in eV
+    :return: generator of (pol1, pol2) SpectraContainer objects for opposite polarisations
+    """
+    loaded = []
+    paired = set()
+    for scan in scans:
+        loaded.append(scan)
+        pairs, _ = pairing.polarisation_pairs(
+            *(s.metadata for s in loaded), temp_tol=temp_tol, field_tol=field_tol, energy_tol=energy_tol
+        )
+        for n, m in pairs:
+            if n not in paired and m not in paired:
+                paired.update((n, m))
+                yield loaded[n], loaded[m]
+    _report_unmatched(tuple(loaded), [n for n in range(len(loaded)) if n not in paired])
+
+
+def pair_scans(*scans: SpectraContainer, temp_tol: float = pairing.TEMP_TOL, field_tol: float = pairing.FIELD_TOL,
+               energy_tol: float = pairing.ENERGY_TOL) -> list[tuple[SpectraContainer, SpectraContainer]]:
     """
     Find the polarisation pair of each spectra from the list of spectra
 
         [(pol1, pol2), (pol3, pol4)] = pair_scans(*scans)
 
     Scans are paired against their opposite polarisation or the opposite magnetic field,
-    whichever comes first.
+    whichever comes first, for scans with the same temperature and energy range within the tolerances,
+    see pairing.polarisation_or_field_pairs. Unmatched scans are reported.
 
     :param scans: list of SpectraContainer objects
+    :param temp_tol: tolerance of temperatures, in K
+    :param field_tol: tolerance of magnetic fields, in T
+    :param energy_tol: tolerance of the minimum and maximum energy, in eV
     :return: list((pol1, pol2)) SpectraContainer objects for opposite polarisations
     """
-    pairs: list[tuple[SpectraContainer, SpectraContainer]] = []
-    scans = list(scans)
-    for n, scan in enumerate(scans):
-        pol, op_pol = opposite_polarisations(scan.metadata.pol, scan.metadata.pol_angle)
-        field = scan.metadata.mag_field
-        for m, next_scan in enumerate(scans[n + 1:]):
-            if next_scan.metadata.pol == op_pol or abs(next_scan.metadata.mag_field + field) < 0.01:
-                pairs.append((scan, scans.pop(n + m + 1)))
-                break
-    return pairs
+    pairs, unmatched = pairing.polarisation_or_field_pairs(
+        *(scan.metadata for scan in scans), temp_tol=temp_tol, field_tol=field_tol, energy_tol=energy_tol
+    )
+    _report_unmatched(scans, unmatched)
+    return [(scans[n], scans[m]) for n, m in pairs]
+
+
+def calculate_scans_sum_rules(*scans: SpectraContainerSubtraction, n_holes: float | None = None,
+                              mode: str | None = None, split_energy: float | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate sum rules of a series of XMCD scans, e.g. a temperature or field series
+
+        xmcd_scans = [pol1 - pol2 for pol1, pol2 in pair_scans(*scans)]
+        orbital, spin = calculate_scans_sum_rules(*xmcd_scans)
+
+    Equivalent to: zip(*[scan.calculate_sum_rules(n_holes, mode, split_energy) for scan in scans])
+
+    :param scans: list of SpectraContainerSubtraction objects
+    :param n_holes: number of holes in absorbing ion, or None to use the element of each scan
+    :param mode: select which detection mode to use (None for default)
+    :param split_energy: energy half-way between two edges, or None to use the edges of each scan
+    :return: orbital[N], spin[N] sum rule values of each scan
+    """
+    for scan in scans:
+        scan.set_sum_rule_parameters(n_holes=n_holes, split_energy=split_energy)
+    return calculate_sum_rules_batch(
+        *(scan.spectra[mode or scan.metadata.default_mode] for scan in scans),
+        n_holes=[scan.n_holes for scan in scans],
+        split_energy=[scan.split_energy for scan in scans],
+    )
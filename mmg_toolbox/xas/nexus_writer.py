@@ -7,6 +7,7 @@ import numpy as np
 import h5py
 
 from mmg_toolbox.nexus import nexus_writer as nw
+from mmg_toolbox.utils.hdf_file_pool import close_hdf
 from . import spectra_analysis as spa
 from .spectra import Spectra
 from .spectra_container import SpectraContainer, SpectraContainerSubtraction
@@ -228,7 +229,8 @@ class XasNexusWriter:
         self.nx_processes(entry)
         self.nx_all_data(entry, self.scan.spectra)
 
-    def _nx_add_items(self, nexus: h5py.File):
+    def nx_add_items(self, nexus: h5py.File):
+        """Write the main entry and, for combined scans, the entries of the parent scans to an open file"""
         nw.add_entry_links(nexus, self.metadata.filename)
         if len(self.scan.parents) > 1:
             for parent in self.scan.parents:
@@ -237,6 +239,7 @@ class XasNexusWriter:
         self.nx_main_entry(nexus, 'processed' if self.scan.name in nexus else self.scan.name)
 
     def write_nexus(self, nexus_filename: str):
+        close_hdf(nexus_filename)
         with h5py.File(nexus_filename, 'w') as nxs:
-            self._nx_add_items(nxs)
+            self.nx_add_items(nxs)
         print(f'Created {nexus_filename}')
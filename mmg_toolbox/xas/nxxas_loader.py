@@ -2,17 +2,26 @@
 Functions to load data from i06-1 and i10-1 beamline XAS measurements
 """
 
+import typing
 import numpy as np
 import h5py
-import hdfmap
 import datetime
+from hdfmap import NexusMap
+from functools import partial
+from contextlib import contextmanager
+from concurrent.futures import Executor
 
 from mmg_toolbox.utils.file_functions import get_scan_number
+from mmg_toolbox.utils.hdf_file_pool import load_hdf
 from mmg_toolbox.utils.file_reader import read_dat_file
+from mmg_toolbox.utils.parallel import parallel_map, DEFAULT_WORKERS
 from mmg_toolbox.utils.polarisation import (get_polarisation, get_polarisation_angle,
                                             check_polarisation, opposite_polarisations,
                                             get_i16_polarisation_from_phaseplate_cmd)
-from mmg_toolbox.nexus.nexus_functions import nx_find, nx_find_all, nx_find_data
+from mmg_toolbox.nexus import nexus_names as nn
+from mmg_toolbox.nexus.nexus_functions import nx_find, nx_find_all, nx_find_data, bytes2str
+from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+from mmg_toolbox.nexus.image_reductions import mca_roi_sums
 from mmg_toolbox.beamline_metadata.hdfmap_generic import HdfMapXASMetadata as Md
 
 from .spectra_analysis import energy_range_edge_label, nearest_edge_label
@@ -21,24 +30,92 @@ from .spectra_container import SpectraContainer, SpectraContainerSubtraction
 from .metadata import XasMetadata
 
 
-def is_nxxas(filename: str) -> bool:
+VORTEX_DETECTORS = ('xmapMca', 'xsp3')
+
+
+@contextmanager
+def _open_hdf(filename: str | h5py.File) -> typing.Iterator[h5py.File]:
+    """Open the file for reading, or use the file object if already open (the file is not closed)"""
+    if isinstance(filename, h5py.File):
+        yield filename
+    else:
+        with load_hdf(filename) as hdf:
+            yield hdf
+
+
+def is_nxxas(filename: str | h5py.File) -> bool:
     """Return True if the NeXus file contains an entry or sub-entry with application definition NXxas"""
-    return bool(nx_find_data(hdfmap.load_hdf(filename), 'NXentry', 'definition') == 'NXxas')
+    with _open_hdf(filename) as hdf:
+        return bool(nx_find_data(hdf, 'NXentry', 'definition') == 'NXxas')
 
 
-def is_i16vortex(filename: str) -> bool:
+def is_i16vortex(filename: str | h5py.File) -> bool:
     """Return True if file is from i16 and uses the vortex detector"""
-    return bool(nx_find(hdfmap.load_hdf(filename), 'NXinstrument', ['xmapMca', 'xsp3']))
+    with _open_hdf(filename) as hdf:
+        return bool(nx_find(hdf, 'NXinstrument', list(VORTEX_DETECTORS)))
 
 
-def is_processed(filename: str) -> bool:
+def is_processed(filename: str | h5py.File) -> bool:
     """Return True if the NeXus file has been written by mmg_toolbox.xas"""
-    return bool(nx_find_data(hdfmap.load_hdf(filename), 'NXentry', 'NXprocess', 'program') == 'mmg_toolbox.xas')
+    with _open_hdf(filename) as hdf:
+        return bool(nx_find_data(hdf, 'NXentry', 'NXprocess', 'program') == 'mmg_toolbox.xas')
 
 
-def is_subtraction(filename: str) -> bool:
+def is_subtraction(filename: str | h5py.File) -> bool:
     """Return True if the NeXus file contains Spectra Subtraction like XMCD or XMLD"""
-    return bool(nx_find(hdfmap.load_hdf(filename), 'NXxas', 'sum_rules'))
+    with _open_hdf(filename) as hdf:
+        return bool(nx_find(hdf, 'NXxas', 'sum_rules'))
+
+
+def xas_file_type(hdf: h5py.File) -> str:
+    """
+    Return the type of XAS NeXus file, determined in a single pass through the groups in the file
+
+    Returns one of:
+        'i16vortex' - i16 file using the vortex detector, as is_i16vortex
+        'subtraction' - Spectra Subtraction like XMCD or XMLD, as is_subtraction
+        'nxxas' - entry with application definition NXxas, as is_nxxas
+        'nexus' - any other NeXus file
+
+    Only hard-linked objects are visited, so externally linked files are not opened.
+
+    :param hdf: open h5py.File
+    :return: file type str
+    """
+    found = {'definition': None, 'subtraction': False}
+
+    def visit(group: h5py.Group, in_instrument: bool, in_nxxas: bool) -> bool:
+        """Search group, returning True if a vortex detector is found"""
+        default = bytes2str(group.attrs.get(nn.NX_DEFAULT, ''))
+        for name in sorted(group, key=lambda n: n != default):  # @default first
+            if not isinstance(group.get(name, getlink=True), h5py.HardLink):
+                continue
+            if in_instrument and name in VORTEX_DETECTORS:
+                return True
+            if in_nxxas and name == 'sum_rules':
+                found['subtraction'] = True
+            obj = group[name]
+            if not isinstance(obj, h5py.Group):
+                continue
+            nx_class = bytes2str(obj.attrs.get(nn.NX_CLASS, ''))
+            definition = ''
+            if nx_class in nn.ENTRY_CLASSES and nn.NX_DEFINITION in obj:
+                definition = bytes2str(obj[nn.NX_DEFINITION][()])
+                if found['definition'] is None:
+                    found['definition'] = definition
+            is_instrument = in_instrument or nx_class == nn.NX_INST
+            is_nxxas = in_nxxas or 'NXxas' in (name, nx_class, definition)
+            if visit(obj, is_instrument, is_nxxas):
+                return True
+        return False
+
+    if visit(hdf, False, False):
+        return 'i16vortex'
+    if found['subtraction']:
+        return 'subtraction'
+    if found['definition'] == 'NXxas':
+        return 'nxxas'
+    return 'nexus'
 
 
 def create_xas_scan(name, energy: np.ndarray, monitor: np.ndarray, raw_signals: dict[str, np.ndarray],
@@ -318,19 +395,19 @@ def _load_from_nxxas(hdf: h5py.File | h5py.Group, sample_name=None, element_edge
     )
 
 
-def load_from_nxs(filename: str, sample_name=None, element_edge=None,
+def load_from_nxs(filename: str | h5py.File, sample_name=None, element_edge=None,
                   mode: str | list[str] = 'all') -> SpectraContainer | SpectraContainerSubtraction:
     """
     Load XAS Spectra from NeXus file with NXxas application Definition
 
     Parameters
-    :param filename: path to file
+    :param filename: path to file, or open h5py.File
     :param sample_name: sample name, e.g. 'sample1' or None to load from NeXus file
     :param element_edge: element edge, e.g. 'FeL3' or None to determine from energy range
     :param mode: detector values to load, 'all', 'default' or e.g. 'tey', 'tfy' as specified in file
     :return: SpectraContainer
     """
-    with h5py.File(filename, 'r') as hdf:
+    with _open_hdf(filename) as hdf:
         default = nx_find(hdf, 'NXxas')
         spectra = _load_from_nxxas(default, sample_name=sample_name, element_edge=element_edge, mode=mode)
         # Add non-default processed spectra as parents
@@ -347,13 +424,13 @@ def load_from_nxs(filename: str, sample_name=None, element_edge=None,
     return spectra
 
 
-def load_from_nxs_using_hdfmap(filename: str, sample_name: str | None = None,
+def load_from_nxs_using_hdfmap(filename: str | h5py.File, sample_name: str | None = None,
                                element_edge: str | None = None, mode: str | list[str] = 'all') -> SpectraContainer:
     """
     Load XAS Spectra from NeXus file with arbitrary application definition
 
     Parameters
-    :param filename: path to file
+    :param filename: path to file, or open h5py.File
     :param sample_name: sample name, e.g. 'sample1' or None to load from NeXus file
     :param element_edge: element edge, e.g. 'FeL3' or None to determine from energy range
     :param mode: detector values to load, 'all', 'default' or e.g. 'tey', 'tfy' as specified in file
@@ -362,10 +439,10 @@ def load_from_nxs_using_hdfmap(filename: str, sample_name: str | None = None,
     if isinstance(mode, str):
         mode = [mode]
 
-    with hdfmap.load_hdf(filename) as hdf:
+    with _open_hdf(filename) as hdf:
+        filename = hdf.filename
         # HdfMap creates data-path namespace
-        m = hdfmap.NexusMap()
-        m.populate(hdf)
+        m = create_nexus_map(hdf)
 
         # scan data
         scan_no = m.eval(hdf, 'entry_identifier', default=get_scan_number(filename))
@@ -419,13 +496,13 @@ def load_from_nxs_using_hdfmap(filename: str, sample_name: str | None = None,
     )
 
 
-def load_xmcd_from_processed_nxs(filename: str, mode: str | list[str] = 'all') -> SpectraContainerSubtraction:
+def load_xmcd_from_processed_nxs(filename: str | h5py.File, mode: str | list[str] = 'all') -> SpectraContainerSubtraction:
     """
     Load XMCD/XMLD Spectra from NeXus file saved by SpectraContainerSubtraction
     """
     spectra: SpectraContainerSubtraction = load_from_nxs(filename, mode=mode)
     # # Add raw files for each polarisation
-    # with hdfmap.load_hdf(filename) as hdf:
+    # with load_hdf(filename) as hdf:
     #     group = nx_find(hdf, 'sum_rules')
     #     if group:
     #         files1 = {scan_no: filename for scan_no, filename in group['raw_files1'].items()}
@@ -434,26 +511,46 @@ def load_xmcd_from_processed_nxs(filename: str, mode: str | list[str] = 'all') -
     #         spectra.metadata.raw_files2 = files2
     return spectra
 
-def load_from_i16_vortex(filename: str, sample_name: str | None = None,
-                         element_edge: str | None = None, mode: str | list[str] = 'all') -> SpectraContainer:
+
+def _mca_dataset(hdf: h5py.File, hdf_map: NexusMap) -> h5py.Dataset:
+    """Return the MCA dataset of the VorteX detector, or the default detector image dataset"""
+    detector = nx_find(hdf, 'NXinstrument', list(VORTEX_DETECTORS))
+    for dataset in [detector.get('data') if isinstance(detector, h5py.Group) else None,
+                    hdf.get(hdf_map.get_image_path())]:
+        if isinstance(dataset, h5py.Dataset) and dataset.ndim >= 2 and np.issubdtype(dataset.dtype, np.number):
+            return dataset
+    raise ValueError(f"{hdf.filename} contains no MCA spectra")
+
+
+def load_from_i16_vortex(filename: str | h5py.File, sample_name: str | None = None,
+                         element_edge: str | None = None, mode: str | list[str] = 'all',
+                         rois: dict[str, tuple[int, int]] | None = None, block_size: int | None = None,
+                         workers: int = 1) -> SpectraContainer:
     """
     Load XAS Spectra from NeXus file from I16 with a VorteX energy dispersion detector
 
     If the scan is in energy, the incident energy will be used. Otherwise, the detector spectrum will be returned.
 
-    :param filename: path to file
+    The MCA spectra are read in blocks of scan points, aligned to the HDF5 chunks, and summed in a single pass,
+    so memory does not depend on the length of the scan. In energy scans, rois adds a mode for each window
+    of MCA channels, e.g. rois={'pfy_fe': (630, 660)} (10 eV per channel).
+
+    :param filename: path to file, or open h5py.File
     :param sample_name: sample name, e.g. 'sample1' or None to load from NeXus file
     :param element_edge: element edge, e.g. 'FeL3' or None to determine from energy range
     :param mode: detector values to load, 'all', 'default' or e.g. 'tey', 'tfy' as specified in file
+    :param rois: {mode: (start, stop)} windows of MCA channels summed at each point of energy scans
+    :param block_size: number of scan points of MCA spectra read at once, None to align with HDF5 chunks
+    :param workers: number of worker processes used to sum the MCA spectra
     :return: SpectraContainer
     """
     if isinstance(mode, str):
         mode = [mode]
 
-    with hdfmap.load_hdf(filename) as hdf:
+    with _open_hdf(filename) as hdf:
+        filename = hdf.filename
         # HdfMap creates data-path namespace
-        m = hdfmap.NexusMap()
-        m.populate(hdf)
+        m = create_nexus_map(hdf)
 
         # scan data
         scan_no = m.eval(hdf, 'entry_identifier', default=get_scan_number(filename))
@@ -467,10 +564,12 @@ def load_from_i16_vortex(filename: str, sample_name: str | None = None,
             }
             if 'Window_1' in signal:  # Vortex energy scan with energy window
                 mode_spec['pfy'] = m.eval(hdf, 'Window_1')
+            if rois:
+                _, roi_sums = mca_roi_sums(_mca_dataset(hdf, m), rois, block_size, workers)
+                mode_spec.update(roi_sums)
         else:
             # vortex spectrum
-            volume = m.get_image(hdf, ())
-            spectrum = volume.sum(axis=tuple(range(volume.ndim-1)))
+            spectrum, _ = mca_roi_sums(_mca_dataset(hdf, m), block_size=block_size, workers=workers)
             monitor = np.mean(monitor) * np.ones_like(spectrum)
             energy = 10 * np.arange(len(spectrum))  # 10eV per channel
             mode_spec = {
@@ -529,6 +628,36 @@ def load_from_i16_vortex(filename: str, sample_name: str | None = None,
         element_edge=element_edge
     )
 
+def load_xas_scan(filename: str, sample_name: str | None = None, element_edge: str | None = None,
+                  mode: str | list[str] = 'all', dls_loader: bool = False) -> SpectraContainer:
+    """
+    Load XAS Spectra from a scan file
+
+    NeXus files are opened once, the type of file is determined using xas_file_type and the open
+    file is passed to the appropriate loader.
+
+    Parameters
+    :param filename: path to file, can be '*.dat' or '*.nxs'
+    :param sample_name: sample name, e.g. 'sample1' or None to load from NeXus file
+    :param element_edge: element edge, e.g. 'FeL3' or None to determine from energy range
+    :param mode: detector values to load, 'all', 'default' or e.g. 'tey', 'tfy' as specified in file
+    :param dls_loader: bool, if True uses explicit loading of metadata from DLS MMG beamlines
+    :return: SpectraContainer
+    """
+    if filename.endswith('.dat'):
+        return load_from_dat(filename, sample_name=sample_name, element_edge=element_edge, mode=mode)
+
+    with load_hdf(filename) as hdf:
+        file_type = xas_file_type(hdf)
+        if file_type == 'i16vortex':
+            return load_from_i16_vortex(hdf, sample_name=sample_name, element_edge=element_edge, mode=mode)
+        if file_type == 'subtraction':
+            return load_xmcd_from_processed_nxs(hdf, mode=mode)
+        if file_type == 'nxxas' and not dls_loader:
+            return load_from_nxs(hdf, sample_name=sample_name, element_edge=element_edge, mode=mode)
+        return load_from_nxs_using_hdfmap(hdf, sample_name=sample_name, element_edge=element_edge, mode=mode)
+
+
 def load_xas_scans(*filenames: str, sample_name: str | None = None, element_edge: str | None = None,
                    mode: str | list[str] = 'all', dls_loader: bool = False) -> list[SpectraContainer]:
     """
@@ -543,31 +672,76 @@ def load_xas_scans(*filenames: str, sample_name: str | None = None, element_edge
     :return: SpectraContainer
     """
     scans = [
-        load_from_dat(filename, sample_name=sample_name, element_edge=element_edge, mode=mode)
-        if filename.endswith('.dat')
-        else load_from_i16_vortex(filename, sample_name=sample_name, element_edge=element_edge, mode=mode)
-        if is_i16vortex(filename)
-        else load_xmcd_from_processed_nxs(filename, mode=mode)
-        if is_subtraction(filename)
-        else load_from_nxs(filename, sample_name=sample_name, element_edge=element_edge, mode=mode)
-        if not dls_loader and is_nxxas(filename)
-        else load_from_nxs_using_hdfmap(filename, sample_name=sample_name, element_edge=element_edge, mode=mode)
+        load_xas_scan(filename, sample_name=sample_name, element_edge=element_edge, mode=mode, dls_loader=dls_loader)
         for filename in filenames
     ]
     return scans
 
 
-def find_similar_measurements(*filenames: str, temp_tol: float = 1., field_tol: float = 0.1,
+def load_xas_metadata(filename: str, element_edge: str | None = None, dls_loader: bool = False) -> dict:
+    """
+    Load the metadata used to compare XAS measurements, without loading the spectra
+
+    Returns dict with keys 'element', 'edge', 'temp', 'mag_field', 'pol', matching the
+    values of SpectraContainer.metadata returned by load_xas_scans.
+    Only the energy and HdfMapXASMetadata fields are read. Files that are not raw NeXus files
+    (e.g. '.dat' files, processed or i16 vortex files) are loaded using load_xas_scan.
+
+    :param filename: path to file, can be '*.dat' or '*.nxs'
+    :param element_edge: element edge, e.g. 'FeL3' or None to determine from energy range
+    :param dls_loader: bool, if True uses explicit loading of metadata from DLS MMG beamlines
+    :return: {'element': str, 'edge': str, 'temp': float, 'mag_field': float, 'pol': str}
+    """
+    if not filename.endswith('.dat'):
+        with load_hdf(filename) as hdf:
+            file_type = xas_file_type(hdf)
+            if file_type == 'nxxas' and not dls_loader and not is_processed(hdf):
+                group = nx_find(hdf, 'NXxas')
+                energy = nx_find_data(group, 'NXxas', 'NXdata', ['axes', 'energy'])
+                temp = nx_find_data(group, 'NXsample', 'temperature', default=300)
+                mag_field = nx_find_data(group, 'NXsample', 'magnetic_field', default=0)
+                pol = get_polarisation(group)
+            elif file_type == 'nexus' or (file_type == 'nxxas' and dls_loader):
+                m = create_nexus_map(hdf)
+                energy = m.eval(hdf, Md.energy)
+                temp = m.eval(hdf, Md.temp)
+                mag_field = m.eval(hdf, Md.field_z)
+                pol = get_polarisation(hdf)
+            else:
+                energy = None
+        if energy is not None:
+            if element_edge is None:
+                element, edge = energy_range_edge_label(np.min(energy), np.max(energy))
+            else:
+                element, edge = element_edge.replace(', ', ',').split()
+            return {
+                'element': element,
+                'edge': edge,
+                'temp': float(np.mean(temp)),
+                'mag_field': float(np.mean(mag_field)),
+                'pol': pol,
+            }
+    m = load_xas_scan(filename, element_edge=element_edge, mode='all', dls_loader=dls_loader).metadata
+    return {'element': m.element, 'edge': m.edge, 'temp': m.temp, 'mag_field': m.mag_field, 'pol': m.pol}
+
+
+def iter_similar_measurements(*filenames: str, temp_tol: float = 1., field_tol: float = 0.1,
                               sample_name: str | None = None, element_edge: str | None = None,
-                              mode: str | list[str] = 'all', dls_loader: bool = False) -> list[SpectraContainer]:
+                              mode: str | list[str] = 'all', dls_loader: bool = False,
+                              workers: int = DEFAULT_WORKERS,
+                              executor: Executor | None = None) -> typing.Iterator[SpectraContainer]:
     """
-    Find similar measurements based on energy, temperature and field.
+    Generator of similar measurements based on energy, temperature and field, see find_similar_measurements.
 
-    Each measurement is compared to the first one in the list, using energy, temperature and field tolerances.
+    Measurements are found in two steps:
+        1. the metadata of all files is read in parallel threads, using load_xas_metadata
+        2. spectra are loaded and yielded for each matching file, in the order of filenames
 
-    The polarisation is also checked to be similar (lh, lv or cl, cr).
+        for scan in iter_similar_measurements(*filenames):
+            plot(scan)
 
-    Scans with different or missing metadata are removed from the list.
+    An existing executor can be passed to read the metadata, e.g. a process pool or the shared
+    thread pool from utils.parallel.get_thread_executor.
 
     :param filenames: List of filenames to compare
     :param temp_tol: Tolerance for temperature comparison (default: 0.1 K)
@@ -576,38 +750,72 @@ def find_similar_measurements(*filenames: str, temp_tol: float = 1., field_tol:
     :param element_edge: element edge, e.g. 'FeL3' or None to determine from energy range
     :param mode: detector values to load, 'all', 'default' or e.g. 'tey', 'tfy' as specified in file
     :param dls_loader: bool, if True uses explicit loading of metadata from DLS MMG beamlines
-    :return: List of similar measurements
+    :param workers: number of threads used to read metadata, if <= 1 files are read serially
+    :param executor: existing executor used to read metadata, instead of creating a thread pool
+    :return: generator of SpectraContainer
     """
     from mmg_toolbox.nexus.nexus_reader import find_matching_scans
-    ini_scan, = load_xas_scans(filenames[0], sample_name=sample_name, element_edge=element_edge,
-                              mode=mode, dls_loader=dls_loader)
+    ini = load_xas_metadata(filenames[0], element_edge=element_edge, dls_loader=dls_loader)
     if len(filenames) == 1:
         filenames = find_matching_scans(filenames[0])
-    element = ini_scan.metadata.element
-    edge = ini_scan.metadata.edge
-    temperature = ini_scan.metadata.temp
-    field_z = abs(ini_scan.metadata.mag_field)  # allow +/- field
-    pol = ini_scan.metadata.pol
-    similar_pols = opposite_polarisations(pol)
-
-    similar = []
-    for filename in filenames:
+    field_z = abs(ini['mag_field'])  # allow +/- field
+    similar_pols = opposite_polarisations(ini['pol'])
+
+    # Read metadata
+    read_metadata = partial(load_xas_metadata, element_edge=element_edge, dls_loader=dls_loader)
+    matches = []
+    for index, m, error in parallel_map(read_metadata, filenames, workers=workers, executor=executor):
+        if error:
+            print(f"Error loading {filenames[index]} as xas_scan: {error}")
+        elif (
+            m['element'] == ini['element'] and
+            m['edge'] == ini['edge'] and
+            abs(m['temp'] - ini['temp']) < temp_tol and
+            abs(abs(m['mag_field']) - field_z) < field_tol and
+            m['pol'] in similar_pols
+        ):
+            matches.append(filenames[index])
+        else:
+            print(f"Measurement {filenames[index]} is not similar to {filenames[0]}")
+
+    # Load spectra
+    for filename in matches:
         try:
-            scan, = load_xas_scans(filename, sample_name=sample_name, element_edge=element_edge,
-                                   mode=mode, dls_loader=dls_loader)
+            yield load_xas_scan(filename, sample_name=sample_name, element_edge=element_edge,
+                                mode=mode, dls_loader=dls_loader)
         except ValueError as ve:
             print(f"Error loading {filename} as xas_scan: {ve}")
-            continue
-        m = scan.metadata
-        if (
-            m.element == element and
-            m.edge == edge and
-            abs(m.temp - temperature) < temp_tol and
-            abs(abs(m.mag_field) - field_z) < field_tol and
-            m.pol in similar_pols
-        ):
-            similar.append(scan)
-        else:
-            print(f"Measurement {repr(scan)} is not similar to {repr(ini_scan)}")
-    return similar
 
+
+def find_similar_measurements(*filenames: str, temp_tol: float = 1., field_tol: float = 0.1,
+                              sample_name: str | None = None, element_edge: str | None = None,
+                              mode: str | list[str] = 'all', dls_loader: bool = False,
+                              workers: int = DEFAULT_WORKERS,
+                              executor: Executor | None = None) -> list[SpectraContainer]:
+    """
+    Find similar measurements based on energy, temperature and field.
+
+    Each measurement is compared to the first one in the list, using energy, temperature and field tolerances.
+
+    The polarisation is also checked to be similar (lh, lv or cl, cr).
+
+    Scans with different or missing metadata are removed from the list.
+
+    The metadata of each file is read in parallel before spectra are loaded for similar files,
+    see iter_similar_measurements.
+
+    :param filenames: List of filenames to compare
+    :param temp_tol: Tolerance for temperature comparison (default: 0.1 K)
+    :param field_tol: Tolerance for field comparison (default: 0.1 T)
+    :param sample_name: sample name, e.g. 'sample1' or None to load from NeXus file
+    :param element_edge: element edge, e.g. 'FeL3' or None to determine from energy range
+    :param mode: detector values to load, 'all', 'default' or e.g. 'tey', 'tfy' as specified in file
+    :param dls_loader: bool, if True uses explicit loading of metadata from DLS MMG beamlines
+    :param workers: number of threads used to read metadata, if <= 1 files are read serially
+    :param executor: existing executor used to read metadata, instead of creating a thread pool
+    :return: List of similar measurements
+    """
+    return list(iter_similar_measurements(
+        *filenames, temp_tol=temp_tol, field_tol=field_tol, sample_name=sample_name,
+        element_edge=element_edge, mode=mode, dls_loader=dls_loader, workers=workers, executor=executor
+    ))
@@ -0,0 +1,169 @@
+"""
+Pairing of XAS scans by polarisation and magnetic field
+
+Scans are matched using the metadata of each scan. Numeric values (temperature, field, energy range)
+are sorted and grouped into clusters, where values within the tolerance of the first value of a cluster share it.
+Scans are then bucketed by the cluster of each value, the element, edge and polarisation type, and only
+scans in the same bucket are compared, so a large collection of scans is paired in O(n log n) time.
+
+    pairs, unmatched = polarisation_pairs(*(scan.metadata for scan in scans), temp_tol=1, field_tol=0.01)
+    pol1_scan, pol2_scan = scans[pairs[0][0]], scans[pairs[0][1]]
+
+    pairs, unmatched = polarisation_or_field_pairs(*(scan.metadata for scan in scans))
+"""
+
+from collections import deque
+
+import numpy as np
+
+from mmg_toolbox.utils.polarisation import opposite_polarisations
+from mmg_toolbox.xas.metadata import XasMetadata
+
+TEMP_TOL = 1.  # K
+FIELD_TOL = 0.01  # T
+ENERGY_TOL = 1.  # eV
+
+
+def cluster_values(values: list[float] | np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Return the cluster index of each value. Values are sorted and each cluster contains the values within
+    tolerance of its first (smallest) value, so a ramp of small steps is split rather than chained into
+    a single cluster. NaN values are given cluster -1.
+
+        cluster_values([1, 5, 1.1, 5.05, 3], 0.2) -> [0, 2, 0, 2, 1]
+        cluster_values([0, 0.1, 0.2, 0.3, 0.4], 0.15) -> [0, 0, 1, 1, 2]
+    """
+    values = np.asarray(values, dtype=float)
+    clusters = np.full(len(values), -1, dtype=int)
+    cluster, start = -1, np.nan
+    for n in np.argsort(values, kind='stable'):
+        if np.isnan(values[n]):
+            break  # NaN values are sorted last
+        if cluster < 0 or values[n] - start > tolerance:
+            cluster, start = cluster + 1, values[n]
+        clusters[n] = cluster
+    return clusters
+
+
+def _polarisations(metadata: tuple[XasMetadata, ...]) -> tuple[list[str], list[str]]:
+    """Return regularised polarisation and opposite polarisation of each scan"""
+    unique = {}
+    pols = []
+    for m in metadata:
+        key = (m.pol, m.pol_angle)
+        if key not in unique:
+            unique[key] = opposite_polarisations(*key)
+        pols.append(unique[key])
+    return [p[0] for p in pols], [p[1] for p in pols]
+
+
+def _bucket_keys(metadata: tuple[XasMetadata, ...], pol: list[str], op_pol: list[str], field: np.ndarray,
+                 temp_tol: float, field_tol: float, energy_tol: float) -> list[tuple]:
+    """Return a key for each scan, with cluster indices of temperature, field and energy range"""
+    temp = cluster_values([m.temp for m in metadata], temp_tol)
+    field = cluster_values(field, field_tol)
+    # energy range from the first and last energy of each scan
+    energy_range = np.sort(np.reshape([(m.energy[0], m.energy[-1]) for m in metadata], (-1, 2)), axis=1)
+    energy_min = cluster_values(energy_range[:, 0], energy_tol)
+    energy_max = cluster_values(energy_range[:, 1], energy_tol)
+    return [
+        (m.element, m.edge, tuple(sorted((p, op))), t, f, e1, e2)
+        for m, p, op, t, f, e1, e2 in zip(metadata, pol, op_pol, temp, field, energy_min, energy_max)
+    ]
+
+
+def _buckets(keys: list[tuple]) -> list[list[int]]:
+    """Return lists of scan indices with the same key, in the order of the first scan of each bucket"""
+    buckets: dict[tuple, list[int]] = {}
+    for n, key in enumerate(keys):
+        buckets.setdefault(key, []).append(n)
+    return list(buckets.values())
+
+
+def _unmatched(n_scans: int, pairs: list[tuple[int, int]]) -> list[int]:
+    matched = {n for pair in pairs for n in pair}
+    return [n for n in range(n_scans) if n not in matched]
+
+
+def polarisation_pairs(*metadata: XasMetadata, temp_tol: float = TEMP_TOL, field_tol: float = FIELD_TOL,
+                       energy_tol: float = ENERGY_TOL) -> tuple[list[tuple[int, int]], list[int]]:
+    """
+    Pair scans with opposite polarisation, the same magnetic field, temperature and energy range
+
+    Within each bucket of similar scans, scans of each polarisation are paired in order. The first
+    index of each pair has the polarisation of the first scan of that type of polarisation (circular or linear).
+    Arbitrary linear polarisations are paired in order.
+
+    :param metadata: XasMetadata of each scan
+    :param temp_tol: tolerance of temperatures, in K
+    :param field_tol: tolerance of magnetic fields, in T
+    :param energy_tol: tolerance of the minimum and maximum energy, in eV
+    :return: [(index1, index2), ...], [unmatched indices]
+    """
+    pol, op_pol = _polarisations(metadata)
+    field = np.array([m.mag_field for m in metadata], dtype=float)
+    keys = _bucket_keys(metadata, pol, op_pol, field, temp_tol, field_tol, energy_tol)
+    # the first polarisation of each type defines the order of each pair
+    first_pol = {}
+    for p, op in zip(pol, op_pol):
+        first_pol.setdefault(tuple(sorted((p, op))), p)
+
+    pairs = []
+    for bucket in _buckets(keys):
+        pol1 = first_pol[keys[bucket[0]][2]]
+        pol1_scans = [n for n in bucket if pol[n] == pol1]
+        pol2_scans = [n for n in bucket if pol[n] != pol1]
+        if op_pol[bucket[0]] == pol[bucket[0]]:
+            # arbitrary linear polarisation, opposite polarisation is the same
+            pol1_scans, pol2_scans = bucket[::2], bucket[1::2]
+        pairs.extend(zip(pol1_scans, pol2_scans))
+    pairs.sort()
+    return pairs, _unmatched(len(metadata), pairs)
+
+
+def polarisation_or_field_pairs(*metadata: XasMetadata, temp_tol: float = TEMP_TOL, field_tol: float = FIELD_TOL,
+                                energy_tol: float = ENERGY_TOL) -> tuple[list[tuple[int, int]], list[int]]:
+    """
+    Pair scans with opposite polarisation or opposite magnetic field, with the same temperature and energy range
+
+    Each scan, in order, is paired with the next unpaired similar scan that has the opposite polarisation
+    and the same field, or the same polarisation and the opposite (non-zero) field, whichever comes first.
+    Within each bucket of similar scans, the next scan is found from a queue of scans for each polarisation
+    and field direction.
+
+    :param metadata: XasMetadata of each scan
+    :param temp_tol: tolerance of temperatures, in K
+    :param field_tol: tolerance of magnetic fields, in T
+    :param energy_tol: tolerance of the minimum and maximum energy, in eV
+    :return: [(index1, index2), ...], [unmatched indices]
+    """
+    pol, op_pol = _polarisations(metadata)
+    field = np.array([m.mag_field for m in metadata], dtype=float)
+    keys = _bucket_keys(metadata, pol, op_pol, abs(field), temp_tol, field_tol, energy_tol)
+    sign = np.where(abs(field) < field_tol, 0, np.sign(field)).astype(int)
+
+    pairs = []
+    for bucket in _buckets(keys):
+        queues: dict[tuple[str, int], deque[int]] = {}
+        for n in bucket:
+            queues.setdefault((pol[n], int(sign[n])), deque()).append(n)
+        matched = set()
+        for n in bucket:
+            if n in matched:
+                continue
+            candidates = []
+            for (p, s), queue in queues.items():
+                opposite_pol = p == op_pol[n] and s == sign[n]
+                opposite_field = p == pol[n] and s == -sign[n] != 0
+                if not (opposite_pol or opposite_field):
+                    continue
+                while queue and (queue[0] <= n or queue[0] in matched):
+                    queue.popleft()
+                if queue:
+                    candidates.append(queue[0])
+            if candidates:
+                m = min(candidates)
+                matched.update((n, m))
+                pairs.append((n, m))
+    pairs.sort()
+    return pairs, _unmatched(len(metadata), pairs)
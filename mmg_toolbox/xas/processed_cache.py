@@ -0,0 +1,327 @@
+"""
+On-disk cache of processed XAS scans
+
+Loading scans and repeating the same processing chain (background, normalisation, averaging, subtraction)
+each time a notebook, script or the XMCD visualiser starts is slow. ProcessedCache stores each processed
+SpectraContainer as a NeXus file, written with the NXxas writer, in a cache directory of the current user.
+Results are stored by a key made from the path, modified time and size of the input files and a hash of the
+processing parameters, so a changed file or parameter only recomputes the scans it affects. Keys include the
+mmg_toolbox version and CACHE_VERSION, so results of older versions are not used:
+
+    cache = get_processed_cache()
+    steps = [('divide_by_preedge', (), {'ev_from_start': 5}), ('remove_background', ('flat',))]
+    scans = cache.process_scans(*files, steps=steps)  # loads and processes each file, or reads cached results
+    pol1, pol2 = polarised_pairs(*scans)
+    av1 = cache.apply(average_scans, *pol1)  # cached average of cached scans
+    av2 = cache.apply(average_scans, *pol2)
+    xmcd = cache.apply(SpectraContainerSubtraction, av1, av2)
+    print(cache)  # ProcessedCache('~/.cache/mmg_toolbox/xas_processed', hits=5, misses=0)
+
+Cached results are read back as processed SpectraContainers, with the name, metadata and spectra of the
+original result but without the intermediate parent containers, in the same way as processed NeXus files.
+Subtractions are restored from their two parent containers, so the sum rules are available.
+
+The cache files are standard processed NXxas files and can be opened with load_xas_scans.
+Old results are not removed automatically, use cache.clear() to remove all cached files.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import typing
+
+import h5py
+import numpy as np
+
+from mmg_toolbox import __version__
+from mmg_toolbox.utils.env_functions import get_cache_directory
+from .metadata import XasMetadata
+from .spectra import Spectra
+from .spectra_container import SpectraContainer, SpectraContainerSubtraction
+
+CACHE_VERSION = 2  # increment when the format of cache files or keys changes
+CACHE_FOLDER = 'xas_processed'  # folder in the user cache directory
+CACHE_ATTRIBUTE = 'mmg_toolbox_cache'  # root attribute of cache files, JSON description of cached containers
+METADATA_ARRAYS = ('energy', 'monitor', 'raw_signals')
+
+_processed_cache: 'ProcessedCache | None' = None
+logger = logging.getLogger(__name__)
+
+Step = tuple[str, tuple] | tuple[str, tuple, dict]
+
+
+def _json_value(value: typing.Any) -> typing.Any:
+    """Convert numpy values to builtin types for json, other objects are described by repr"""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    return repr(value)
+
+
+def _parameter_value(value: typing.Any) -> typing.Any:
+    """Convert numpy values to builtin types for json, raises TypeError for objects without a stable value"""
+    if isinstance(value, (np.ndarray, np.generic)):
+        return value.tolist()
+    raise TypeError(f"Processing parameter of type {type(value).__name__} can't be hashed: {value!r}")
+
+
+def hash_parameters(*parameters: typing.Any) -> str:
+    """
+    Return sha256 hash of processing parameters
+
+    Parameters can be str, int, float, bool, None, numpy arrays and values, and lists, tuples and dicts of these.
+    Other objects raise TypeError, as their repr can change between processes (e.g. memory addresses).
+    """
+    text = json.dumps(parameters, default=_parameter_value, sort_keys=True)
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def file_states(*filenames: str) -> list[tuple[str, int, int]]:
+    """Return (absolute path, modified time, size) of each file, used to detect changed files"""
+    states = []
+    for filename in filenames:
+        stat = os.stat(filename)
+        states.append((os.path.abspath(filename), stat.st_mtime_ns, stat.st_size))
+    return states
+
+
+def _check_steps(steps: typing.Iterable[Step]) -> list[tuple[str, tuple, dict]]:
+    """Return steps as (method, args, kwargs)"""
+    return [(step[0], tuple(step[1]), dict(step[2]) if len(step) > 2 else {}) for step in steps]
+
+
+def _metadata_description(metadata: XasMetadata) -> dict:
+    """Return json compatible dict of the scalar metadata"""
+    return json.loads(json.dumps(
+        {name: value for name, value in vars(metadata).items() if name not in METADATA_ARRAYS},
+        default=_json_value
+    ))
+
+
+def _container_description(scan: SpectraContainer, entry: str) -> dict:
+    """Return json compatible description of SpectraContainer, stored in the cache file"""
+    return {
+        'entry': entry,
+        'name': scan.name,
+        'count': getattr(scan, 'count', 1),
+        'labels': {mode: spectra.label for mode, spectra in scan.spectra.items()},
+        'raw_signals': list(scan.metadata.raw_signals),
+        'metadata': _metadata_description(scan.metadata),
+    }
+
+
+def _read_container(hdf: h5py.File, description: dict) -> SpectraContainer:
+    """Read SpectraContainer from the main entry of a processed NeXus file using known paths"""
+    entry = hdf[description['entry']]
+    instrument = entry['instrument']
+    spectra = {}
+    for mode, label in description['labels'].items():
+        data = entry[mode]
+        spectra[mode] = Spectra(
+            energy=data['energy'][()],
+            signal=data['absorbed_beam'][()],
+            background=data['background'][()] if 'background' in data else None,
+            label=label,
+            mode=mode,
+            process_label='processed',
+            process=mode
+        )
+    names = [name for name in description['metadata'] if hasattr(XasMetadata, name)]
+    metadata = XasMetadata(
+        **{name: description['metadata'][name] for name in names},
+        energy=instrument['mono/energy'][()],
+        monitor=instrument['incoming_beam/data'][()],
+        raw_signals={name: instrument[f"{name}/data"][()] for name in description['raw_signals']},
+    )
+    for name, value in description['metadata'].items():
+        if name not in names:
+            setattr(metadata, name, value)  # e.g. raw_files1 of subtractions
+    container = SpectraContainer(description['name'], spectra, metadata=metadata)
+    if description['count'] > 1:
+        # cached averages are averaged again weighted by the number of scans, see provenance.py
+        container.count = description['count']
+        for spectra in container.spectra.values():
+            spectra.count = description['count']
+    return container
+
+
+class ProcessedCache:
+    """
+    On-disk cache of processed SpectraContainers, stored as NeXus files by key
+
+    :param directory: cache directory, created if it doesn't exist, None for default_cache_directory()
+    :param enabled: if False, results are always computed and nothing is written
+    """
+    def __init__(self, directory: str | None = None, enabled: bool = True):
+        self.directory = os.path.abspath(directory or default_cache_directory())
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f"ProcessedCache('{self.directory}', hits={self.hits}, misses={self.misses})"
+
+    def __len__(self):
+        return len(self.cache_files())
+
+    def filename(self, key: str) -> str:
+        """Return cache filename of key"""
+        return os.path.join(self.directory, f"{key}.nxs")
+
+    def cache_files(self) -> list[str]:
+        """Return list of cached files"""
+        if not os.path.isdir(self.directory):
+            return []
+        return [os.path.join(self.directory, f) for f in os.listdir(self.directory) if f.endswith('.nxs')]
+
+    def clear(self):
+        """Remove all cached files"""
+        for filename in self.cache_files():
+            os.remove(filename)
+
+    def stats(self) -> dict[str, int]:
+        """Return dict of cache statistics"""
+        return {'files': len(self), 'hits': self.hits, 'misses': self.misses}
+
+    def key(self, *parameters: typing.Any) -> str:
+        """Return key of a result from its parameters, the cache format and the mmg_toolbox version"""
+        return hash_parameters(CACHE_VERSION, __version__, *parameters)
+
+    def file_key(self, filenames: typing.Iterable[str], *parameters: typing.Any) -> str:
+        """Return key of a result computed from files, changes if any file is modified"""
+        return self.key(file_states(*filenames), *parameters)
+
+    def load(self, key: str) -> SpectraContainer | None:
+        """Return cached SpectraContainer, or None if key is not in the cache"""
+        filename = self.filename(key)
+        if not self.enabled or not os.path.isfile(filename):
+            return None
+        try:
+            with h5py.File(filename, 'r') as hdf:
+                description = json.loads(hdf.attrs[CACHE_ATTRIBUTE])
+                containers = [_read_container(hdf, d) for d in description['containers']]
+        except (OSError, KeyError, ValueError) as error:
+            logger.warning("Ignoring unreadable cache file %s: %s", filename, error)
+            return None
+        if description['type'] == 'subtraction':
+            scan = SpectraContainerSubtraction(*containers[:2])
+        else:
+            scan = containers[-1]
+        scan.cache_key = key
+        return scan
+
+    def save(self, key: str, scan: SpectraContainer):
+        """Write SpectraContainer to the cache, as a processed NeXus file"""
+        from .nexus_writer import XasNexusWriter
+
+        if not self.enabled:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        filename = self.filename(key)
+        tmp_filename = f"{filename}.{os.getpid()}.tmp"
+        writer = XasNexusWriter(scan)
+        # the main entry is called 'processed' if the name is used by a parent, see XasNexusWriter
+        containers = list(scan.parents) if len(scan.parents) > 1 else []
+        entries = [parent.name for parent in containers]
+        entries.append('processed' if scan.name in entries else scan.name)
+        description = {
+            'type': 'subtraction' if isinstance(scan, SpectraContainerSubtraction) else 'container',
+            'containers': [
+                _container_description(container, entry)
+                for container, entry in zip(containers + [scan], entries)
+            ]
+        }
+        try:
+            with h5py.File(tmp_filename, 'w') as nxs:
+                writer.nx_add_items(nxs)
+                nxs.attrs[CACHE_ATTRIBUTE] = json.dumps(description)
+            os.replace(tmp_filename, filename)  # other processes never read partial files
+        except (OSError, KeyError, TypeError, ValueError) as error:
+            logger.warning("Unable to write cache file %s: %s", filename, error)
+            if os.path.isfile(tmp_filename):
+                os.remove(tmp_filename)
+            return
+        scan.cache_key = key
+
+    def cached(self, key: str, function: typing.Callable[..., SpectraContainer],
+               *args, **kwargs) -> SpectraContainer:
+        """Return cached result of key, or compute function(*args, **kwargs) and store it"""
+        scan = self.load(key)
+        if scan is not None:
+            self.hits += 1
+            return scan
+        self.misses += 1
+        scan = function(*args, **kwargs)
+        self.save(key, scan)
+        return scan
+
+    def process_scan(self, filename: str, steps: typing.Iterable[Step] = (), sample_name: str | None = None,
+                     element_edge: str | None = None, mode: str | list[str] = 'all',
+                     dls_loader: bool = False) -> SpectraContainer:
+        """
+        Load and process a scan file, or read the cached result
+
+        :param filename: path to file, can be '*.dat' or '*.nxs'
+        :param steps: list of (method, args) or (method, args, kwargs) of SpectraContainer processing methods
+        :param sample_name: sample name, e.g. 'sample1' or None to load from NeXus file
+        :param element_edge: element edge, e.g. 'FeL3' or None to determine from energy range
+        :param mode: detector values to load, 'all', 'default' or e.g. 'tey', 'tfy' as specified in file
+        :param dls_loader: bool, if True uses explicit loading of metadata from DLS MMG beamlines
+        :return: processed SpectraContainer
+        """
+        steps = _check_steps(steps)
+        load_kwargs = dict(sample_name=sample_name, element_edge=element_edge, mode=mode, dls_loader=dls_loader)
+        key = self.file_key([filename], 'load_xas_scan', load_kwargs, steps)
+        return self.cached(key, _load_and_process, filename, steps, **load_kwargs)
+
+    def process_scans(self, *filenames: str, steps: typing.Iterable[Step] = (), sample_name: str | None = None,
+                      element_edge: str | None = None, mode: str | list[str] = 'all',
+                      dls_loader: bool = False) -> list[SpectraContainer]:
+        """
+        Load and process scan files, or read cached results, see process_scan
+
+        Each file is cached separately, so only new or modified files are processed.
+        """
+        steps = _check_steps(steps)
+        return [
+            self.process_scan(filename, steps, sample_name=sample_name, element_edge=element_edge,
+                              mode=mode, dls_loader=dls_loader)
+            for filename in filenames
+        ]
+
+    def apply(self, function: typing.Callable[..., SpectraContainer], *scans: SpectraContainer,
+              **kwargs) -> SpectraContainer:
+        """
+        Return cached result of function(*scans, **kwargs), e.g. average_scans or SpectraContainerSubtraction
+
+        The key is made from the keys of the scans, so results are only cached if all scans were returned by
+        this cache. The function must return a single SpectraContainer.
+        """
+        keys = [getattr(scan, 'cache_key', None) for scan in scans]
+        if None in keys:
+            return function(*scans, **kwargs)
+        key = self.key(f"{function.__module__}.{function.__qualname__}", keys, kwargs)
+        return self.cached(key, function, *scans, **kwargs)
+
+
+def _load_and_process(filename: str, steps: list[tuple[str, tuple, dict]], **load_kwargs) -> SpectraContainer:
+    """Load scan and apply processing steps"""
+    from .nxxas_loader import load_xas_scan
+
+    scan = load_xas_scan(filename, **load_kwargs)
+    for method, args, kwargs in steps:
+        scan = getattr(scan, method)(*args, **kwargs)
+    return scan
+
+
+def default_cache_directory() -> str:
+    """Return the default cache directory, in the cache directory of the current user"""
+    return os.path.join(get_cache_directory(), CACHE_FOLDER)
+
+
+def get_processed_cache() -> ProcessedCache:
+    """Return the cache of processed scans for this process, in default_cache_directory()"""
+    global _processed_cache
+    if _processed_cache is None:
+        _processed_cache = ProcessedCache()
+    return _processed_cache
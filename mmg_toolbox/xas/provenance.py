@@ -0,0 +1,98 @@
+"""
+Provenance of processed spectra
+
+Each Spectra records the processing step that created it as a ProcessStep (operation, label, mode,
+parameters and the identifiers of its inputs), and keeps the steps of all its parents in Spectra.history.
+The history is small (no arrays), so a processed Spectra can describe how it was made without keeping
+the energy and signal arrays of every intermediate step.
+
+By default, parent Spectra and SpectraContainers are also kept, so that plot_parents, analysis_steps
+and write_nexus include every intermediate step. With set_keep_parents(False), new objects only keep
+weak references to their parents, and memory is proportional to the final outputs:
+
+    set_keep_parents(False)
+    scans = [scan.divide_by_preedge().remove_background('flat') for scan in load_xas_scans(*files)]
+    average = average_scans(*scans)
+    del scans  # intermediate spectra are released, average.parents is now empty
+    for step in average.spectra['tey'].history:
+        print(step)
+
+Averages that have lost their parents are averaged again weighted by the number of spectra they contain.
+Subtractions always keep their parents, as the average of the parents is used by the sum rules.
+"""
+
+import itertools
+import typing
+import weakref
+
+# keep strong references to parent objects in new Spectra and SpectraContainers
+KEEP_PARENTS = True
+
+_step_index = itertools.count(1)
+
+
+def set_keep_parents(keep: bool) -> bool:
+    """Set whether new Spectra and SpectraContainers keep their parents, returns previous value"""
+    global KEEP_PARENTS
+    previous, KEEP_PARENTS = KEEP_PARENTS, keep
+    return previous
+
+
+class ProcessStep:
+    """
+    Record of a single processing step
+
+    :param operation: process label, e.g. 'divide_by_preedge'
+    :param label: label of the output spectra
+    :param mode: detector mode of the output spectra
+    :param parameters: dict of process parameters
+    :param inputs: identifiers of the input steps
+    """
+    def __init__(self, operation: str, label: str = '', mode: str = '', parameters: dict | None = None,
+                 inputs: tuple[str, ...] = ()):
+        self.identifier = f"{operation}#{next(_step_index)}"
+        self.operation = operation
+        self.label = label
+        self.mode = mode
+        self.parameters = parameters or {}
+        self.inputs = inputs
+
+    def __repr__(self):
+        return f"ProcessStep('{self.identifier}', '{self.label}', '{self.mode}', inputs={list(self.inputs)})"
+
+    def __str__(self):
+        parameters = ', '.join(f"{name}={value}" for name, value in self.parameters.items())
+        inputs = ', '.join(self.inputs)
+        return f"{self.identifier}: {self.label} {self.mode} {self.operation}({parameters}) <- [{inputs}]"
+
+
+def merge_history(parents: typing.Iterable, step: ProcessStep) -> tuple[ProcessStep, ...]:
+    """Return the history of all parents, without repeated steps, followed by step"""
+    steps = dict.fromkeys(s for parent in parents for s in getattr(parent, 'history', ()))
+    return (*steps, step)
+
+
+class ParentReferences:
+    """
+    References to parent objects, strong or weak
+
+    :param parents: list or tuple of parent objects
+    :param keep: if True, keep strong references, if False, weak references, None to use KEEP_PARENTS
+    """
+    def __init__(self, parents: list | tuple, keep: bool | None = None):
+        self.keep = KEEP_PARENTS if keep is None else keep
+        self._type = type(parents)
+        self._parents = parents if self.keep else [weakref.ref(parent) for parent in parents]
+
+    def __getstate__(self):
+        # weak references are not sent with pickled objects
+        return {'parents': self.get() if self.keep else self._type(), 'keep': self.keep}
+
+    def __setstate__(self, state: dict):
+        self.__init__(**state)
+
+    def get(self) -> list | tuple:
+        """Return the parent objects that still exist"""
+        if self.keep:
+            return self._parents
+        return self._type(parent for ref in self._parents if (parent := ref()) is not None)
@@ -19,6 +19,7 @@ import h5py
 
 from mmg_toolbox.nexus import nexus_writer as nw
 from mmg_toolbox.xas import spectra_analysis as spa
+from mmg_toolbox.xas.provenance import ProcessStep, ParentReferences, merge_history
 
 
 # Build database of spectra functions from spectra_analysis.py
@@ -40,6 +41,8 @@ BACKGROUND_FUNCTIONS = {
     'double_edge_step': spa.fit_double_edge_step_background,  # l3_energy, l2_energy, peak_width_ev
     'poly_edges': spa.fit_spectra_background, # *step_energies, peak_width_ev
     'exp_edges': spa.fit_spectra_exp_background, # *step_energies, peak_width_ev
+    'poly_fixed_edges': spa.fit_fixed_edges_background,  # *step_energies, peak_width_ev, step_width, degree
+    'double_edge_fixed': spa.fit_double_edge_fixed_background,  # l3_energy, l2_energy, peak_width_ev, step_width
 }
 BACKGROUND_DOCSTRINGS = {
     # name: next(iter(fn.__doc__.splitlines()), 'background function') for name, fn in BACKGROUND_FUNCTIONS.items()
@@ -48,6 +51,94 @@ BACKGROUND_DOCSTRINGS = {
 }
 
 
+"""PROCESS DESCRIPTIONS - shared by Spectra and SpectraStack, returns (process_label, process, parameters)"""
+
+
+def _trim_indices(energy: np.ndarray, ev_from_start: float = 5.,
+                  ev_from_end: float | None = None) -> tuple[float, float, int, int]:
+    """Return energies and indices of trimmed energy range"""
+    en1 = float(energy[0] + ev_from_start)
+    en2 = float(energy[-1] - (ev_from_end or 0))
+    index1 = int(np.argmin(np.abs(energy - en1)))
+    index2 = int(np.argmin(np.abs(energy - en2)))
+    return en1, en2, index1, index2
+
+
+def _trim_process(en1: float, en2: float, index1: int, index2: int,
+                  ev_from_start: float, ev_from_end: float | None) -> tuple[str, str, dict]:
+    process = f"trip spectra between {en1:.2f} and {en2:.2f} eV\n"
+    process += f"Spectra.energy = energy[{index1}:{index2}]\n"
+    process += f"Spectra.signal = signal[{index1}:{index2}]\n"
+    parameters = {'ev_from_start': ev_from_start, 'ev_from_end': ev_from_end}
+    return "trim", process, parameters
+
+
+def _signal_at_energy_process(value: float, energy1: float, energy2: float | None) -> tuple[str, str, dict]:
+    process = f"normalise  to signal at energy between {energy1:.0f} and {energy2} eV\n"
+    process += f"energy1 = {energy1}\n"
+    process += f"energy2 = {energy2}\n"
+    process += f"Spectra.signal_at_energy(energy1, energy2) = {value:.3f}\n"
+    process += f"Spectra.signal = signal / {value:.3f}"
+    parameters = {'energy1': energy1, 'energy2': energy2}
+    return "divide_by_signal_at_energy", process, parameters
+
+
+def _preedge_process(value: float, ev_from_start: float) -> tuple[str, str, dict]:
+    process = f"normalise signal to signal in the pre-edge region in first {ev_from_start} eV\n"
+    process += f"mean(Spectra.signal[:{ev_from_start}]) = {value:.3f}\n"
+    process += f"Spectra.signal = signal / {value:.3f}"
+    parameters = {'ev_from_start': ev_from_start}
+    return 'divide_by_preedge', process, parameters
+
+
+def _postedge_process(value: float, ev_from_end: float) -> tuple[str, str, dict]:
+    process = f"normalise signal to signal in the post-edge region in last {ev_from_end} eV\n"
+    process += f"mean(Spectra.signal[:{ev_from_end} eV]) = {value:.3f}\n"
+    process += f"Spectra.signal = signal / {value:.3f}"
+    parameters = {'ev_from_end': ev_from_end}
+    return 'divide_by_postedge', process, parameters
+
+
+def _peak_process(peak: float) -> tuple[str, str, dict]:
+    process = f"normalise signal to the maximum peak height\n"
+    process += f"max(Spectra.signal) = {peak:.3f}\n"
+    process += f"Spectra.signal = signal / {peak:.3f}"
+    return 'norm_to_peak', process, {}
+
+
+def _jump_process(jump: float, ev_from_start: float, ev_from_end: float | None) -> tuple[str, str, dict]:
+    process = f"normalise signal to the jump in signal between start and end of spectra\n"
+    process += f"ev_from_start = {ev_from_start}\n"
+    process += f"ev_from_end = {ev_from_end}\n"
+    process += f"jump(Spectra.signal) = {jump:.3f}\n"
+    process += f"Spectra.signal = signal / {jump:.3f}"
+    parameters = {'ev_from_start': ev_from_start, 'ev_from_end': ev_from_end}
+    return 'norm_to_jump', process, parameters
+
+
+def _divide_background_process(name: str, bkg: np.ndarray, fit_report: str,
+                               args: tuple, kwargs: dict) -> tuple[str, str, dict]:
+    process = f"Background normalisation '{name}', using function: \n {BACKGROUND_FUNCTIONS[name].__name__}: {BACKGROUND_DOCSTRINGS[name]}\n"
+    process += f"args: {str(args)}\n"
+    process += f"kwargs: {str(kwargs)}\n"
+    process += f"\nFit Report:\n{fit_report}\n"
+    process += f"\nResults:\n <bkg> = {np.mean(bkg):.3f}{bkg.shape}\nsignal = signal / bkg\n"
+    parameters = {'name': name} | kwargs
+    return f"{name}", process, parameters
+
+
+def _remove_background_process(name: str, bkg: np.ndarray, norm: float, fit_report: str,
+                               args: tuple, kwargs: dict) -> tuple[str, str, dict]:
+    process = f"Background removal '{name}', using function: \n {BACKGROUND_FUNCTIONS[name].__name__}: {BACKGROUND_DOCSTRINGS[name]}\n"
+    process += f"args: {str(args)}\n"
+    process += f"kwargs: {str(kwargs)}\n"
+    process += f"\nFit Report:\n{fit_report}\n"
+    process += f"\nResults:\n <bkg> = {np.mean(bkg):.3f}\n  norm = {norm:.3f}\nsignal = (signal - bkg) / norm\n"
+    parameters = {'name': name} | kwargs
+    return f"{name}", process, parameters
+
+
+
 class Spectra:
     """
     An energy spectra, containing:
@@ -60,7 +151,12 @@ class Spectra:
     :param process_label: str label of the process
     :param process: str describing a process done to the spectra
     :param parameters: dict including any process parameters used
+
+    The processing step is recorded in Spectra.step and the steps of all parents in Spectra.history,
+    parents are kept unless provenance.set_keep_parents(False) is used, see provenance.py
     """
+    keep_parents: bool | None = None  # None to use provenance.KEEP_PARENTS
+
     def __init__(self, energy: np.ndarray, signal: np.ndarray,
                  background: np.ndarray | None = None,
                  parents: list['Spectra'] | None = None, label: str = '',
@@ -68,6 +164,9 @@ class Spectra:
         if parents is None:
             parents = []
         self.parents = parents
+        self.step = ProcessStep(process_label, label, mode, parameters,
+                                inputs=tuple(p.step.identifier for p in parents if hasattr(p, 'step')))
+        self.history = merge_history(parents, self.step)
         self.energy = energy
         self.signal = signal
         if energy.shape != signal.shape:
@@ -83,6 +182,15 @@ class Spectra:
 
     """SPECTRA PROPERTIES"""
 
+    @property
+    def parents(self) -> list[Spectra]:
+        """Parent Spectra, omitting parents that no longer exist if only weak references are kept"""
+        return self._parents.get()
+
+    @parents.setter
+    def parents(self, parents: list[Spectra]):
+        self._parents = ParentReferences(parents, self.keep_parents)
+
     def __repr__(self):
         return f"Spectra('{self.label}', '{self.mode}', energy=array{self.energy.shape}, signal=array{self.signal.shape}, process_label='{self.process_label}')"
 
@@ -138,107 +246,58 @@ class Spectra:
                        parents=[self], process_label='subtract_value', process=f'{self.mode}-{other}',
                        parameters={'value': other})
 
+    def _divide(self, value: float, process_label: str, process: str, parameters: dict | None = None) -> Spectra:
+        """Return new Spectra with signal and background divided by value"""
+        sig = self.signal / value
+        bkg = self.background / value if self.background is not None else None
+        return Spectra(self.energy, sig, parents=[self], background=bkg, label=self.label,
+                       process_label=process_label, process=process, mode=self.mode, parameters=parameters)
+
     def trim(self, ev_from_start=5., ev_from_end=None) -> Spectra:
         """Trim spectra between energies"""
-        en1 = float(self.energy[0] + ev_from_start)
-        en2 = float(self.energy[-1] - (ev_from_end or 0))
-        index1 = self.energy_index(en1)
-        index2 = self.energy_index(en2)
+        en1, en2, index1, index2 = _trim_indices(self.energy, ev_from_start, ev_from_end)
         s = slice(index1, index2 + 1)
         en = self.energy[s]
         sig = self.signal[s]
         bkg = self.background[s] if self.background is not None else None
-        proc_label = "trim"
-        process = f"trip spectra between {en1:.2f} and {en2:.2f} eV\n"
-        process += f"Spectra.energy = energy[{index1}:{index2}]\n"
-        process += f"Spectra.signal = signal[{index1}:{index2}]\n"
-        parameters = {'ev_from_start': ev_from_start, 'ev_from_end': ev_from_end}
+        proc_label, process, parameters = _trim_process(en1, en2, index1, index2, ev_from_start, ev_from_end)
         return Spectra(en, sig, parents=[self], background=bkg, label=self.label,
                        process_label=proc_label, process=process, mode=self.mode, parameters=parameters)
 
     def divide_by_signal_at_energy(self, energy1: float, energy2: float | None = None) -> Spectra:
         """Divide spectra by signal"""
         value = self.signal_at_energy(energy1, energy2)
-        sig = self.signal / value
-        bkg = self.background / value if self.background is not None else None
-        proc_label = "divide_by_signal_at_energy"
-        process = f"normalise  to signal at energy between {energy1:.0f} and {energy2} eV\n"
-        process += f"energy1 = {energy1}\n"
-        process += f"energy2 = {energy2}\n"
-        process += f"Spectra.signal_at_energy(energy1, energy2) = {value:.3f}\n"
-        process += f"Spectra.signal = signal / {value:.3f}"
-        parameters = {'energy1': energy1, 'energy2': energy2}
-        return Spectra(self.energy, sig, parents=[self], background=bkg, label=self.label,
-                       process_label=proc_label, process=process, mode=self.mode, parameters=parameters)
+        return self._divide(value, *_signal_at_energy_process(value, energy1, energy2))
 
     def divide_by_preedge(self, ev_from_start: float = 5) -> Spectra:
         """Divide by average of raw_signals at start"""
         value = spa.preedge_signal(self.energy, self.signal, ev_from_start)
-        sig = self.signal / value
-        bkg = self.background / value if self.background is not None else None
-        proc_label = 'divide_by_preedge'
-        process = f"normalise signal to signal in the pre-edge region in first {ev_from_start} eV\n"
-        process += f"mean(Spectra.signal[:{ev_from_start}]) = {value:.3f}\n"
-        process += f"Spectra.signal = signal / {value:.3f}"
-        parameters = {'ev_from_start': ev_from_start}
-        return Spectra(self.energy, sig, parents=[self], background=bkg, label=self.label,
-                       process_label=proc_label, process=process, mode=self.mode, parameters=parameters)
+        return self._divide(value, *_preedge_process(value, ev_from_start))
 
     def divide_by_postedge(self, ev_from_end: float = 5) -> Spectra:
         """Divide by average of raw_signals at end"""
         value = spa.postedge_signal(self.energy, self.signal, ev_from_end)
-        sig = self.signal / value
-        bkg = self.background / value if self.background is not None else None
-        proc_label = 'divide_by_postedge'
-        process = f"normalise signal to signal in the post-edge region in last {ev_from_end} eV\n"
-        process += f"mean(Spectra.signal[:{ev_from_end} eV]) = {value:.3f}\n"
-        process += f"Spectra.signal = signal / {value:.3f}"
-        parameters = {'ev_from_end': ev_from_end}
-        return Spectra(self.energy, sig, parents=[self], background=bkg, label=self.label,
-                       process_label=proc_label, process=process, mode=self.mode, parameters=parameters)
+        return self._divide(value, *_postedge_process(value, ev_from_end))
 
     def divide_by_peak(self) -> Spectra:
         """Divide by peak height [max(abs(signal))]"""
         peak = self.signal_peak()
-        sig = self.signal / peak
-        bkg = self.background / peak if self.background is not None else None
-        proc_label = 'norm_to_peak'
-        process = f"normalise signal to the maximum peak height\n"
-        process += f"max(Spectra.signal) = {peak:.3f}\n"
-        process += f"Spectra.signal = signal / {peak:.3f}"
-        return Spectra(self.energy, sig, parents=[self], background=bkg, label=self.label,
-                       process_label=proc_label, process=process, mode=self.mode)
+        return self._divide(peak, *_peak_process(peak))
 
     def divide_by_jump(self, ev_from_start=5., ev_from_end=None) -> Spectra:
         """Divide by the jump between start and end of spectra"""
         jump = abs(self.signal_jump(ev_from_start, ev_from_end))
-        sig = self.signal / jump
-        bkg = self.background / jump if self.background is not None else None
-        proc_label = 'norm_to_jump'
-        process = f"normalise signal to the jump in signal between start and end of spectra\n"
-        process += f"ev_from_start = {ev_from_start}\n"
-        process += f"ev_from_end = {ev_from_end}\n"
-        process += f"jump(Spectra.signal) = {jump:.3f}\n"
-        process += f"Spectra.signal = signal / {jump:.3f}"
-        parameters = {'ev_from_start': ev_from_start, 'ev_from_end': ev_from_end}
-        return Spectra(self.energy, sig, parents=[self], background=bkg, label=self.label,
-                       process_label=proc_label, process=process, mode=self.mode, parameters=parameters)
+        return self._divide(jump, *_jump_process(jump, ev_from_start, ev_from_end))
 
     def divide_by_background(self, name='flat', *args, **kwargs) -> Spectra:
         """
         Return new Spectra object with signal divided by a particular background
         """
         bkg_fun = BACKGROUND_FUNCTIONS[name]
-        bkg_doc = BACKGROUND_DOCSTRINGS[name]
         bkg, norm, fit = bkg_fun(self.energy, self.signal, *args, **kwargs)
         sig = self.signal / bkg
-        proc_label = f"{name}"
-        process = f"Background normalisation '{name}', using function: \n {bkg_fun.__name__}: {bkg_doc}\n"
-        process += f"args: {str(args)}\n"
-        process += f"kwargs: {str(kwargs)}\n"
-        process += f"\nFit Report:\n{fit.fit_report() if fit is not None else 'None'}\n"
-        process += f"\nResults:\n <bkg> = {np.mean(bkg):.3f}{bkg.shape}\nsignal = signal / bkg\n"
-        parameters = {'name': name} | kwargs
+        fit_report = fit.fit_report() if fit is not None else 'None'
+        proc_label, process, parameters = _divide_background_process(name, bkg, fit_report, args, kwargs)
         return Spectra(self.energy, sig, parents=[self], background=bkg, label=self.label,
                        process_label=proc_label, process=process, mode=self.mode, parameters=parameters)
     divide_by_background.__doc__ += (
@@ -251,16 +310,10 @@ class Spectra:
         Return new Spectra object with background removed
         """
         bkg_fun = BACKGROUND_FUNCTIONS[name]
-        bkg_doc = BACKGROUND_DOCSTRINGS[name]
         bkg, norm, fit = bkg_fun(self.energy, self.signal, *args, **kwargs)
         sig = (self.signal - bkg) / norm
-        proc_label = f"{name}"
-        process = f"Background removal '{name}', using function: \n {bkg_fun.__name__}: {bkg_doc}\n"
-        process += f"args: {str(args)}\n"
-        process += f"kwargs: {str(kwargs)}\n"
-        process += f"\nFit Report:\n{fit.fit_report() if fit is not None else 'None'}\n"
-        process += f"\nResults:\n <bkg> = {np.mean(bkg):.3f}\n  norm = {norm:.3f}\nsignal = (signal - bkg) / norm\n"
-        parameters = {'name': name} | kwargs
+        fit_report = fit.fit_report() if fit is not None else 'None'
+        proc_label, process, parameters = _remove_background_process(name, bkg, norm, fit_report, args, kwargs)
         return Spectra(self.energy, sig, parents=[self], background=bkg, label=self.label,
                        process_label=proc_label, process=process, mode=self.mode, parameters=parameters)
     remove_background.__doc__ += (
@@ -405,6 +458,7 @@ class Spectra:
 
 class SpectraSubtraction(Spectra):
     """Difference between two spectra"""
+    keep_parents = True  # parents are used by the sum rules
 
     def __init__(self, spectra1: Spectra, spectra2: Spectra):
         if spectra1.mode != spectra2.mode:
@@ -450,6 +504,20 @@ class SpectraSubtraction(Spectra):
             edges = expand_edges
         return sum(edges.values()) / len(edges)
 
+    def _sum_rules_arrays(self, split_energy: float | None = None, edges: dict[str, float] | None = None
+                          ) -> tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+        """Return energy, average, difference, split_energy used by the sum rules"""
+        energy = self.energy
+        difference = self.signal
+        average = self.average_subtracted_spectra().signal
+        if len(average) != len(energy):
+            min_len = min(len(average), len(energy))
+            average = average[:min_len]
+            energy = energy[:min_len]
+            difference = difference[:min_len]
+        split = split_energy or self.get_split_energy(edges)
+        return energy, average, difference, split
+
     def calculate_sum_rules(self, n_holes: float, split_energy: float | None = None,
                             edges: dict[str, float] | None = None) -> tuple[float, float]:
         """
@@ -463,15 +531,7 @@ class SpectraSubtraction(Spectra):
         :param edges: dictionary of edges
         :returns: (orbital, spin) sum rule values
         """
-        energy = self.energy
-        difference = self.signal
-        average = self.average_subtracted_spectra().signal
-        if len(average) != len(energy):
-            min_len = min(len(average), len(energy))
-            average = average[:min_len]
-            energy = energy[:min_len]
-            difference = difference[:min_len]
-        split = split_energy or self.get_split_energy(edges)
+        energy, average, difference, split = self._sum_rules_arrays(split_energy, edges)
         orb = spa.orbital_angular_momentum(energy, average, difference, n_holes)
         spin = spa.spin_angular_momentum(energy, average, difference, n_holes, split_energy=split)
         return orb, spin
@@ -545,21 +605,76 @@ class SpectraSubtraction(Spectra):
         return note
 
 
+def calculate_sum_rules_batch(*spectra: SpectraSubtraction, n_holes: float | list[float],
+                              split_energy: float | list[float] | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate sum rules of many XMCD spectra, e.g. a temperature or field series
+
+        orb, spin = calculate_sum_rules_batch(*xmcd_spectra, n_holes=4)
+
+    Spectra on the same energy grid are integrated together using spectra_analysis.sum_rules_batch,
+    giving the same values as spectra.calculate_sum_rules(n_holes, split_energy) for each spectra.
+
+    :param spectra: SpectraSubtraction objects
+    :param n_holes: number of holes in absorbing ion, or list for each spectra
+    :param split_energy: energy half-way between two edges, list for each spectra or None to use the edges
+    :returns: orbital[N], spin[N] sum rule values of each spectra
+    """
+    n_holes = np.broadcast_to(np.asarray(n_holes, dtype=float), len(spectra))
+    split_energy = [None] * len(spectra) if split_energy is None else np.broadcast_to(split_energy, len(spectra))
+    arrays = [s._sum_rules_arrays(split) for s, split in zip(spectra, split_energy)]
+    # group spectra by energy grid
+    groups: dict[bytes, list[int]] = {}
+    for n, (energy, average, difference, split) in enumerate(arrays):
+        groups.setdefault(energy.tobytes(), []).append(n)
+    orbital = np.zeros(len(spectra))
+    spin = np.zeros(len(spectra))
+    for index in groups.values():
+        energy = arrays[index[0]][0]
+        orbital[index], spin[index] = spa.sum_rules_batch(
+            energy=energy,
+            average=np.array([arrays[n][1] for n in index]),
+            difference=np.array([arrays[n][2] for n in index]),
+            n_holes=n_holes[index],
+            split_energy=np.array([arrays[n][3] for n in index], dtype=float),
+        )
+    return orbital, spin
+
+
 class SpectraAverage(Spectra):
-    """Averaged Spectra"""
-    def __init__(self, *spectra: Spectra):
+    """
+    Averaged Spectra, including the standard error of the average
+
+    :param spectra: Spectra objects to average, averaged Spectra are expanded into their parents
+    :param energy: energy array to interpolate spectra at, or None to use average_energy_scans
+    :param grid: grid policy of average_energy_scans, one of spectra_analysis.GRID_POLICIES
+    :param weights: weight of each Spectra, e.g. monitor counts, or None for equal weights
+    """
+    def __init__(self, *spectra: Spectra, energy: np.ndarray | None = None, grid: str = 'min_step',
+                 weights: list[float] | None = None):
         mode = next(iter(s.mode for s in spectra if s.mode is not None), '')
         process_label = 'average'
+        weights = [1.0] * len(spectra) if weights is None else weights
+        weights = [w for s, w in zip(spectra, weights) if s.mode == mode]
         spectra = [s for s in spectra if s.mode == mode]
         # avoid average of average by using parents of previously averaged spectra
         parents = []
-        for s in spectra:
-            if len(s.parents) > 1:
-                parents += s.parents
+        parent_weights = []
+        for s, weight in zip(spectra, weights):
+            s_parents = s.parents
+            # averages that have lost parents (see provenance.py) are weighted by the number of averaged spectra
+            parent_count = sum(getattr(p, 'count', 1) for p in s_parents)
+            if len(s_parents) > 1 and parent_count == getattr(s, 'count', parent_count):
+                parents += s_parents
+                parent_weights += [weight] * len(s_parents)
             else:
                 parents.append(s)
-        av_energy = spa.average_energy_scans(*(s.energy for s in parents))
-        av_signal = spa.average_energy_spectra(av_energy, *((s.energy, s.signal) for s in parents))
+                parent_weights.append(weight * getattr(s, 'count', 1))
+        self.count = sum(getattr(s, 'count', 1) for s in parents)
+        av_energy = spa.average_energy_scans(*(s.energy for s in parents), grid=grid) if energy is None else energy
+        av_signal, self.error = spa.average_energy_spectra_error(
+            av_energy, *((s.energy, s.signal) for s in parents), weights=parent_weights
+        )
         if all(s.background is None for s in parents):
             av_bkg = None
         else:
@@ -577,3 +692,148 @@ class SpectraAverage(Spectra):
             f"process_label='{self.process_label}')"
         )
 
+
+
+class SpectraStack:
+    """
+    Spectra of several modes on a shared energy axis, stored as 2D arrays
+
+    Processing steps run on all modes at once and return a new SpectraStack, including
+    a Spectra object for each mode, with signals that are views of the stacked arrays and
+    the same process and parents as if the step was applied to each Spectra.
+
+        stack = SpectraStack.from_spectra({'tey': tey_spectra, 'tfy': tfy_spectra})
+        stack = stack.process('trim', 5).process('divide_by_preedge', 5)
+        stack.spectra['tey']  # Spectra, signal is stack.signals[0]
+
+    :param energy: n-length array
+    :param signals: (modes, n) array
+    :param backgrounds: (modes, n) array (*or None)
+    :param spectra: {mode: Spectra} with signals matching each row of signals
+    """
+    BACKGROUNDS = ('flat', 'norm', 'linear', 'curve', 'poly_fixed_edges', 'double_edge_fixed')
+
+    def __init__(self, energy: np.ndarray, signals: np.ndarray, backgrounds: np.ndarray | None,
+                 spectra: dict[str, Spectra]):
+        self.energy = energy
+        self.signals = signals
+        self.backgrounds = backgrounds
+        self.spectra = spectra
+
+    def __repr__(self):
+        return f"SpectraStack({list(self.spectra)}, energy=array{self.energy.shape}, signals=array{self.signals.shape})"
+
+    @classmethod
+    def from_spectra(cls, spectra: dict[str, Spectra]) -> SpectraStack | None:
+        """Return SpectraStack of spectra, or None if the spectra don't share an energy axis"""
+        first = next(iter(spectra.values()))
+        energy = first.energy
+        if any(s.energy is not energy and not np.array_equal(s.energy, energy) for s in spectra.values()):
+            return None
+        has_background = [s.background is not None for s in spectra.values()]
+        if any(has_background) and not all(has_background):
+            return None
+        signals = np.array([s.signal for s in spectra.values()], dtype=float)
+        backgrounds = np.array([s.background for s in spectra.values()], dtype=float) if all(has_background) else None
+        return cls(energy, signals, backgrounds, spectra)
+
+    def _new(self, energy: np.ndarray, signals: np.ndarray, backgrounds: np.ndarray | None,
+             processes: list[tuple[str, str, dict]]) -> SpectraStack:
+        """Create new SpectraStack with Spectra views of each row, one process description per mode"""
+        spectra = {
+            mode: Spectra(energy, signals[n], parents=[parent],
+                          background=backgrounds[n] if backgrounds is not None else None,
+                          label=parent.label, mode=parent.mode, process_label=process_label,
+                          process=process, parameters=parameters)
+            for n, ((mode, parent), (process_label, process, parameters)) in enumerate(zip(self.spectra.items(),
+                                                                                          processes))
+        }
+        return SpectraStack(energy, signals, backgrounds, spectra)
+
+    def _divide(self, values: np.ndarray, process_function, *args) -> SpectraStack:
+        signals = self.signals / values[:, np.newaxis]
+        backgrounds = self.backgrounds / values[:, np.newaxis] if self.backgrounds is not None else None
+        processes = [process_function(float(value), *args) for value in values]
+        return self._new(self.energy, signals, backgrounds, processes)
+
+    def _preedge(self, ev_from_start: float) -> np.ndarray:
+        return np.mean(self.signals[:, self.energy < np.min(self.energy) + ev_from_start], axis=1)
+
+    def _postedge(self, ev_from_end: float) -> np.ndarray:
+        return np.mean(self.signals[:, self.energy > np.max(self.energy) - ev_from_end], axis=1)
+
+    def trim(self, ev_from_start=5., ev_from_end=None) -> SpectraStack:
+        """Trim spectra between energies"""
+        en1, en2, index1, index2 = _trim_indices(self.energy, ev_from_start, ev_from_end)
+        s = slice(index1, index2 + 1)
+        backgrounds = self.backgrounds[:, s] if self.backgrounds is not None else None
+        process = _trim_process(en1, en2, index1, index2, ev_from_start, ev_from_end)
+        return self._new(self.energy[s], self.signals[:, s], backgrounds, [process] * len(self.spectra))
+
+    def divide_by_signal_at_energy(self, energy1: float, energy2: float | None = None) -> SpectraStack:
+        """Divide spectra by signal"""
+        idx1 = int(np.argmin(np.abs(self.energy - energy1)))
+        idx2 = idx1 + 1 if energy2 is None else int(np.argmin(np.abs(self.energy - energy2)))
+        values = np.mean(self.signals[:, idx1:idx2], axis=1)
+        return self._divide(values, _signal_at_energy_process, energy1, energy2)
+
+    def divide_by_preedge(self, ev_from_start: float = 5) -> SpectraStack:
+        """Divide by average of raw_signals at start"""
+        return self._divide(self._preedge(ev_from_start), _preedge_process, ev_from_start)
+
+    def divide_by_postedge(self, ev_from_end: float = 5) -> SpectraStack:
+        """Divide by average of raw_signals at end"""
+        return self._divide(self._postedge(ev_from_end), _postedge_process, ev_from_end)
+
+    def divide_by_peak(self) -> SpectraStack:
+        """Divide by peak height [max(abs(signal))]"""
+        return self._divide(np.max(abs(self.signals), axis=1), _peak_process)
+
+    def divide_by_jump(self, ev_from_start=5., ev_from_end=None) -> SpectraStack:
+        """Divide by the jump between start and end of spectra"""
+        jump = abs(self._postedge(ev_from_end or ev_from_start) - self._preedge(ev_from_start))
+        return self._divide(jump, _jump_process, ev_from_start, ev_from_end)
+
+    def _background(self, name: str, *args, **kwargs) -> tuple[np.ndarray, np.ndarray, list[str]]:
+        """Return backgrounds, norms and fit reports of all modes, see spectra_analysis.fit_background_batch"""
+        backgrounds, norms, fits = spa.fit_background_batch(self.energy, self.signals, name, *args, **kwargs)
+        reports = [fit.fit_report() if fit is not None else 'None' for fit in fits]
+        return backgrounds, norms, reports
+
+    def remove_background(self, name='flat', *args, **kwargs) -> SpectraStack:
+        """Return new SpectraStack with background removed, for backgrounds in SpectraStack.BACKGROUNDS"""
+        backgrounds, norms, reports = self._background(name, *args, **kwargs)
+        signals = (self.signals - backgrounds) / norms[:, np.newaxis]
+        processes = [
+            _remove_background_process(name, bkg, float(norm), report, args, kwargs)
+            for bkg, norm, report in zip(backgrounds, norms, reports)
+        ]
+        return self._new(self.energy, signals, backgrounds, processes)
+
+    def divide_by_background(self, name='flat', *args, **kwargs) -> SpectraStack:
+        """Return new SpectraStack with signal divided by background, for backgrounds in SpectraStack.BACKGROUNDS"""
+        backgrounds, norms, reports = self._background(name, *args, **kwargs)
+        signals = self.signals / backgrounds
+        processes = [
+            _divide_background_process(name, bkg, report, args, kwargs)
+            for bkg, report in zip(backgrounds, reports)
+        ]
+        return self._new(self.energy, signals, backgrounds, processes)
+
+    def process(self, method: str, *args, **kwargs) -> SpectraStack | None:
+        """
+        Apply processing method to all modes, returns None if the method can't be applied to the stack
+
+        :param method: name of Spectra method, e.g. 'trim', 'divide_by_preedge', 'remove_background'
+        :param args: positional arguments of method
+        :param kwargs: keyword arguments of method
+        :return: processed SpectraStack or None
+        """
+        if method in ('remove_background', 'divide_by_background'):
+            name = args[0] if args else kwargs.get('name', 'flat')
+            if name not in self.BACKGROUNDS:
+                return None
+        elif method not in ('trim', 'divide_by_signal_at_energy', 'divide_by_preedge', 'divide_by_postedge',
+                            'divide_by_peak', 'divide_by_jump'):
+            return None
+        return getattr(self, method)(*args, **kwargs)
@@ -3,6 +3,7 @@ Set of functions for analysing x-ray absorption spectra
 """
 
 import json
+from inspect import signature
 
 import os
 import re
@@ -73,15 +74,108 @@ def single_element_label(*edge_labels: str) -> tuple[str, str]:
     return element, ', '.join(edges)
 
 
+class XrayEdgeDatabase:
+    """
+    X-ray absorption edge energies, read once from EDGE_FILE
+
+    Edge energies are held in arrays sorted by energy for each edge family ('K', 'L3', 'L2', ...),
+    and for each combination of edges searched, so range queries use a binary search and many
+    energies can be labelled in one call.
+
+        db = get_edge_database()
+        {label: energy} = db.in_range(770, 800, ('L3', 'L2'))
+        labels = db.nearest([708, 778, 853], ('L3', 'L2'))  # ['Fe L3', 'Co L3', 'Ni L3']
+
+    :param edge_file: json file of edges, {label: {'element': str, 'edge': str, 'energy': float, ...}}
+    """
+    def __init__(self, edge_file: str = EDGE_FILE):
+        self.edge_file = edge_file
+        with open(edge_file, 'r') as infile:
+            self.edges: dict[str, dict] = json.load(infile)
+        self.energies = {label: edge['energy'] for label, edge in self.edges.items()}
+        # arrays in file order, used to build sorted arrays for each combination of edges
+        self._labels = np.array(list(self.energies.keys()))
+        self._energies = np.array(list(self.energies.values()), dtype=float)
+        self._edge_names = np.array([edge['edge'] for edge in self.edges.values()])
+        self._sorted: dict[tuple[str, ...] | None, tuple[np.ndarray, np.ndarray]] = {}
+        families = dict.fromkeys(edge['edge'] for edge in self.edges.values())
+        self.families = {family: self.sorted_edges([family]) for family in families}
+
+    def __repr__(self):
+        return f"XrayEdgeDatabase(edges={len(self.edges)}, families={list(self.families)})"
+
+    def sorted_edges(self, edges: list[str] | None = SEARCH_EDGES) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return arrays of edge energies and labels, sorted by energy
+        :param edges: if not None, only return energies for these edges, e.g. ('L3', 'L2')
+        :return: energies[ndarray], labels[ndarray]
+        """
+        key = tuple(edges) if edges else None
+        if key not in self._sorted:
+            if key is None:
+                energies, labels = self._energies, self._labels
+            else:
+                mask = np.isin(self._edge_names, key)
+                energies, labels = self._energies[mask], self._labels[mask]
+            idx = np.argsort(energies)
+            self._sorted[key] = energies[idx], labels[idx]
+        return self._sorted[key]
+
+    def edge_energies(self, edges: list[str] | None = SEARCH_EDGES) -> dict[str, float]:
+        """Return {label: energy} of edges, in file order"""
+        if not edges:
+            return dict(self.energies)
+        return {label: energy for label, energy in self.energies.items() if self.edges[label]['edge'] in edges}
+
+    def range_indices(self, min_energy_ev: float | np.ndarray, max_energy_ev: float | np.ndarray,
+                      edges: list[str] | None = SEARCH_EDGES) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Return the start and stop indices of edges with min_energy_ev < energy < max_energy_ev
+        in the arrays returned by sorted_edges(edges), for one or many ranges
+        """
+        energies, labels = self.sorted_edges(edges)
+        start = np.searchsorted(energies, min_energy_ev, side='right')
+        stop = np.searchsorted(energies, max_energy_ev, side='left')
+        return start, np.maximum(start, stop)
+
+    def in_range(self, min_energy_ev: float, max_energy_ev: float,
+                 edges: list[str] | None = SEARCH_EDGES) -> dict[str, float]:
+        """Return {label: energy} of edges with min_energy_ev < energy < max_energy_ev, sorted by energy"""
+        energies, labels = self.sorted_edges(edges)
+        start, stop = self.range_indices(min_energy_ev, max_energy_ev, edges)
+        return {str(label): float(energy) for label, energy in zip(labels[start:stop], energies[start:stop])}
+
+    def nearest(self, energy_ev: float | np.ndarray, edges: list[str] | None = None) -> np.ndarray:
+        """
+        Return the labels of the edges nearest each energy
+        :param energy_ev: energy or array of energies in eV
+        :param edges: if not None, only search these edges, e.g. ('L3', 'L2')
+        :return: array of labels, the same shape as energy_ev
+        """
+        energies, labels = self.sorted_edges(edges)
+        energy_ev = np.asarray(energy_ev, dtype=float)
+        right = np.clip(np.searchsorted(energies, energy_ev), 1, len(energies) - 1)
+        left = right - 1
+        idx = np.where(abs(energy_ev - energies[left]) <= abs(energies[right] - energy_ev), left, right)
+        # first edge with the same energy, as np.argmin
+        idx = np.searchsorted(energies, energies[idx], side='left')
+        return labels[idx]
+
+
+_edge_database: XrayEdgeDatabase | None = None
+
+
+def get_edge_database() -> XrayEdgeDatabase:
+    """Return the x-ray edge database, loading it from EDGE_FILE on first use"""
+    global _edge_database
+    if _edge_database is None:
+        _edge_database = XrayEdgeDatabase()
+    return _edge_database
+
+
 def _load_edge_file(edges: list[str] | None = SEARCH_EDGES) -> dict[str, float]:
     """Load edges from file"""
-    with open(EDGE_FILE, 'r') as infile:
-        edge_dict = json.load(infile)
-    edge_energies = {
-        label: edge['energy'] for label, edge in edge_dict.items()
-        if (edge['edge'] in edges if edges else True)
-    }
-    return edge_energies
+    return get_edge_database().edge_energies(edges)
 
 
 def load_edge_energies(edges: list[str] | None = SEARCH_EDGES) -> tuple[np.ndarray, np.ndarray]:
@@ -90,11 +184,8 @@ def load_edge_energies(edges: list[str] | None = SEARCH_EDGES) -> tuple[np.ndarr
     :param edges: if not None, only return energies for these edges, e.g. ('L3', 'L2')
     :return: energies[ndarray], labels[ndarray]
     """
-    edge_energies = _load_edge_file(edges)
-    energies = np.array(list(edge_energies.values()))
-    labels = np.array(list(edge_energies.keys()))
-    idx = np.argsort(energies)
-    return energies[idx], labels[idx]
+    energies, labels = get_edge_database().sorted_edges(edges)
+    return energies.copy(), labels.copy()
 
 
 def get_edge_energies(*label: str) -> dict[str, float]:
@@ -108,7 +199,7 @@ def get_edge_energies(*label: str) -> dict[str, float]:
     :param label: label to get energies for
     :return: {label: energy in eV}
     """
-    edge_energies = _load_edge_file(None)
+    edge_energies = get_edge_database().energies
     labels = []
     for _label in label:
         labels.extend(find_edge_labels(_label))
@@ -132,33 +223,14 @@ def xray_edges_in_range(min_energy_ev: float, max_energy_ev: float | None = None
     if max_energy_ev is None:
         max_energy_ev = min_energy_ev + (energy_range_ev / 2)
         min_energy_ev = min_energy_ev - (energy_range_ev / 2)
-    energies, labels = load_edge_energies(search_edges)
-    idx = (energies > min_energy_ev) * (energies < max_energy_ev)
-    return {str(labels[ii]): float(energies[ii]) for ii in np.flatnonzero(idx)}
+    return get_edge_database().in_range(min_energy_ev, max_energy_ev, search_edges)
 
 
-def energy_range_edge_label(min_energy_ev: float, max_energy_ev: float | None = None,
-                            energy_range_ev: float = 10., search_edges: list[str] | None = None) -> tuple[str, str]:
-    """
-    Return mode string for x-ray absorption edges in energy range
-      raises ValueError is no edges are found or if multiple non-equivalent edges are found
+LIKELY_EDGES = (('L3', 'L2'), ('K',), ('M4', 'M5'), None)
 
-    :param min_energy_ev: energy to find x-ray absorption edges within
-    :param max_energy_ev: energy to find x-ray absorption edges within
-    :param energy_range_ev: energy to find x-ray absorption edges within
-    :param search_edges: if not None, only return energies for these edges, e.g. ('L3', 'L2')
-    :return: element, mode strings, e.g. 'Mn', 'L2, L3'
-    """
-    if search_edges:
-        edges = xray_edges_in_range(min_energy_ev, max_energy_ev, energy_range_ev, search_edges)
-    else:
-        # iterate through likely edges
-        likely_edges = (['L3', 'L2'], ['K'], ['M4', 'M5'], None)
-        for search_edges in likely_edges:
-            edges = xray_edges_in_range(min_energy_ev, max_energy_ev, energy_range_ev, search_edges)
-            if edges:
-                break
 
+def _edges_element_label(edges: dict[str, float], energy_ev: float) -> tuple[str, str]:
+    """Return element, edge strings from {label: energy} of edges in a range"""
     if len(edges) == 1:
         label, = edges.keys()
         element, edge = label.split()
@@ -179,22 +251,210 @@ def energy_range_edge_label(min_energy_ev: float, max_energy_ev: float | None =
         # pick first edge
         edge_pick = next(iter(edge_options))
         return edge_pick, ', '.join(edge_options[edge_pick])
-    raise ValueError(f"xray absorption edge not found: {edges} edges at energy {min_energy_ev} eV")
+    raise ValueError(f"xray absorption edge not found: {edges} edges at energy {energy_ev} eV")
+
+
+def energy_range_edge_label(min_energy_ev: float, max_energy_ev: float | None = None,
+                            energy_range_ev: float = 10., search_edges: list[str] | None = None) -> tuple[str, str]:
+    """
+    Return mode string for x-ray absorption edges in energy range
+      raises ValueError is no edges are found or if multiple non-equivalent edges are found
+
+    :param min_energy_ev: energy to find x-ray absorption edges within
+    :param max_energy_ev: energy to find x-ray absorption edges within
+    :param energy_range_ev: energy to find x-ray absorption edges within
+    :param search_edges: if not None, only return energies for these edges, e.g. ('L3', 'L2')
+    :return: element, mode strings, e.g. 'Mn', 'L2, L3'
+    """
+    if search_edges:
+        edges = xray_edges_in_range(min_energy_ev, max_energy_ev, energy_range_ev, search_edges)
+    else:
+        # iterate through likely edges
+        for search_edges in LIKELY_EDGES:
+            edges = xray_edges_in_range(min_energy_ev, max_energy_ev, energy_range_ev, search_edges)
+            if edges:
+                break
+    return _edges_element_label(edges, min_energy_ev)
+
+
+def energy_range_edge_labels(min_energies_ev: np.ndarray, max_energies_ev: np.ndarray | None = None,
+                             energy_range_ev: float = 10., search_edges: list[str] | None = None,
+                             default: tuple[str, str] | None = None) -> list[tuple[str, str]]:
+    """
+    Return element, edge labels for many energy ranges, e.g. of a batch of spectra, in one call.
+    Equivalent to [energy_range_edge_label(mn, mx) for mn, mx in zip(min_energies, max_energies)]
+
+        labels = energy_range_edge_labels([s.energy.min() for s in spectra], [s.energy.max() for s in spectra])
+
+    :param min_energies_ev: array of minimum or central energies, in eV
+    :param max_energies_ev: array of max energies of each range, or None
+    :param energy_range_ev: range in eV around min_energies_ev, if max is None
+    :param search_edges: if not None, only return energies for these edges, e.g. ('L3', 'L2')
+    :param default: if not None, returned for ranges without a single element edge instead of raising ValueError
+    :return: [(element, edge), ...] for each range
+    """
+    min_energies_ev = np.asarray(min_energies_ev, dtype=float).reshape(-1)
+    if max_energies_ev is None:
+        max_energies_ev = min_energies_ev + (energy_range_ev / 2)
+        min_energies_ev = min_energies_ev - (energy_range_ev / 2)
+    max_energies_ev = np.asarray(max_energies_ev, dtype=float).reshape(-1)
+    db = get_edge_database()
+    labels: list[tuple[str, str] | None] = [default] * len(min_energies_ev)
+    remaining = np.arange(len(min_energies_ev))
+    for edges in ([search_edges] if search_edges else LIKELY_EDGES):
+        energies, edge_labels = db.sorted_edges(edges)
+        start, stop = db.range_indices(min_energies_ev[remaining], max_energies_ev[remaining], edges)
+        found = stop > start
+        for n, i, j in zip(remaining[found], start[found], stop[found]):
+            range_edges = {str(label): float(energy) for label, energy in zip(edge_labels[i:j], energies[i:j])}
+            try:
+                labels[n] = _edges_element_label(range_edges, min_energies_ev[n])
+            except ValueError:
+                if default is None:
+                    raise
+        remaining = remaining[~found]
+        if len(remaining) == 0:
+            break
+    if default is None and len(remaining):
+        raise ValueError(f"xray absorption edge not found at energies {min_energies_ev[remaining]} eV")
+    return labels
+
 
 def nearest_edge_label(energy_ev: float) -> tuple[str, str]:
     """Return the element edges nearest the energy"""
-    all_edge_energies, all_edge_labels = load_edge_energies(None)
-    nearest_edge = all_edge_labels[np.argmin(abs(all_edge_energies - energy_ev))]
-    expand_edges = find_edge_labels(str(nearest_edge).strip('12345'))  # expand to L23 etc
-    return single_element_label(*expand_edges)
+    return nearest_edge_labels([energy_ev])[0]
+
+
+def nearest_edge_labels(energies_ev: np.ndarray) -> list[tuple[str, str]]:
+    """Return the element edges nearest each energy, e.g. [('Fe', 'L3, L2'), ('Co', 'L3, L2')]"""
+    nearest_edges = get_edge_database().nearest(np.reshape(energies_ev, -1))
+    return [
+        single_element_label(*find_edge_labels(str(nearest_edge).strip('12345')))  # expand to L23 etc
+        for nearest_edge in nearest_edges
+    ]
+
+
+GRID_POLICIES = ('min_step', 'median_step', 'n_points')
+
+
+def average_energy_scans(*args: np.ndarray, grid: str = 'min_step', n_points: int | None = None) -> np.ndarray:
+    """
+    Return a regular energy grid over the minimum range covered by all input arguments
 
+        energy = average_energy_scans(en1, en2)  # step is the smallest step in en1 or en2
+        energy = average_energy_scans(en1, en2, grid='median_step')  # median of steps in en1 and en2
+        energy = average_energy_scans(en1, en2, grid='n_points', n_points=500)
 
-def average_energy_scans(*args: np.ndarray):
-    """Return the minimum range covered by all input arguments"""
+    :param args: energy arrays, in eV
+    :param grid: grid policy, one of GRID_POLICIES
+    :param n_points: number of points in the grid if grid='n_points', defaults to the longest input array
+    :return: (n*1) array of energy values
+    """
     min_energy = np.max([np.min(en) for en in args])
     max_energy = np.min([np.max(en) for en in args])
-    min_step = np.min([np.min(np.abs(np.diff(en))) for en in args])
-    return np.arange(min_energy, max_energy + min_step, min_step)
+    if grid == 'n_points':
+        return np.linspace(min_energy, max_energy, n_points or max(len(en) for en in args))
+    # identical energy arrays (e.g. repeated scans) have the same steps
+    unique = {id(en): en for en in args}.values()
+    if grid == 'min_step':
+        step = np.min([np.min(np.abs(np.diff(en))) for en in unique])
+    elif grid == 'median_step':
+        step = np.median(np.concatenate([np.abs(np.diff(en)) for en in unique]))
+    else:
+        raise ValueError(f"Unknown grid policy '{grid}', options are {GRID_POLICIES}")
+    return np.arange(min_energy, max_energy + step, step)
+
+
+def interpolate_spectra(energy: np.ndarray, *args: tuple[np.ndarray, np.ndarray | list[np.ndarray]]) -> np.ndarray:
+    """
+    Interpolate spectra at given energy, equivalent to np.interp for each spectra
+
+    Spectra with the same energy array share the interpolation indices and weights,
+    signals may be 1D arrays or 2D arrays of several signals measured at the same energies.
+
+        signals = interpolate_spectra(energy, (en1, sig1), (en2, [sig2a, sig2b]))  # shape (3, len(energy))
+
+    :param energy: (n*1) array of energy values, in eV
+    :param args: (mes_energy, mes_signal): pair of (m*1) energy and (m*1) or (k*m) signal arrays
+    :returns: (k*n) array of interpolated signals
+    """
+    weights = {}
+    data = []
+    for en, sig in args:
+        key = id(en)
+        if key not in weights:
+            en = np.asarray(en, dtype=float)
+            order = np.argsort(en) if np.any(np.diff(en) < 0) else slice(None)
+            en = en[order]
+            index = np.clip(np.searchsorted(en, energy, side='right'), 1, len(en) - 1)
+            low, high = en[index - 1], en[index]
+            with np.errstate(divide='ignore', invalid='ignore'):
+                frac = np.clip(np.where(high > low, (energy - low) / (high - low), 1.), 0, 1)
+            weights[key] = (order, index, frac)
+        order, index, frac = weights[key]
+        sig = np.atleast_2d(np.asarray(sig, dtype=float))[:, order]
+        data.append(sig[:, index - 1] * (1 - frac) + sig[:, index] * frac)
+    return np.concatenate(data) if data else np.zeros([0, len(energy)])
+
+
+class SpectraAverager:
+    """
+    Weighted average and standard error of spectra interpolated onto a shared energy grid
+
+    Spectra are added one at a time or in batches, keeping only running totals (West's weighted
+    incremental algorithm), so memory does not grow with the number of spectra.
+
+        averager = SpectraAverager(energy)
+        for en, sig, counts in scans:
+            averager.add(en, sig, weight=counts)
+        mean, error = averager.result()
+
+    :param energy: (n*1) array of energy values, in eV
+    """
+    def __init__(self, energy: np.ndarray):
+        self.energy = energy
+        self.count = 0
+        self.sum_weights = np.zeros(len(energy))
+        self.sum_weights2 = np.zeros(len(energy))
+        self.mean = np.zeros(len(energy))
+        self._sum_squares = np.zeros(len(energy))
+
+    def __repr__(self):
+        return f"SpectraAverager(energy=array{self.energy.shape}, count={self.count})"
+
+    def add(self, energy: np.ndarray, signal: np.ndarray, weight: float | np.ndarray = 1.0) -> 'SpectraAverager':
+        """
+        Add spectra to the average
+
+        :param energy: (m*1) energy array
+        :param signal: (m*1) signal array, or (k*m) array of signals measured at the same energy
+        :param weight: weight of each spectrum, e.g. monitor counts, either float, (k*1) or (k*n) array
+        :return: self
+        """
+        data = interpolate_spectra(self.energy, (energy, signal))
+        weight = np.broadcast_to(np.reshape(weight, (-1, 1)) if np.ndim(weight) == 1 else weight, data.shape)
+        block_weights = weight.sum(axis=0)
+        block_mean = (weight * data).sum(axis=0) / block_weights
+        block_squares = (weight * (data - block_mean) ** 2).sum(axis=0)
+        # combine running totals with totals of this block
+        total = self.sum_weights + block_weights
+        delta = block_mean - self.mean
+        self.mean = self.mean + delta * block_weights / total
+        self._sum_squares += block_squares + delta ** 2 * self.sum_weights * block_weights / total
+        self.sum_weights = total
+        self.sum_weights2 += (weight ** 2).sum(axis=0)
+        self.count += len(data)
+        return self
+
+    def standard_error(self) -> np.ndarray:
+        """Return standard error of the weighted mean, using the effective number of spectra"""
+        n_eff = self.sum_weights ** 2 / self.sum_weights2
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.sqrt(self._sum_squares / (self.sum_weights * (n_eff - 1)))
+
+    def result(self) -> tuple[np.ndarray, np.ndarray]:
+        """Return weighted mean and standard error arrays"""
+        return self.mean, self.standard_error()
 
 
 def average_energy_spectra(energy: np.ndarray, *args: tuple[np.ndarray, np.ndarray]):
@@ -209,10 +469,36 @@ def average_energy_spectra(energy: np.ndarray, *args: tuple[np.ndarray, np.ndarr
     :param args: (mes_energy, mes_signal): pair of (m*1) arrays for energy and measurement raw_signals
     :returns signal: (n*1) array of averaged signal values at points in energy
     """
-    data = np.zeros([len(args), len(energy)])
-    for n, (en, dat) in enumerate(args):
-        data[n, :] = np.interp(energy, en, dat)
-    return data.mean(axis=0)
+    return interpolate_spectra(energy, *args).mean(axis=0)
+
+
+def average_energy_spectra_error(energy: np.ndarray, *args: tuple[np.ndarray, np.ndarray],
+                                 weights: list[float] | None = None) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Weighted average and standard error of energy spectra, interpolating at given energy
+
+    Spectra measured at the same energy array are interpolated and added together.
+
+        energy = average_energy_scans(en1, en2, en3)
+        signal, error = average_energy_spectra_error(energy, (en1, sig1), (en2, sig2), (en3, sig3))
+
+    :param energy: (n*1) array of energy values, in eV
+    :param args: (mes_energy, mes_signal): pair of (m*1) arrays for energy and measurement raw_signals
+    :param weights: weight of each spectra, e.g. monitor counts, or None for equal weights
+    :returns signal, error: (n*1) arrays of averaged signal and standard error at points in energy
+    """
+    weights = np.ones(len(args)) if weights is None else np.asarray(weights, dtype=float)
+    if len(weights) != len(args):
+        raise ValueError(f"{len(weights)} weights given for {len(args)} spectra")
+    groups = {}
+    for (en, sig), weight in zip(args, weights):
+        groups.setdefault(id(en), (en, [], []))
+        groups[id(en)][1].append(sig)
+        groups[id(en)][2].append(weight)
+    averager = SpectraAverager(energy)
+    for en, signals, group_weights in groups.values():
+        averager.add(en, np.array(signals), np.array(group_weights))
+    return averager.result()
 
 
 def preedge_signal(energy: np.ndarray, signal: np.ndarray, ev_from_start: float = 5.) -> float:
@@ -447,6 +733,192 @@ def fit_spectra_exp_background(energy: np.ndarray, signal: np.ndarray, *step_ene
     return bkg, jump, fit_output
 
 
+"""
+--- LINEAR BACKGROUND FUNCTIONS ---
+Backgrounds that are linear in their parameters (polynomials and steps at fixed energies and widths)
+are solved directly by least squares, for a single spectra or many spectra measured at the same energies.
+"""
+
+
+class LinearFitResult:
+    """
+    Result of a linear least-squares background fit, with a fit_report method like lmfit.ModelResult
+
+    :param params: {name: value} of fitted parameters, followed by fixed parameters
+    :param chisqr: sum of squared residuals in the fitted region
+    :param ndata: number of points in the fitted region
+    :param nvarys: number of fitted parameters
+    """
+    def __init__(self, params: dict[str, float], chisqr: float, ndata: int, nvarys: int):
+        self.params = params
+        self.chisqr = chisqr
+        self.ndata = ndata
+        self.nvarys = nvarys
+
+    def __repr__(self):
+        return f"LinearFitResult({self.params})"
+
+    def fit_report(self) -> str:
+        return (
+            "[[Fit Statistics]]\n" +
+            "    # fitting method   = linear least squares\n" +
+            f"    # data points      = {self.ndata}\n" +
+            f"    # variables        = {self.nvarys}\n" +
+            f"    chi-square         = {self.chisqr:.8g}\n" +
+            "[[Variables]]\n" +
+            "\n".join(f"    {name}: {value:.8g}" for name, value in self.params.items())
+        )
+
+
+def step_function(energy: np.ndarray, center: float, sigma: float = 2.) -> np.ndarray:
+    """Unit arctan step, as lmfit StepModel(form='arctan') with amplitude=1"""
+    return 0.5 + np.arctan((energy - center) / sigma) / np.pi
+
+
+def _linear_background_batch(energy: np.ndarray, signals: np.ndarray, region: np.ndarray, degree: int = 2,
+                             step_energies: tuple[float, ...] = (),
+                             step_width: float = 2.) -> tuple[np.ndarray, np.ndarray, list[LinearFitResult]]:
+    """
+    Least-squares fit of polynomial + fixed steps to region of signals
+    :param energy: ndarray[n] energy in eV
+    :param signals: ndarray[N, n] signals measured at energy
+    :param region: ndarray[n] bool of points to fit
+    :param degree: polynomial degree, or -1 for no polynomial
+    :param step_energies: centres of arctan steps, in eV
+    :param step_width: width (sigma) of the arctan steps, in eV
+    :return: background[N, n], jump[N] (sum of step amplitudes or 1 if no steps), list of LinearFitResult
+    """
+    # polynomial of energy relative to the first point, for a well-conditioned solution
+    e0 = float(energy[0])
+    names = [f"bkg_c{p}" for p in range(degree + 1)] + [f"edge{n + 1}_amplitude" for n in range(len(step_energies))]
+    columns = [(energy - e0) ** p for p in range(degree + 1)]
+    columns += [step_function(energy, edge, step_width) for edge in step_energies]
+    design = np.transpose(columns)
+    coefficients, *_ = np.linalg.lstsq(design[region], signals[:, region].T, rcond=None)
+    backgrounds = (design @ coefficients).T
+    chisqr = np.sum((signals[:, region] - backgrounds[:, region]) ** 2, axis=1)
+    if step_energies:
+        jumps = coefficients[degree + 1:].sum(axis=0)
+    else:
+        jumps = np.ones(len(signals))
+    constants = {'bkg_e0': e0} if degree >= 0 else {}
+    constants |= {f"edge{n + 1}_center": edge for n, edge in enumerate(step_energies)}
+    constants |= {'edge_sigma': step_width} if step_energies else {}
+    fits = [
+        LinearFitResult(dict(zip(names, map(float, coefs))) | constants, float(chi), int(np.sum(region)), len(names))
+        for coefs, chi in zip(coefficients.T, chisqr)
+    ]
+    return backgrounds, jumps, fits
+
+
+def _edges_region(energy: np.ndarray, step_energies: tuple[float, ...], peak_width_ev: float) -> np.ndarray:
+    """Return region with peaks around each edge removed"""
+    region = np.ones_like(energy, dtype=bool)
+    for edge in step_energies:
+        region[np.abs(energy - edge) < peak_width_ev] = 0
+    return region
+
+
+def _double_edge_region(energy: np.ndarray, l3_energy: float, l2_energy: float, peak_width_ev: float) -> np.ndarray:
+    return (
+            (energy < l3_energy - peak_width_ev / 2) +
+            np.logical_and(energy > l3_energy + peak_width_ev / 2, energy < l2_energy - peak_width_ev / 2) +
+            (energy > l2_energy + peak_width_ev / 2)
+    )
+
+
+def fit_fixed_edges_background(energy: np.ndarray, signal: np.ndarray, *step_energies: float,
+                               peak_width_ev: float = 5., step_width: float = 2.,
+                               degree: int = 2) -> tuple[np.ndarray, float, LinearFitResult]:
+    """
+    Least-squares fit of an order-2 polynomial and arctan steps at fixed edge energies, with peaks removed
+
+    :energy: ndarray[n] of spectra energy in eV
+    :signal: ndarray[n] of spectra signal
+    :step_energies: list of absorption energy steps, in eV
+    :peak_width_ev: float width of absorption peak in eV
+    :step_width: float width of the arctan steps in eV
+    :degree: polynomial degree
+    :return: background[ndarray], jump[float], LinearFitResult
+    """
+    region = _edges_region(energy, step_energies, peak_width_ev)
+    bkg, jump, fits = _linear_background_batch(energy, signal[np.newaxis], region, degree, step_energies, step_width)
+    return bkg[0], float(jump[0]), fits[0]
+
+
+def fit_double_edge_fixed_background(energy: np.ndarray, signal: np.ndarray, l3_energy: float, l2_energy: float,
+                                     peak_width_ev: float = 5., step_width: float = 2.) -> tuple[np.ndarray, float, LinearFitResult]:
+    """Least-squares fit of a flat background and two arctan steps at fixed edge energies"""
+    region = _double_edge_region(energy, l3_energy, l2_energy, peak_width_ev)
+    bkg, jump, fits = _linear_background_batch(energy, signal[np.newaxis], region, 0,
+                                               (l3_energy, l2_energy), step_width)
+    return bkg[0], float(jump[0]), fits[0]
+
+
+def _bind_arguments(function, names: tuple[str, ...], *args, **kwargs) -> list:
+    """Return values of named arguments of a background function, including defaults"""
+    bound = signature(function).bind(None, None, *args, **kwargs)
+    bound.apply_defaults()
+    return [bound.arguments[name] for name in names]
+
+
+_LMFIT_BACKGROUNDS = {
+    'exp': fit_exp_background,
+    'step': fit_step_background,
+    'double_edge_step': fit_double_edge_step_background,
+    'poly_edges': fit_spectra_background,
+    'exp_edges': fit_spectra_exp_background,
+}
+
+
+def fit_background_batch(energy: np.ndarray, signals: np.ndarray, name: str = 'flat',
+                         *args, **kwargs) -> tuple[np.ndarray, np.ndarray, list[LinearFitResult | ModelResult | None]]:
+    """
+    Background of many spectra measured at the same energies
+
+    Backgrounds that are linear in their parameters are solved for all spectra at once:
+        'flat', 'norm', 'linear', 'curve', 'poly_fixed_edges', 'double_edge_fixed'
+    Other backgrounds ('exp', 'step', 'double_edge_step', 'poly_edges', 'exp_edges') are fitted with lmfit,
+    one spectra at a time.
+
+        bkg, norm, fits = fit_background_batch(energy, signals, 'linear', ev_from_start=5)
+        corrected = (signals - bkg) / norm[:, np.newaxis]
+
+    :param energy: ndarray[n] energy in eV
+    :param signals: ndarray[N, n] signals measured at energy
+    :param name: name of background, as Spectra.remove_background
+    :param args: arguments of the background function, e.g. ev_from_start
+    :param kwargs: keyword arguments of the background function
+    :return: backgrounds[N, n], norms[N], list of fit results (or None)
+    """
+    signals = np.atleast_2d(signals)
+    if name in _LMFIT_BACKGROUNDS:
+        results = [_LMFIT_BACKGROUNDS[name](energy, signal, *args, **kwargs) for signal in signals]
+        backgrounds, norms, fits = zip(*results)
+        return np.array(backgrounds), np.array([float(norm) for norm in norms]), list(fits)
+    if name in ('flat', 'norm', 'linear', 'curve'):
+        ev_from_start, = _bind_arguments(subtract_flat_background, ('ev_from_start',), *args, **kwargs)
+        region = energy < np.min(energy) + ev_from_start
+        if name == 'flat':
+            preedge = np.mean(signals[:, region], axis=1)
+            return preedge[:, np.newaxis] * np.ones_like(signals), np.ones(len(signals)), [None] * len(signals)
+        if name == 'norm':
+            return np.zeros_like(signals), np.mean(signals[:, region], axis=1), [None] * len(signals)
+        return _linear_background_batch(energy, signals, region, degree=1 if name == 'linear' else 2)
+    if name == 'poly_fixed_edges':
+        step_energies, peak_width_ev, step_width, degree = _bind_arguments(
+            fit_fixed_edges_background, ('step_energies', 'peak_width_ev', 'step_width', 'degree'), *args, **kwargs)
+        region = _edges_region(energy, step_energies, peak_width_ev)
+        return _linear_background_batch(energy, signals, region, degree, step_energies, step_width)
+    if name == 'double_edge_fixed':
+        l3_energy, l2_energy, peak_width_ev, step_width = _bind_arguments(
+            fit_double_edge_fixed_background, ('l3_energy', 'l2_energy', 'peak_width_ev', 'step_width'),
+            *args, **kwargs)
+        region = _double_edge_region(energy, l3_energy, l2_energy, peak_width_ev)
+        return _linear_background_batch(energy, signals, region, 0, (l3_energy, l2_energy), step_width)
+    raise ValueError(f"Unknown background '{name}'")
+
+
 """
 --- SUM RULES ---
 """
@@ -546,6 +1018,60 @@ def spin_angular_momentum(energy: np.ndarray, average: np.ndarray,
     return S
 
 
+def _cumulative_trapz(energy: np.ndarray, signals: np.ndarray) -> np.ndarray:
+    """Return cumulative trapezoid integrals of signals[N, n] with a leading 0, shape [N, n]"""
+    areas = np.diff(energy) * (signals[:, 1:] + signals[:, :-1]) / 2.0
+    cumulative = np.zeros_like(signals, dtype=float)
+    np.cumsum(areas, axis=1, out=cumulative[:, 1:])
+    return cumulative
+
+
+def sum_rules_batch(energy: np.ndarray, average: np.ndarray, difference: np.ndarray,
+                    n_holes: float | np.ndarray, split_energy: float | np.ndarray | None = None,
+                    dipole_term: float | np.ndarray = 0) -> tuple[np.ndarray, np.ndarray]:
+    """
+    Calculate the orbital and spin sum rules of many XMCD spectra on the same energy grid at once.
+    Integrals are taken from the cumulative sum of trapezoids, giving the same values as
+    orbital_angular_momentum and spin_angular_momentum for each spectra.
+
+        orbital, spin = sum_rules_batch(energy, average[N, n], difference[N, n], n_holes=4, split_energy=715)
+
+    :param energy: Energy axis of the spectra [n]
+    :param average: average XAS spectra (left + right) for both polarisations [N, n]
+    :param difference: difference XAS spectra (right - left) for both polarisations [N, n]
+    :param n_holes: Number of holes in the system, float or array [N]
+    :param split_energy: energy to split the spectra between L3 and L2, float or array [N]
+        (or None to use the middle of the spectra)
+    :param dipole_term: magnetic dopole term (T_z), defaults to 0 for effective spin
+    :return: orbital[N], spin[N] angular momentum of each spectra
+    """
+    energy = np.asarray(energy, dtype=float)
+    average = np.atleast_2d(average)
+    difference = np.atleast_2d(difference)
+    if average.shape[-1] != len(energy) or difference.shape != average.shape:
+        raise ValueError(f"Energy and spectra must have the same length: {energy.shape}, {average.shape}, {difference.shape}")
+    n_holes = np.broadcast_to(np.asarray(n_holes, dtype=float), len(average))
+    if np.any(n_holes <= 0):
+        raise ValueError(f"Number of holes must be greater than 0: {n_holes}")
+    if split_energy is None:
+        split_energy = (energy[0] + energy[-1]) / 2
+    split_energy = np.broadcast_to(np.asarray(split_energy, dtype=float), len(average))
+
+    # total intensity
+    tot = trapz(average, energy, axis=1)
+    integral = _cumulative_trapz(energy, difference)
+    index = np.arange(len(difference))
+    orbital = -2 * n_holes * integral[:, -1] / tot
+
+    # the interval either side of the split index is not included in either edge, as spin_angular_momentum
+    split_energies, split_inverse = np.unique(split_energy, return_inverse=True)
+    split_index = np.argmin(np.abs(energy[np.newaxis, :] - split_energies[:, np.newaxis]), axis=1)[split_inverse]
+    l3_integral = integral[:, -1] - integral[index, split_index]
+    l2_integral = integral[index, np.maximum(split_index - 1, 0)]
+    spin = (3 / 2) * n_holes * (l3_integral - 2 * l2_integral) / tot - dipole_term
+    return orbital, spin
+
+
 def magnetic_moment(orbital: float, spin: float) -> float:
     """
     Calculate the magnetic moment of the system using the formula:
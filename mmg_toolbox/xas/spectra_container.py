@@ -15,7 +15,8 @@ import matplotlib.pyplot as plt
 
 from mmg_toolbox.utils.polarisation import pol_subtraction_label, PolLabels
 from mmg_toolbox.xas import spectra_analysis as spa
-from mmg_toolbox.xas.spectra import Spectra, SpectraSubtraction
+from mmg_toolbox.xas.spectra import Spectra, SpectraSubtraction, SpectraAverage, SpectraStack
+from mmg_toolbox.xas.provenance import ParentReferences
 from mmg_toolbox.xas.metadata import XasMetadata, merge_xas_metadata
 
 
@@ -40,7 +41,10 @@ class SpectraContainer:
     spectra1.create_background_figure() : create a matplotlib figure of all contained spectra
     spectra1.create_background_figure() : create a matplotlib figure including background subtraction
     spectra1.write_nexus('filename.nxs') : write a processed NeXus file
+
+    Parents are kept unless provenance.set_keep_parents(False) is used, see provenance.py
     """
+    keep_parents: bool | None = None  # None to use provenance.KEEP_PARENTS
 
     def __init__(self, name: str, spectra: dict[str, Spectra | SpectraSubtraction],
                  *parents: SpectraContainer, metadata: XasMetadata = None):
@@ -48,6 +52,7 @@ class SpectraContainer:
         self.process_label = next(iter(spectra.values())).process_label
         self.parents = parents
         self.spectra = spectra
+        self._stack: SpectraStack | None = None
         if metadata is None:
             m, s = next(iter(spectra.items()))
             element, edge = spa.energy_range_edge_label(s.energy.min(), s.energy.max())
@@ -55,6 +60,15 @@ class SpectraContainer:
                                    default_mode=m, element=element, edge=edge)
         self.metadata = metadata
 
+    @property
+    def parents(self) -> tuple[SpectraContainer, ...]:
+        """Parent SpectraContainers, omitting parents that no longer exist if only weak references are kept"""
+        return self._parents.get()
+
+    @parents.setter
+    def parents(self, parents: tuple[SpectraContainer, ...]):
+        self._parents = ParentReferences(parents, self.keep_parents)
+
     def __repr__(self):
         return f"SpectraContainer('{self.name}', '{self.process_label}', {list(self.spectra)})"
 
@@ -249,15 +263,27 @@ class SpectraContainer:
 
     ### Spectra Processing ###
 
+    def stack(self) -> SpectraStack | None:
+        """Return SpectraStack of all modes, or None if the modes don't share an energy axis"""
+        if self._stack is None or self._stack.spectra != self.spectra:
+            self._stack = SpectraStack.from_spectra(self.spectra)
+        return self._stack
+
     def _process_spectra(self, method: str, *args, **kwargs) -> SpectraContainer:
-        """wrapper function for spectra processing"""
-        spectra = {
-            mode: getattr(spec, method)(*args, **kwargs)
-            for mode, spec in self.spectra.items()
-        }
+        """wrapper function for spectra processing, processing all modes at once where possible"""
+        stack = self.stack()
+        stack = stack.process(method, *args, **kwargs) if stack is not None else None
+        if stack is None:
+            spectra = {
+                mode: getattr(spec, method)(*args, **kwargs)
+                for mode, spec in self.spectra.items()
+            }
+        else:
+            spectra = stack.spectra.copy()
         process_label = next(iter(spectra.values())).process_label
         scan = SpectraContainer(self.name, spectra, self.copy(), metadata=self.metadata)
         scan.process_label = process_label
+        scan._stack = stack
         return scan
 
     def trim(self, ev_from_start=1., ev_from_end=None) -> SpectraContainer:
@@ -302,8 +328,12 @@ class SpectraContainer:
         | 'double_edge_step' | l3_energy, l2_energy, peak_width_ev |
         | 'poly_edges' | *step_energies, peak_width_ev |
         | 'exp_edges' | *step_energies, peak_width_ev |
+        | 'poly_fixed_edges' | *step_energies, peak_width_ev, step_width, degree |
+        | 'double_edge_fixed' | l3_energy, l2_energy, peak_width_ev, step_width |
 
         :param name: the name of the background to remove e.g. 'flat', 'linear', 'curve', 'exp', 'step', 'double_edge_step', 'poly_edges'
+            backgrounds 'flat', 'norm', 'linear', 'curve', 'poly_fixed_edges' and 'double_edge_fixed' are
+            solved for all modes at once
         :param args: additional positional arguments
         :param kwargs: additional keyword arguments
         :return: processed SpectraContainer object
@@ -328,8 +358,12 @@ class SpectraContainer:
         | 'double_edge_step' | l3_energy, l2_energy, peak_width_ev |
         | 'poly_edges' | *step_energies, peak_width_ev |
         | 'exp_edges' | *step_energies, peak_width_ev |
+        | 'poly_fixed_edges' | *step_energies, peak_width_ev, step_width, degree |
+        | 'double_edge_fixed' | l3_energy, l2_energy, peak_width_ev, step_width |
 
         :param name: the name of the background to remove e.g. 'flat', 'linear', 'curve', 'exp', 'step', 'double_edge_step', 'poly_edges'
+            backgrounds 'flat', 'norm', 'linear', 'curve', 'poly_fixed_edges' and 'double_edge_fixed' are
+            solved for all modes at once
         :param args: additional positional arguments
         :param kwargs: additional keyword arguments
         :return: processed SpectraContainer object
@@ -342,18 +376,38 @@ class SpectraContainer:
 
 
 class SpectraContainerAverage(SpectraContainer):
-    """Special subclass for average of SpectraContainers"""
-    def __init__(self, *spectra_containers: SpectraContainer):
+    """
+    Special subclass for average of SpectraContainers
+
+    All modes are averaged on the same energy grid in a single pass over the containers,
+    see spectra_analysis.average_energy_scans for the grid policies.
+
+    :param spectra_containers: SpectraContainer objects to average
+    :param grid: grid policy, one of spectra_analysis.GRID_POLICIES
+    :param weight_by_counts: if True, weight each scan by its monitor counts
+    """
+    def __init__(self, *spectra_containers: SpectraContainer, grid: str = 'min_step',
+                 weight_by_counts: bool = False):
         # Expand any Average containers into their parents
         expanded_list = []
         for spectra_container in spectra_containers:
-            if isinstance(spectra_container, SpectraContainerAverage):
-                expanded_list.extend(spectra_container.parents)
+            parents = spectra_container.parents
+            # averages that have lost parents (see provenance.py) are included as one container
+            if (isinstance(spectra_container, SpectraContainerAverage) and
+                    sum(getattr(p, 'count', 1) for p in parents) == spectra_container.count):
+                expanded_list.extend(parents)
             else:
                 expanded_list.append(spectra_container)
+        self.count = sum(getattr(s, 'count', 1) for s in expanded_list)
         first = expanded_list[0]
+        energy = spa.average_energy_scans(
+            *(s.spectra[n].energy for s in expanded_list for n in first.spectra), grid=grid
+        )
+        weights = [
+            float(np.mean(s.metadata.monitor) * s.metadata.count_time) for s in expanded_list
+        ] if weight_by_counts else None
         spectra = {
-            n: sum((s.spectra[n] for s in expanded_list[1:]), first.spectra[n])
+            n: SpectraAverage(*(s.spectra[n] for s in expanded_list), energy=energy, weights=weights)
             for n in first.spectra
         }
         metadata = merge_xas_metadata(*(s.metadata for s in expanded_list))
@@ -371,6 +425,8 @@ class SpectraContainerAverage(SpectraContainer):
 
 class SpectraContainerSubtraction(SpectraContainer):
     """Special subclass for subtraction of SpectraContainers - XMCD and XMLD"""
+    keep_parents = True  # parents are used for labels and sum rules
+
     def __init__(self, spectra_container1: SpectraContainer | SpectraContainerAverage, spectra_container2: SpectraContainer | SpectraContainerAverage):
         # subtract each spectra in container
         spectra = {
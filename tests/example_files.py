@@ -48,3 +48,107 @@ FILES_DICT = {
     desc: path for path, desc in FILES
 }
 
+
+
+def create_nexus_scan(filename: str, scan_number: int = 12345, cmd: str = 'scan x 0 1 0.1 det',
+                      temperature: float = 300., n_points: int = 11, image_shape: tuple[int, int] | None = None):
+    """Write a small NeXus scan file, for tests that don't require the DLS file system"""
+    import h5py
+    import numpy as np
+    import mmg_toolbox.nexus.nexus_writer as nw
+    from mmg_toolbox.utils.hdf_file_pool import close_hdf
+
+    x = np.linspace(0, 1, n_points)
+    signal = 100 * np.exp(-(x - 0.5) ** 2 / 0.02) + 10
+    close_hdf(filename)  # files read by an earlier test step may be kept open by the pool
+    with h5py.File(filename, 'w') as hdf:
+        entry = nw.add_nxentry(hdf, 'entry', default=True)
+        nw.add_nxfield(entry, 'entry_identifier', scan_number)
+        nw.add_nxfield(entry, 'scan_command', cmd)
+        nw.add_nxfield(entry, 'start_time', '2025-01-01T12:00:00')
+        nw.add_nxfield(entry, 'end_time', '2025-01-01T12:01:00')
+        instrument = nw.add_nxinstrument(entry, 'instrument', 'i16')
+        nw.add_nxsample(entry, 'sample', 'test', temperature_k=temperature)
+        data = nw.add_nxdata(entry, 'measurement', axes=['x'], signal='signal', default=True)
+        nw.add_nxfield(data, 'x', x, units='mm')
+        nw.add_nxfield(data, 'signal', signal)
+        nw.add_nxfield(data, 'Tsample', temperature * np.ones(n_points), units='K')
+        if image_shape is not None:
+            images = np.random.default_rng(scan_number).poisson(5, size=(n_points, *image_shape))
+            detector = nw.add_nxclass(instrument, 'detector', 'NXdetector')
+            nw.add_nxfield(detector, 'data', images.astype(float))
+    return filename
+
+
+def create_diffraction_scan(filename: str, n_points: int = 5, image_shape: tuple[int, int] = (20, 30),
+                            energy_kev: float = 8.0):
+    """Write a small NeXus eta scan with an area detector and NXtransformations, for tests of the instrument model"""
+    import h5py
+    import numpy as np
+    import mmg_toolbox.nexus.nexus_writer as nw
+    from mmg_toolbox.utils.hdf_file_pool import close_hdf
+    from mmg_toolbox.nexus.nexus_transformations import RotationAxis, TranslationAxis
+    from mmg_toolbox.diffraction.lattice import bmatrix
+
+    eta = np.linspace(20, 22, n_points)
+    images = np.random.default_rng(1).poisson(5, size=(n_points, *image_shape)).astype(float)
+    close_hdf(filename)  # files read by an earlier test step may be kept open by the pool
+    with h5py.File(filename, 'w') as hdf:
+        entry = nw.add_nxentry(hdf, 'entry', default=True)
+        instrument = nw.add_nxinstrument(entry, 'instrument', 'i16')
+        diff = nw.add_nxclass(instrument, 'diffractometer', 'NXcollection')
+        nw.add_nxtransformations(diff, 'sample', RotationAxis('eta', eta, vector=(-1, 0, 0)),
+                                 RotationAxis('mu', 0., vector=(0, 1, 0)))
+        del diff['depends_on']
+        nw.add_nxtransformations(diff, 'detector_arm', RotationAxis('delta', 40., vector=(-1, 0, 0)),
+                                 RotationAxis('gamma', 0., vector=(0, 1, 0)))
+        del diff['depends_on']
+        detector = nw.add_nxdetector(instrument, 'detector', images, detector_distance_mm=500,
+                                     depends_on=diff['detector_arm/delta'].name)
+        detector.attrs['NX_class'] = np.bytes_('NXdetector')  # fixed length strings, as in GDA files
+        detector['module'].attrs['NX_class'] = np.bytes_('NXdetector_module')
+        detector['module/fast_pixel_direction'].attrs['vector'] = (1, 0, 0)
+        detector['module/slow_pixel_direction'].attrs['vector'] = (0, 1, 0)
+        sample = nw.add_nxsample(entry, 'sample', 'test')
+        nw.add_nxfield(sample, 'unit_cell', [2.85, 2.85, 10.8, 90, 90, 120])
+        nw.add_nxfield(sample, 'ub_matrix', bmatrix(2.85, 2.85, 10.8, 90, 90, 120))
+        nw.add_nxfield(sample, 'depends_on', diff['sample/eta'].name)
+        beam = nw.add_nxbeam(sample, 'beam', incident_energy_ev=energy_kev * 1000)
+        nw.add_nxtransformations(beam, 'transformations', TranslationAxis('direction', 0, vector=(0, 0, 1)))
+        data = nw.add_nxdata(entry, 'data', axes=['eta'], signal='sum', default=True)
+        data['eta'] = diff['sample/eta']
+        nw.add_nxfield(data, 'sum', images.sum(axis=(1, 2)))
+        nw.add_nxfield(data, 'rc', np.linspace(100, 200, n_points))
+    return filename
+
+
+def create_vortex_scan(filename: str, n_points: int = 20, n_channels: int = 256, energy_scan: bool = True):
+    """Write a small I16 NeXus scan with VorteX MCA spectra, chunked along the scan, returns the MCA spectra"""
+    import h5py
+    import numpy as np
+    import mmg_toolbox.nexus.nexus_writer as nw
+    from mmg_toolbox.utils.hdf_file_pool import close_hdf
+
+    energy = np.linspace(7.1, 7.2, n_points)
+    mca = np.random.default_rng(1).poisson(5, size=(n_points, 1, n_channels))
+    close_hdf(filename)  # files read by an earlier test step may be kept open by the pool
+    with h5py.File(filename, 'w') as hdf:
+        entry = nw.add_nxentry(hdf, 'entry', default=True)
+        nw.add_nxfield(entry, 'entry_identifier', 1)
+        nw.add_nxfield(entry, 'scan_command', 'scan energy2 7.1 7.2 0.005')
+        nw.add_nxfield(entry, 'start_time', '2025-01-01T12:00:00')
+        nw.add_nxfield(entry, 'end_time', '2025-01-01T12:01:00')
+        instrument = nw.add_nxinstrument(entry, 'instrument', 'i16')
+        sample = nw.add_nxsample(entry, 'sample', 'test', temperature_k=300)
+        nw.add_nxbeam(sample, 'beam', incident_energy_ev=7150, polarisation_label='lh')
+        diff = nw.add_nxclass(instrument, 'diffractometer_sample', 'NXcollection')
+        nw.add_nxfield(diff, 'alpha', 0.)
+        detector = nw.add_nxclass(instrument, 'xmapMca', 'NXdetector')
+        detector.create_dataset('data', data=mca, chunks=(4, 1, n_channels))
+        axis = 'energy2' if energy_scan else 'x'
+        data = nw.add_nxdata(entry, 'measurement', axes=[axis], signal='sum', default=True)
+        nw.add_nxfield(data, axis, energy)
+        nw.add_nxfield(data, 'sum', mca.sum(axis=(1, 2)))
+        nw.add_nxfield(data, 'ic1monitor', np.ones(n_points))
+        nw.add_nxfield(data, 'rc', 300 * np.ones(n_points))
+    return mca
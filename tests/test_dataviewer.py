@@ -124,3 +124,138 @@ def test_nexus_viewer_rois():
 
 
 
+
+
+def test_frame_cache(tmp_path):
+    import os
+    import time
+    import threading
+    import h5py
+    import numpy as np
+    from mmg_toolbox.tkguis.misc.frame_cache import FrameCache
+
+    filename = str(tmp_path / 'images.nxs')
+    images = np.arange(10 * 4 * 5, dtype=float).reshape(10, 4, 5)
+    with h5py.File(filename, 'w') as hdf:
+        hdf['data'] = images
+
+    reads = []
+
+    def reader(hdf, index):
+        reads.append(index)
+        return hdf['data'][index]
+
+    cache = FrameCache(max_bytes=6 * images[0].nbytes, prefetch=3)
+    assert np.all(cache.get(filename, 'data', 2, reader, n_frames=10) == images[2])
+    cache.wait()
+    assert sorted(reads) == [2, 3, 4, 5]  # prefetch forward
+    assert np.all(cache.get(filename, 'data', 3, reader, n_frames=10) == images[3])
+    cache.wait()
+    assert cache.hits == 1 and sorted(reads) == [2, 3, 4, 5, 6]
+    cache.get(filename, 'data', 1, reader, n_frames=10)  # move backwards
+    cache.wait()
+    assert reads[-1] == 0
+    assert len(cache._frames) <= 6
+
+    # modified file invalidates cache
+    images[1] = -1
+    with h5py.File(filename + '.new', 'w') as hdf:
+        hdf['data'] = images
+    os.replace(filename + '.new', filename)
+    os.utime(filename, ns=(0, 0))
+    assert np.all(cache.get(filename, 'data', 1, reader, n_frames=10) == -1)
+    assert not cache.get(filename, 'data', 1, reader).flags.writeable  # frames are shared
+    cache.clear()
+
+    # cached frames are returned while the prefetch thread is reading
+    release = threading.Event()
+
+    def slow_reader(hdf, index):
+        if index > 2:
+            release.wait(5)
+        return hdf['data'][index]
+
+    cache.get(filename, 'data', 2, slow_reader, n_frames=10)  # prefetch blocks reading frame 3
+    start = time.perf_counter()
+    assert np.all(cache.get(filename, 'data', 2, slow_reader, n_frames=10) == images[2])
+    assert time.perf_counter() - start < 1
+    release.set()
+    cache.wait()
+
+
+def test_background_loader():
+    import time
+    import threading
+    from mmg_toolbox.tkguis.misc.background_loader import BackgroundLoader
+
+    root = tk.Tcl()  # after() without a display
+    loader = BackgroundLoader(root, delay_ms=50, poll_ms=5)
+    started = []
+    delivered = []
+    release = threading.Event()
+
+    def load(value, request):
+        started.append(value)
+        if value == 'slow':
+            release.wait(5)
+        request.check()
+        return value
+
+    def run_until(condition, timeout=5):
+        end = time.time() + timeout
+        while not condition() and time.time() < end:
+            root.update()
+            time.sleep(0.005)
+
+    # rapid requests are debounced, only the last is loaded
+    for n in range(10):
+        loader.submit(lambda request, n=n: load(n, request), delivered.append)
+    run_until(lambda: not loader.busy)
+    assert started == [9] and delivered == [9]
+
+    # a newer request cancels a request that is loading
+    loader.submit(lambda request: load('slow', request), delivered.append)
+    run_until(lambda: 'slow' in started)
+    loader.submit(lambda request: load('fast', request), delivered.append)
+    release.set()
+    run_until(lambda: not loader.busy)
+    assert delivered == [9, 'fast']
+    assert (loader.loaded, loader.cancelled) == (2, 10)
+
+    errors = []
+    loader.submit(lambda request: 1 / 0, delivered.append, errors.append)
+    run_until(lambda: not loader.busy)
+    assert isinstance(errors[0], ZeroDivisionError)
+
+    # items of iterating requests are delivered as they are generated
+    def generate(request):
+        yield 'first'
+        release.clear()
+        release.wait(5)
+        yield 'second'
+
+    items = []
+    loader.submit(generate, items.append, iterate=True)
+    run_until(lambda: items == ['first'])
+    assert loader.busy and items == ['first']
+    release.set()
+    run_until(lambda: not loader.busy)
+    assert items == ['first', 'second']
+
+
+def test_load_selection_data(tmp_path):
+    from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+    from mmg_toolbox.tkguis.widgets.nexus_plot import load_plot_title
+    from mmg_toolbox.tkguis.widgets.nexus_image import load_first_image
+    from .example_files import create_nexus_scan
+
+    # title and first image are read away from the widgets, for the background loader
+    filename = create_nexus_scan(str(tmp_path / '1001.nxs'), scan_number=1001, image_shape=(4, 5))
+    hdf_map = create_nexus_map(filename)
+    assert load_plot_title(filename, hdf_map, '#{entry_identifier}') == '#1001'
+    image = load_first_image(filename, hdf_map)
+    assert image.shape == (4, 5)
+    assert load_first_image(filename, hdf_map) is image  # stored in the frame cache
+
+    filename = create_nexus_scan(str(tmp_path / '1002.nxs'), scan_number=1002)
+    assert load_first_image(filename, create_nexus_map(filename)) is None
@@ -3,6 +3,7 @@ mmg_toolbox tests
 Test experiment folder functions
 """
 
+import numpy as np
 
 from mmg_toolbox.utils.experiment import Experiment
 from mmg_toolbox.nexus.nexus_scan import NexusScan, NexusDataHolder
@@ -56,3 +57,113 @@ def test_plots():
 
 
 
+
+def test_scan_index(tmp_path):
+    from mmg_toolbox.utils.scan_index import ScanIndex, encode_value, decode_value, map_key
+    from mmg_toolbox.nexus.nexus_map_cache import create_nexus_map
+    from .example_files import create_nexus_scan
+    for n in range(10):
+        create_nexus_scan(str(tmp_path / f"{1000 + n}.nxs"), scan_number=1000 + n, temperature=10. * n,
+                          cmd=f"scan x 0 1 0.1 {'pil' if n % 2 else 'merlin'}")
+    index_file = str(tmp_path / 'index.sqlite')
+    exp = Experiment(str(tmp_path), instrument='i16', index=index_file)
+    assert isinstance(exp.index, ScanIndex)
+    assert len(exp) == 10
+    assert len(exp.index) == 10
+
+    scans = exp.find_scans(scan_command='pil', **{'mean(Tsample)': (50, 1)})
+    assert [scan.scan_number() for scan in scans] == [1005]
+    hdf_map = create_nexus_map(exp.get_scan_filename(1000))  # map used by find_scans
+    assert exp.index.get(scans[0].filename, 'scan_command', hdf_map=hdf_map) == {'scan_command': 'scan x 0 1 0.1 pil'}
+    assert exp.index.get(scans[0].filename, 'scan_command') == {}  # values are stored per map
+
+    data = exp.join_scan_data(*range(1000, 1010), data_fields=['scan_command', 'Tsample'])
+    assert len(data['Tsample']) == 10
+    assert data['Tsample'][3].mean() == 30.
+
+    # results from the index match results from the files
+    no_index = Experiment(str(tmp_path), instrument='i16', index=False)
+    assert no_index.index is None
+    assert no_index.scans_str(1001, 1002) == exp.scans_str(1001, 1002)
+    assert len(no_index.find_scans(scan_command='merlin')) == len(exp.find_scans(scan_command='merlin')) == 5
+
+    # changed files are re-read
+    filename = create_nexus_scan(str(tmp_path / '1003.nxs'), scan_number=1003, temperature=200, n_points=21)
+    data = exp.join_scan_data(1003, data_fields=['Tsample'])
+    assert data['Tsample'][0].shape == (21,)
+    assert data['Tsample'][0].mean() == 200.
+    hdf_map = exp.scan(1003).map  # map used by join_scan_data, including config replace_names
+    assert exp.index.get(filename, 'Tsample', hdf_map=hdf_map)['Tsample'].mean() == 200.
+
+    # names that resolve differently in another map are not returned from the index
+    map1, map2 = create_nexus_map(filename), create_nexus_map(filename)
+    map1.add_named_expression(temp='Tsample')
+    map2.add_named_expression(temp='Tsample + 1')
+    assert map_key(map1) != map_key(map2)
+    assert exp.index.eval(map1, filename, names=['mean(temp)'])[0].values == [200.]
+    assert exp.index.eval(map2, filename, names=['mean(temp)'])[0].values == [201.]
+    assert exp.index.get(filename, 'mean(temp)', hdf_map=map1, check_files=False) == {'mean(temp)': 200.}
+
+    # values are stored without pickle
+    for value in ['text', 1, 2.5, None, np.float64(3.5), np.arange(5.), np.array(['a', 'bc'])]:
+        stored = decode_value(encode_value(value))
+        assert type(stored) is type(value) and np.all(stored == value)
+    assert encode_value(np.array([{}, 1], dtype=object)) is None
+    assert encode_value([1, 'a']) is None
+
+
+def test_scan_index_missing_names(tmp_path):
+    from mmg_toolbox.utils.parallel import MultiScanReader
+    from mmg_toolbox.utils.scan_index import ScanIndex
+    from .example_files import create_nexus_scan
+    filenames = [create_nexus_scan(str(tmp_path / f"{1000 + n}.nxs"), scan_number=1000 + n) for n in range(4)]
+    exp = Experiment(str(tmp_path), instrument='i16', index=False)
+    hdf_map = exp.scan(filenames[0]).map
+    index = ScanIndex(str(tmp_path / 'index.sqlite'))
+    for processes in [False, True]:
+        reader = MultiScanReader(workers=2, chunk_size=1, processes=processes)
+        for default in [1.0, 5.0]:
+            results = index.eval(hdf_map, *filenames, names=['scan_command', 'nonexistent'],
+                                 default=np.array([default]), reader=reader)
+            assert all(result.values[1][0] == default for result in results)
+        results = reader.eval(hdf_map, *filenames, names=['scan_command', 'nonexistent'])
+        assert all(result.found == [True, False] for result in results)
+        assert index.get(filenames[0], 'nonexistent', hdf_map=hdf_map) == {}
+
+
+def test_parallel_reader(tmp_path):
+    from mmg_toolbox.utils.parallel import MultiScanReader, parallel_map
+    from .example_files import create_nexus_scan
+    filenames = [
+        create_nexus_scan(str(tmp_path / f"{1000 + n}.nxs"), scan_number=1000 + n, temperature=10. * n)
+        for n in range(6)
+    ]
+    # per-file error capture
+    bad_file = str(tmp_path / '1006.nxs')
+    with open(bad_file, 'w') as f:
+        f.write('not a nexus file')
+    exp = Experiment(str(tmp_path), instrument='i16', index=False)
+    assert not exp.reader.processes  # threads by default
+    scans = exp.scans(*filenames)
+    exp.reader = MultiScanReader(workers=1)
+    serial = exp.join_scan_data(*filenames, data_fields=['Tsample', 'signal'])
+    assert exp.reader._executor is None
+
+    for processes in [False, True]:
+        exp.reader = MultiScanReader(workers=2, chunk_size=2, processes=processes)
+        data = exp.join_scan_data(*filenames, data_fields=['Tsample', 'signal'])
+        assert all((a == b).all() for a, b in zip(data['Tsample'], serial['Tsample']))
+        assert all((a == b).all() for a, b in zip(data['signal'], serial['signal']))
+        executor = exp.reader.executor()
+        results = exp.reader.eval(scans[0].map, *filenames, bad_file, names=['mean(Tsample)'])
+        assert exp.reader.executor() is executor  # pool is re-used between calls
+        assert [r.values[0] for r in results[:-1]] == [10. * n for n in range(6)]
+        assert not results[-1] and results[-1].error is not None
+        exp.reader.shutdown()
+
+    x, y, z = exp.generate_mesh(*filenames, axes='x', signal='signal', values='Tsample')
+    assert x.shape == y.shape == z.shape == (6, 11)
+    assert y[3, 0] == 30.
+
+    unordered = parallel_map(abs, range(-10, 0), workers=3, ordered=False)
+    assert sorted(result for index, result, error in unordered) == list(range(1, 11))
@@ -110,3 +110,45 @@ def test_scan_fit():
     result = scan.fit.multi_peak_fit('eta', 'sum', model='pVoight')
     assert result.npeaks == len(result) == 5
     assert result.amplitude == pytest.approx(1.3493e6, abs=1e3)
+
+
+def test_batch_multipeakfit():
+    from mmg_toolbox.fitting import batch_multipeakfit
+
+    x = np.linspace(-1, 1, 101)
+    centres = np.linspace(-0.2, 0.2, 6)
+    rng = np.random.default_rng(1)
+    ydata = [gauss(x, height=10, cen=cen, fwhm=0.2, bkg=1) + rng.random(len(x)) for cen in centres]
+
+    serial = batch_multipeakfit([x] * len(ydata), ydata, workers=1, npeaks=1)
+    assert len(serial) == 6 and all(error is None for error in serial.errors)
+    table = serial.table('center', 'fwhm')
+    assert table['center'] == pytest.approx(centres, abs=0.01)
+    assert np.all(table['stderr_center'] > 0)
+    assert serial[0].get_value('center')[0] == pytest.approx(multipeakfit(x, ydata[0], npeaks=1).center)
+
+    parallel = batch_multipeakfit([x] * len(ydata), ydata, workers=2, npeaks=1)
+    assert parallel.table('center')['center'] == pytest.approx(table['center'])
+    seeded = batch_multipeakfit([x] * len(ydata), ydata, workers=2, seed_from_previous=True)
+    assert seeded.table('center')['center'] == pytest.approx(table['center'], abs=1e-4)
+    assert len(str(seeded).splitlines()) == 7
+
+    from mmg_toolbox.utils.parallel import get_thread_executor
+    threads = batch_multipeakfit([x] * len(ydata), ydata, npeaks=1, executor=get_thread_executor())
+    assert threads.table('center')['center'] == pytest.approx(table['center'])
+    failed = batch_multipeakfit([x, x[:5]], [ydata[0], ydata[1]], npeaks=1, processes=False, workers=2)
+    assert failed.errors[0] is None and failed.errors[1] is not None
+
+
+def test_scan_batch_multi_peak_fit(tmp_path):
+    from mmg_toolbox.nexus.nexus_scan import NexusScan
+    from .example_files import create_nexus_scan
+
+    scans = [
+        NexusScan(create_nexus_scan(str(tmp_path / f"{1000 + n}.nxs"), scan_number=1000 + n, n_points=21))
+        for n in range(3)
+    ]
+    results = scans[0].fit.batch_multi_peak_fit(*scans[1:], xaxis='x', yaxis='signal', npeaks=1, workers=2)
+    assert results.labels == [1000, 1001, 1002]
+    assert results.table('center')['center'] == pytest.approx([0.5] * 3, abs=1e-3)
+    assert scans[2].fit.fit_result().center == pytest.approx(0.5, abs=1e-3)
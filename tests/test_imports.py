@@ -56,3 +56,27 @@ def test_other_imports():
         errors = e
     assert errors is None
 
+
+
+IMPORT_TIME_BUDGET = 1.0  # seconds, the eager package took ~2 s to import
+
+
+def test_import_time():
+    import sys
+    import subprocess
+    code = (
+        "import sys, mmg_toolbox\n"
+        "from mmg_toolbox import NexusScan\n"
+        "heavy = ['matplotlib', 'lmfit', 'scipy', 'tkinter', 'mmg_toolbox.xas', 'mmg_toolbox.fitting', "
+        "'mmg_toolbox.plotting', 'mmg_toolbox.diffraction', 'mmg_toolbox.tkguis', 'mmg_toolbox.utils.experiment']\n"
+        "print([m for m in heavy if m in sys.modules])\n"
+    )
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], capture_output=True, text=True)
+    assert output.returncode == 0, output.stderr
+    assert output.stdout.strip() == '[]'
+    # import time: self [us] | cumulative | imported package
+    cumulative = next(
+        int(line.split('|')[1]) for line in output.stderr.splitlines()
+        if line.startswith('import time:') and line.split('|')[-1].strip() == 'mmg_toolbox'
+    )
+    assert cumulative / 1e6 < IMPORT_TIME_BUDGET
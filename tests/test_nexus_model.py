@@ -15,3 +15,65 @@ def test_read_nexus_file():
     model = scan.instrument_model()
     assert isinstance(model, NXInstrumentModel)
 
+
+
+def test_pixel_hkl(tmp_path):
+    import h5py
+    import numpy as np
+    from .example_files import create_diffraction_scan
+
+    filename = create_diffraction_scan(str(tmp_path / 'diffraction.nxs'), n_points=5, image_shape=(20, 30))
+    with h5py.File(filename, 'r') as hdf:
+        model = NXInstrumentModel(hdf)
+    assert model.frames() == 5
+
+    hkl = model.pixel_hkl()
+    assert hkl.shape == (5, 20, 30, 3)
+    for point in [(0, 0, 0), (2, 10, 15), (4, 19, 29)]:
+        assert np.allclose(hkl[point], model.hkl(point))
+    q = model.pixel_q(frames=[1, 3], block_size=1)
+    assert q.shape == (2, 20, 30, 3)
+    assert np.allclose(q[1, 5, 7], model.detector_q((3, 5, 7)))
+    blocks = list(model.iter_pixel_q(hkl=True, block_size=2))
+    assert [len(frames) for frames, values in blocks] == [2, 2, 1]
+    assert np.allclose(np.concatenate([values for frames, values in blocks]), hkl)
+
+
+def test_map_volume(tmp_path):
+    import h5py
+    import numpy as np
+    from mmg_toolbox.diffraction.volume_mapper import map_volume, map_scan_volume, _load_instrument_model
+    from .example_files import create_diffraction_scan
+
+    filename = create_diffraction_scan(str(tmp_path / 'diffraction.nxs'), n_points=5, image_shape=(20, 30))
+    grid, volume, weight = map_volume(filename, step=0.002, workers=1)
+    assert volume.shape == weight.shape == grid.shape
+    assert weight.sum() == 5 * 20 * 30  # every pixel in the autobox
+    with h5py.File(filename, 'r') as hdf:
+        total = hdf['/entry/instrument/detector/data'][()].sum()
+    assert np.isclose((volume * weight).sum(), total)
+
+    grid2, volume2, weight2 = map_volume(filename, step=0.002, workers=2, block_size=2)
+    assert np.allclose(volume, volume2) and np.allclose(weight, weight2)
+
+    grid3, volume3, weight3 = map_volume(filename, start=grid.start, shape=grid.shape, step=0.002,
+                                         normalisation='rc', detector_region=[5, 25, 2, 18],
+                                         splitter='gaussian', workers=1)
+    assert grid3.shape == grid.shape
+    assert volume3.max() < volume.max() / 50  # normalised by monitor
+
+    output = map_scan_volume(filename, str(tmp_path / 'rsmap.nxs'), step=0.002, workers=1)
+    with h5py.File(output, 'r') as hdf:
+        assert hdf['/processed/reciprocal_space/volume'].shape == grid.shape
+        assert hdf['/processed/reciprocal_space/l-axis'].shape == (grid.shape[2],)
+        assert 'entry0/instrument' in hdf
+
+
+    # rewritten files are mapped with the new instrument model, which holds no open file objects
+    filename = create_diffraction_scan(filename, n_points=8, image_shape=(20, 30))
+    grid4, volume4, weight4 = map_volume(filename, step=0.002, workers=1)
+    assert weight4.sum() == 8 * 20 * 30
+    model = _load_instrument_model(filename)
+    assert model.frames() == 8
+    assert not any(isinstance(value, h5py.HLObject) for value in vars(model).values())
+    assert not any(isinstance(value, h5py.HLObject) for value in vars(model.sample).values())
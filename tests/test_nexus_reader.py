@@ -81,3 +81,204 @@ def test_find_scans():
     found_files = find_scans(*files, **match)
     assert len(found_files) == 2
 
+
+
+def test_image_stack_reductions(tmp_path):
+    import h5py
+    from .example_files import create_diffraction_scan
+
+    filename = create_diffraction_scan(str(tmp_path / 'diffraction.nxs'), n_points=7, image_shape=(20, 30))
+    with h5py.File(filename, 'r+') as hdf:
+        images = hdf['/entry/instrument/detector/data'][()]
+        del hdf['/entry/instrument/detector/data']
+        hdf.create_dataset('/entry/instrument/detector/data', data=images, chunks=(2, 20, 30))
+    scan = NexusScan(filename)
+    assert np.allclose(scan.image('sum'), images.sum(axis=0))
+    assert np.allclose(scan.image('sum', block_size=3, workers=2), images.sum(axis=0))
+    assert np.allclose(scan.image('mean', block_size=1), images.mean(axis=0))
+    assert np.allclose(scan.image('max', block_size=4), images.max(axis=0))
+    assert np.allclose(scan.image_totals(block_size=2, workers=2), images.sum(axis=(1, 2)))
+
+    n, bins = np.histogram(np.log10(images[images > 0].flatten()), bins=20)
+    assert scan.image_background(n_bins=20, block_size=3) == approx(10 ** bins[np.argmax(n)])
+
+
+def test_mca_roi_sums(tmp_path):
+    import h5py
+    from mmg_toolbox.nexus.image_reductions import mca_roi_sums, image_block_size
+
+    mca = np.random.default_rng(1).poisson(5, size=(37, 2, 64)).astype(np.int32)
+    with h5py.File(tmp_path / 'mca.h5', 'w') as hdf:
+        hdf.create_dataset('data', data=mca, chunks=(4, 2, 64))
+    rois = {'a': (10, 20), 'all': (0, 64), 'end': (60, 100)}
+    with h5py.File(tmp_path / 'mca.h5', 'r') as hdf:
+        dataset = hdf['data']
+        assert image_block_size(dataset, max_bytes=10 * 2 * 64 * 4, frame_ndim=2) == 8
+        for block_size, workers in [(None, 1), (5, 1), (7, 2)]:
+            spectrum, sums = mca_roi_sums(dataset, rois, block_size=block_size, workers=workers)
+            assert np.array_equal(spectrum, mca.sum(axis=(0, 1)))
+            assert np.array_equal(sums['a'], mca[..., 10:20].sum(axis=(1, 2)))
+            assert np.array_equal(sums['all'], mca.sum(axis=(1, 2)))
+            assert np.array_equal(sums['end'], mca[..., 60:].sum(axis=(1, 2)))
+        spectrum, sums = mca_roi_sums(dataset)
+        assert spectrum.shape == (64,) and sums == {}
+
+
+def test_nexus_map_cache(tmp_path):
+    import hdfmap
+    from mmg_toolbox.nexus.nexus_map_cache import NexusMapCache
+    from .example_files import create_nexus_scan
+
+    files = [create_nexus_scan(str(tmp_path / f"{n}.nxs"), scan_number=n, temperature=n) for n in range(3)]
+    other = create_nexus_scan(str(tmp_path / 'other.nxs'), n_points=21)
+    cache = NexusMapCache(max_maps=1)
+    maps = [cache.get(f) for f in files]
+    assert (cache.hits, cache.misses) == (2, 1)
+    assert maps[2].filename == files[2]
+    new_map = hdfmap.create_nexus_map(files[2])
+    assert maps[2].combined == new_map.combined
+    assert maps[2].scannables == new_map.scannables
+    assert maps[2].eval(maps[2].load_hdf(), 'Tsample[0]') == approx(2)
+
+    maps[1].add_roi('roi1', 1, 1, 2, 2)
+    assert 'roi1' in maps[1].alternate_names and 'roi1' not in maps[0].alternate_names
+
+    cache.get(files[0])  # unchanged file
+    assert cache.hits == 3
+    assert cache.get(other).scannables_length() == 21  # different shape, replaces map
+    assert (len(cache), cache.misses) == (1, 2)
+    assert cache.get(files[1]).scannables_length() == 11
+    assert cache.misses == 3
+
+    cache.enabled = False
+    cache.get(files[0])
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+def test_lazy_nexus_data_holder(tmp_path):
+    import hdfmap
+    from .example_files import create_nexus_scan
+
+    filename = create_nexus_scan(str(tmp_path / '1.nxs'), scan_number=1, temperature=12.3)
+    hdf_map = hdfmap.create_nexus_map(filename)
+    with hdfmap.load_hdf(filename) as hdf:
+        scannables = hdf_map.get_scannables(hdf, flatten=True)
+        metadata = hdf_map.get_metadata(hdf)
+
+    scan = NexusDataHolder(filename)
+    assert list(scan.keys()) == list(scannables) and list(scan.metadata.keys()) == list(metadata)
+    assert scan.loaded() == []
+    name = next(iter(scannables))
+    assert np.all(getattr(scan, name) == scannables[name])
+    assert scan.loaded() == [name]
+    assert scan.metadata.filename == metadata['filename']
+
+    assert scan.preload() is scan
+    assert len(scan.loaded()) == len(scannables)
+    assert all(np.all(dict(scan)[key] == value) for key, value in scannables.items())
+    assert all(np.all(scan.metadata[key] == value) for key, value in metadata.items())
+
+
+def test_hdf_file_pool(tmp_path):
+    import os
+    import threading
+    import h5py
+    from mmg_toolbox.utils.hdf_file_pool import HdfFilePool, hdf_file_pool, get_hdf_file_pool
+    from .example_files import create_nexus_scan
+
+    files = [create_nexus_scan(str(tmp_path / f"{n}.nxs"), scan_number=n, temperature=n) for n in range(4)]
+
+    # by default, files are closed after use and can be written to
+    scan = NexusScan(files[0])
+    assert scan('signal').shape == (11,)
+    with h5py.File(files[0], 'a') as hdf:
+        hdf['/entry/sample'].attrs['note'] = 'written'
+    with hdf_file_pool():
+        with get_hdf_file_pool().open(files[0]) as hdf:
+            pass
+        with get_hdf_file_pool().open(files[0]) as hdf2:
+            assert hdf2 is hdf and hdf.id.valid
+    assert not hdf.id.valid
+
+    pool = HdfFilePool(max_open=2, keep_open=True)
+    with pool.open(files[0]) as hdf:
+        assert hdf['/entry/sample/temperature'][()] == 0
+    with pool.open(files[0]) as hdf2:
+        assert hdf2 is hdf
+    assert hdf.id.valid  # not closed by the with statement
+    assert (pool.opens, pool.reused) == (1, 1)
+
+    # files in use are not closed, least recently used files are closed
+    with pool.open(files[1]) as hdf1:
+        for filename in files[2:]:
+            with pool.open(filename):
+                pass
+        assert hdf1.id.valid
+        assert not hdf.id.valid
+    assert len(pool) == 2
+
+    # changed files are re-opened
+    pool.close(files[3])  # files must be released from the pool before writing
+    create_nexus_scan(files[3], scan_number=3, temperature=30)
+    with pool.open(files[3]) as hdf:
+        assert hdf['/entry/sample/temperature'][()] == 30
+    os.utime(files[3], ns=(0, 0))
+    with pool.open(files[3]) as hdf2:
+        assert hdf2 is not hdf and not hdf.id.valid
+    assert pool.reopened == 1
+
+    def read(filename):
+        for _ in range(20):
+            with pool.open(filename) as f:
+                assert f['/entry/sample/temperature'][()] >= 0
+
+    threads = [threading.Thread(target=read, args=(files[n % 4],)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert pool.opens + pool.reused == 1 + 1 + 3 + 2 + 160
+    pool.close()
+    assert len(pool) == 0 and pool.closed == pool.opens
+
+
+def test_dataset_cache(tmp_path):
+    import os
+    from .example_files import create_nexus_scan
+
+    filename = create_nexus_scan(str(tmp_path / '1.nxs'), scan_number=1, temperature=300)
+    scan = NexusScan(filename)
+    result = scan('signal / Tsample')
+    assert scan.cache.stats()['misses'] == 2
+    assert scan('signal / Tsample') == approx(result)
+    assert scan.cache.hits == 2
+    assert scan.format('T={temperature:.0f}') == 'T=300'
+    assert scan.format('T={temperature:.0f}') == 'T=300'
+    assert scan.cache.stats()['scalars'] == 1
+    assert 'signal' not in scan._local_data  # values are kept in the cache only
+
+    # arrays are limited by size, scalars are kept
+    scan.cache.max_bytes = 100  # 11 float64 values = 88 bytes
+    scan('x + signal')
+    stats = scan.cache.stats()
+    assert stats['arrays'] == 1 and stats['bytes'] <= 100 and stats['evictions'] >= 2
+    assert stats['scalars'] == 1
+
+    # changed files clear the cache
+    os.utime(filename, ns=(0, 0))
+    assert scan('x')[-1] == approx(1)
+    stats = scan.cache.stats()
+    assert stats['invalidations'] == 1 and stats['scalars'] == 0 and stats['arrays'] == 1
+
+
+def test_dataset_cache_values_unchanged(tmp_path):
+    from .example_files import create_nexus_scan
+
+    scan = NexusScan(create_nexus_scan(str(tmp_path / '1.nxs'), scan_number=1))
+    y = scan('signal')
+    y /= 10  # returned arrays can be changed without changing cached values
+    x, y2 = scan('axes, signal')
+    y2 *= 2
+    assert scan('signal') == approx(10 * y)
+    assert scan('signal').max() == approx(110)
+    assert scan.cache.stats()['hits'] >= 2
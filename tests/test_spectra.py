@@ -3,17 +3,24 @@ mmg_toolbox tests
 Test Spectra Analysis Functions
 """
 
-from pytest import approx
+from pytest import approx, raises
 import numpy as np
+import gc
+from copy import deepcopy
 import os
 import h5py
 
 from mmg_toolbox import data_file_reader
 from mmg_toolbox.xas import (
     Spectra, SpectraContainer, SpectraContainerSubtraction, SpectraContainerAverage,
-    load_xas_scans, average_polarised_scans, polarised_pairs, pair_scans, average_scans
+    load_xas_scans, average_polarised_scans, polarised_pairs, iter_polarised_pairs, pair_scans, average_scans,
+    calculate_scans_sum_rules, create_xas_scan, find_similar_measurements, iter_similar_measurements
 )
-from mmg_toolbox.xas.nxxas_loader import is_nxxas, is_processed
+from mmg_toolbox.xas import pairing
+from mmg_toolbox.xas.processed_cache import ProcessedCache, hash_parameters
+from mmg_toolbox.xas.provenance import set_keep_parents
+from mmg_toolbox.xas.nxxas_loader import (is_nxxas, is_processed, is_subtraction, is_i16vortex, xas_file_type,
+                                          load_xas_metadata)
 from . import only_dls_file_system
 from .example_files import FILES_DICT
 
@@ -85,6 +92,50 @@ def test_spectra_container():
     assert 'xmcd' in steps_string
 
 
+def test_spectra_stack():
+    from mmg_toolbox.xas.spectra import SpectraStack
+    energy = np.arange(700, 730, 0.1)
+    rng = np.random.default_rng(1)
+    spectra = {
+        mode: Spectra(energy, 1 + n + 0.01 * energy + rng.random(len(energy)), label='test', mode=mode)
+        for n, mode in enumerate(['tey', 'tfy', 'pfy'])
+    }
+    container = SpectraContainer('test', spectra)
+    assert container.stack().signals.shape == (3, len(energy))
+    steps = [
+        ('trim', (2, 1), {}),
+        ('divide_by_signal_at_energy', (705, 710), {}),
+        ('divide_by_preedge', (5,), {}),
+        ('divide_by_postedge', (5,), {}),
+        ('divide_by_peak', (), {}),
+        ('divide_by_jump', (), {'ev_from_start': 3}),
+        ('divide_by_background', ('flat',), {}),
+        ('remove_background', ('norm',), {'ev_from_start': 4}),
+        ('remove_background', ('linear', 6), {}),
+        ('remove_background', ('flat',), {}),
+    ]
+    stacked = container
+    for method, args, kwargs in steps:
+        stacked = stacked._process_spectra(method, *args, **kwargs)
+        assert stacked.stack() is not None
+        for mode, spec in stacked.spectra.items():
+            parent = spec.parents[0]
+            expected = getattr(parent, method)(*args, **kwargs)
+            assert spec.signal == approx(expected.signal, abs=1e-8)
+            assert spec.process_label == expected.process_label
+            assert spec.parameters == expected.parameters
+            if 'linear' not in args:
+                assert spec.process == expected.process
+            assert np.shares_memory(spec.signal, stacked.stack().signals)
+    assert 'norm_to_jump' in stacked.analysis_steps()
+
+    # modes on different energy axes are processed separately
+    spectra['tfy'] = Spectra(energy + 0.05, spectra['tfy'].signal, mode='tfy')
+    assert SpectraStack.from_spectra(spectra) is None
+    container = SpectraContainer('test', spectra).remove_background('curve')
+    assert container.stack() is None and container.process_label == 'curve'
+
+
 def test_average_spectra():
     energy = np.arange(700, 730, 0.1)
     signal = 3 * np.ones(len(energy))
@@ -95,6 +146,10 @@ def test_average_spectra():
 
     av_scan = average_scans(container1, container2, container3)
     assert len(av_scan.parents) == 3
+    assert av_scan.spectra['tey'].error == approx(0)
+    av_scan = average_scans(container1, container2, container3, grid='n_points', weight_by_counts=True)
+    assert av_scan.spectra['tey'].signal.shape == energy.shape
+    assert av_scan.spectra['tey'].energy is av_scan.spectra['tfy'].energy
     assert repr(av_scan) == "SpectraContainerAverage('scan1+scan2+scan3', 'average', ['tey', 'tfy'])"
     av_scan = average_scans(container1, container2, container3, container2)
     assert len(av_scan.parents) == 4
@@ -110,6 +165,122 @@ def test_average_spectra():
     assert len(av_scan.parents) == 5
 
 
+def test_provenance():
+    energy = np.arange(700, 730, 0.1)
+
+    def create_container(name: str) -> SpectraContainer:
+        spectra = {
+            mode: Spectra(energy, 1 + 0.01 * energy + np.random.rand(len(energy)), label=name, mode=mode)
+            for mode in ['tey', 'tfy']
+        }
+        return SpectraContainer(name, spectra)
+
+    previous = set_keep_parents(False)
+    try:
+        scans = [create_container(str(n)).divide_by_preedge().remove_background('flat') for n in range(4)]
+        assert scans[0].parents == ()
+        average = average_scans(*scans)
+        assert len(average.parents) == 4
+        history = average.spectra['tey'].history
+        assert [step.operation for step in history[:3]] == ['raw', 'divide_by_preedge', 'flat']
+        assert history[-1].inputs == tuple(s.spectra['tey'].step.identifier for s in scans)
+        check = average.spectra['tey'].signal.copy()
+        del scans
+        gc.collect()
+        assert average.parents == ()
+        assert average.spectra['tey'].parents == []
+        assert len(average.spectra['tey'].history) == len(history)
+
+        # average without parents is weighted by the number of averaged spectra
+        extra = create_container('4').divide_by_preedge().remove_background('flat')
+        average2 = average + extra
+        assert average2.count == 5
+        extra_signal = np.interp(average2.spectra['tey'].energy, energy, extra.spectra['tey'].signal)
+        assert average2.spectra['tey'].signal == approx((4 * check + extra_signal) / 5)
+
+        # subtractions keep parents for the sum rules
+        xmcd = SpectraContainerSubtraction(average, extra)
+        del average, extra
+        gc.collect()
+        assert len(xmcd.parents) == 2
+        assert len(xmcd.spectra['tey'].parents) == 2
+    finally:
+        set_keep_parents(previous)
+
+
+def test_sum_rules_batch():
+    energy = np.arange(700, 730, 0.1)
+    xas = 1 + np.exp(-(energy - 708) ** 2 / 2) + 0.5 * np.exp(-(energy - 721) ** 2 / 2)
+    xmcd = 0.1 * np.exp(-(energy - 708) ** 2 / 2) - 0.08 * np.exp(-(energy - 721) ** 2 / 2)
+    scans = []
+    for n, amplitude in enumerate(np.linspace(0.1, 1, 10)):
+        containers = []
+        for pol, sign in [('pc', 1), ('nc', -1)]:
+            spectra = {
+                mode: Spectra(energy, xas + sign * amplitude * xmcd / 2, label=f"{n}{pol}", mode=mode)
+                for mode in ['tey', 'tfy']
+            }
+            container = SpectraContainer(f"{n}{pol}", spectra)
+            container.metadata.pol = pol
+            containers.append(container)
+        scans.append(containers[0] - containers[1])
+    # different energy grid
+    scans[-1] = SpectraContainerSubtraction(*(c.trim(1, 1) for c in scans[-1].parents))
+
+    orbital, spin = calculate_scans_sum_rules(*scans, n_holes=4)
+    assert orbital.shape == spin.shape == (10,)
+    for n, scan in enumerate(scans):
+        orb, spn = scan.calculate_sum_rules(n_holes=4)
+        assert orbital[n] == approx(orb, rel=1e-10)
+        assert spin[n] == approx(spn, rel=1e-10)
+    assert abs(orbital[1]) > abs(orbital[0])
+
+    orbital, spin = calculate_scans_sum_rules(*scans, mode='tfy', split_energy=715)
+    assert spin[3] == approx(scans[3].calculate_sum_rules(mode='tfy', split_energy=715)[1], rel=1e-10)
+
+
+def test_pairing(caplog):
+    energy = np.arange(700, 730, 0.1)
+
+    def create_container(name: str, pol: str, field: float, temp: float = 300) -> SpectraContainer:
+        spectra = {'tey': Spectra(energy, np.ones_like(energy), label=name, mode='tey')}
+        container = SpectraContainer(name, spectra)
+        container.metadata.pol = pol
+        container.metadata.mag_field = field
+        container.metadata.temp = temp
+        return container
+
+    scans = [
+        create_container('1', 'pc', 1),
+        create_container('2', 'pc', -1),
+        create_container('3', 'nc', 1.002),
+        create_container('4', 'nc', -1),
+        create_container('5', 'nc', 1, temp=10),
+        create_container('6', 'pc', 1, temp=10.5),
+        create_container('7', 'lh', 0),
+    ]
+    pairs = polarised_pairs(*scans)
+    assert [(s1.name, s2.name) for s1, s2 in pairs] == [('1', '3'), ('2', '4'), ('6', '5')]
+    assert '1 scans could not be paired: 7' in caplog.text
+    pairs = pair_scans(*scans)
+    assert [(s1.name, s2.name) for s1, s2 in pairs] == [('1', '2'), ('3', '4'), ('5', '6')]
+    pairs = pair_scans(*scans, temp_tol=0.1)
+    assert [(s1.name, s2.name) for s1, s2 in pairs] == [('1', '2'), ('3', '4')]
+
+    pairs = iter_polarised_pairs(iter(scans))
+    assert [(s1.name, s2.name) for s1, s2 in pairs] == [('1', '3'), ('2', '4'), ('6', '5')]
+
+    pairs, unmatched = pairing.polarisation_pairs(*(s.metadata for s in scans), field_tol=0.001)
+    assert pairs == [(1, 3), (5, 4)]
+    assert unmatched == [0, 2, 6]
+    assert list(pairing.cluster_values([1, 5, 1.1, 5.05, 3, np.nan], 0.2)) == [0, 2, 0, 2, 1, -1]
+    # a ramp of steps smaller than the tolerance is not chained into a single cluster
+    ramp = np.arange(0, 10, 0.05)
+    clusters = pairing.cluster_values(ramp, 0.5)
+    assert clusters.max() >= 9
+    assert all(np.ptp(ramp[clusters == n]) <= 0.5 for n in range(clusters.max() + 1))
+
+
 @only_dls_file_system
 def test_load_xas_scans():
     assert is_nxxas(FILES_DICT['i06-1 zacscan'])
@@ -296,6 +467,163 @@ def test_write_subtracted_outputs():
     os.remove('test_subtracted.csv')
 
 
+def test_xas_file_type(tmp_path, monkeypatch):
+    from mmg_toolbox.utils.hdf_file_pool import close_hdf
+    energy = np.arange(700, 730, 0.1)
+    signal = 3 * np.ones(len(energy))
+    containers = []
+    for n, pol in enumerate(['cr', 'cl']):
+        spectra = {mode: Spectra(energy, signal * (1 + n), label=f'test{n}', mode=mode) for mode in ['tey', 'tfy']}
+        container = SpectraContainer(f'test{n}', spectra)
+        container.metadata.pol = pol
+        containers.append(container)
+    containers[0].write_nexus(str(tmp_path / 'xas.nxs'))
+    (containers[0] - containers[1]).write_nexus(str(tmp_path / 'xmcd.nxs'))
+    with h5py.File(tmp_path / 'vortex.nxs', 'w') as hdf:
+        hdf.create_group('entry/instrument/xmapMca').attrs['NX_class'] = 'NXdetector'
+        hdf['entry'].attrs['NX_class'] = 'NXentry'
+        hdf['entry/instrument'].attrs['NX_class'] = 'NXinstrument'
+        hdf['entry/definition'] = 'NXmx'
+
+    file_types = {'xas.nxs': 'nxxas', 'xmcd.nxs': 'subtraction', 'vortex.nxs': 'i16vortex'}
+    for name, file_type in file_types.items():
+        filename = str(tmp_path / name)
+        with h5py.File(filename, 'r') as hdf:
+            assert xas_file_type(hdf) == file_type
+            assert is_i16vortex(hdf) == (file_type == 'i16vortex')
+            assert is_subtraction(hdf) == (file_type == 'subtraction')
+            assert is_nxxas(hdf) == (file_type != 'i16vortex')
+        assert is_nxxas(filename) == (file_type != 'i16vortex')
+
+    # each file is only opened once
+    close_hdf()  # files opened above may be kept in the pool
+    opened = []
+    h5py_init = h5py.File.__init__
+    def count_init(self, name, *args, **kwargs):
+        if isinstance(name, str):  # h5py.File(GroupID) is used internally for obj.file
+            opened.append(name)
+        h5py_init(self, name, *args, **kwargs)
+    monkeypatch.setattr(h5py.File, '__init__', count_init)
+    xas, xmcd = load_xas_scans(str(tmp_path / 'xas.nxs'), str(tmp_path / 'xmcd.nxs'))
+    monkeypatch.undo()
+    assert len(opened) == 2
+    assert isinstance(xas, SpectraContainer)
+    assert isinstance(xmcd, SpectraContainerSubtraction)
+
+
+def test_find_similar_measurements(tmp_path):
+    energy = np.arange(700, 730, 0.1)
+    filenames = []
+    for n, (pol, temp, field) in enumerate([('cl', 10, 1), ('cr', 10, -1), ('cl', 100, 1), ('cl', 10, 0)]):
+        scan = create_xas_scan(str(n), energy, np.ones_like(energy), {'tey': 3 + np.random.rand(len(energy))},
+                               scan_no=n, pol=pol, temp=temp, mag_field=field)
+        filename = str(tmp_path / f"{n}.nxs")
+        scan.write_nexus(filename)
+        # remove NXprocess groups to create raw NXxas file
+        with h5py.File(filename, 'a') as hdf:
+            for name in list(hdf[str(n)]):
+                if hdf[str(n)][name].attrs.get('NX_class') == 'NXprocess':
+                    del hdf[str(n)][name]
+        assert not is_processed(filename)
+        metadata = load_xas_metadata(filename)
+        m = load_xas_scans(filename)[0].metadata
+        assert metadata == {'element': m.element, 'edge': m.edge, 'temp': m.temp, 'mag_field': m.mag_field, 'pol': m.pol}
+        filenames.append(filename)
+
+    similar = find_similar_measurements(*filenames, workers=2)
+    assert [scan.name for scan in similar] == ['0', '1']
+    scans = iter_similar_measurements(*filenames, workers=1)
+    assert next(scans).name == '0'
+    assert len(list(scans)) == 1
+
+    # metadata read using an executor supplied by the caller
+    from mmg_toolbox.utils.parallel import get_thread_executor
+    scans = iter_similar_measurements(*filenames, executor=get_thread_executor())
+    assert [scan.metadata.filename for scan in scans] == filenames[:2]
+
+
+def test_processed_cache(tmp_path, monkeypatch):
+    energy = np.arange(700, 730, 0.1)
+    filenames = []
+    for n, pol in enumerate(['cl', 'cr', 'cl', 'cr']):
+        signal = 1 + (1 + 0.1 * n) * np.exp(-(energy - 708) ** 2) + np.random.rand(len(energy)) / 100
+        scan = create_xas_scan(str(n), energy, np.ones_like(energy), {'tey': signal, 'tfy': signal + 1},
+                               scan_no=n, pol=pol, element_edge='Fe L3', sample_name='sample')
+        filename = str(tmp_path / f"{n}.nxs")
+        scan.write_nexus(filename)
+        # remove NXprocess groups to create raw NXxas file
+        with h5py.File(filename, 'a') as hdf:
+            for name in list(hdf[str(n)]):
+                if hdf[str(n)][name].attrs.get('NX_class') == 'NXprocess':
+                    del hdf[str(n)][name]
+        filenames.append(filename)
+
+    steps = [('divide_by_preedge', (), {'ev_from_start': 5}), ('remove_background', ('flat',))]
+
+    def process(cache):
+        scans = cache.process_scans(*filenames, steps=steps)
+        av1 = cache.apply(average_scans, scans[0], scans[2])
+        av2 = cache.apply(average_scans, scans[1], scans[3])
+        return scans, cache.apply(SpectraContainerSubtraction, av1, av2)
+
+    cache = ProcessedCache(str(tmp_path / 'cache'))
+    scans, xmcd = process(cache)
+    assert cache.stats() == {'files': 7, 'hits': 0, 'misses': 7}
+
+    cache = ProcessedCache(str(tmp_path / 'cache'))
+    cached_scans, cached_xmcd = process(cache)
+    assert cache.stats() == {'files': 7, 'hits': 7, 'misses': 0}
+    assert cached_scans[0].name == '0'
+    assert cached_scans[1].metadata.pol == scans[1].metadata.pol != scans[0].metadata.pol
+    assert cached_scans[0].metadata.filename == filenames[0]
+    assert cached_scans[0].spectra['tey'].signal == approx(scans[0].spectra['tey'].signal)
+    assert cached_scans[0].spectra['tey'].background == approx(scans[0].spectra['tey'].background)
+    assert isinstance(cached_xmcd, SpectraContainerSubtraction)
+    assert cached_xmcd.spectra['tey'].signal == approx(xmcd.spectra['tey'].signal)
+    assert cached_xmcd.calculate_sum_rules(n_holes=4) == approx(xmcd.calculate_sum_rules(n_holes=4))
+
+    # changed parameters recompute every scan, a modified file recomputes the results that use it
+    cache.process_scans(*filenames, steps=steps[:1])
+    assert cache.misses == 4
+    os.utime(filenames[1], ns=(0, 0))
+    process(cache)
+    assert cache.misses == 4 + 3
+
+    # results of other versions of mmg_toolbox are not used
+    monkeypatch.setattr('mmg_toolbox.xas.processed_cache.__version__', '0.0.0')
+    process(cache)
+    assert cache.misses == 4 + 3 + 7
+
+    # cache files are processed NeXus files
+    assert all(is_processed(filename) for filename in cache.cache_files())
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_hash_parameters():
+    steps = [('remove_background', ('poly',), {'order': np.int64(2), 'ev_range': np.array([700., 705.])})]
+    assert hash_parameters('load_xas_scan', steps) == hash_parameters('load_xas_scan', deepcopy(steps))
+    assert hash_parameters({'a': 1, 'b': 2}) == hash_parameters({'b': 2, 'a': 1})
+    assert hash_parameters(steps) != hash_parameters(steps[:0])
+    with raises(TypeError):
+        hash_parameters([('method', (object(),), {})])
+
+
+def test_i16_vortex_mca(tmp_path):
+    from mmg_toolbox.xas.nxxas_loader import load_from_i16_vortex
+    from .example_files import create_vortex_scan
+
+    filename = str(tmp_path / 'vortex.nxs')
+    mca = create_vortex_scan(filename)
+    scan = load_from_i16_vortex(filename, rois={'pfy': (100, 150)}, block_size=3, workers=2)
+    assert list(scan.spectra) == ['tfy', 'pfy']
+    assert np.array_equal(scan.metadata.raw_signals['pfy'], mca[..., 100:150].sum(axis=(1, 2)))
+
+    mca = create_vortex_scan(filename, energy_scan=False)
+    scan, = load_xas_scans(filename)
+    assert np.array_equal(scan.metadata.raw_signals['xes'], mca.sum(axis=(0, 1)))
+
+
 @only_dls_file_system
 def test_i16_vortex_spectra():
     # single energy detector spectrum
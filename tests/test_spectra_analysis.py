@@ -36,6 +36,48 @@ def test_edge_labels():
     # assert element + edges == 'TbM5'  # currently gives GeL2
 
 
+def test_edge_database():
+    db = spa.get_edge_database()
+    assert spa.get_edge_database() is db
+    energies, labels = db.families['L3']
+    assert np.all(np.diff(energies) >= 0)
+    assert db.in_range(770, 800, ('L3', 'L2')) == {'Co L3': 778.0, 'Co L2': 793.0}
+    assert db.in_range(778, 793, ('L3', 'L2')) == {}  # range is exclusive
+    assert list(db.nearest([708, 778.4, 853])) == ['Fe L3', 'Co L3', 'La M4']
+    assert list(db.nearest([708, 778.4, 853], ('L3', 'L2'))) == ['Fe L3', 'Co L3', 'Ni L3']
+
+    labels = spa.nearest_edge_labels([708, 778.4, 543])
+    assert labels == [spa.nearest_edge_label(708), ('Co', 'L3, L2'), ('O', 'K')]
+
+    min_energy = [700, 850, 523, 1]
+    max_energy = [730, 875, 560, 2]
+    labels = spa.energy_range_edge_labels(min_energy, max_energy, default=('', ''))
+    assert labels == [('Fe', 'L3, L2'), ('Ni', 'L3, L2'), ('O', 'K'), ('', '')]
+    with pytest.raises(ValueError):
+        spa.energy_range_edge_labels(min_energy, max_energy)
+
+
+def test_sum_rules_batch():
+    rng = np.random.default_rng(1)
+    energy = np.linspace(700, 730, 301)
+    average = 1 + rng.random((20, len(energy)))
+    difference = rng.normal(0, 0.1, (20, len(energy)))
+    n_holes = rng.uniform(1, 5, 20)
+    split_energy = rng.uniform(705, 725, 20)
+    split_energy[0] = 0  # all L3
+    orbital, spin = spa.sum_rules_batch(energy, average, difference, n_holes, split_energy)
+    for n in range(20):
+        orb = spa.orbital_angular_momentum(energy, average[n], difference[n], n_holes[n])
+        spn = spa.spin_angular_momentum(energy, average[n], difference[n], n_holes[n], split_energy[n])
+        assert orbital[n] == pytest.approx(orb, rel=1e-10)
+        assert spin[n] == pytest.approx(spn, rel=1e-10)
+
+    orbital, spin = spa.sum_rules_batch(energy, average, difference, 4)
+    assert spin[5] == pytest.approx(spa.spin_angular_momentum(energy, average[5], difference[5], 4), rel=1e-10)
+    with pytest.raises(ValueError):
+        spa.sum_rules_batch(energy, average, difference, 0)
+
+
 def test_n_holes():
     assert spa.d_electron_count('Ni2+') == 8
     assert spa.d_electron_count('Co2+') == 7
@@ -49,3 +91,82 @@ def test_n_holes():
     assert spa.d_electron_holes('Fe') == 4
 
 
+
+
+def test_average_energy_spectra():
+    rng = np.random.default_rng(0)
+    en1 = np.sort(rng.uniform(700, 730, 300))
+    en2 = np.linspace(699, 731, 250)
+    sig1, sig2 = rng.random(300), rng.random(250)
+
+    energy = spa.average_energy_scans(en1, en2)
+    assert energy[0] == en1[0] and energy[-1] >= en1[-1]
+    assert len(spa.average_energy_scans(en1, en2, grid='n_points', n_points=100)) == 100
+    assert len(spa.average_energy_scans(en1, en2, grid='median_step')) < len(energy)
+    with pytest.raises(ValueError):
+        spa.average_energy_scans(en1, grid='max_step')
+
+    check = np.mean([np.interp(energy, en1, sig1), np.interp(energy, en2, sig2)], axis=0)
+    assert spa.average_energy_spectra(energy, (en1, sig1), (en2, sig2)) == pytest.approx(check)
+    outside = np.linspace(690, 740, 501)
+    assert spa.interpolate_spectra(outside, (en1, sig1))[0] == pytest.approx(np.interp(outside, en1, sig1))
+
+    # repeated scans, added in one batch or one at a time
+    data = 1 + rng.random((50, len(en2)))
+    weights = rng.uniform(1, 5, 50)
+    signal, error = spa.average_energy_spectra_error(en2, *((en2, d) for d in data))
+    assert signal == pytest.approx(data.mean(axis=0))
+    assert error == pytest.approx(data.std(axis=0, ddof=1) / np.sqrt(50))
+    averager = spa.SpectraAverager(en2)
+    for sig, weight in zip(data, weights):
+        averager.add(en2, sig, weight)
+    assert averager.count == 50
+    assert averager.mean == pytest.approx(np.average(data, axis=0, weights=weights))
+    signal, error = spa.average_energy_spectra_error(en2, *((en2, d) for d in data), weights=weights)
+    assert error == pytest.approx(averager.standard_error())
+
+
+def test_fit_background_batch():
+    from lmfit.models import PolynomialModel, StepModel
+    rng = np.random.default_rng(2)
+    energy = np.arange(700, 730, 0.1)
+    signals = np.array([
+        1 + 0.01 * (energy - 700) + 0.5 * spa.step_function(energy, 707) + 0.25 * spa.step_function(energy, 720)
+        + 0.01 * rng.random(len(energy))
+        for _ in range(5)
+    ])
+
+    for name, function in [('flat', spa.subtract_flat_background), ('norm', spa.normalise_background),
+                           ('linear', spa.fit_linear_background), ('curve', spa.fit_curve_background)]:
+        bkg, norm, fits = spa.fit_background_batch(energy, signals, name, ev_from_start=8)
+        for n, signal in enumerate(signals):
+            check_bkg, check_norm, check_fit = function(energy, signal, ev_from_start=8)
+            assert bkg[n] == pytest.approx(check_bkg, abs=1e-6)
+            assert norm[n] == pytest.approx(check_norm)
+
+    # polynomial with steps at fixed energies, compared with lmfit with fixed centres and widths
+    bkg, jump, fits = spa.fit_background_batch(energy, signals, 'poly_fixed_edges', 707, 720, peak_width_ev=3)
+    model = PolynomialModel(degree=2, prefix='bkg_')
+    model += StepModel(form='arctan', prefix='edge1_') + StepModel(form='arctan', prefix='edge2_')
+    pars = model.make_params(bkg_c0=1, bkg_c1=0, bkg_c2=0)
+    for n, edge in enumerate((707, 720)):
+        pars[f'edge{n + 1}_center'].set(value=edge, vary=False)
+        pars[f'edge{n + 1}_sigma'].set(value=2, vary=False)
+        pars[f'edge{n + 1}_amplitude'].set(value=0.3)
+    region = np.abs(energy - 707) >= 3
+    region &= np.abs(energy - 720) >= 3
+    for n, signal in enumerate(signals):
+        result = model.fit(signal[region], pars, x=energy[region])
+        assert bkg[n] == pytest.approx(result.eval(x=energy), abs=1e-6)
+        check_jump = result.params['edge1_amplitude'].value + result.params['edge2_amplitude'].value
+        assert jump[n] == pytest.approx(check_jump, abs=1e-6)
+        assert fits[n].params['edge1_amplitude'] == pytest.approx(0.5, abs=0.05)
+    single = spa.fit_fixed_edges_background(energy, signals[0], 707, 720, peak_width_ev=3)
+    assert single[0] == pytest.approx(bkg[0]) and 'linear least squares' in single[2].fit_report()
+
+    bkg, jump, fits = spa.fit_background_batch(energy, signals, 'double_edge_fixed', 707, 720)
+    assert jump[1] == pytest.approx(spa.fit_double_edge_fixed_background(energy, signals[1], 707, 720)[1])
+
+    # non-linear models are fitted with lmfit
+    bkg, jump, fits = spa.fit_background_batch(energy, signals[:2], 'step')
+    assert bkg.shape == (2, len(energy)) and hasattr(fits[0], 'fit_report')
@@ -105,3 +105,33 @@ def test_misc_functions():
     # misc_functions.numbers2string()
 
 
+
+
+def test_folder_watcher(tmp_path):
+    import os
+    from mmg_toolbox.utils.folder_watcher import FolderWatcher
+
+    folder = str(tmp_path)
+    for n in range(3):
+        (tmp_path / f"{n}.nxs").write_text('')
+    (tmp_path / 'other.dat').write_text('')
+
+    for use_inotify in [True, False]:
+        watcher = FolderWatcher('.nxs', use_inotify=use_inotify)
+        changes = watcher.changes(folder)
+        assert changes.reset and len(changes.added) == 3
+        assert watcher.changes(folder, changes.sequence).added == []
+
+        new_file = os.path.join(folder, f"new_{use_inotify}.nxs")
+        with open(new_file, 'w'):
+            pass
+        os.remove(os.path.join(folder, '0.nxs'))
+        os.utime(folder, ns=(0, 0))  # ensure directory modified time changes
+        new_changes = watcher.changes(folder, changes.sequence)
+        assert new_changes.added == [new_file]
+        assert new_changes.removed == [os.path.join(folder, '0.nxs')]
+        assert not new_changes.reset
+        assert watcher.files(folder)[-1] == new_file  # sorted by modified time
+        (tmp_path / '0.nxs').write_text('')
+        os.remove(new_file)
+        watcher.close()